@@ -0,0 +1,113 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+"""
+ Benchmark of pragma extraction over a corpus of large flattened contracts:
+ the line by line extraction against the pragma scanner.
+
+     PYTHONPATH=src/usolc USOLC_HOME=. python3 benchmarks/bench_pragma_scanner.py [CORPUS_DIR]
+
+ Without CORPUS_DIR, a corpus of generated flattened files is used.
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+import usolc
+import pragma_scanner
+from exceptions.pragmaline_notfound_error import PragmaLineNotFoundError
+
+UNIT_TEMPLATE = """// File: contracts/Unit{index}.sol
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.4.24;
+
+/**
+ * @title Unit{index}
+ * @dev generated for benchmarking, "pragma solidity" in comments must be ignored
+ */
+contract Unit{index} {{
+    mapping(address => uint256) balances;
+    string constant NAME = "Unit{index}; pragma solidity 0.1.0;";
+
+    function transfer(address to, uint256 value) public returns (bool) {{
+        require(balances[msg.sender] >= value);
+        balances[msg.sender] -= value;
+        balances[to] += value;
+        return true;
+    }}
+{functions}
+}}
+
+"""
+
+FUNCTION_TEMPLATE = """
+    // helper {index}
+    function helper{index}(uint256 a, uint256 b) internal pure returns (uint256) {{
+        return a * {index} + b;
+    }}
+"""
+
+
+def generate_flattened_file(directory, index, units, functions_per_unit):
+    functions = "".join(FUNCTION_TEMPLATE.format(index=i) for i in range(functions_per_unit))
+    path = os.path.join(directory, "Flattened{0}.sol".format(index))
+    with open(path, "w") as flattened:
+        for unit in range(units):
+            flattened.write(UNIT_TEMPLATE.format(index=unit, functions=functions))
+    return path
+
+
+def rules_line_by_line(filename):
+    try:
+        return [usolc.getrule_from_pragma(line) for line in usolc.extract_pragma_lines(filename)]
+    except PragmaLineNotFoundError:
+        return ["*"]
+
+
+def rules_scanner(filename):
+    return pragma_scanner.scan_file_pragma_rules(filename) or ["*"]
+
+
+def bench(function, filenames, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for filename in filenames:
+            function(filename)
+    return (time.perf_counter() - start) / repeat
+
+
+def run(filenames):
+    lines = 0
+    for filename in filenames:
+        with open(filename, "rb") as source:
+            lines += source.read().count(b"\n")
+
+    line_by_line = bench(rules_line_by_line, filenames, 3)
+    scanner = bench(rules_scanner, filenames, 3)
+    print("{0} files, {1} lines".format(len(filenames), lines))
+    print("line by line: {0:8.1f} ms".format(line_by_line * 1e3))
+    print("scanner:      {0:8.1f} ms  ({1:.1f}x)".format(scanner * 1e3, line_by_line / scanner))
+
+
+def main(argv):
+    if len(argv) > 1:
+        corpus = argv[1]
+        run([os.path.join(corpus, name) for name in sorted(os.listdir(corpus)) if name.endswith(".sol")])
+        return 0
+
+    with tempfile.TemporaryDirectory() as corpus:
+        filenames = [generate_flattened_file(corpus, index, 20, 60) for index in range(20)]
+        run(filenames)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
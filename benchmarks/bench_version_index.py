@@ -0,0 +1,78 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+"""
+ Microbenchmark of version resolution: the semver_filter path against the version index.
+
+ The semver_filter path is what choose_version_by_argument() used to do: filter the list
+ once per pragma rule with node-semver, then pick with max_satisfying/min_satisfying.
+
+     PYTHONPATH=src/usolc USOLC_HOME=. python3 benchmarks/bench_version_index.py
+"""
+
+import sys
+import timeit
+import semver
+
+import usolc
+import version_index
+
+PRAGMA_RULES = [["^0.4.2"], [">=0.4.2 <0.6.0"], ["0.4.1 || >=0.4.3 <0.6.0"], ["^0.4.2", "0.4.2"]]
+STRATEGIES = [["*", usolc.VersionChoosing.NEWEST], ["*", usolc.VersionChoosing.OLDEST]]
+
+
+def synthetic_versions(count):
+    """
+    Returns count versions spread evenly over 0.4.x ~ 0.8.x
+    """
+    return ["0.{0}.{1}".format(4 + minor, patch) for minor in range(5) for patch in range(count // 5)]
+
+
+def resolve_with_semver_filter(available_versions, sol_rules, strategy):
+    filtered = available_versions
+    for sol_rule in sol_rules:
+        filtered = list(filter(usolc.make_semver_filter(sol_rule), filtered))
+    [target_range, choosing] = strategy
+    if choosing == usolc.VersionChoosing.NEWEST:
+        return semver.max_satisfying(filtered, target_range, loose=True)
+    return usolc.semver_min_satisfying(filtered, target_range)
+
+
+def resolve_with_index(available_versions, sol_rules, strategy):
+    return usolc.choose_version_by_rules(available_versions, sol_rules, strategy)
+
+
+def bench(function, available_versions, repeat):
+    def run():
+        for sol_rules in PRAGMA_RULES:
+            for strategy in STRATEGIES:
+                function(available_versions, sol_rules, strategy)
+    resolutions = len(PRAGMA_RULES) * len(STRATEGIES) * repeat
+    return timeit.timeit(run, number=repeat) / resolutions
+
+
+def main():
+    print("{0:>8} {1:>20} {2:>20} {3:>10}".format("versions", "semver_filter (us)", "index (us)", "speedup"))
+    for count in [20, 200, 2000]:
+        available_versions = synthetic_versions(count)
+        for sol_rules in PRAGMA_RULES:
+            for strategy in STRATEGIES:
+                assert(resolve_with_semver_filter(available_versions, sol_rules, strategy) ==
+                       resolve_with_index(available_versions, sol_rules, strategy))
+
+        repeat = max(1, 2000 // count)
+        legacy = bench(resolve_with_semver_filter, available_versions, repeat)
+        indexed = bench(resolve_with_index, available_versions, repeat * 10)
+        print("{0:>8} {1:>20.1f} {2:>20.1f} {3:>9.0f}x".format(count, legacy * 1e6, indexed * 1e6,
+                                                                legacy / indexed))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
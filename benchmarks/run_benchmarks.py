@@ -0,0 +1,283 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+"""
+ Benchmark suite of usolc, with a baseline to catch regressions.
+
+     PYTHONPATH=src/usolc:benchmarks USOLC_HOME=. python3 benchmarks/run_benchmarks.py \
+         [--output FILE] [--check BASELINE] [--tolerance 0.5] [--update-baseline BASELINE] [-k NAME]
+
+ or "make bench" / "make bench-check". The benchmarks are:
+
+     cold_start              bin/solc on a single file, with a stub solc that exits at once
+     resolve_<n>             choose_version_by_argument() against <n> synthetic versions
+     pragma_scan_large       pragma extraction of a large flattened file
+     stdjson_<n>             version resolution of a standard-json input of <n> sources
+
+ Each benchmark is run for several rounds of at least 10 ms, repeating quick operations, with
+ the garbage collector paused, and its best time per operation is kept: other load only ever
+ adds time. The time of every round is also divided by that of a fixed pure-Python calibration
+ loop run right before and after it, and the best of these normalized times is kept, so that a
+ baseline recorded on one machine can be checked on another: a benchmark regresses when its
+ normalized time exceeds the baseline's by more than the tolerance (50% by default).
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import argparse
+import platform
+import subprocess
+import tempfile
+
+import usolc
+import bench_pragma_scanner
+import bench_version_index
+
+RESULTS_FORMAT_VERSION = 2
+DEFAULT_TOLERANCE = 0.5
+DEFAULT_ROUNDS = 7
+CALIBRATION_ROUNDS = 21
+# rounds shorter than this are mostly scheduler noise
+MIN_ROUND_SECONDS = 0.01
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(REPO_DIR, "benchmarks", "baseline.json")
+
+STUB_SOLC = "#!/bin/sh\nexit 0\n"
+SOURCE_TEMPLATE = "pragma solidity ^0.4.2;\ncontract C{0} {{ function f() public pure returns (uint) {{ return {0}; }} }}\n"
+
+
+def timed(function, calls=1):
+    start = time.perf_counter()
+    for _ in range(calls):
+        function()
+    return time.perf_counter() - start
+
+
+def measure(function, operations, rounds=DEFAULT_ROUNDS):
+    """
+    Runs function (which performs the given number of operations) for several rounds, calling it
+    as many times per round as it takes to last MIN_ROUND_SECONDS, between two runs of the
+    calibration loop
+    Returns [best time of one operation in seconds, best time normalized by the calibration loop]
+    """
+    import gc
+    calls = max(1, int(math.ceil(MIN_ROUND_SECONDS / max(timed(function), 1e-9))))
+    timings = []
+    normalized = []
+    # as timeit does: collections triggered by earlier garbage are not the benchmark's time
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            gc.collect()
+            before = timed(calibration_loop)
+            timing = timed(function, calls) / (calls * operations)
+            after = timed(calibration_loop)
+            timings.append(timing)
+            # the host speeds up and slows down over seconds: each round is compared to its neighbours
+            normalized.append(timing / min(before, after))
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return [min(timings), min(normalized)]
+
+
+def calibration_loop():
+    """
+    Fixed pure-Python work, the unit in which normalized times are expressed
+    """
+    total = 0
+    for i in range(200000):
+        total += i % 7
+    return sorted(str(i) for i in range(20000))
+
+
+def calibrate():
+    """
+    Returns the fastest time of the calibration loop, the least disturbed by other load
+    """
+    return min(timed(calibration_loop) for _ in range(CALIBRATION_ROUNDS))
+
+
+def make_stub_home(directory):
+    """
+    A USOLC_HOME running the usolc sources of this repository, with stub compilers
+    """
+    os.makedirs(os.path.join(directory, "bin"))
+    os.symlink(os.path.join(REPO_DIR, "src"), os.path.join(directory, "src"))
+    shutil.copy(os.path.join(REPO_DIR, "bin", "solc"), os.path.join(directory, "bin", "solc"))
+    for version in ["0.4.24", "0.4.25", "0.5.0"]:
+        path = os.path.join(directory, "bin", "solc-" + version)
+        with open(path, "w") as stub:
+            stub.write(STUB_SOLC)
+        os.chmod(path, 0o755)
+
+
+def bench_cold_start(workdir):
+    home = os.path.join(workdir, "home")
+    make_stub_home(home)
+    source = os.path.join(workdir, "Cold.sol")
+    with open(source, "w") as file:
+        file.write(SOURCE_TEMPLATE.format(0))
+
+    env = dict((key, value) for key, value in os.environ.items() if not key.startswith("USOLC_"))
+    env["USOLC_SOCKET"] = os.path.join(workdir, "no-daemon.sock")
+    env["USOLC_CACHE_DIR"] = os.path.join(workdir, "cache")
+    command = [os.path.join(home, "bin", "solc"), source, "--abi"]
+
+    def run():
+        subprocess.run(command, env=env, check=True, stdout=subprocess.DEVNULL)
+    return measure(run, 1)
+
+
+def bench_resolve(workdir, count):
+    source = os.path.join(workdir, "Resolve.sol")
+    with open(source, "w") as file:
+        file.write(SOURCE_TEMPLATE.format(0))
+    available_versions = bench_version_index.synthetic_versions(count)
+    strategy = usolc.interpret_strategy_string(None)
+
+    def run():
+        for _ in range(100):
+            usolc.choose_version_by_argument(available_versions, source, strategy)
+    return measure(run, 100)
+
+
+def bench_pragma_scan(workdir):
+    filename = bench_pragma_scanner.generate_flattened_file(workdir, 0, 20, 60)
+
+    def run():
+        for _ in range(10):
+            usolc.getrules_from_file(filename)
+    return measure(run, 10)
+
+
+def bench_stdjson(count):
+    stdin_data = json.dumps({
+        "language": "Solidity",
+        "sources": dict(("C{0}.sol".format(i), {"content": SOURCE_TEMPLATE.format(i)}) for i in range(count)),
+    }).encode("utf-8")
+    available_versions = bench_version_index.synthetic_versions(20) + ["0.4.24", "0.4.25"]
+    strategy = usolc.interpret_strategy_string(None)
+
+    def run():
+        usolc.choose_version_by_rules(available_versions, usolc.getrules_from_stdjson(stdin_data), strategy)
+    return measure(run, 1)
+
+
+def benchmarks(workdir):
+    """
+    Returns [name, function] for every benchmark
+    """
+    return [
+        ["cold_start", lambda: bench_cold_start(workdir)],
+        ["resolve_20", lambda: bench_resolve(workdir, 20)],
+        ["resolve_200", lambda: bench_resolve(workdir, 200)],
+        ["resolve_2000", lambda: bench_resolve(workdir, 2000)],
+        ["pragma_scan_large", lambda: bench_pragma_scan(workdir)],
+        ["stdjson_1", lambda: bench_stdjson(1)],
+        ["stdjson_100", lambda: bench_stdjson(100)],
+        ["stdjson_1000", lambda: bench_stdjson(1000)],
+    ]
+
+
+def run_benchmarks(selected=None):
+    """
+    Runs the benchmarks whose name contains one of the selected strings, or all of them
+    """
+    calibration = calibrate()
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, function in benchmarks(workdir):
+            if selected and not any(pattern in name for pattern in selected):
+                continue
+            [best, normalized] = function()
+            results[name] = {"best_s": best, "normalized": normalized}
+
+    return {
+        "format": RESULTS_FORMAT_VERSION,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "calibration_s": calibration,
+        "results": results,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns [name, baseline normalized time, normalized time, ratio, regressed] for every
+    benchmark present in both
+    """
+    rows = []
+    for name, result in sorted(results["results"].items()):
+        reference = baseline["results"].get(name)
+        if reference is None:
+            continue
+        ratio = result["normalized"] / reference["normalized"]
+        rows.append([name, reference["normalized"], result["normalized"], ratio, ratio > 1 + tolerance])
+    return rows
+
+
+def print_results(results, rows):
+    compared = dict((row[0], row) for row in rows)
+    print("{0:<20} {1:>14} {2:>12}".format("benchmark", "best", "vs baseline"), file=sys.stderr)
+    for name, result in sorted(results["results"].items()):
+        row = compared.get(name)
+        status = "" if row is None else "{0:.2f}x{1}".format(row[3], "  REGRESSION" if row[4] else "")
+        print("{0:<20} {1:>11.1f} us {2:>12}".format(name, result["best_s"] * 1e6, status), file=sys.stderr)
+
+
+def write_json(filename, data):
+    with open(filename, "w") as file:
+        json.dump(data, file, indent=2, sort_keys=True)
+        file.write("\n")
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Run the usolc benchmarks")
+    parser.add_argument("-o", "--output", default=None, help="write the results to this file instead of stdout")
+    parser.add_argument("--check", nargs="?", const=BASELINE, default=None,
+                        help="fail if a benchmark regressed against the baseline (benchmarks/baseline.json)")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed slowdown before failing, 0.5 = 50%%")
+    parser.add_argument("--update-baseline", nargs="?", const=BASELINE, default=None,
+                        help="record the results as the new baseline")
+    parser.add_argument("-k", dest="selected", action="append", default=None,
+                        help="only run the benchmarks whose name contains this string")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.selected)
+    if args.output:
+        write_json(args.output, results)
+    else:
+        print(json.dumps(results, indent=2, sort_keys=True))
+
+    if args.update_baseline:
+        write_json(args.update_baseline, results)
+
+    rows = []
+    if args.check:
+        with open(args.check) as file:
+            rows = compare(results, json.load(file), args.tolerance)
+    print_results(results, rows)
+
+    regressions = [row[0] for row in rows if row[4]]
+    if regressions:
+        print("Regressions: " + ", ".join(regressions), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,17 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+"""
+ Entry point of the zipapp built by "make zipapp", which bin/solc runs when it exists
+"""
+
+import sys
+import usolc_client
+
+sys.exit(usolc_client.main())
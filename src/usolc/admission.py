@@ -0,0 +1,359 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+"""
+ Admission control and resource limits for the solc processes of a host.
+
+ Parallel compilations can each drive solc to several GB. With a memory budget set, every usolc
+ process of the host (wrappers, the daemon, batch and queue workers) registers the solc jobs it
+ runs in a shared ledger, and a job only starts once the estimated memory of the running jobs
+ plus its own fits the budget; a job alone on the host always starts. The estimate of a job is
+ the largest peak RSS recently recorded for its version and an input of the same size (sizes are
+ bucketed by powers of two), else that of the nearest size recorded for the version, at least
+ the default estimate when the input is bigger.
+
+ Each solc may also be given an address-space limit, set in the child before it runs solc, and
+ a wall-clock timeout. A job that runs past its time, is killed by a signal after growing to half
+ of its memory limit or reporting a bad_alloc, or is killed by the OOM killer, raises
+ JobKilledError with what solc wrote before it died.
+
+     USOLC_MEMORY_BUDGET_MB   memory the solc jobs of the host may use together (default 0: unlimited)
+     USOLC_JOB_MEMORY_MB      address-space limit of each solc (default 0: none)
+     USOLC_JOB_TIMEOUT        wall-clock seconds a solc may run (default 0: none)
+     USOLC_JOB_ESTIMATE_MB    estimate of a job without history (default 512)
+     USOLC_ADMISSION_DIR      ledger and history (default $USOLC_CACHE_DIR/admission/<host name>)
+
+ The ledger (jobs.json) and the peak RSS history (history.json) are rewritten under an exclusive
+ flock; jobs of processes that died without leaving the ledger are dropped from it. When none of
+ the variables above is set, solc runs as it did without this module. Every solc usolc spawns goes
+ through run() when governed: the pool of warm processes is then disabled, and asyncio callers
+ run it in a thread.
+"""
+
+import os
+import sys
+import json
+import time
+import fcntl
+import resource
+import itertools
+import contextlib
+import compile_cache
+import profiling
+from exceptions.job_killed_error import JobKilledError
+
+DEFAULT_ESTIMATE_MB = 512
+HISTORY_SIZE = 8
+POLL_SECONDS = 0.05
+MAX_POLL_SECONDS = 1.0
+# a solc dying of a signal is only blamed on its memory limit past this share of it, or on bad_alloc
+MEMORY_LIMIT_BLAME_RATIO = 0.5
+
+job_counter = itertools.count()
+
+
+def env_number(name, default=0):
+    try:
+        return max(0, float(os.environ.get(name, default)))
+    except ValueError:
+        return default
+
+
+def memory_budget_kb():
+    return int(env_number("USOLC_MEMORY_BUDGET_MB") * 1024)
+
+
+def job_memory_kb():
+    return int(env_number("USOLC_JOB_MEMORY_MB") * 1024)
+
+
+def job_timeout():
+    return env_number("USOLC_JOB_TIMEOUT")
+
+
+def governed():
+    """
+    Tells whether solc has to run under admission control or limits, see run()
+    """
+    return memory_budget_kb() > 0 or job_memory_kb() > 0 or job_timeout() > 0
+
+
+def admission_dir():
+    directory = os.environ.get("USOLC_ADMISSION_DIR")
+    if directory is None:
+        # process ids are only meaningful on one host, even when the cache is shared
+        directory = os.path.join(compile_cache.cache_dir(), "admission", os.uname().nodename)
+    return directory
+
+
+def solc_version(binary):
+    name = os.path.basename(binary)
+    return name[len("solc-"):] if name.startswith("solc-") else name
+
+
+def size_bucket(input_size):
+    return max(0, int(input_size)).bit_length()
+
+
+def read_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def write_json(directory, name, data):
+    import tempfile
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-" + name + "-")
+    with os.fdopen(fd, 'w', encoding='utf-8') as file:
+        json.dump(data, file)
+    os.replace(tmp_path, os.path.join(directory, name))
+
+
+@contextlib.contextmanager
+def locked(name):
+    """
+    Holds the exclusive lock of a file of the admission directory, yielding the directory
+    """
+    directory = admission_dir()
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, name + ".lock"), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield directory
+
+
+def estimate_kb(version, input_size):
+    """
+    Returns the memory a job of the version is expected to use, in KB
+    """
+    default = int(env_number("USOLC_JOB_ESTIMATE_MB", DEFAULT_ESTIMATE_MB) * 1024)
+    peaks = read_json(os.path.join(admission_dir(), "history.json")).get(version, {})
+    bucket = size_bucket(input_size)
+    try:
+        recorded = sorted(int(key) for key in peaks)
+    except ValueError:
+        recorded = []
+
+    if not recorded:
+        estimate = default
+    else:
+        nearest = min(recorded, key=lambda key: [abs(key - bucket), -key])
+        estimate = max(peaks[str(nearest)])
+        if nearest < bucket:
+            estimate = max(estimate, default)
+
+    # the job cannot grow past its own limit
+    limit = job_memory_kb()
+    return min(estimate, limit) if limit > 0 else estimate
+
+
+def record_peak(version, input_size, peak_kb):
+    with locked("history") as directory:
+        history = read_json(os.path.join(directory, "history.json"))
+        peaks = history.setdefault(version, {})
+        bucket = str(size_bucket(input_size))
+        peaks[bucket] = (peaks.get(bucket, []) + [peak_kb])[-HISTORY_SIZE:]
+        write_json(directory, "history.json", history)
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def try_admit(job_id, version, estimate):
+    """
+    Adds the job to the ledger if it fits the budget next to the running jobs
+    Returns True if it was admitted
+    """
+    with locked("jobs") as directory:
+        ledger = read_json(os.path.join(directory, "jobs.json"))
+        jobs = dict((key, job) for key, job in ledger.items() if process_alive(job["pid"]))
+        admitted = not jobs or sum(job["kb"] for job in jobs.values()) + estimate <= memory_budget_kb()
+        if admitted:
+            jobs[job_id] = {"pid": os.getpid(), "kb": estimate, "version": version, "since": time.time()}
+        if admitted or len(jobs) != len(ledger):
+            write_json(directory, "jobs.json", jobs)
+    return admitted
+
+
+def leave(job_id):
+    with locked("jobs") as directory:
+        jobs = read_json(os.path.join(directory, "jobs.json"))
+        if jobs.pop(job_id, None) is not None:
+            write_json(directory, "jobs.json", jobs)
+
+
+@contextlib.contextmanager
+def admitted(version, estimate):
+    """
+    Waits until the job fits the memory budget of the host, and holds its share meanwhile
+    """
+    if memory_budget_kb() <= 0:
+        yield
+        return
+
+    job_id = "{0}-{1}".format(os.getpid(), next(job_counter))
+    delay = POLL_SECONDS
+    try:
+        with profiling.phase("admission"):
+            while not try_admit(job_id, version, estimate):
+                time.sleep(delay)
+                delay = min(delay * 2, MAX_POLL_SECONDS)
+    except OSError as e:
+        # like the cache, the ledger must never fail a compilation
+        print("Warning: usolc admission control is unavailable: " + str(e), file=sys.stderr)
+        yield
+        return
+
+    try:
+        yield
+    finally:
+        try:
+            leave(job_id)
+        except OSError:
+            pass
+
+
+def wait_limited(process, stdin_data, timeout):
+    """
+    Feeds and drains the process until it exits, killing it after timeout seconds
+    Returns [stdout, stderr, timed out, peak RSS in KB]; the outputs are None unless piped
+    """
+    import threading
+    outputs = {}
+    timed_out = []
+
+    def feed():
+        try:
+            process.stdin.write(stdin_data)
+            process.stdin.close()
+        except OSError:
+            # solc exited without reading all of its input
+            pass
+
+    def drain(name, stream):
+        outputs[name] = stream.read()
+
+    threads = [threading.Thread(target=drain, args=[name, stream])
+               for name, stream in [["stdout", process.stdout], ["stderr", process.stderr]] if stream is not None]
+    if stdin_data is not None:
+        threads.append(threading.Thread(target=feed))
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    # the timer must not signal the pid once reaped, which another process may then be given
+    reaping = threading.Lock()
+
+    def expire():
+        with reaping:
+            if process.returncode is None:
+                timed_out.append(True)
+                process.kill()
+
+    timer = threading.Timer(timeout, expire) if timeout > 0 else None
+    if timer is not None:
+        timer.daemon = True
+        timer.start()
+    try:
+        # waits for the exit without reaping, so that the timer can still signal the zombie meanwhile
+        os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOWAIT)
+        with reaping:
+            # unlike Popen.wait, wait4 reports the resources of this very process
+            _, status, usage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+    except BaseException:
+        if process.returncode is None:
+            process.kill()
+        raise
+    finally:
+        if timer is not None:
+            timer.cancel()
+
+    for thread in threads:
+        thread.join()
+    return [outputs.get("stdout"), outputs.get("stderr"), bool(timed_out), usage.ru_maxrss]
+
+
+def limit_memory(limit_kb):
+    """
+    Returns the preexec_fn of a solc limited to limit_kb of address space
+    """
+    def apply_limit():
+        resource.setrlimit(resource.RLIMIT_AS, (limit_kb * 1024, limit_kb * 1024))
+    return apply_limit
+
+
+def effective_timeout(timeout=None):
+    """
+    Returns the time limit of a job, the shortest of USOLC_JOB_TIMEOUT and timeout; 0 for none
+    """
+    limits = [limit for limit in [job_timeout(), timeout or 0] if limit > 0]
+    return min(limits) if limits else 0
+
+
+def kill_reason(returncode, timed_out, peak_kb, timeout=None, errors=None):
+    """
+    Tells why solc was killed, None if it was not killed for its resources; errors is what it
+    wrote on stderr, when captured
+    """
+    import signal
+    if returncode >= 0:
+        return None
+    signal_name = signal.Signals(-returncode).name if -returncode in signal.valid_signals() else str(-returncode)
+    peak = "peak RSS {0} MB".format(peak_kb // 1024)
+    if timed_out and returncode == -signal.SIGKILL:
+        limit = effective_timeout(timeout)
+        return "it ran past the time limit of {0:g} s{1}, {2}".format(
+            limit, " (USOLC_JOB_TIMEOUT)" if limit == job_timeout() else "", peak)
+    if job_memory_kb() > 0 and returncode in [-signal.SIGABRT, -signal.SIGSEGV, -signal.SIGKILL] and \
+            (peak_kb >= job_memory_kb() * MEMORY_LIMIT_BLAME_RATIO or b"bad_alloc" in (errors or b"")):
+        # otherwise an ordinary crash, which old solc versions are not short of
+        return "killed by {0}, out of its memory limit of {1} MB (USOLC_JOB_MEMORY_MB), {2}".format(
+            signal_name, job_memory_kb() // 1024, peak)
+    if returncode == -signal.SIGKILL:
+        return "killed by SIGKILL, likely by the out-of-memory killer of the host, " + peak
+    return None
+
+
+def run(command, input_size, stdin_data=None, stdout=None, stderr=None, cwd=None, timeout=None):
+    """
+    Runs solc once admitted, under the limits of jobs, as subprocess.run would; stdout and stderr
+    may be subprocess.PIPE to capture them, timeout shortens USOLC_JOB_TIMEOUT for this job.
+    Raises JobKilledError if solc was killed for its resources or its time.
+    """
+    import subprocess
+    version = solc_version(command[0])
+    limit = job_memory_kb()
+    with admitted(version, estimate_kb(version, input_size)):
+        with profiling.phase("solc_exec"):
+            process = subprocess.Popen(command, stdin=subprocess.PIPE if stdin_data is not None else None,
+                                       stdout=stdout, stderr=stderr, cwd=cwd,
+                                       preexec_fn=limit_memory(limit) if limit > 0 else None)
+        with process:
+            [output, errors, timed_out, peak_kb] = wait_limited(process, stdin_data, effective_timeout(timeout))
+
+    try:
+        record_peak(version, input_size, peak_kb)
+    except OSError:
+        pass
+
+    reason = kill_reason(process.returncode, timed_out, peak_kb, timeout, errors)
+    if reason is not None:
+        raise JobKilledError(version, process.returncode, output, errors,
+                             "solc {0} was killed: {1}".format(version, reason))
+    return subprocess.CompletedProcess(command, process.returncode, output, errors)
@@ -0,0 +1,495 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+"""
+ Indexed store of compiler outputs, for tools needing one field of one contract.
+
+ With "--usolc-artifacts=DIR" (or USOLC_ARTIFACTS_DIR=DIR), the contracts of a --combined-json or
+ --standard-json output are also written to DIR, one file per contract:
+
+     DIR/index                                          where every field is, see below
+     DIR/contracts/<source>-<hash>/<contract>-<digest>.json
+
+ A contract file holds the JSON object of the fields of the contract. In standard-json outputs,
+ the members of "evm", "evm.bytecode" and "evm.deployedBytecode" are fields of their own, named
+ after their path ("evm.bytecode.sourceMap"). With USOLC_ARTIFACTS_GZIP=1 the files are
+ compressed (".json.gz"), every value in a gzip member of its own so it can be read alone.
+
+ The index is memory-mapped and searched by bisection:
+
+     header     "USAI", format, record count, size of the strings
+     records    (key offset, key length, path offset, path length, value offset, value length)
+                of every field, sorted by key
+     strings    keys ("<source>\\0<contract>\\0<field>") and paths relative to DIR, utf-8
+
+ read_field(DIR, source, contract, field) thus returns the JSON text of a value, reading nothing
+ else. From the shell:
+
+     usolc artifacts DIR                        lists the contracts
+     usolc artifacts DIR SOURCE:CONTRACT        lists the fields of a contract
+     usolc artifacts DIR SOURCE:CONTRACT FIELD  prints a field
+
+ Contract files are named after their content and never modified. Under an exclusive flock, a
+ compilation links its files into DIR and replaces the index: records of the sources it compiled
+ are replaced, those of other sources kept, and files no record refers to are removed. With the
+ compile cache, the artifacts of a compilation are kept next to its entry, and a hit links them
+ into DIR without parsing the output again.
+"""
+
+import os
+import sys
+import mmap
+import json
+import fcntl
+import struct
+import hashlib
+import compile_cache
+
+INDEX_FORMAT_VERSION = 1
+INDEX_MAGIC = b"USAI"
+HEADER = struct.Struct("<4sIII")
+RECORD = struct.Struct("<IIIIQQ")
+
+ARTIFACTS_ARGUMENT = "--usolc-artifacts"
+CHUNK_SIZE = 1024 * 1024
+READ_ATTEMPTS = 3
+
+# objects of a standard-json contract whose members are stored as fields of their own
+STANDARD_JSON_GROUPS = [("evm",), ("evm", "bytecode"), ("evm", "deployedBytecode")]
+
+
+def target_dir(argv):
+    """
+    Returns the artifact directory of the invocation, None if artifacts are not written
+    """
+    for arg in argv:
+        if is_artifacts_argument(arg):
+            return arg[len(ARTIFACTS_ARGUMENT) + 1:] or None
+    return os.environ.get("USOLC_ARTIFACTS_DIR") or None
+
+
+def is_artifacts_argument(arg):
+    return arg.startswith(ARTIFACTS_ARGUMENT + "=")
+
+
+def compression_enabled():
+    return os.environ.get("USOLC_ARTIFACTS_GZIP", "").lower() in ("1", "true", "yes", "on")
+
+
+def output_format(native_argv):
+    """
+    Returns "standard-json" or "combined-json", None if solc prints nothing artifacts are made of
+    """
+    if "--standard-json" in native_argv:
+        return "standard-json"
+    if any(arg == "--combined-json" or arg.startswith("--combined-json=") for arg in native_argv):
+        return "combined-json"
+    return None
+
+
+def standard_json_selector(path):
+    import streaming
+    if len(path) == 1:
+        return streaming.DESCEND if path[0] == "contracts" else streaming.SKIP
+    if len(path) <= 3 or path[3:] in STANDARD_JSON_GROUPS:
+        return streaming.DESCEND
+    return streaming.EMIT
+
+
+def combined_json_selector(path):
+    import streaming
+    if len(path) == 1:
+        return streaming.DESCEND if path[0] == "contracts" else streaming.SKIP
+    return streaming.DESCEND if len(path) <= 2 else streaming.EMIT
+
+
+def iter_fields(chunks, output_format):
+    """
+    Yields [source, contract, field, value] for every field of the contracts of an output,
+    given chunk by chunk, one contract after the other
+    Raises ValueError if the output is not a JSON document
+    """
+    import streaming
+    if output_format == "standard-json":
+        parser = streaming.JsonStreamParser(standard_json_selector)
+    else:
+        parser = streaming.JsonStreamParser(combined_json_selector)
+
+    def item(path, value):
+        if output_format == "standard-json":
+            return [path[1], path[2], ".".join(path[3:]), value]
+        # combined-json names contracts "<source>:<contract>"
+        [source, _, contract] = path[1].rpartition(":")
+        return [source, contract, path[2], value]
+
+    for chunk in chunks:
+        for path, value in parser.feed(chunk):
+            yield item(path, value)
+    for path, value in parser.close():
+        yield item(path, value)
+
+
+def file_chunks(file, offset, count):
+    """
+    Yields count bytes of an open file from offset
+    """
+    file.seek(offset)
+    while count > 0:
+        chunk = file.read(min(CHUNK_SIZE, count))
+        if not chunk:
+            return
+        count -= len(chunk)
+        yield chunk
+
+
+def safe_name(name):
+    return "".join(char if char.isalnum() or char in "._-" else "_" for char in name)[-100:]
+
+
+def contract_path(source, contract, content, compress):
+    """
+    Returns the path of a contract file relative to the artifact directory
+    """
+    source_dir = "{0}-{1}".format(safe_name(source), hashlib.sha256(source.encode("utf-8")).hexdigest()[:8])
+    filename = "{0}-{1}.json".format(safe_name(contract), hashlib.sha256(content).hexdigest()[:16])
+    return "/".join(["contracts", source_dir, filename + (".gz" if compress else "")])
+
+
+def write_file(path, content):
+    """
+    Writes a file unless it exists, which is then the same since files are named after their content
+    """
+    import tempfile
+    if os.path.exists(path):
+        return
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(content)
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def write_contract(set_dir, source, contract, fields, compress):
+    """
+    Writes the file of a contract, fields being a list of [field, value]
+    Returns the records of its fields: [source, contract, field, path, offset, length]
+    """
+    pieces = []
+    for position, [field, value] in enumerate(fields):
+        separator = "{" if position == 0 else ","
+        pieces.append([None, (separator + json.dumps(field) + ":").encode("utf-8")])
+        pieces.append([field, json.dumps(value, separators=(",", ":")).encode("utf-8")])
+    pieces.append([None, b"}" if fields else b"{}"])
+    if compress:
+        import gzip
+        pieces = [[field, gzip.compress(data, mtime=0)] for field, data in pieces]
+
+    content = b"".join(data for _, data in pieces)
+    path = contract_path(source, contract, content, compress)
+    write_file(os.path.join(set_dir, path), content)
+
+    records = []
+    offset = 0
+    for field, data in pieces:
+        if field is not None:
+            records.append([source, contract, field, path, offset, len(data)])
+        offset += len(data)
+    return records
+
+
+def build_set(set_dir, chunks, output_format, compress):
+    """
+    Writes the contract files and the index of an output into set_dir
+    Returns the records of the index
+    """
+    records = []
+    current = None
+    fields = []
+    for [source, contract, field, value] in iter_fields(chunks, output_format):
+        if [source, contract] != current:
+            if current is not None:
+                records += write_contract(set_dir, current[0], current[1], fields, compress)
+            current = [source, contract]
+            fields = []
+        fields.append([field, value])
+    if current is not None:
+        records += write_contract(set_dir, current[0], current[1], fields, compress)
+
+    write_index(set_dir, records)
+    return records
+
+
+def record_key(source, contract, field):
+    return "\0".join([source, contract, field]).encode("utf-8")
+
+
+def encode_index(records):
+    """
+    Returns the content of an index holding the records, sorted by key
+    """
+    keyed = sorted((record_key(*record[:3]), record) for record in records)
+    paths = {}
+    strings = []
+    size = 0
+    packed = []
+    for key, [_, _, _, path, offset, length] in keyed:
+        if path not in paths:
+            encoded_path = path.encode("utf-8")
+            paths[path] = [size, len(encoded_path)]
+            strings.append(encoded_path)
+            size += len(encoded_path)
+        packed.append(RECORD.pack(size, len(key), paths[path][0], paths[path][1], offset, length))
+        strings.append(key)
+        size += len(key)
+
+    return b"".join([HEADER.pack(INDEX_MAGIC, INDEX_FORMAT_VERSION, len(packed), size)] + packed + strings)
+
+
+def write_index(directory, records):
+    import tempfile
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-index-")
+    with os.fdopen(fd, 'wb') as file:
+        file.write(encode_index(records))
+    os.replace(tmp_path, os.path.join(directory, "index"))
+
+
+class ArtifactIndex(object):
+    """
+    The index of an artifact directory, mapped in memory
+    Raises ValueError if the file is not a valid index
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            [magic, format_version, self.record_count, strings_size] = HEADER.unpack_from(self.data, 0)
+            if magic != INDEX_MAGIC or format_version != INDEX_FORMAT_VERSION:
+                raise ValueError("Not an artifact index: " + path)
+            self.strings_offset = HEADER.size + self.record_count * RECORD.size
+            if self.strings_offset + strings_size > len(self.data):
+                raise ValueError("Truncated artifact index: " + path)
+        except (struct.error, ValueError):
+            self.data.close()
+            raise ValueError("Invalid artifact index: " + path)
+
+    def close(self):
+        self.data.close()
+
+    def string(self, offset, length):
+        start = self.strings_offset + offset
+        return self.data[start:start + length]
+
+    def record_at(self, position):
+        """
+        Returns [key, path, offset, length] of the record at position
+        """
+        [key_offset, key_length, path_offset, path_length, offset, length] = \
+            RECORD.unpack_from(self.data, HEADER.size + position * RECORD.size)
+        return [self.string(key_offset, key_length), self.string(path_offset, path_length).decode("utf-8"),
+                offset, length]
+
+    def find(self, source, contract, field):
+        """
+        Returns [path, offset, length] of a field, None if the index does not hold it
+        """
+        key = record_key(source, contract, field)
+        low = 0
+        high = self.record_count
+        while low < high:
+            middle = (low + high) // 2
+            [candidate, path, offset, length] = self.record_at(middle)
+            if candidate < key:
+                low = middle + 1
+            elif candidate > key:
+                high = middle
+            else:
+                return [path, offset, length]
+        return None
+
+    def records(self):
+        """
+        Returns [source, contract, field, path, offset, length] for every field, sorted
+        """
+        records = []
+        for position in range(self.record_count):
+            [key, path, offset, length] = self.record_at(position)
+            records.append(key.decode("utf-8").split("\0") + [path, offset, length])
+        return records
+
+
+def read_records(directory):
+    """
+    Returns the records of the index of a directory, None if it has no valid index
+    """
+    try:
+        index = ArtifactIndex(os.path.join(directory, "index"))
+    except (OSError, ValueError):
+        return None
+    try:
+        return index.records()
+    finally:
+        index.close()
+
+
+def read_field(directory, source, contract, field):
+    """
+    Returns the JSON text of a field of a contract, None if the directory does not hold it
+    """
+    for attempt in range(READ_ATTEMPTS):
+        index = ArtifactIndex(os.path.join(directory, "index"))
+        try:
+            found = index.find(source, contract, field)
+        finally:
+            index.close()
+        if found is None:
+            return None
+
+        [path, offset, length] = found
+        try:
+            with open(os.path.join(directory, path), 'rb') as file:
+                file.seek(offset)
+                data = file.read(length)
+            break
+        except FileNotFoundError:
+            # a concurrent install replaced the index and removed the file it referenced
+            if attempt == READ_ATTEMPTS - 1:
+                raise
+    if path.endswith(".gz"):
+        import gzip
+        data = gzip.decompress(data)
+    return data
+
+
+def link_file(source_path, target_path):
+    import shutil
+    if os.path.exists(target_path):
+        return
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    try:
+        os.link(source_path, target_path)
+    except FileExistsError:
+        pass
+    except OSError:
+        # another file system than the cache
+        with open(source_path, 'rb') as file:
+            write_file(target_path, file.read())
+        shutil.copystat(source_path, target_path)
+
+
+def remove_unreferenced(directory, records):
+    referenced = set(os.path.join(directory, record[3]) for record in records)
+    contracts_dir = os.path.join(directory, "contracts")
+    for root, _, filenames in os.walk(contracts_dir, topdown=False):
+        for filename in filenames:
+            path = os.path.join(root, filename)
+            if path not in referenced and not filename.startswith(".tmp-"):
+                os.unlink(path)
+        if root != contracts_dir and not os.listdir(root):
+            os.rmdir(root)
+
+
+def install(target, set_dir, records):
+    """
+    Links the files of a set into the artifact directory and merges its records into the index
+    """
+    os.makedirs(target, exist_ok=True)
+    with open(os.path.join(target, "index.lock"), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if set_dir != target:
+            for path in sorted(set(record[3] for record in records)):
+                link_file(os.path.join(set_dir, path), os.path.join(target, path))
+
+        compiled = set(record[0] for record in records)
+        merged = [record for record in read_records(target) or [] if record[0] not in compiled] + records
+        write_index(target, merged)
+        remove_unreferenced(target, merged)
+
+
+def cached_set_dir(key, compress):
+    return os.path.join(compile_cache.artifacts_path(key), "gzip" if compress else "json")
+
+
+def collect(target, chunks, output_format, key=None):
+    """
+    Adds the contracts of an output, yielded by chunks, to the artifact directory target.
+    With the cache key of the compilation, they are only parsed once and reused on later hits.
+    Raises ValueError if the output is not a JSON document.
+    """
+    import shutil
+    import tempfile
+    compress = compression_enabled()
+    if key is None:
+        os.makedirs(target, exist_ok=True)
+        staging = tempfile.mkdtemp(dir=target, prefix=".tmp-")
+        try:
+            install(target, staging, build_set(staging, chunks, output_format, compress))
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        return
+
+    set_dir = cached_set_dir(key, compress)
+    records = read_records(set_dir)
+    built = records is None
+    if built:
+        os.makedirs(os.path.dirname(set_dir), exist_ok=True)
+        staging = tempfile.mkdtemp(dir=os.path.dirname(set_dir), prefix=".tmp-")
+        try:
+            records = build_set(staging, chunks, output_format, compress)
+            try:
+                os.rename(staging, set_dir)
+            except OSError:
+                # built by another process meanwhile: the same files under the same names
+                install(target, staging, records)
+                return
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+    install(target, set_dir, records)
+    if built:
+        compile_cache.account(compile_cache.tree_size(set_dir))
+
+
+def main(argv):
+    import argparse
+    parser = argparse.ArgumentParser(prog="usolc artifacts", description="Read an artifact directory")
+    parser.add_argument("directory")
+    parser.add_argument("contract", nargs="?", help="SOURCE:CONTRACT")
+    parser.add_argument("field", nargs="?")
+    args = parser.parse_args(argv)
+
+    records = read_records(args.directory)
+    if records is None:
+        print("Error: no artifact index in " + args.directory, file=sys.stderr)
+        return 1
+    if args.contract is None:
+        for name in sorted(set(record[0] + ":" + record[1] for record in records)):
+            print(name)
+        return 0
+
+    [source, _, contract] = args.contract.rpartition(":")
+    if args.field is None:
+        fields = [record[2] for record in records if record[:2] == [source, contract]]
+        for field in fields:
+            print(field)
+        return 0 if fields else 1
+
+    data = read_field(args.directory, source, contract, args.field)
+    if data is None:
+        print("Error: no field {0} for {1}".format(args.field, args.contract), file=sys.stderr)
+        return 1
+    sys.stdout.buffer.write(data + b"\n")
+    return 0
@@ -0,0 +1,236 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+"""
+ Compiles many Solidity files from a single usolc process.
+
+ Every file gets its own version, resolved from its pragmas exactly like the CLI does.
+ Files sharing a version are compiled together with --combined-json in chunks, and the
+ chunks run concurrently on a process pool sized to the CPU count. The combined output
+ is split back per file and written as one JSON line per file:
+
+     {"file": ..., "version": ..., "returncode": ..., "contracts": {...}, "errors": ..., "error": ...}
+
+ When a chunk fails to compile, its files are compiled one by one so that errors are
+ reported against the file that caused them.
+
+     usolc batch [FILES...] [--manifest FILE] [-U RULE] [--jobs N] [--output FILE]
+"""
+
+import os
+import sys
+import json
+import shlex
+import argparse
+import concurrent.futures
+import usolc
+from exceptions.noversion_available_by_sol import NoVersionAvailableBySol
+from exceptions.noversion_available_by_user import NoVersionAvailableByUser
+from exceptions.provisioning_error import ProvisioningError
+
+DEFAULT_COMBINED_JSON = "abi,bin"
+DEFAULT_CHUNK_SIZE = 32
+
+
+def read_manifest(manifest_filename):
+    """
+    A manifest lists one file per line, blank lines and lines starting with # are ignored
+    """
+    if manifest_filename == "-":
+        lines = sys.stdin.readlines()
+    else:
+        with open(manifest_filename, 'r', encoding='utf-8') as manifest:
+            lines = manifest.readlines()
+    return [line.strip() for line in lines if line.strip() and not line.strip().startswith("#")]
+
+
+def result_line(filename, version=None, returncode=None, contracts=None, errors="", error=None):
+    return {
+        "file": filename,
+        "version": version,
+        "returncode": returncode,
+        "contracts": contracts if contracts is not None else {},
+        "errors": errors,
+        "error": error,
+    }
+
+
+def resolve_versions(filenames, valid_versions, version_selection_strategy, solc_args=None):
+    """
+    Resolves the version of every file independently, following its imports
+    Returns [groups, failures] where groups maps a version to its files
+    and failures holds the result lines of files that cannot be compiled
+    """
+    groups = {}
+    failures = []
+
+    for filename in filenames:
+        try:
+            version_chosen = usolc.choose_version_by_unit(valid_versions, (solc_args or []) + [filename],
+                                                          version_selection_strategy)
+        except FileNotFoundError:
+            failures.append(result_line(filename, error="Solidity file not found"))
+            continue
+        except NoVersionAvailableBySol as e:
+            failures.append(result_line(filename, error="No solc version satisfies the requirement "
+                                                        "of the solidity file: " + e.sol_rule))
+            continue
+        except NoVersionAvailableByUser as e:
+            failures.append(result_line(filename, error="No solc version satisfies both the "
+                                                        "requirement of the solidity file (" + e.sol_rule +
+                                                        ") and the user's rule (" + str(e.user_rule[0]) + ")"))
+            continue
+        groups.setdefault(version_chosen, []).append(filename)
+
+    return [groups, failures]
+
+
+def make_chunks(groups, chunk_size):
+    """
+    Returns [version, files] pairs, splitting large groups so they can run in parallel
+    """
+    chunks = []
+    for version_chosen in sorted(groups):
+        files = groups[version_chosen]
+        for start in range(0, len(files), chunk_size):
+            chunks.append([version_chosen, files[start:start + chunk_size]])
+    return chunks
+
+
+def split_contracts(combined_output, filenames):
+    """
+    Splits the contracts of a --combined-json output by the file that declares them
+    """
+    contracts_by_file = {filename: {} for filename in filenames}
+    normalized = {os.path.normpath(filename): filename for filename in filenames}
+
+    for contract_id, contract in combined_output.get("contracts", {}).items():
+        source, _, contract_name = contract_id.rpartition(":")
+        filename = normalized.get(os.path.normpath(source))
+        if filename is not None:
+            contracts_by_file[filename][contract_name] = contract
+
+    return contracts_by_file
+
+
+def compile_files(version_chosen, filenames, combined_json, solc_args):
+    """
+    Compiles the files together, returning one result line per file
+    """
+    native_argv = solc_args + ["--combined-json", combined_json] + filenames
+    completed_process = usolc.run_solc_captured(version_chosen, native_argv)
+    errors = completed_process.stderr.decode("utf-8", errors="replace")
+
+    if completed_process.returncode != 0:
+        return [result_line(filename, version_chosen, completed_process.returncode, errors=errors)
+                for filename in filenames]
+
+    try:
+        combined_output = json.loads(completed_process.stdout.decode("utf-8"))
+    except ValueError:
+        return [result_line(filename, version_chosen, completed_process.returncode, errors=errors,
+                            error="Cannot parse the output of solc")
+                for filename in filenames]
+
+    contracts_by_file = split_contracts(combined_output, filenames)
+    return [result_line(filename, version_chosen, 0, contracts_by_file[filename], errors)
+            for filename in filenames]
+
+
+def compile_chunk(version_chosen, filenames, combined_json, solc_args):
+    """
+    Runs in a pool worker: compiles a chunk at once, then file by file if the chunk fails
+    """
+    results = compile_files(version_chosen, filenames, combined_json, solc_args)
+    if len(filenames) > 1 and any(result["returncode"] != 0 for result in results):
+        results = []
+        for filename in filenames:
+            results += compile_files(version_chosen, [filename], combined_json, solc_args)
+    return results
+
+
+def provision_versions(groups):
+    """
+    Installs the missing versions of the groups, see provisioning.py
+    The files of a version that cannot be installed are removed from the groups and returned
+    as failures
+    """
+    failures = []
+    for version_chosen in list(groups):
+        try:
+            usolc.ensure_solc_installed(version_chosen)
+        except ProvisioningError as e:
+            failures += [result_line(filename, version_chosen, error=str(e))
+                         for filename in groups.pop(version_chosen)]
+    return failures
+
+
+def run_batch(filenames, version_selection_strategy, output, jobs=None,
+              combined_json=DEFAULT_COMBINED_JSON, chunk_size=DEFAULT_CHUNK_SIZE, solc_args=None):
+    """
+    Compiles every file and writes one JSON line per file to output
+    Returns the number of files that failed
+    """
+    solc_args = solc_args or []
+    valid_versions = usolc.fetch_resolvable_solc_versions()
+    [groups, failures] = resolve_versions(filenames, valid_versions, version_selection_strategy,
+                                         solc_args)
+    failures += provision_versions(groups)
+
+    for failure in failures:
+        output.write(json.dumps(failure) + "\n")
+    failed = len(failures)
+
+    chunks = make_chunks(groups, chunk_size)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs or os.cpu_count()) as executor:
+        futures = [executor.submit(compile_chunk, version_chosen, files, combined_json, solc_args)
+                   for version_chosen, files in chunks]
+        for future in concurrent.futures.as_completed(futures):
+            for result in future.result():
+                if result["returncode"] != 0 or result["error"] is not None:
+                    failed += 1
+                output.write(json.dumps(result) + "\n")
+            output.flush()
+
+    return failed
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="usolc batch",
+                                     description="Compile many Solidity files, each with its own solc version")
+    parser.add_argument("files", nargs="*", help="Solidity files to compile")
+    parser.add_argument("-m", "--manifest", help="file listing the files to compile, one per line (- for stdin)")
+    parser.add_argument("-U", dest="strategy", default=None, help="user rule, as for solc -U")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="number of workers, CPU count by default")
+    parser.add_argument("-o", "--output", default=None, help="write the JSON lines to this file instead of stdout")
+    parser.add_argument("--combined-json", default=DEFAULT_COMBINED_JSON,
+                        help="fields requested from solc, " + DEFAULT_COMBINED_JSON + " by default")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="maximum number of files given to a single solc")
+    parser.add_argument("--solc-args", default="", help="additional arguments passed to every solc")
+    args = parser.parse_args(argv)
+
+    filenames = list(args.files)
+    if args.manifest is not None:
+        filenames += read_manifest(args.manifest)
+    if not filenames:
+        parser.error("no files to compile")
+
+    version_selection_strategy = usolc.interpret_strategy_string(args.strategy)
+    solc_args = shlex.split(args.solc_args)
+
+    if args.output is None:
+        failed = run_batch(filenames, version_selection_strategy, sys.stdout, args.jobs,
+                           args.combined_json, args.chunk_size, solc_args)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            failed = run_batch(filenames, version_selection_strategy, output, args.jobs,
+                               args.combined_json, args.chunk_size, solc_args)
+
+    return 1 if failed else 0
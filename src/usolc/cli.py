@@ -0,0 +1,54 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+"""
+ Entry point of the usolc management commands, invoked through bin/usolc
+
+ usolc daemon ...        serve compilations on a Unix socket, see usolc_server.py
+ usolc batch ...         compile many files, each with its own version, see batch.py
+ usolc queue ...         spread compilations over workers on several hosts, see jobqueue.py
+ usolc resolve ...       tell which version files need, without compiling, see resolve.py
+ usolc inventory ...     show or refresh the installed solc binaries, see inventory.py
+ usolc install ...       download solc binaries into $USOLC_HOME/bin, see installer.py
+ usolc store ...         share solc binaries through a content-addressed store, see compiler_store.py
+ usolc artifacts ...     read the contracts written by --usolc-artifacts, see artifacts.py
+"""
+
+import sys
+import importlib
+
+# subcommand -> module implementing main(argv)
+SUBCOMMANDS = {
+    "daemon": "usolc_server",
+    "batch": "batch",
+    "queue": "jobqueue",
+    "resolve": "resolve",
+    "inventory": "inventory",
+    "install": "installer",
+    "store": "compiler_store",
+    "artifacts": "artifacts",
+}
+
+
+def usage():
+    print("usage: usolc <command> [options]", file=sys.stderr)
+    print("commands: " + ", ".join(sorted(SUBCOMMANDS)), file=sys.stderr)
+
+
+def main(argv):
+    if not argv or argv[0] not in SUBCOMMANDS:
+        usage()
+        return 2
+
+    module = importlib.import_module(SUBCOMMANDS[argv[0]])
+    return module.main(argv[1:])
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
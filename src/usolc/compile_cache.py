@@ -0,0 +1,471 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+"""
+ Content-addressed cache of solc outputs.
+
+ An entry is keyed by the chosen solc version, the sha256 of every input source and the
+ normalized native arguments. It stores what solc wrote to stdout/stderr and its exit code,
+ so a hit can be replayed without spawning the compiler.
+
+ Entries live under $USOLC_CACHE_DIR (default: $USOLC_HOME/cache) as
+
+     objects/<key[:2]>/<key>
+
+ where each file is a one-line JSON header followed by the raw stdout and stderr bytes.
+ The artifacts built from an entry (see artifacts.py) live in artifacts/<key[:2]>/<key>, and
+ count toward its size and are evicted with it.
+ Files are written to a temporary name and renamed into place, so concurrent wrappers
+ never observe a partial entry. Least recently used entries are evicted once the cache
+ grows past $USOLC_CACHE_MAX_BYTES: every store adds its size to a running total (the "size"
+ file, under the flock of size.lock), and the cache is only scanned once that total goes past
+ the limit; the scan writes back the exact size that remains.
+
+ Hits and misses are counted without a lock, each lookup appending one byte to stats.log;
+ the log is folded into stats.json once it grows past STATS_LOG_MAX_BYTES.
+
+ The cache is opt-in: set USOLC_CACHE=1.
+"""
+
+import os
+import json
+import fcntl
+import hashlib
+
+CACHE_FORMAT_VERSION = 1
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+COPY_CHUNK_SIZE = 1024 * 1024
+STATS_LOG_MAX_BYTES = 1024 * 1024
+STATS_MARKS = {"hits": b"h", "misses": b"m"}
+
+# solc options that write files or read from places the key cannot cover
+UNCACHEABLE_ARGUMENTS = [
+    "-o",
+    "--output-dir",
+    "--link",
+    "-",
+]
+
+# options whose values may be given either as "--opt=value" or as "--opt value"
+NORMALIZED_ARGUMENTS = [
+    "--evm-version",
+    "--optimize-runs",
+    "--libraries",
+    "--combined-json",
+    "--allow-paths",
+]
+
+cache_hits = 0
+cache_misses = 0
+
+
+def cache_enabled():
+    """
+    The cache is only used when USOLC_CACHE is set to a true value
+    """
+    return os.environ.get("USOLC_CACHE", "").lower() in ("1", "true", "yes", "on")
+
+
+def cache_dir():
+    """
+    Returns the root directory of the cache
+    """
+    directory = os.environ.get("USOLC_CACHE_DIR")
+    if directory is None:
+        directory = os.path.join(os.environ['USOLC_HOME'], "cache")
+    return directory
+
+
+def cache_max_bytes():
+    """
+    Returns the size limit of the cache, in bytes
+    """
+    try:
+        return int(os.environ.get("USOLC_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+    except ValueError:
+        return DEFAULT_MAX_BYTES
+
+
+def is_cacheable(native_argv):
+    """
+    Outputs that solc writes somewhere other than stdout/stderr cannot be replayed
+    """
+    for arg in native_argv:
+        if arg in UNCACHEABLE_ARGUMENTS or arg.startswith("--output-dir="):
+            return False
+    return True
+
+
+def normalize_argv(native_argv):
+    """
+    Splits "--opt=value" into "--opt", "value" so that both spellings share a key
+    """
+    normalized = []
+    for arg in native_argv:
+        option, separator, value = arg.partition("=")
+        if separator and option in NORMALIZED_ARGUMENTS:
+            normalized.append(option)
+            normalized.append(value)
+        else:
+            normalized.append(arg)
+    return normalized
+
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(filename):
+    """
+    Returns the sha256 of the content of the file
+    """
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_cache_key(version_chosen, native_argv, source_files, stdin_data=None):
+    """
+    Computes the key of a compilation from the version, the argv and the content of the sources.
+    Source files are hashed under the exact path given to solc, since solc echoes those paths
+    in its output.
+    """
+    key_material = {
+        "format": CACHE_FORMAT_VERSION,
+        "version": version_chosen,
+        "argv": normalize_argv(native_argv),
+        "sources": [[filename, hash_file(filename)] for filename in source_files],
+        "stdin": None if stdin_data is None else hash_bytes(stdin_data),
+    }
+    return hash_bytes(json.dumps(key_material, sort_keys=True).encode("utf-8"))
+
+
+def entry_path(key):
+    return os.path.join(cache_dir(), "objects", key[:2], key)
+
+
+def artifacts_path(key):
+    """
+    Returns the directory of the artifacts built from an entry, see artifacts.py
+    """
+    return os.path.join(cache_dir(), "artifacts", key[:2], key)
+
+
+def open_entry(key):
+    """
+    Opens a cached compilation without reading its outputs
+    Returns [returncode, file, stdout size, stderr size], the file being positioned at the start
+    of stdout, or None on a miss. The caller closes the file.
+    """
+    path = entry_path(key)
+    try:
+        entry = open(path, 'rb')
+    except OSError:
+        record_lookup(False)
+        return None
+
+    try:
+        header = json.loads(entry.readline().decode("utf-8"))
+        [returncode, stdout_size, stderr_size] = [header["returncode"], header["stdout"], header["stderr"]]
+        complete = os.fstat(entry.fileno()).st_size == entry.tell() + stdout_size + stderr_size
+    except (OSError, ValueError, KeyError, TypeError):
+        complete = False
+    if not complete:
+        entry.close()
+        record_lookup(False)
+        return None
+
+    try:
+        # the modification time doubles as the last access time for LRU eviction
+        os.utime(path)
+    except OSError:
+        pass
+
+    record_lookup(True)
+    return [returncode, entry, stdout_size, stderr_size]
+
+
+def lookup(key):
+    """
+    Returns [returncode, stdout, stderr] of a cached compilation, or None on a miss
+    """
+    opened = open_entry(key)
+    if opened is None:
+        return None
+
+    [returncode, entry, stdout_size, stderr_size] = opened
+    with entry:
+        stdout = entry.read(stdout_size)
+        stderr = entry.read(stderr_size)
+    return [returncode, stdout, stderr]
+
+
+def write_entry(key, header, write_outputs):
+    """
+    Atomically writes an entry whose outputs are written by write_outputs(file),
+    then evicts old entries if the cache grew too large
+    """
+    import tempfile
+    path = entry_path(key)
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, 'wb') as entry:
+            entry.write(json.dumps(header).encode("utf-8") + b"\n")
+            write_outputs(entry)
+            size = entry.tell()
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    account(size)
+
+
+def store(key, returncode, stdout, stderr):
+    """
+    Stores the outputs of a compilation held in memory
+    """
+    def write_outputs(entry):
+        entry.write(stdout)
+        entry.write(stderr)
+    write_entry(key, {"returncode": returncode, "stdout": len(stdout), "stderr": len(stderr)}, write_outputs)
+
+
+def store_files(key, returncode, stdout_file, stderr_file):
+    """
+    Stores the outputs of a compilation written to files, copying them chunk by chunk
+    """
+    for output in [stdout_file, stderr_file]:
+        output.flush()
+    sizes = [os.fstat(output.fileno()).st_size for output in [stdout_file, stderr_file]]
+
+    def write_outputs(entry):
+        import shutil
+        for output in [stdout_file, stderr_file]:
+            output.seek(0)
+            shutil.copyfileobj(output, entry, COPY_CHUNK_SIZE)
+    write_entry(key, {"returncode": returncode, "stdout": sizes[0], "stderr": sizes[1]}, write_outputs)
+
+
+def scan_buckets(directory):
+    """
+    Yields the os.DirEntry of every key of a two-level directory like objects/ and artifacts/
+    """
+    try:
+        buckets = list(os.scandir(directory))
+    except FileNotFoundError:
+        return
+
+    for bucket in buckets:
+        if not bucket.is_dir():
+            continue
+        for entry in os.scandir(bucket.path):
+            if not entry.name.startswith(".tmp-"):
+                yield entry
+
+
+def tree_size(directory):
+    size = 0
+    for root, _, filenames in os.walk(directory):
+        for filename in filenames:
+            try:
+                size += os.lstat(os.path.join(root, filename)).st_size
+            except FileNotFoundError:
+                pass
+    return size
+
+
+def list_entries():
+    """
+    Returns [path, size, mtime] for every entry in the cache; the size of an entry includes its
+    artifact set, and artifact sets left without an entry are listed by their own directory
+    """
+    artifact_sets = {}
+    for entry in scan_buckets(os.path.join(cache_dir(), "artifacts")):
+        try:
+            mtime = entry.stat().st_mtime
+        except FileNotFoundError:
+            continue
+        artifact_sets[entry.name] = [entry.path, tree_size(entry.path), mtime]
+
+    entries = []
+    for entry in scan_buckets(os.path.join(cache_dir(), "objects")):
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        [_, artifacts_size, _] = artifact_sets.pop(entry.name, [None, 0, None])
+        entries.append([entry.path, stat.st_size + artifacts_size, stat.st_mtime])
+    return entries + list(artifact_sets.values())
+
+
+def read_size(directory):
+    """
+    Returns the running size of the cache, None if it is unknown
+    """
+    try:
+        with open(os.path.join(directory, "size"), 'r') as size_file:
+            return int(size_file.read())
+    except (OSError, ValueError):
+        return None
+
+
+def write_size(directory, size):
+    with open(os.path.join(directory, "size"), 'w') as size_file:
+        size_file.write(str(size))
+
+
+def account(size):
+    """
+    Adds size bytes to the running size of the cache, and evicts old entries once it goes past
+    the limit; an unknown size, such as that of a cache written before it was kept, is scanned
+    Returns the number of entries removed
+    """
+    directory = cache_dir()
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "size.lock"), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        total = read_size(directory)
+        if total is not None and total + size <= cache_max_bytes():
+            write_size(directory, total + size)
+            return 0
+        return evict(cache_max_bytes())
+
+
+def evict(max_bytes):
+    """
+    Removes the least recently used entries until the cache fits in max_bytes, and records the
+    size that remains as the running size of the cache
+    Returns the number of entries removed
+    """
+    entries = list_entries()
+    total_size = sum(size for _, size, _ in entries)
+    removed = 0
+
+    for path, size, _ in sorted(entries, key=lambda entry: entry[2]):
+        if total_size <= max_bytes:
+            break
+        import shutil
+        if os.path.isdir(path):
+            # an artifact set without its entry
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            if os.path.isdir(artifacts_path(os.path.basename(path))):
+                shutil.rmtree(artifacts_path(os.path.basename(path)), ignore_errors=True)
+        total_size -= size
+        removed += 1
+
+    write_size(cache_dir(), total_size)
+    return removed
+
+
+def record_lookup(hit):
+    """
+    Counts the lookup in this process and in the persistent stats file
+    """
+    global cache_hits, cache_misses
+    if hit:
+        cache_hits += 1
+    else:
+        cache_misses += 1
+
+    field = "hits" if hit else "misses"
+    try:
+        update_stats(field)
+    except OSError:
+        # the counters are informative only and must never fail a compilation
+        pass
+
+
+def update_stats(field):
+    directory = cache_dir()
+    os.makedirs(directory, exist_ok=True)
+
+    # appends of one byte never interleave: lookups do not wait on each other
+    fd = os.open(os.path.join(directory, "stats.log"), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, STATS_MARKS[field])
+        log_size = os.fstat(fd).st_size
+    finally:
+        os.close(fd)
+    if log_size >= STATS_LOG_MAX_BYTES:
+        fold_stats_log(directory)
+
+
+def count_marks(filename):
+    """
+    Returns the hit/miss counters of a stats log
+    """
+    try:
+        with open(filename, 'rb') as log:
+            data = log.read()
+    except FileNotFoundError:
+        data = b""
+    return dict((field, data.count(mark)) for field, mark in STATS_MARKS.items())
+
+
+def fold_stats_log(directory):
+    """
+    Adds the counters of stats.log to stats.json, unless another process is already at it
+    """
+    import tempfile
+    with open(os.path.join(directory, "stats.lock"), 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return
+        folding = os.path.join(directory, ".tmp-stats-log-{0}".format(os.getpid()))
+        try:
+            os.rename(os.path.join(directory, "stats.log"), folding)
+        except FileNotFoundError:
+            return
+        stats = read_folded_stats(directory)
+        for field, count in count_marks(folding).items():
+            stats[field] += count
+
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-stats-")
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            json.dump(stats, file)
+        os.replace(tmp_path, os.path.join(directory, "stats.json"))
+        os.unlink(folding)
+
+
+def read_folded_stats(directory):
+    try:
+        with open(os.path.join(directory, "stats.json"), 'r', encoding='utf-8') as file:
+            stats = json.load(file)
+    except (OSError, ValueError):
+        stats = {}
+
+    stats.setdefault("hits", 0)
+    stats.setdefault("misses", 0)
+    return stats
+
+
+def read_stats():
+    """
+    Returns the hit/miss counters accumulated by every usolc process sharing the cache
+    """
+    directory = cache_dir()
+    stats = read_folded_stats(directory)
+    for field, count in count_marks(os.path.join(directory, "stats.log")).items():
+        stats[field] += count
+    return stats
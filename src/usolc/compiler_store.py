@@ -0,0 +1,412 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+"""
+ Content-addressed store of solc binaries.
+
+ Binaries are kept once, named by their sha256, in $USOLC_STORE (when it is set):
+
+     <store>/sha256/<hash[:2]>/<hash>
+
+ and bin/solc-<version> becomes a link to its object, so that usolc keeps seeing the flat
+ bin/ layout it always had. A hardlink is used when the store is on the same filesystem, a
+ reflink (copy-on-write clone) when the filesystem supports it, and a symlink otherwise,
+ e.g. for a store shared read-only by several containers through a bind mount. Every
+ USOLC_HOME using the same store shares the same pages in the page cache.
+
+     usolc store add        move the binaries of bin/ into the store, leaving links behind
+     usolc store status     show how every version of bin/ is linked to the store
+     usolc store gc [-n]    remove the objects no binary links to any more
+     usolc store release    drop the references of this USOLC_HOME, before retiring it
+
+ Symlinks and reflinks do not show in the link count of an object, so the store keeps a
+ registry of which homes use which object, one file per object listing the ids of the homes:
+
+     <store>/refs/<hash[:2]>/<hash>
+
+ A home is identified by the random id of its solc-store-id file. Installing a binary registers
+ the home in the same locked step that adds its object; gc first brings the references of its
+ own home up to date with bin/, then only removes the objects whose registry lists no home and
+ that no hardlink points to. Objects without a registry file, stored before it existed or by a
+ home that could not write the store, are never removed.
+"""
+
+import os
+import sys
+import json
+import fcntl
+import errno
+import shutil
+import argparse
+import tempfile
+import contextlib
+import compile_cache
+import inventory
+
+# ioctl cloning a file on copy-on-write filesystems (btrfs, xfs), from linux/fs.h
+FICLONE = 0x40049409
+# ioctl mapping the extents of a file, and its flags, from linux/fiemap.h
+FS_IOC_FIEMAP = 0xC020660B
+FIEMAP_FLAG_SYNC = 0x1
+FIEMAP_EXTENT_UNKNOWN = 0x2
+FIEMAP_EXTENT_DATA_INLINE = 0x200
+
+
+def store_dir():
+    """
+    Returns the store directory, None when the store is not used
+    """
+    return os.environ.get("USOLC_STORE") or None
+
+
+def object_path(store, digest):
+    return os.path.join(store, "sha256", digest[:2], digest)
+
+
+def add_object(store, filename, digest=None):
+    """
+    Copies the file into the store unless an object with the same content is already there
+    Returns the path of the object
+    """
+    digest = digest or compile_cache.hash_file(filename)
+    path = object_path(store, digest)
+    if os.path.exists(path):
+        return path
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, 'wb') as target, open(filename, 'rb') as source:
+            shutil.copyfileobj(source, target)
+        # objects are shared: nobody writes to them, everybody runs them
+        os.chmod(tmp_path, 0o555)
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return path
+
+
+def refs_path(store, digest):
+    return os.path.join(store, "refs", digest[:2], digest)
+
+
+def home_id(usolc_home):
+    """
+    Returns the id of the home in the registry of the store, created on first use; the caller holds the lock
+    """
+    import uuid
+    filename = os.path.join(usolc_home, "solc-store-id")
+    try:
+        with open(filename, 'r') as id_file:
+            return id_file.read().strip()
+    except FileNotFoundError:
+        pass
+
+    home = uuid.uuid4().hex
+    fd, tmp_path = tempfile.mkstemp(dir=usolc_home, prefix=".tmp-store-id-")
+    with os.fdopen(fd, 'w') as id_file:
+        id_file.write(home + "\n")
+    os.replace(tmp_path, filename)
+    return home
+
+
+@contextlib.contextmanager
+def locked_registry(store):
+    """
+    Holds the exclusive lock under which objects are added, referenced and collected
+    """
+    os.makedirs(store, exist_ok=True)
+    with open(os.path.join(store, "refs.lock"), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def read_refs(store, digest):
+    """
+    Returns the ids of the homes using the object, None if no home ever registered it
+    """
+    try:
+        with open(refs_path(store, digest), 'r') as refs_file:
+            return set(json.load(refs_file))
+    except FileNotFoundError:
+        return None
+
+
+def write_refs(store, digest, homes):
+    path = refs_path(store, digest)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    with os.fdopen(fd, 'w') as refs_file:
+        json.dump(sorted(homes), refs_file)
+    os.replace(tmp_path, path)
+
+
+def update_refs(store, digest, home, referenced):
+    """
+    Adds the home to the registry of the object, or removes it; the caller holds the lock
+    """
+    homes = read_refs(store, digest)
+    if homes is None and not referenced:
+        return
+    homes = homes or set()
+    if (home in homes) != referenced:
+        write_refs(store, digest, homes | {home} if referenced else homes - {home})
+
+
+def reflink(source, target):
+    with open(source, 'rb') as source_file, open(target, 'wb') as target_file:
+        fcntl.ioctl(target_file.fileno(), FICLONE, source_file.fileno())
+    os.chmod(target, 0o755)
+
+
+def link_object(path, target):
+    """
+    Atomically replaces target with a link to the object at path
+    Returns the kind of link made: "hardlink", "reflink" or "symlink"
+    """
+    directory = os.path.dirname(target)
+    tmp_path = os.path.join(directory, ".tmp-link-{0}-{1}".format(os.getpid(), os.path.basename(target)))
+
+    for kind in ["hardlink", "reflink", "symlink"]:
+        try:
+            if os.path.lexists(tmp_path):
+                os.unlink(tmp_path)
+            if kind == "hardlink":
+                os.link(path, tmp_path)
+            elif kind == "reflink":
+                reflink(path, tmp_path)
+            else:
+                os.symlink(os.path.abspath(path), tmp_path)
+            os.replace(tmp_path, target)
+            return kind
+        except OSError as e:
+            if kind == "symlink" or e.errno not in (errno.EXDEV, errno.EPERM, errno.EACCES, errno.EROFS,
+                                                   errno.EOPNOTSUPP, errno.EINVAL, errno.ENOTTY,
+                                                   errno.EMLINK):
+                if os.path.lexists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+    return None
+
+
+def install_binary(store, filename, target, digest=None):
+    """
+    Adds the binary to the store and points target to it
+    Returns the kind of link made
+    """
+    digest = digest or compile_cache.hash_file(filename)
+    usolc_home = os.path.dirname(os.path.dirname(os.path.abspath(target)))
+    registered = False
+    try:
+        # gc of another home cannot remove the object between its registration and the link
+        with locked_registry(store):
+            path = add_object(store, filename, digest)
+            update_refs(store, digest, home_id(usolc_home), True)
+            registered = True
+            kind = link_object(path, target)
+    except OSError as e:
+        path = object_path(store, digest)
+        if registered or e.errno not in (errno.EROFS, errno.EACCES, errno.EPERM) or not os.path.exists(path):
+            raise
+        # a store shared read-only: its owner keeps the objects its homes registered
+        print("Warning: cannot register solc {0} in the store: {1}".format(digest, e), file=sys.stderr)
+        kind = link_object(path, target)
+    if os.path.abspath(filename) != os.path.abspath(target) and os.path.exists(filename):
+        os.unlink(filename)
+    return kind
+
+
+def first_extent(filename):
+    """
+    Returns the physical address of the first extent of the file, None if the filesystem does not tell
+    """
+    import struct
+    # struct fiemap asking for one struct fiemap_extent
+    request = bytearray(struct.pack("=QQIIII", 0, 0xFFFFFFFFFFFFFFFF, FIEMAP_FLAG_SYNC, 0, 1, 0) + bytes(56))
+    try:
+        with open(filename, 'rb') as file:
+            fcntl.ioctl(file.fileno(), FS_IOC_FIEMAP, request)
+    except OSError:
+        return None
+    [mapped_extents] = struct.unpack_from("=I", request, 20)
+    [physical] = struct.unpack_from("=Q", request, 40)
+    [flags] = struct.unpack_from("=I", request, 72)
+    if mapped_extents == 0 or physical == 0 or flags & (FIEMAP_EXTENT_UNKNOWN | FIEMAP_EXTENT_DATA_INLINE):
+        return None
+    return physical
+
+
+def is_reflink(path, filename):
+    """
+    Tells whether the file shares the blocks of the object at path
+    """
+    extent = first_extent(path)
+    return extent is not None and extent == first_extent(filename)
+
+
+def link_kind(store, filename):
+    """
+    Tells how a binary of bin/ relates to the store: "hardlink", "reflink", "symlink" or "copy"
+    """
+    if os.path.islink(filename):
+        real_path = os.path.realpath(filename)
+        if real_path.startswith(os.path.realpath(store) + os.sep):
+            return "symlink"
+        return "copy"
+
+    digest = compile_cache.hash_file(filename)
+    path = object_path(store, digest)
+    if not os.path.exists(path):
+        return "copy"
+    if os.path.samefile(path, filename):
+        return "hardlink"
+    return "reflink" if is_reflink(path, filename) else "copy"
+
+
+def list_objects(store):
+    """
+    Returns the paths of every object of the store
+    """
+    objects = []
+    root = os.path.join(store, "sha256")
+    if not os.path.isdir(root):
+        return objects
+    for bucket in sorted(os.listdir(root)):
+        bucket_dir = os.path.join(root, bucket)
+        if not os.path.isdir(bucket_dir):
+            continue
+        for name in sorted(os.listdir(bucket_dir)):
+            if not name.startswith(".tmp-"):
+                objects.append(os.path.join(bucket_dir, name))
+    return objects
+
+
+def linked_objects(store, usolc_home):
+    """
+    Returns the digests of the objects the binaries of bin/ link to, whatever the kind of link
+    """
+    digests = set()
+    directory = inventory.bin_dir(usolc_home)
+    for name in os.listdir(directory):
+        filename = os.path.join(directory, name)
+        if not name.startswith("solc-") or not os.path.isfile(filename):
+            continue
+        if os.path.islink(filename):
+            digest = os.path.basename(os.path.realpath(filename))
+        else:
+            digest = compile_cache.hash_file(filename)
+        if os.path.exists(object_path(store, digest)):
+            digests.add(digest)
+    return digests
+
+
+def sync_refs(store, usolc_home, linked):
+    """
+    Makes the registry list the home for exactly the linked objects; the caller holds the lock
+    """
+    home = home_id(usolc_home)
+    for path in list_objects(store):
+        digest = os.path.basename(path)
+        update_refs(store, digest, home, digest in linked)
+
+
+def collect_garbage(store, usolc_home, dry_run=False):
+    """
+    Removes the objects that no home registered in the store uses and that are not hardlinked
+    Returns the paths of the objects removed (or that would be removed)
+    """
+    removed = []
+    with locked_registry(store):
+        linked = linked_objects(store, usolc_home)
+        if not dry_run:
+            sync_refs(store, usolc_home, linked)
+        home = home_id(usolc_home)
+        for path in list_objects(store):
+            digest = os.path.basename(path)
+            homes = read_refs(store, digest)
+            if dry_run and homes is not None:
+                homes = homes - {home} | ({home} if digest in linked else set())
+            if homes is None or homes or os.stat(path).st_nlink > 1:
+                continue
+            removed.append(path)
+            if not dry_run:
+                os.unlink(path)
+                os.unlink(refs_path(store, digest))
+    return removed
+
+
+def release(store, usolc_home):
+    """
+    Removes the home from the registry of every object, so that gc can collect what it used
+    """
+    with locked_registry(store):
+        sync_refs(store, usolc_home, set())
+
+
+def add_bin_directory(store, usolc_home):
+    """
+    Moves every binary of bin/ into the store
+    Returns {version: kind of link}
+    """
+    results = {}
+    directory = inventory.bin_dir(usolc_home)
+    for version in inventory.installed_versions(usolc_home):
+        target = os.path.join(directory, "solc-" + version)
+        if link_kind(store, target) != "copy":
+            continue
+        results[version] = install_binary(store, target, target)
+    # binaries linked before the store kept a registry
+    with locked_registry(store):
+        home = home_id(usolc_home)
+        for digest in linked_objects(store, usolc_home):
+            update_refs(store, digest, home, True)
+    inventory.refresh_manifest(usolc_home)
+    return results
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="usolc store", description="Manage the store of solc binaries")
+    parser.add_argument("command", choices=["add", "status", "gc", "release"])
+    parser.add_argument("-n", "--dry-run", action="store_true", help="only list what gc would remove")
+    parser.add_argument("--store", default=None, help="store directory, $USOLC_STORE by default")
+    args = parser.parse_args(argv)
+
+    store = args.store or store_dir()
+    if store is None:
+        print("Error: no store configured, set USOLC_STORE or use --store", file=sys.stderr)
+        return 2
+    usolc_home = os.environ['USOLC_HOME']
+
+    try:
+        if args.command == "add":
+            for version, kind in sorted(add_bin_directory(store, usolc_home).items(),
+                                        key=lambda item: inventory.version_key(item[0])):
+                print("solc-{0}: {1}".format(version, kind))
+        elif args.command == "status":
+            directory = inventory.bin_dir(usolc_home)
+            for version in inventory.installed_versions(usolc_home):
+                print("solc-{0}: {1}".format(version, link_kind(store, os.path.join(directory, "solc-" + version))))
+        elif args.command == "release":
+            release(store, usolc_home)
+        else:
+            for path in collect_garbage(store, usolc_home, args.dry_run):
+                print(("would remove " if args.dry_run else "removed ") + path)
+    except OSError as e:
+        print("Error: " + str(e), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,16 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+
+class ChecksumMismatchError(Exception):
+    def __init__(self, version, expected_sha256, actual_sha256, msg):
+        super(ChecksumMismatchError, self).__init__(msg)
+        self.version = version
+        self.expected_sha256 = expected_sha256
+        self.actual_sha256 = actual_sha256
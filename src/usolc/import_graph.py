@@ -0,0 +1,241 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+"""
+ Follows the imports of a compilation unit to collect the pragmas of every file solc will read.
+
+ Imports are resolved the way solc resolves them on the command line:
+     - "./x" and "../x" are relative to the importing file,
+     - remappings given as [context:]prefix=target replace the longest matching prefix,
+     - anything else is relative to the working directory.
+ Files outside of the directories solc is allowed to read (the working directory, the
+ directories of the input files, the --allow-paths and the remapping targets) are not followed.
+
+ The rules and imports of each file are kept for the life of the process, keyed by the absolute
+ path and validated by mtime and size, so that the daemon, batches and watch sessions only scan
+ the files that changed. With the compile cache enabled (USOLC_CACHE=1), they are also kept in
+ $USOLC_CACHE_DIR/constraints.json for later runs, along with the sha256 of each file: a file
+ whose mtime changed is only scanned again if its content did, and one modified within
+ RACY_NANOSECONDS of its scan, which the mtime cannot tell apart from it, is checked by hash.
+"""
+
+import os
+import json
+import time
+import collections
+import compile_cache
+import pragma_scanner
+
+PREFIX_FILELOC_SEPARATOR = "="
+MAX_CONSTRAINT_ENTRIES = 100000
+RACY_NANOSECONDS = 2 * 10 ** 9
+
+constraints_memo = None
+constraints_dirty = False
+
+
+def constraints_filename():
+    """
+    Returns the file constraints persist in, None if the compile cache is disabled
+    """
+    if not compile_cache.cache_enabled():
+        return None
+    return os.path.join(compile_cache.cache_dir(), "constraints.json")
+
+
+def load_constraints():
+    """
+    Loads the persistent constraint cache once per process
+    """
+    global constraints_memo
+    filename = constraints_filename()
+    if constraints_memo is None or constraints_memo[0] != filename:
+        constraints_memo = [filename, {}]
+        if filename is not None:
+            try:
+                with open(filename, 'r', encoding='utf-8') as file:
+                    constraints_memo = [filename, json.load(file)]
+            except (OSError, ValueError):
+                pass
+    return constraints_memo[1]
+
+
+def save_constraints():
+    """
+    Writes the constraint cache back if files were scanned; failing to do so is not an error
+    """
+    global constraints_dirty
+    if not constraints_dirty or constraints_filename() is None:
+        return
+
+    constraints = load_constraints()
+    if len(constraints) > MAX_CONSTRAINT_ENTRIES:
+        newest = sorted(constraints.items(), key=lambda item: item[1]["seen"], reverse=True)
+        constraints.clear()
+        constraints.update(newest[:MAX_CONSTRAINT_ENTRIES])
+
+    import tempfile
+    try:
+        directory = os.path.dirname(constraints_filename())
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-constraints-")
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            json.dump(constraints, file)
+        os.replace(tmp_path, constraints_filename())
+        constraints_dirty = False
+    except OSError:
+        pass
+
+
+def file_constraints(filename):
+    """
+    Returns [rules, import paths] of a file, scanning it only if it changed since last time
+    """
+    global constraints_dirty
+    stat = os.stat(filename)
+    key = os.path.abspath(filename)
+    constraints = load_constraints()
+    now = time.time_ns()
+
+    entry = constraints.get(key)
+    if entry is not None and entry["size"] == stat.st_size:
+        if entry["mtime"] == stat.st_mtime_ns and stat.st_mtime_ns + RACY_NANOSECONDS < entry.get("scanned", 0):
+            return [entry["rules"], entry["imports"]]
+        # touched, or modified too close to its scan for the mtime to tell
+        if entry.get("sha256") is not None and entry["sha256"] == compile_cache.hash_file(filename):
+            if stat.st_mtime_ns + RACY_NANOSECONDS < now:
+                entry.update({"mtime": stat.st_mtime_ns, "scanned": now})
+                constraints_dirty = True
+            return [entry["rules"], entry["imports"]]
+
+    [rules, imports] = pragma_scanner.scan_file_header(filename)
+    constraints[key] = {
+        "mtime": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "sha256": None if constraints_filename() is None else compile_cache.hash_file(filename),
+        "rules": rules,
+        "imports": imports,
+        "scanned": now,
+        "seen": int(time.time()),
+    }
+    constraints_dirty = True
+    return [rules, imports]
+
+
+def parse_remappings(native_argv, prefix_fileloc):
+    """
+    Returns the [context, prefix, target] remappings found in the arguments
+    """
+    remappings = []
+    for arg in native_argv:
+        if arg.startswith("-") or prefix_fileloc.match(arg) is None:
+            continue
+        [source, target] = arg.split(PREFIX_FILELOC_SEPARATOR, 1)
+        context, _, prefix = source.rpartition(":")
+        remappings.append([context, prefix, target])
+    return remappings
+
+
+def parse_allow_paths(native_argv):
+    """
+    Returns the directories given to --allow-paths
+    """
+    allow_paths = []
+    for position, arg in enumerate(native_argv):
+        if arg == "--allow-paths" and position + 1 < len(native_argv):
+            value = native_argv[position + 1]
+        elif arg.startswith("--allow-paths="):
+            value = arg[len("--allow-paths="):]
+        else:
+            continue
+        allow_paths += [path for path in value.split(",") if path]
+    return allow_paths
+
+
+def apply_remappings(importing_file, path, remappings):
+    """
+    Applies the remapping with the longest context, then the longest prefix, matching the import
+    """
+    best = None
+    for context, prefix, target in remappings:
+        if not importing_file.startswith(context) or not path.startswith(prefix):
+            continue
+        if best is None or (len(context), len(prefix)) > (len(best[0]), len(best[1])):
+            best = [context, prefix, target]
+
+    if best is None:
+        return path
+    return best[2] + path[len(best[1]):]
+
+
+def resolve_import(importing_file, path, remappings):
+    """
+    Returns the path of the file solc will read for an import found in importing_file
+    """
+    if path.startswith("./") or path.startswith("../"):
+        path = os.path.normpath(os.path.join(os.path.dirname(importing_file), path))
+    return os.path.normpath(apply_remappings(importing_file, path, remappings))
+
+
+def allowed_roots(filenames, remappings, allow_paths):
+    roots = [os.getcwd()]
+    roots += [os.path.dirname(os.path.abspath(filename)) for filename in filenames]
+    roots += [os.path.abspath(path) for path in allow_paths]
+    roots += [os.path.abspath(target) for _, _, target in remappings if target]
+    return roots
+
+
+def is_allowed(filename, roots):
+    path = os.path.abspath(filename)
+    return any(path == root or path.startswith(root.rstrip(os.sep) + os.sep) for root in roots)
+
+
+def build_import_graph(filenames, remappings=None, allow_paths=None, save=True):
+    """
+    Walks the imports from the input files
+    Returns {file: [rules, resolved imports]} for every reachable file, in discovery order.
+    Missing input files raise FileNotFoundError; missing imports are left for solc to report.
+    Callers building many graphs pass save=False and call save_constraints() once at the end.
+    """
+    remappings = remappings or []
+    roots = allowed_roots(filenames, remappings, allow_paths or [])
+    graph = {}
+    pending = collections.deque(filenames)
+
+    while pending:
+        filename = pending.popleft()
+        if filename in graph:
+            continue
+
+        try:
+            [rules, imports] = file_constraints(filename)
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+            if filename in filenames:
+                raise
+            continue
+
+        resolved = [resolve_import(filename, path, remappings) for path in imports]
+        graph[filename] = [rules, resolved]
+        pending.extend(path for path in resolved if path not in graph and is_allowed(path, roots))
+
+    if save:
+        save_constraints()
+    return graph
+
+
+def unit_rules(graph):
+    """
+    Returns the rules of every file of the graph, without repetitions
+    """
+    rules = []
+    for file_rules, _ in graph.values():
+        for rule in file_rules:
+            if rule not in rules:
+                rules.append(rule)
+    return rules
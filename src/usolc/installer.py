@@ -0,0 +1,374 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+"""
+ Installs solc binaries into $USOLC_HOME/bin.
+
+     usolc install [VERSION...] [--jobs N] [--mirror URL|DIR] [--checksums FILE]
+                   [--checksum-list URL|FILE] [--require-checksums] [--force]
+
+ Without versions, every known release is installed. Versions are fetched concurrently by a
+ bounded pool of threads from a mirror, an http(s) URL or a local directory laid out either like
+ binaries.soliditylang.org, whose <mirror>/list.json gives the path and the sha256 of every
+ build (the default, the linux-amd64 builds of the Solidity project), or like the GitHub
+ releases, <mirror>/v<version>/<asset>.
+
+ Downloads go to $USOLC_HOME/downloads/solc-<version>.part and resume from where they
+ stopped with an HTTP range request; installers of the same version take turns on the
+ exclusive flock of downloads/solc-<version>.lock, so that a .part file has one writer and
+ a version is fetched once. A complete download is checked against the sha256 of its
+ version, made executable and renamed into bin/, so bin/ never holds a partial or
+ unverified binary. The sha256 pinned in solc_checksums.txt wins; versions without one are
+ checked against the list.json the binary was downloaded along with, or the list named by
+ --checksum-list or $USOLC_CHECKSUM_LIST (an http(s) URL or a file) for a mirror laid out like
+ the GitHub releases, whose builds it must describe. With $USOLC_STORE set, the binary goes to
+ the store and bin/ gets a link to it instead, see compiler_store.py. The inventory manifest is
+ refreshed once at the end.
+"""
+
+import os
+import sys
+import json
+import time
+import fcntl
+import shutil
+import argparse
+import concurrent.futures
+import urllib.error
+import urllib.request
+import inventory
+import compile_cache
+import compiler_store
+from exceptions.checksum_mismatch_error import ChecksumMismatchError
+
+DEFAULT_MIRROR = "https://binaries.soliditylang.org/linux-amd64"
+RELEASE_LIST = "list.json"
+DEFAULT_JOBS = 4
+DEFAULT_RETRIES = 3
+CHUNK_SIZE = 1024 * 1024
+TIMEOUT_SECONDS = 60
+
+# next to this file, or next to the zipapp it was packaged into (see "make zipapp")
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+if os.path.isfile(SOURCE_DIR):
+    SOURCE_DIR = os.path.dirname(SOURCE_DIR)
+PINNED_CHECKSUMS = os.path.join(SOURCE_DIR, "solc_checksums.txt")
+
+# version -> name of its linux binary in the GitHub release
+KNOWN_RELEASES = dict(
+    [("0.4.10", "solc")] +
+    [(version, "solc-static-linux") for version in [
+        "0.4.11", "0.4.12", "0.4.13", "0.4.14", "0.4.15", "0.4.16", "0.4.17", "0.4.18", "0.4.19",
+        "0.4.20", "0.4.21", "0.4.22", "0.4.23", "0.4.24", "0.4.25",
+        "0.5.0", "0.5.1", "0.5.2", "0.5.3", "0.5.4",
+    ]])
+
+
+def read_checksums(filename):
+    """
+    Reads "<version> <sha256>" lines, ignoring blank lines and # comments
+    """
+    checksums = {}
+    with open(filename, 'r', encoding='utf-8') as file:
+        for line in file:
+            fields = line.split("#", 1)[0].split()
+            if len(fields) == 2:
+                checksums[fields[0]] = fields[1].lower()
+    return checksums
+
+
+def default_mirror():
+    return os.environ.get("USOLC_MIRROR", DEFAULT_MIRROR)
+
+
+def default_checksum_list():
+    return os.environ.get("USOLC_CHECKSUM_LIST") or None
+
+
+def is_url(mirror):
+    return mirror.startswith("http://") or mirror.startswith("https://")
+
+
+def parse_release_list(data):
+    """
+    Returns {version: [path, sha256]} for the releases of a list.json of the Solidity builds
+    """
+    releases = {}
+    for build in data.get("builds", []):
+        if build.get("prerelease") or not build.get("version"):
+            continue
+        digest = (build.get("sha256") or "").lower()
+        releases[build["version"]] = [build.get("path"), (digest[2:] if digest.startswith("0x") else digest) or None]
+    return releases
+
+
+def read_json_location(location):
+    if is_url(location):
+        with urllib.request.urlopen(location, timeout=TIMEOUT_SECONDS) as response:
+            return json.loads(response.read().decode("utf-8"))
+    with open(location, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def read_checksum_list(location):
+    """
+    Reads the sha256 of the releases from a list.json of the Solidity builds, a URL or a file
+    """
+    return published_checksums(parse_release_list(read_json_location(location)))
+
+
+def list_location(mirror):
+    if is_url(mirror):
+        return mirror.rstrip("/") + "/" + RELEASE_LIST
+    return os.path.join(mirror, RELEASE_LIST)
+
+
+def read_release_list(mirror):
+    """
+    Returns {version: [path, sha256]} from the list.json of the mirror, None for a mirror laid
+    out like the GitHub releases, which has none
+    """
+    try:
+        return parse_release_list(read_json_location(list_location(mirror)))
+    except FileNotFoundError:
+        return None
+    except urllib.error.HTTPError as e:
+        if e.code == 404:
+            return None
+        raise
+
+
+def published_checksums(releases):
+    return dict((version, digest) for version, [_, digest] in (releases or {}).items() if digest is not None)
+
+
+def complete_checksums(checksums, versions, checksum_list):
+    """
+    Adds the published sha256 of the versions that have no pinned one
+    A list that cannot be read leaves them without, which --require-checksums refuses
+    """
+    if checksum_list is None or all(version in checksums for version in versions):
+        return checksums
+    try:
+        published = read_checksum_list(checksum_list)
+    except (OSError, ValueError, AttributeError) as e:
+        print("Warning: cannot read the published sha256 of solc from {0}: {1}".format(checksum_list, e),
+              file=sys.stderr)
+        return checksums
+    return dict(published, **checksums)
+
+
+def release_location(mirror, version, releases=None):
+    """
+    Returns where the binary of the version is, given the release list of the mirror if it has one
+    """
+    if releases is not None:
+        if releases.get(version, [None])[0] is None:
+            raise FileNotFoundError("solc {0} is not in {1}".format(version, list_location(mirror)))
+        path = releases[version][0]
+        return mirror.rstrip("/") + "/" + path if is_url(mirror) else os.path.join(mirror, path)
+    asset = KNOWN_RELEASES.get(version, "solc-static-linux")
+    if is_url(mirror):
+        return "{0}/v{1}/{2}".format(mirror.rstrip("/"), version, asset)
+    return os.path.join(mirror, "v" + version, asset)
+
+
+def partial_path(usolc_home, version):
+    return os.path.join(usolc_home, "downloads", "solc-{0}.part".format(version))
+
+
+def lock_path(usolc_home, version):
+    return os.path.join(usolc_home, "downloads", "solc-{0}.lock".format(version))
+
+
+def download_url(url, part_path):
+    """
+    Downloads url into part_path, resuming from the bytes already there
+    """
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    request = urllib.request.Request(url)
+    if offset:
+        request.add_header("Range", "bytes={0}-".format(offset))
+
+    try:
+        response = urllib.request.urlopen(request, timeout=TIMEOUT_SECONDS)
+    except urllib.error.HTTPError as e:
+        if e.code == 416 and offset:
+            # nothing left to fetch: the checksum tells whether the file is complete
+            return
+        raise
+
+    with response:
+        # a server ignoring the range sends the whole file again
+        resumed = offset and response.status == 206
+        expected_size = expected_download_size(response, offset if resumed else 0)
+        with open(part_path, 'ab' if resumed else 'wb') as part:
+            shutil.copyfileobj(response, part, CHUNK_SIZE)
+            part.flush()
+            os.fsync(part.fileno())
+            size = part.tell()
+
+    # a dropped connection looks like the end of the body: retry from where it stopped
+    if expected_size is not None and size < expected_size:
+        raise urllib.error.ContentTooShortError(
+            "Download of {0} stopped at {1} of {2} bytes".format(url, size, expected_size), None)
+
+
+def expected_download_size(response, offset):
+    """
+    Returns the size the file will have once the response is written at offset, if known
+    """
+    content_range = response.headers.get("Content-Range")
+    if content_range and "/" in content_range and not content_range.endswith("/*"):
+        return int(content_range.rsplit("/", 1)[1])
+    content_length = response.headers.get("Content-Length")
+    if content_length is not None:
+        return offset + int(content_length)
+    return None
+
+
+def fetch(mirror, version, part_path, retries=DEFAULT_RETRIES, releases=None):
+    """
+    Fetches the release of the version into part_path, retrying interrupted downloads
+    """
+    location = release_location(mirror, version, releases)
+    if not is_url(mirror):
+        shutil.copyfile(location, part_path)
+        return
+
+    for attempt in range(retries):
+        try:
+            download_url(location, part_path)
+            return
+        except urllib.error.HTTPError as e:
+            if e.code < 500 or attempt == retries - 1:
+                raise
+        except OSError:
+            if attempt == retries - 1:
+                raise
+        time.sleep(2 ** attempt)
+
+
+def install_version(usolc_home, version, mirror, checksums, require_checksums=False, force=False, releases=None):
+    """
+    Installs one version into bin/, holding the lock of the version meanwhile; releases is the
+    release list of the mirror, if it has one
+    Returns "installed" or "present"; raises on download errors and checksum mismatches
+    """
+    target = os.path.join(inventory.bin_dir(usolc_home), "solc-" + version)
+    if os.path.exists(target) and not force:
+        return "present"
+
+    expected_sha256 = checksums.get(version)
+    if expected_sha256 is None and require_checksums:
+        raise ChecksumMismatchError(version, None, None, "No known sha256 for solc " + version)
+
+    os.makedirs(os.path.dirname(lock_path(usolc_home, version)), exist_ok=True)
+    with open(lock_path(usolc_home, version), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        # another installer may have installed it while we were waiting
+        if os.path.exists(target) and not force:
+            return "present"
+        return install_download(usolc_home, version, mirror, target, expected_sha256, releases)
+
+
+def install_download(usolc_home, version, mirror, target, expected_sha256, releases=None):
+    """
+    Fetches the version into its .part file, checks it and moves it into bin/
+    """
+    part_path = partial_path(usolc_home, version)
+    fetch(mirror, version, part_path, releases=releases)
+
+    actual_sha256 = compile_cache.hash_file(part_path)
+    if expected_sha256 is not None and actual_sha256 != expected_sha256:
+        os.unlink(part_path)
+        raise ChecksumMismatchError(version, expected_sha256, actual_sha256,
+                                    "sha256 of solc {0} is {1}, expected {2}".format(
+                                        version, actual_sha256, expected_sha256))
+    if expected_sha256 is None:
+        print("Warning: no known sha256 for solc {0}, installed {1}".format(version, actual_sha256),
+              file=sys.stderr)
+
+    store = compiler_store.store_dir()
+    if store is not None:
+        compiler_store.install_binary(store, part_path, target, actual_sha256)
+    else:
+        os.chmod(part_path, 0o755)
+        os.replace(part_path, target)
+    return "installed"
+
+
+def install(usolc_home, versions, mirror=None, checksums=None, jobs=DEFAULT_JOBS,
+            require_checksums=False, force=False, checksum_list=None):
+    """
+    Installs the versions concurrently, checking those without a sha256 in checksums against
+    the release list of the mirror, or the published list at checksum_list if any
+    Returns {version: "installed" | "present" | the error raised}
+    """
+    mirror = mirror or default_mirror()
+    checksums = checksums if checksums is not None else read_checksums(PINNED_CHECKSUMS)
+    try:
+        releases = read_release_list(mirror)
+    except (OSError, ValueError, AttributeError) as e:
+        return dict((version, OSError("cannot read {0}: {1}".format(list_location(mirror), e)))
+                    for version in versions)
+    checksums = dict(published_checksums(releases), **checksums)
+    checksums = complete_checksums(checksums, versions, checksum_list)
+    os.makedirs(inventory.bin_dir(usolc_home), exist_ok=True)
+
+    results = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = dict((executor.submit(install_version, usolc_home, version, mirror, checksums,
+                                        require_checksums, force, releases), version)
+                       for version in versions)
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                results[futures[future]] = future.result()
+            except (OSError, ChecksumMismatchError) as e:
+                results[futures[future]] = e
+
+    inventory.refresh_manifest(usolc_home)
+    return results
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="usolc install", description="Install solc binaries")
+    parser.add_argument("versions", nargs="*", help="versions to install, every known release by default")
+    parser.add_argument("-j", "--jobs", type=int, default=DEFAULT_JOBS, help="concurrent downloads")
+    parser.add_argument("--mirror", default=None,
+                        help="http(s) URL or directory holding a list.json of the builds, or laid out as "
+                             "<mirror>/v<version>/<asset>, $USOLC_MIRROR or the linux-amd64 builds of "
+                             "binaries.soliditylang.org by default")
+    parser.add_argument("--checksums", default=PINNED_CHECKSUMS,
+                        help="file of pinned '<version> <sha256>' lines")
+    parser.add_argument("--checksum-list", default=default_checksum_list(),
+                        help="list.json giving the sha256 of the builds of a mirror without one, "
+                             "$USOLC_CHECKSUM_LIST by default")
+    parser.add_argument("--require-checksums", action="store_true",
+                        help="refuse versions without a pinned or published sha256")
+    parser.add_argument("--force", action="store_true", help="reinstall versions already present")
+    args = parser.parse_args(argv)
+
+    versions = args.versions or sorted(KNOWN_RELEASES, key=inventory.version_key)
+    results = install(os.environ['USOLC_HOME'], versions, args.mirror, read_checksums(args.checksums),
+                      max(1, args.jobs), args.require_checksums, args.force, args.checksum_list or None)
+
+    failed = 0
+    for version in versions:
+        result = results[version]
+        if isinstance(result, Exception):
+            print("Error: cannot install solc {0}: {1}".format(version, result), file=sys.stderr)
+            failed += 1
+        else:
+            print("solc-{0}: {1}".format(version, result))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
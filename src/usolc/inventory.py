@@ -0,0 +1,215 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+"""
+ Inventory of the solc binaries installed under $USOLC_HOME/bin.
+
+ The inventory is kept in $USOLC_HOME/solc-manifest.json, next to bin/ rather than in it so
+ that writing it does not change the directory it describes:
+
+     {"format": 1, "bin_dir": ..., "bin_mtime_ns": ...,
+      "versions": {"0.4.24": {"path": ..., "size": ..., "mtime_ns": ..., "sha256": ...}, ...}}
+
+ Installing or removing a binary changes the mtime of bin/, so a manifest whose bin_mtime_ns
+ matches the directory is current and is used as is: startup costs one read and one stat.
+ Otherwise the manifest is rebuilt from the stat of each binary, and written back if the
+ installation is writable. Rebuilding never hashes: the sha256 of a binary is recorded when
+ usolc installs it or on "usolc inventory --refresh", and kept while its size and mtime do not
+ change. The manifest is also kept in memory, keyed by the directory mtime, for long-lived
+ processes.
+
+ A binary rewritten in place does not change the mtime of bin/; "usolc inventory --verify"
+ rehashes every binary and compares it to the manifest.
+
+     usolc inventory [--refresh] [--verify]
+"""
+
+import os
+import re
+import sys
+import json
+import compile_cache
+
+MANIFEST_FORMAT_VERSION = 1
+SOLC_BINARY = re.compile(r'solc-[0-9.]+')
+
+inventory_memo = None
+
+
+def bin_dir(usolc_home):
+    return os.path.join(usolc_home, "bin")
+
+
+def manifest_filename(usolc_home):
+    return os.path.join(usolc_home, "solc-manifest.json")
+
+
+def version_key(version):
+    return [int(part) if part.isdigit() else 0 for part in version.split(".")]
+
+
+def read_manifest(usolc_home):
+    """
+    Returns the manifest of the installation, None if it is missing or unreadable
+    """
+    try:
+        with open(manifest_filename(usolc_home), 'r', encoding='utf-8') as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(manifest, dict) or manifest.get("format") != MANIFEST_FORMAT_VERSION:
+        return None
+    return manifest
+
+
+def write_manifest(usolc_home, manifest):
+    """
+    Atomically replaces the manifest; a read-only installation keeps rebuilding it from stat data
+    """
+    import tempfile
+    directory = os.path.dirname(manifest_filename(usolc_home))
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-manifest-")
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            json.dump(manifest, file, indent=1, sort_keys=True)
+        os.replace(tmp_path, manifest_filename(usolc_home))
+        return True
+    except OSError:
+        return False
+
+
+def build_manifest(usolc_home, previous=None, hashed=False):
+    """
+    Lists the binaries under bin/, reusing the hashes of the previous manifest for the
+    binaries that did not change; the others are only hashed if hashed is set
+    """
+    directory = bin_dir(usolc_home)
+    bin_mtime_ns = os.stat(directory).st_mtime_ns
+    previous_versions = (previous or {}).get("versions", {})
+
+    versions = {}
+    for filename in os.listdir(directory):
+        if SOLC_BINARY.match(filename) is None:
+            continue
+        path = os.path.join(directory, filename)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+
+        version = filename.replace("solc-", "")
+        entry = previous_versions.get(version)
+        if entry is None or entry.get("size") != stat.st_size or entry.get("mtime_ns") != stat.st_mtime_ns:
+            entry = {
+                "path": path,
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "sha256": None,
+            }
+        if hashed and entry["sha256"] is None:
+            entry = dict(entry, sha256=compile_cache.hash_file(path))
+        versions[version] = entry
+
+    return {
+        "format": MANIFEST_FORMAT_VERSION,
+        "bin_dir": directory,
+        "bin_mtime_ns": bin_mtime_ns,
+        "versions": versions,
+    }
+
+
+def refresh_manifest(usolc_home):
+    """
+    Rebuilds the manifest, hashing new binaries, and writes it, e.g. right after installing binaries
+    """
+    global inventory_memo
+    manifest = build_manifest(usolc_home, read_manifest(usolc_home), hashed=True)
+    write_manifest(usolc_home, manifest)
+    inventory_memo = [usolc_home, manifest]
+    return manifest
+
+
+def load_manifest(usolc_home):
+    """
+    Returns the current manifest, from memory, from the manifest file, or rebuilt
+    """
+    global inventory_memo
+    bin_mtime_ns = os.stat(bin_dir(usolc_home)).st_mtime_ns
+
+    if inventory_memo is not None and inventory_memo[0] == usolc_home \
+            and inventory_memo[1]["bin_mtime_ns"] == bin_mtime_ns:
+        return inventory_memo[1]
+
+    manifest = read_manifest(usolc_home)
+    if manifest is None or manifest.get("bin_mtime_ns") != bin_mtime_ns \
+            or manifest.get("bin_dir") != bin_dir(usolc_home):
+        manifest = build_manifest(usolc_home, manifest)
+        write_manifest(usolc_home, manifest)
+
+    inventory_memo = [usolc_home, manifest]
+    return manifest
+
+
+def installed_versions(usolc_home):
+    """
+    Returns the installed solc versions, oldest first
+    """
+    return sorted(load_manifest(usolc_home)["versions"], key=version_key)
+
+
+def verify_manifest(usolc_home):
+    """
+    Rehashes every binary of the manifest
+    Returns the versions whose binary is missing, differs from the manifest or was never hashed
+    """
+    mismatches = []
+    for version, entry in sorted(load_manifest(usolc_home)["versions"].items()):
+        try:
+            digest = compile_cache.hash_file(entry["path"])
+        except OSError:
+            digest = None
+        if digest != entry["sha256"]:
+            mismatches.append(version)
+    return mismatches
+
+
+def main(argv):
+    import argparse
+    parser = argparse.ArgumentParser(prog="usolc inventory",
+                                     description="Show the installed solc binaries")
+    parser.add_argument("--refresh", action="store_true", help="rebuild the manifest")
+    parser.add_argument("--verify", action="store_true",
+                        help="rehash every binary and report the ones that changed")
+    args = parser.parse_args(argv)
+    usolc_home = os.environ['USOLC_HOME']
+
+    try:
+        manifest = refresh_manifest(usolc_home) if args.refresh else load_manifest(usolc_home)
+    except OSError as e:
+        print("Error: " + str(e), file=sys.stderr)
+        return 1
+
+    for version in installed_versions(usolc_home):
+        entry = manifest["versions"][version]
+        print("{0}\t{1}\t{2}".format(version, entry["sha256"] or "-", entry["path"]))
+
+    if args.verify:
+        mismatches = verify_manifest(usolc_home)
+        for version in mismatches:
+            if manifest["versions"][version]["sha256"] is None:
+                print("Error: solc-{0} changed since it was hashed, see --refresh".format(version), file=sys.stderr)
+            else:
+                print("Error: solc-{0} does not match the manifest".format(version), file=sys.stderr)
+        if mismatches:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
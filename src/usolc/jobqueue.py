@@ -0,0 +1,695 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+"""
+ Spreads compilations over workers on several hosts, behind a job queue.
+
+     usolc queue coordinator [--listen ADDRESS]
+     usolc queue worker [--coordinator ADDRESS] [--jobs N] [--node NAME]
+
+ With USOLC_COORDINATOR set to the address of a coordinator, usolc resolves the version as
+ usual, then submits the compilation as a job: the chosen version, the solc arguments and the
+ content of every source solc will read. A worker takes the job, writes the sources to a
+ temporary directory under the same relative paths, runs its own $USOLC_HOME/bin/solc-<version>
+ there and sends back the exit code, stdout and stderr, which usolc replays as if solc had run
+ locally. Addresses are "unix:PATH" (or any path) and "HOST:PORT".
+
+ Jobs are queued per version. A worker is handed the jobs of the versions its node ran last,
+ so that the binary stays in the page cache and warm solc processes (solc_pool.py) are reused;
+ an idle worker otherwise takes the oldest job of a version no other node is warm for, and
+ only then steals from the others. Jobs of a worker that disconnects are queued again.
+
+ A compilation runs locally when it cannot be reproduced elsewhere: outputs written to files,
+ sources outside the working directory, imports that cannot be found, standard-json sources
+ given by URL, a version no worker has installed, or an unreachable coordinator.
+
+ A worker checks every job again before running it: a job that writes files, names a source
+ it does not carry, or points solc at paths outside of its sources fails without running.
+
+ Transports carry the calls of clients and workers to the Coordinator: LocalTransport calls a
+ coordinator of the same process, SocketTransport talks to "usolc queue coordinator" with
+ length-prefixed JSON headers followed by raw blobs. Any object with the same methods will do.
+ With USOLC_QUEUE_TOKEN set, every call carries it and the coordinator drops connections that
+ do not; a coordinator only listens on a TCP address other than loopback with a token. The
+ jobs of a client that disconnects before getting their result are dropped.
+"""
+
+import os
+import sys
+import hmac
+import json
+import time
+import socket
+import ipaddress
+import argparse
+import itertools
+import tempfile
+import threading
+import subprocess
+import collections
+import usolc
+import solc_pool
+import inventory
+import compile_cache
+import admission
+from exceptions.job_killed_error import JobKilledError
+
+LENGTH_DIGITS = 8
+TAKE_TIMEOUT_SECONDS = 1.0
+RECONNECT_SECONDS = 2.0
+WARM_VERSIONS = 4
+
+
+def coordinator_address():
+    return os.environ.get("USOLC_COORDINATOR") or None
+
+
+def default_listen_address():
+    return coordinator_address() or "unix:" + os.path.join(os.environ['USOLC_HOME'], "run", "coordinator.sock")
+
+
+def queue_token():
+    return os.environ.get("USOLC_QUEUE_TOKEN") or None
+
+
+def parse_address(address):
+    """
+    Returns [socket family, socket address] of "unix:PATH", a path, or "HOST:PORT"
+    """
+    if address.startswith("unix:"):
+        return [socket.AF_UNIX, address[len("unix:"):]]
+    host, separator, port = address.rpartition(":")
+    if "/" in address or not separator or not port.isdigit():
+        return [socket.AF_UNIX, address]
+    return [socket.AF_INET, (host or "127.0.0.1", int(port))]
+
+
+def portable_path(path):
+    """
+    Sources are sent under their relative path, so it must stay inside the working directory
+    """
+    normalized = os.path.normpath(path)
+    return not os.path.isabs(normalized) and normalized != ".." and not normalized.startswith(".." + os.sep)
+
+
+def job_error(job):
+    """
+    Tells why a job cannot run on another host, None if it can: it must not write files, nor
+    let solc read anything but the sources it carries
+    """
+    if inventory.SOLC_BINARY.fullmatch("solc-" + job["version"]) is None:
+        return "Invalid solc version: " + job["version"]
+    argv = compile_cache.normalize_argv(job["argv"])
+    if not compile_cache.is_cacheable(argv):
+        return "The job writes files"
+    if job["stdin"] is not None and ("--standard-json" not in argv or not usolc.stdjson_cacheable(job["stdin"])):
+        return "The job reads sources that it does not carry"
+
+    option = None
+    for arg in argv:
+        if option is not None:
+            if option == "--allow-paths" and not all(portable_path(path) for path in arg.split(",")):
+                return "Path outside of the job: " + arg
+            if option == "--libraries" and ":" not in arg:
+                return "Libraries read from a file: " + arg
+            option = None
+        elif arg in usolc.SOLC_ARGUMENTS_WITH_OPTIONS:
+            option = arg
+        elif arg.startswith("-"):
+            continue
+        elif usolc.PREFIX_FILELOC.match(arg) is not None:
+            if not portable_path(arg.partition("=")[2] or "."):
+                return "Remapping outside of the job: " + arg
+        elif os.path.normpath(arg) not in job["files"]:
+            return "Source not carried by the job: " + arg
+    return None
+
+
+def make_job(version_chosen, native_argv, stdin_data, graph):
+    """
+    Returns the job of a compilation, None when it cannot run on another host
+    graph is the import graph of the sources, {} when solc reads its input from stdin
+    """
+    if not compile_cache.is_cacheable(native_argv):
+        return None
+    for filename, [_, imports] in graph.items():
+        if not portable_path(filename) or any(path not in graph for path in imports):
+            return None
+
+    files = {}
+    for filename in graph:
+        with open(filename, 'rb') as file:
+            files[os.path.normpath(filename)] = file.read()
+    job = {"id": None, "version": version_chosen, "argv": list(native_argv), "files": files, "stdin": stdin_data}
+    return job if job_error(job) is None else None
+
+
+def encode_job(job):
+    names = sorted(job["files"])
+    blobs = [job["files"][name] for name in names]
+    if job["stdin"] is not None:
+        blobs.append(job["stdin"])
+    header = {"id": job["id"], "version": job["version"], "argv": job["argv"], "files": names,
+              "stdin": job["stdin"] is not None}
+    return [header, blobs]
+
+
+def decode_job(header, blobs):
+    names = header["files"]
+    return {"id": header["id"], "version": header["version"], "argv": header["argv"],
+            "files": dict(zip(names, blobs)), "stdin": blobs[len(names)] if header["stdin"] else None}
+
+
+def encode_result(result):
+    return [{"returncode": result["returncode"], "error": result["error"]}, [result["stdout"], result["stderr"]]]
+
+
+def decode_result(header, blobs):
+    return {"returncode": header["returncode"], "error": header["error"], "stdout": blobs[0], "stderr": blobs[1]}
+
+
+def send_message(sock, header, blobs=()):
+    header = dict(header, blobs=[len(blob) for blob in blobs])
+    payload = json.dumps(header).encode("utf-8")
+    sock.sendall(str(len(payload)).zfill(LENGTH_DIGITS).encode("ascii") + payload)
+    for blob in blobs:
+        sock.sendall(blob)
+
+
+def receive_bytes(sock, size):
+    data = bytearray(size)
+    view = memoryview(data)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if count == 0:
+            raise ConnectionError("usolc job queue connection closed")
+        received += count
+    return bytes(data)
+
+
+def receive_message(sock):
+    """
+    Returns [header, blobs] sent by send_message()
+    """
+    length = int(receive_bytes(sock, LENGTH_DIGITS))
+    header = json.loads(receive_bytes(sock, length).decode("utf-8"))
+    blobs = [receive_bytes(sock, size) for size in header.pop("blobs")]
+    return [header, blobs]
+
+
+class Coordinator(object):
+    """
+    Queues the jobs per version and hands them to workers, keeping versions on the nodes
+    that ran them last
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.job_ids = itertools.count(1)
+        self.queues = collections.OrderedDict()
+        self.jobs = {}
+        self.results = {}
+        self.workers = {}
+        self.warm = {}
+        self.assigned = {}
+
+    def register(self, worker_id, versions, node):
+        with self.condition:
+            self.workers[worker_id] = [node, set(versions)]
+            self.warm.setdefault(node, collections.OrderedDict())
+            self.condition.notify_all()
+
+    def unregister(self, worker_id):
+        """
+        Forgets a worker, queueing its unfinished jobs again
+        """
+        with self.condition:
+            self.workers.pop(worker_id, None)
+            for job_id, assignee in list(self.assigned.items()):
+                if assignee == worker_id:
+                    del self.assigned[job_id]
+                    self.queues.setdefault(self.jobs[job_id]["version"], collections.deque()).appendleft(job_id)
+
+            # jobs no remaining worker can compile are handed back to their clients
+            for version, queue in self.queues.items():
+                if not any(version in versions for _, versions in self.workers.values()):
+                    while queue:
+                        self.results[queue.popleft()] = {"returncode": None, "stdout": b"", "stderr": b"",
+                                                         "error": "No worker left for solc " + version}
+            self.condition.notify_all()
+
+    def submit(self, job):
+        """
+        Queues a job, returns its id, or None when no worker can compile with its version
+        """
+        with self.condition:
+            if not any(job["version"] in versions for _, versions in self.workers.values()):
+                return None
+            job_id = str(next(self.job_ids))
+            self.jobs[job_id] = dict(job, id=job_id, submitted=time.monotonic())
+            self.queues.setdefault(job["version"], collections.deque()).append(job_id)
+            self.condition.notify_all()
+            return job_id
+
+    def wait(self, job_id, timeout=None):
+        """
+        Returns the result of a job once it is done, None if it is not done within timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while job_id not in self.results:
+                if job_id not in self.jobs:
+                    raise KeyError("Unknown job " + job_id)
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+            del self.jobs[job_id]
+            return self.results.pop(job_id)
+
+    def cancel(self, job_id):
+        """
+        Forgets a job whose client is gone, whether it is queued, running or done
+        """
+        with self.condition:
+            job = self.jobs.pop(job_id, None)
+            if job is None:
+                return
+            self.results.pop(job_id, None)
+            self.assigned.pop(job_id, None)
+            queue = self.queues.get(job["version"])
+            if queue is not None and job_id in queue:
+                queue.remove(job_id)
+
+    def choose_version(self, worker_id):
+        """
+        The version of the next job for a worker: one its node is warm for, else one no other
+        node is warm for, else any; the oldest job first
+        """
+        [node, versions] = self.workers[worker_id]
+        pending = [version for version, queue in self.queues.items() if queue and version in versions]
+        if not pending:
+            return None
+
+        for version in reversed(self.warm[node]):
+            if version in pending:
+                return version
+
+        warm_elsewhere = set(version for other, recent in self.warm.items() if other != node for version in recent)
+        candidates = [version for version in pending if version not in warm_elsewhere] or pending
+        return min(candidates, key=lambda version: self.jobs[self.queues[version][0]]["submitted"])
+
+    def take(self, worker_id, timeout=None):
+        """
+        Returns the next job of a worker, None if there is none within timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while True:
+                if worker_id not in self.workers:
+                    raise KeyError("Unknown worker " + worker_id)
+                version = self.choose_version(worker_id)
+                if version is not None:
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+
+            job_id = self.queues[version].popleft()
+            self.assigned[job_id] = worker_id
+            recent = self.warm[self.workers[worker_id][0]]
+            recent.pop(version, None)
+            recent[version] = True
+            while len(recent) > WARM_VERSIONS:
+                recent.popitem(last=False)
+            return self.jobs[job_id]
+
+    def complete(self, worker_id, job_id, result):
+        with self.condition:
+            if self.assigned.get(job_id) != worker_id:
+                # the job was queued again after the worker was given up on
+                return
+            del self.assigned[job_id]
+            self.results[job_id] = result
+            self.condition.notify_all()
+
+
+class LocalTransport(object):
+    """
+    Calls a coordinator of this process
+    """
+
+    def __init__(self, coordinator):
+        self.coordinator = coordinator
+
+    def register(self, worker_id, versions, node):
+        self.coordinator.register(worker_id, versions, node)
+
+    def unregister(self, worker_id):
+        self.coordinator.unregister(worker_id)
+
+    def submit(self, job):
+        return self.coordinator.submit(job)
+
+    def wait(self, job_id, timeout=None):
+        return self.coordinator.wait(job_id, timeout)
+
+    def take(self, worker_id, timeout=None):
+        return self.coordinator.take(worker_id, timeout)
+
+    def complete(self, worker_id, job_id, result):
+        self.coordinator.complete(worker_id, job_id, result)
+
+    def close(self):
+        pass
+
+
+class SocketTransport(object):
+    """
+    Talks to "usolc queue coordinator" over a Unix or TCP socket, one call at a time
+    """
+
+    def __init__(self, address):
+        [family, socket_address] = parse_address(address)
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            self.sock.connect(socket_address)
+        except OSError:
+            self.sock.close()
+            raise
+        self.lock = threading.Lock()
+
+    def call(self, header, blobs=()):
+        if queue_token() is not None:
+            header = dict(header, token=queue_token())
+        with self.lock:
+            send_message(self.sock, header, blobs)
+            [reply, reply_blobs] = receive_message(self.sock)
+        if reply.get("failure") is not None:
+            raise ConnectionError("usolc coordinator: " + reply["failure"])
+        return [reply, reply_blobs]
+
+    def register(self, worker_id, versions, node):
+        self.call({"op": "register", "worker": worker_id, "versions": sorted(versions), "node": node})
+
+    def unregister(self, worker_id):
+        self.call({"op": "unregister", "worker": worker_id})
+
+    def submit(self, job):
+        [header, blobs] = encode_job(job)
+        return self.call({"op": "submit", "job": header}, blobs)[0]["id"]
+
+    def wait(self, job_id, timeout=None):
+        [reply, blobs] = self.call({"op": "wait", "id": job_id, "timeout": timeout})
+        return decode_result(reply["result"], blobs) if reply["result"] is not None else None
+
+    def take(self, worker_id, timeout=None):
+        [reply, blobs] = self.call({"op": "take", "worker": worker_id, "timeout": timeout})
+        return decode_job(reply["job"], blobs) if reply["job"] is not None else None
+
+    def complete(self, worker_id, job_id, result):
+        [header, blobs] = encode_result(result)
+        self.call({"op": "complete", "worker": worker_id, "id": job_id, "result": header}, blobs)
+
+    def close(self):
+        self.sock.close()
+
+
+def dispatch(coordinator, header, blobs, registered, submitted):
+    """
+    Runs one call received from a SocketTransport, returns the [reply, blobs] to send back
+    registered and submitted collect the workers and jobs of the connection
+    """
+    op = header["op"]
+    if op == "register":
+        coordinator.register(header["worker"], header["versions"], header["node"])
+        registered.add(header["worker"])
+    elif op == "unregister":
+        coordinator.unregister(header["worker"])
+        registered.discard(header["worker"])
+    elif op == "submit":
+        job_id = coordinator.submit(decode_job(header["job"], blobs))
+        if job_id is not None:
+            submitted.add(job_id)
+        return [{"id": job_id}, []]
+    elif op == "wait":
+        result = coordinator.wait(header["id"], header["timeout"])
+        if result is None:
+            return [{"result": None}, []]
+        submitted.discard(header["id"])
+        [result_header, result_blobs] = encode_result(result)
+        return [{"result": result_header}, result_blobs]
+    elif op == "take":
+        job = coordinator.take(header["worker"], header["timeout"])
+        if job is None:
+            return [{"job": None}, []]
+        [job_header, job_blobs] = encode_job(job)
+        return [{"job": job_header}, job_blobs]
+    elif op == "complete":
+        coordinator.complete(header["worker"], header["id"], decode_result(header["result"], blobs))
+    else:
+        raise ValueError("Unknown job queue call: " + str(op))
+    return [{}, []]
+
+
+def handle_connection(coordinator, conn, token=None):
+    """
+    Serves the calls of one client or worker until it disconnects, if they carry the token
+    """
+    registered = set()
+    submitted = set()
+    try:
+        while True:
+            try:
+                [header, blobs] = receive_message(conn)
+            except (ConnectionError, ValueError):
+                return
+            if token is not None and not hmac.compare_digest(str(header.pop("token", "")), token):
+                send_message(conn, {"failure": "invalid USOLC_QUEUE_TOKEN"})
+                return
+            try:
+                [reply, reply_blobs] = dispatch(coordinator, header, blobs, registered, submitted)
+            except (KeyError, ValueError, TypeError) as e:
+                [reply, reply_blobs] = [{"failure": str(e)}, []]
+            send_message(conn, reply, reply_blobs)
+    except OSError:
+        return
+    finally:
+        for worker_id in registered:
+            coordinator.unregister(worker_id)
+        for job_id in submitted:
+            coordinator.cancel(job_id)
+        conn.close()
+
+
+def is_loopback(host):
+    try:
+        return ipaddress.ip_address(socket.gethostbyname(host)).is_loopback
+    except (OSError, ValueError):
+        return False
+
+
+def listen(address):
+    """
+    Binds the coordinator; TCP addresses other than loopback require USOLC_QUEUE_TOKEN
+    """
+    [family, socket_address] = parse_address(address)
+    if family == socket.AF_UNIX:
+        from usolc_server import bind_socket
+        return bind_socket(socket_address)
+    if not is_loopback(socket_address[0]) and queue_token() is None:
+        raise PermissionError("Set USOLC_QUEUE_TOKEN to listen on " + address + ", which is not a loopback address")
+    server = socket.socket(family, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(socket_address)
+    server.listen(128)
+    return server
+
+
+def serve_forever(coordinator, server, token=None):
+    while True:
+        conn, _ = server.accept()
+        threading.Thread(target=handle_connection, args=(coordinator, conn, token), daemon=True).start()
+
+
+def run_job(job, usolc_home):
+    """
+    Compiles a job with the binaries of this host
+    Returns {"returncode", "stdout", "stderr", "error"}
+    """
+    error = job_error(job)
+    if error is not None:
+        return {"returncode": None, "stdout": b"", "stderr": b"", "error": error}
+    binary = os.path.join(usolc_home, "bin", "solc-" + job["version"])
+    try:
+        with tempfile.TemporaryDirectory(prefix="usolc-job-") as workdir:
+            for name, content in job["files"].items():
+                if not portable_path(name):
+                    raise ValueError("Source outside of the job: " + name)
+                path = os.path.join(workdir, name)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'wb') as file:
+                    file.write(content)
+
+            pool = solc_pool.get_pool()
+            if pool is not None and job["stdin"] is not None and not job["files"]:
+                completed_process = pool.run(binary, job["argv"], job["stdin"])
+            elif admission.governed():
+                input_size = sum(len(content) for content in job["files"].values()) + len(job["stdin"] or b"")
+                completed_process = admission.run([binary] + job["argv"], input_size, job["stdin"],
+                                                  stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=workdir)
+            else:
+                completed_process = subprocess.run([binary] + job["argv"], input=job["stdin"], cwd=workdir,
+                                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except JobKilledError as e:
+        # sent back as the outcome of the job: compiling it again on the client would not fare better
+        return {"returncode": e.returncode, "stdout": e.stdout,
+                "stderr": e.stderr + ("Error: " + str(e) + "\n").encode("utf-8"), "error": None}
+    except (OSError, ValueError) as e:
+        return {"returncode": None, "stdout": b"", "stderr": b"", "error": str(e)}
+    return {"returncode": completed_process.returncode, "stdout": completed_process.stdout,
+            "stderr": completed_process.stderr, "error": None}
+
+
+class JobWorker(object):
+    """
+    Takes jobs from the coordinator and compiles them, one at a time
+    """
+
+    def __init__(self, transport, usolc_home, worker_id, node, versions=None):
+        self.transport = transport
+        self.usolc_home = usolc_home
+        self.worker_id = worker_id
+        self.node = node
+        self.versions = versions if versions is not None else inventory.installed_versions(usolc_home)
+        self.completed = 0
+
+    def serve(self, stop):
+        """
+        Runs jobs until the stop event is set
+        """
+        self.transport.register(self.worker_id, self.versions, self.node)
+        try:
+            while not stop.is_set():
+                job = self.transport.take(self.worker_id, TAKE_TIMEOUT_SECONDS)
+                if job is not None:
+                    self.transport.complete(self.worker_id, job["id"], run_job(job, self.usolc_home))
+                    self.completed += 1
+        finally:
+            try:
+                self.transport.unregister(self.worker_id)
+            except (OSError, ConnectionError):
+                pass
+
+
+def serve_worker(address, usolc_home, worker_id, node, stop):
+    """
+    Keeps a worker connected to the coordinator, reconnecting when the connection is lost
+    """
+    while not stop.is_set():
+        try:
+            transport = SocketTransport(address)
+        except OSError as e:
+            print("usolc worker: cannot reach the coordinator: " + str(e), file=sys.stderr)
+            stop.wait(RECONNECT_SECONDS)
+            continue
+        try:
+            JobWorker(transport, usolc_home, worker_id, node).serve(stop)
+        except (OSError, ConnectionError) as e:
+            print("usolc worker: connection to the coordinator lost: " + str(e), file=sys.stderr)
+            stop.wait(RECONNECT_SECONDS)
+        finally:
+            transport.close()
+
+
+def run_remote(version_chosen, native_argv, stdin_data, graph, transport=None):
+    """
+    Compiles on a worker of the coordinator at $USOLC_COORDINATOR, or through transport
+    Returns [returncode, stdout, stderr], or None when the compilation has to run here
+    """
+    job = make_job(version_chosen, native_argv, stdin_data, graph)
+    if job is None:
+        return None
+
+    close = transport is None
+    try:
+        if transport is None:
+            transport = SocketTransport(coordinator_address())
+        job_id = transport.submit(job)
+        result = transport.wait(job_id) if job_id is not None else None
+    except (OSError, ConnectionError):
+        return None
+    finally:
+        if close and transport is not None:
+            transport.close()
+
+    if result is None or result["error"] is not None:
+        return None
+    return [result["returncode"], result["stdout"], result["stderr"]]
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="usolc queue", description="Spread compilations over several hosts")
+    subparsers = parser.add_subparsers(dest="role")
+    coordinator_parser = subparsers.add_parser("coordinator", help="queue the jobs of usolc clients")
+    coordinator_parser.add_argument("--listen", default=None,
+                                    help="unix:PATH or HOST:PORT, $USOLC_COORDINATOR or "
+                                         "$USOLC_HOME/run/coordinator.sock by default")
+    worker_parser = subparsers.add_parser("worker", help="compile the jobs of a coordinator")
+    worker_parser.add_argument("--coordinator", default=None, help="address of the coordinator, $USOLC_COORDINATOR by default")
+    worker_parser.add_argument("-j", "--jobs", type=int, default=None, help="concurrent jobs, one per CPU by default")
+    worker_parser.add_argument("--node", default=None, help="name of this host, its hostname by default")
+    args = parser.parse_args(argv)
+
+    if args.role == "coordinator":
+        address = args.listen or default_listen_address()
+        try:
+            server = listen(address)
+        except OSError as e:
+            print("Error: " + str(e), file=sys.stderr)
+            return 1
+        print("usolc coordinator listening on " + address, file=sys.stderr)
+        try:
+            serve_forever(Coordinator(), server, queue_token())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+        return 0
+
+    if args.role == "worker":
+        address = args.coordinator or coordinator_address()
+        if address is None:
+            parser.error("no coordinator: use --coordinator or set USOLC_COORDINATOR")
+        usolc_home = os.environ['USOLC_HOME']
+        node = args.node or socket.gethostname()
+        # workers run job after job: warm solc processes get used
+        solc_pool.enable()
+        stop = threading.Event()
+        threads = [threading.Thread(target=serve_worker, daemon=True,
+                                    args=(address, usolc_home, "{0}-{1}-{2}".format(node, os.getpid(), index),
+                                          node, stop))
+                   for index in range(args.jobs or os.cpu_count() or 1)]
+        for thread in threads:
+            thread.start()
+        try:
+            while any(thread.is_alive() for thread in threads):
+                time.sleep(RECONNECT_SECONDS)
+        except KeyboardInterrupt:
+            stop.set()
+        return 0
+
+    parser.print_usage(sys.stderr)
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,182 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+"""
+ Finds the "pragma solidity" rules of a source without going through it line by line.
+
+ The source is mapped in memory (or read in one go when it cannot be mapped) and handed to
+ compiled regular expressions and bytes searches, so the bulk of it is only ever looked at
+ from C:
+
+ 1. every occurrence of "pragma solidity" is located. The last one is the last place a
+    version pragma can be, whatever the number of source units flattened into the file.
+ 2. each occurrence is checked to be in code rather than in a comment or a string literal.
+    String literals and line comments cannot span lines, so only the line of the occurrence
+    is lexed, after looking back for an unterminated block comment.
+
+ With first_only, the search stops at the header of the source: a version pragma comes before
+ the first contract, library or interface, so the rest of the file is never looked at. All the
+ rules of a file are searched in all of it, since each source unit flattened into a file
+ starts with its own header, after the definitions of the previous unit; only the occurrences
+ of "pragma solidity" are lexed, so the part of the cost growing with the file is the search
+ done from C.
+
+ Like solc, the scanner is case-sensitive.
+
+ Unlike a per-line match, this accepts indented pragmas, pragmas sharing a line with a
+ license header or another statement, and pragmas spanning several lines, while ignoring
+ the ones that are commented out.
+"""
+
+import re
+import mmap
+
+PRAGMA_CANDIDATE = re.compile(rb'pragma\s+solidity')
+PRAGMA_DIRECTIVE = re.compile(rb'pragma\s+solidity(\s[^;]*);')
+
+DEFINITION_CANDIDATE = re.compile(rb'\b(?:contract|library|interface)\b')
+
+IMPORT_CANDIDATE = re.compile(rb'\bimport\b')
+IMPORT_DIRECTIVE = re.compile(
+    rb'import\s*(?:[^;"\']*?\bfrom\s*)?(?:"((?:[^"\\\n]|\\.)*)"|\'((?:[^\'\\\n]|\\.)*)\')')
+
+LINE_TOKEN = re.compile(
+    rb'//[^\n]*'                                    # line comment
+    rb'|/\*.*?(?:\*/|\Z)'                           # block comment
+    rb'|"(?:[^"\\\n]|\\.)*"?'                       # double quoted string
+    rb"|'(?:[^'\\\n]|\\.)*'?",                      # single quoted string
+    re.DOTALL)
+
+
+def in_line_code(data, position, floor):
+    """
+    Lexes the line of position, from floor at the earliest, to tell whether position is
+    outside of the line comments and string literals of that line
+    """
+    lex_start = max(data.rfind(b"\n", 0, position) + 1, floor)
+    lex_end = data.find(b"\n", position)
+    if lex_end == -1:
+        lex_end = len(data)
+
+    for token in LINE_TOKEN.finditer(data, lex_start, lex_end):
+        if token.start() >= position:
+            break
+        if token.end() > position:
+            return False
+    return True
+
+
+def in_code(data, position):
+    """
+    Tells whether the byte at position is code, as opposed to a comment or a string literal.
+
+    A block comment around position has to be opened after the last "*/" before position,
+    so only the "/*" found after it are candidates, and they open a comment unless they are
+    themselves in a line comment or a string literal.
+    """
+    block_end = data.rfind(b"*/", 0, position)
+    floor = 0 if block_end == -1 else block_end + 2
+
+    block_start = data.rfind(b"/*", floor, position)
+    while block_start != -1:
+        if in_line_code(data, block_start, floor):
+            return False
+        block_start = data.rfind(b"/*", floor, block_start)
+
+    return in_line_code(data, position, floor)
+
+
+def header_end(data):
+    """
+    Returns the position of the first contract, library or interface definition, where the
+    header of the source ends, or the size of data if there is none
+    """
+    for candidate in DEFINITION_CANDIDATE.finditer(data):
+        if in_code(data, candidate.start()):
+            return candidate.start()
+    return len(data)
+
+
+def scan_pragma_rules(data, first_only=False):
+    """
+    Returns the rules of every "pragma solidity" directive found in data (bytes, str or mmap)
+    With first_only, returns the rule of the first directive of the header, if any
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+
+    rules = []
+    end = header_end(data) if first_only else len(data)
+    for candidate in PRAGMA_CANDIDATE.finditer(data, 0, end):
+        if not in_code(data, candidate.start()):
+            continue
+
+        directive = PRAGMA_DIRECTIVE.match(data, candidate.start())
+        if directive is None:
+            continue
+
+        rules.append(" ".join(directive.group(1).decode("utf-8", errors="replace").split()))
+        if first_only:
+            break
+
+    return rules
+
+
+def scan_import_paths(data):
+    """
+    Returns the paths imported by the "import" directives found in data (bytes, str or mmap)
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+
+    paths = []
+    for candidate in IMPORT_CANDIDATE.finditer(data):
+        if not in_code(data, candidate.start()):
+            continue
+
+        directive = IMPORT_DIRECTIVE.match(data, candidate.start())
+        if directive is None:
+            continue
+
+        path = directive.group(1) if directive.group(1) is not None else directive.group(2)
+        paths.append(path.decode("utf-8", errors="replace"))
+
+    return paths
+
+
+def map_file(filename, scan):
+    """
+    Maps the file in memory and returns what scan(data) finds in it
+    """
+    with open(filename, 'rb') as file:
+        try:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            # empty files and pipes cannot be mapped
+            data = file.read()
+
+        try:
+            return scan(data)
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+
+
+def scan_file_pragma_rules(filename, first_only=False):
+    """
+    Returns the rules of every "pragma solidity" directive of the file
+    """
+    return map_file(filename, lambda data: scan_pragma_rules(data, first_only))
+
+
+def scan_file_header(filename):
+    """
+    Returns [rules, import paths] of the file, mapping it only once
+    """
+    return map_file(filename, lambda data: [scan_pragma_rules(data), scan_import_paths(data)])
@@ -0,0 +1,199 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+"""
+ Per-phase timing of a usolc invocation.
+
+ Enabled by "--usolc-profile" (report on stderr), "--usolc-profile=PATH" (report appended to
+ PATH) or the USOLC_PROFILE environment variable ("1" for stderr, or a path). Each invocation
+ then emits a single JSON line:
+
+     {"pid": ..., "time": ..., "argv": [...], "exit_code": 0, "version": "0.4.25",
+      "startup_ms": ..., "total_ms": ..., "phases_ms": {"arguments": ..., "list_versions": ...,
+      "scan": ..., "resolve": ..., "admission": ..., "solc_exec": ..., "solc": ...},
+      "wrapper_maxrss_kb": ..., "solc_maxrss_kb": ..., "solc_user_ms": ..., "solc_sys_ms": ...,
+      "cache": {"hits": ..., "misses": ...}}
+
+ startup_ms is the time from the start of the process (as recorded by bin/solc in
+ $USOLC_START_TIME, or as reported by /proc) to main(). Phases are exclusive: time spent in
+ a nested phase is not counted in the enclosing one. Lines appended to a log file are
+ written with a single O_APPEND write, so concurrent invocations can share the log.
+
+ When profiling is disabled, phase() returns a shared no-op context manager and nothing is
+ measured.
+"""
+
+import os
+import sys
+import json
+import time
+import resource
+import contextlib
+import compile_cache
+
+PROFILE_ARGUMENT = "--usolc-profile"
+
+NO_PHASE = contextlib.nullcontext()
+
+profile = None
+
+
+class Profile(object):
+    def __init__(self, destination, argv):
+        self.destination = destination
+        self.argv = argv
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.stack = []
+        self.fields = {}
+
+
+class Phase(object):
+    """
+    Adds the time spent in its block to a phase, minus the time of the phases nested in it
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.nested = 0.0
+
+    def __enter__(self):
+        profile.stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        elapsed = time.perf_counter() - self.start
+        profile.stack.pop()
+        profile.phases[self.name] = profile.phases.get(self.name, 0.0) + elapsed - self.nested
+        if profile.stack:
+            profile.stack[-1].nested += elapsed
+        return False
+
+
+def profile_destination(argv):
+    """
+    Returns where the report goes ("-" for stderr, or a path), None if profiling is disabled
+    """
+    for arg in argv:
+        if arg == PROFILE_ARGUMENT:
+            return "-"
+        if arg.startswith(PROFILE_ARGUMENT + "="):
+            return arg[len(PROFILE_ARGUMENT) + 1:] or "-"
+
+    value = os.environ.get("USOLC_PROFILE", "")
+    if value.lower() in ("", "0", "false", "no", "off"):
+        return None
+    if value.lower() in ("1", "true", "yes", "on"):
+        return "-"
+    return value
+
+
+def is_profile_argument(arg):
+    return arg == PROFILE_ARGUMENT or arg.startswith(PROFILE_ARGUMENT + "=")
+
+
+def start(argv):
+    """
+    Starts profiling the invocation if it was requested
+    """
+    global profile
+    destination = profile_destination(argv)
+    profile = None if destination is None else Profile(destination, list(argv))
+
+
+def enabled():
+    return profile is not None
+
+
+def phase(name):
+    if profile is None:
+        return NO_PHASE
+    return Phase(name)
+
+
+def annotate(name, value):
+    if profile is not None:
+        profile.fields[name] = value
+
+
+def process_start_time():
+    """
+    Returns the epoch time at which the process (or bin/solc before it) started, None if unknown
+    """
+    recorded = os.environ.get("USOLC_START_TIME", "").replace(",", ".")
+    if recorded:
+        try:
+            return float(recorded)
+        except ValueError:
+            pass
+
+    try:
+        with open("/proc/self/stat") as stat_file:
+            # the command name may contain spaces, the fields after it cannot
+            start_ticks = int(stat_file.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as uptime_file:
+            uptime = float(uptime_file.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return time.time() - uptime + start_ticks / os.sysconf("SC_CLK_TCK")
+
+
+def milliseconds(seconds):
+    return round(seconds * 1000, 3)
+
+
+def make_report(exit_code):
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    process_start = process_start_time()
+
+    report = {
+        "pid": os.getpid(),
+        "time": profile.started_at,
+        "argv": profile.argv,
+        "exit_code": exit_code,
+        "startup_ms": None if process_start is None else milliseconds(max(0.0, profile.started_at - process_start)),
+        "total_ms": milliseconds(time.perf_counter() - profile.started),
+        "phases_ms": dict((name, milliseconds(seconds)) for name, seconds in profile.phases.items()),
+        "wrapper_maxrss_kb": self_usage.ru_maxrss,
+        "solc_maxrss_kb": children_usage.ru_maxrss,
+        "solc_user_ms": milliseconds(children_usage.ru_utime),
+        "solc_sys_ms": milliseconds(children_usage.ru_stime),
+        "cache": {"hits": compile_cache.cache_hits, "misses": compile_cache.cache_misses},
+    }
+    report.update(profile.fields)
+    return report
+
+
+def finish(exit_code):
+    """
+    Emits the report of the invocation, if it is being profiled
+    """
+    global profile
+    if profile is None:
+        return
+    line = json.dumps(make_report(exit_code), sort_keys=True) + "\n"
+    destination = profile.destination
+    profile = None
+
+    if destination == "-":
+        sys.stderr.write(line)
+        sys.stderr.flush()
+        return
+
+    try:
+        fd = os.open(destination, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode("utf-8"))
+        finally:
+            os.close(fd)
+    except OSError as e:
+        print("Warning: cannot write the usolc profile: " + str(e), file=sys.stderr)
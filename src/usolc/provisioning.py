@@ -0,0 +1,144 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+"""
+ On-demand provisioning of solc binaries.
+
+ With USOLC_PROVISION=1, versions are resolved against a catalog of known releases rather
+ than against the installed binaries only, and the chosen version is installed the first
+ time it is needed, from $USOLC_MIRROR (an http(s) URL or a local directory, see
+ installer.py). The catalog is the file named by $USOLC_CATALOG, one version per line, else
+ the releases of the list.json of the mirror, which also gives their paths and sha256. The
+ list is kept in $USOLC_HOME/downloads for CATALOG_MAX_AGE_SECONDS, and fetched again sooner
+ only when a version missing from it has to be installed; a mirror without a list.json falls
+ back to the releases known to the installer.
+
+ Wrappers running concurrently take the installer's exclusive lock of the version before
+ installing it, so a version is downloaded once; the others wait for the lock and find the
+ binary in place. Binaries are checked like "usolc install" checks them, pinned sha256 first,
+ then the published ones.
+"""
+
+import os
+import sys
+import json
+import time
+import inventory
+from exceptions.checksum_mismatch_error import ChecksumMismatchError
+from exceptions.provisioning_error import ProvisioningError
+
+
+def env_flag(name):
+    return os.environ.get(name, "").lower() in ("1", "true", "yes", "on")
+
+
+def provisioning_enabled():
+    return env_flag("USOLC_PROVISION")
+
+
+CATALOG_MAX_AGE_SECONDS = 24 * 60 * 60
+
+
+def catalog_filename(usolc_home, mirror):
+    import hashlib
+    return os.path.join(usolc_home, "downloads",
+                        "releases-{0}.json".format(hashlib.sha256(mirror.encode("utf-8")).hexdigest()[:16]))
+
+
+def release_list(usolc_home, mirror, refresh=False):
+    """
+    Returns the release list of the mirror (see installer.read_release_list), None for a mirror
+    without one; it is only fetched when the copy on disk is missing, too old or refresh is set
+    """
+    # the installer brings urllib and ssl along, which a compilation rarely needs
+    import installer
+    import tempfile
+    filename = catalog_filename(usolc_home, mirror)
+    try:
+        with open(filename, 'r', encoding='utf-8') as file:
+            cached = json.load(file)
+    except (OSError, ValueError):
+        cached = None
+    if cached is not None and not refresh and time.time() - cached.get("fetched", 0) < CATALOG_MAX_AGE_SECONDS:
+        return cached.get("releases")
+
+    try:
+        releases = installer.read_release_list(mirror)
+    except (OSError, ValueError, AttributeError):
+        if cached is None:
+            raise
+        # an old list beats none while the mirror is unreachable
+        return cached.get("releases")
+
+    try:
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(filename), prefix=".tmp-releases-")
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            json.dump({"mirror": mirror, "fetched": time.time(), "releases": releases}, file)
+        os.replace(tmp_path, filename)
+    except OSError:
+        pass
+    return releases
+
+
+def known_releases(usolc_home):
+    """
+    Returns the versions of the catalog of the mirror
+    """
+    import installer
+    try:
+        releases = release_list(usolc_home, installer.default_mirror())
+    except (OSError, ValueError, AttributeError) as e:
+        print("Warning: cannot read the releases of {0}: {1}".format(installer.default_mirror(), e), file=sys.stderr)
+        releases = None
+    if releases is None:
+        return list(installer.KNOWN_RELEASES)
+    return [version for version, [path, _] in releases.items() if path is not None]
+
+
+def merge_versions(installed_versions, catalog_versions):
+    """
+    Returns the installed versions followed by the versions of the catalog missing from them
+    """
+    versions = list(installed_versions)
+    for version in catalog_versions:
+        if version and version not in versions:
+            versions.append(version)
+    return sorted(versions, key=inventory.version_key)
+
+
+def provision(usolc_home, version):
+    """
+    Installs the version unless it is present, holding the lock of the version meanwhile
+    Returns True if this call installed it
+    """
+    target = os.path.join(inventory.bin_dir(usolc_home), "solc-" + version)
+    if os.path.exists(target):
+        return False
+
+    import installer
+
+    mirror = installer.default_mirror()
+    try:
+        releases = release_list(usolc_home, mirror)
+        if releases is not None and version not in releases:
+            # released since the list was fetched
+            releases = release_list(usolc_home, mirror, refresh=True)
+        checksums = dict(installer.published_checksums(releases),
+                         **installer.read_checksums(installer.PINNED_CHECKSUMS))
+        checksums = installer.complete_checksums(checksums, [version], installer.default_checksum_list())
+        # another wrapper may install it while we wait for the lock of the version
+        installed = installer.install_version(usolc_home, version, mirror, checksums,
+                                              env_flag("USOLC_REQUIRE_CHECKSUMS"), releases=releases) == "installed"
+    except (OSError, ValueError, ChecksumMismatchError) as e:
+        raise ProvisioningError(version, "Cannot provision solc {0}: {1}".format(version, e))
+
+    if installed:
+        inventory.refresh_manifest(usolc_home)
+    return installed
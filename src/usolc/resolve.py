@@ -0,0 +1,230 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+"""
+ Tells which solc version files need, without compiling them.
+
+     usolc resolve [PATH|GLOB...] [--manifest FILE] [-U RULE] [--follow-imports]
+                   [--versions FILE] [--jobs N] [--output FILE]
+
+ Paths may be files, directories (searched for *.sol) or globs ("contracts/**/*.sol").
+ Directories are walked concurrently, files are scanned by a pool of threads, and one JSON
+ line is written per file, in the order the files were found:
+
+     {"file": ..., "rules": [...], "chosen_version": "0.4.25", "error": null}
+
+ The rules are those of the file itself, or of every file it imports with --follow-imports
+ (those files are then resolved in a single thread, as they share the constraint cache).
+ Versions are chosen among the installed ones (plus the catalog when provisioning is
+ enabled), or among the versions listed in --versions. Files sharing the same rules share
+ a single resolution. solc is never run and nothing is installed.
+"""
+
+import os
+import sys
+import glob
+import json
+import argparse
+import concurrent.futures
+import usolc
+import batch
+import import_graph
+from exceptions.noversion_available_by_sol import NoVersionAvailableBySol
+from exceptions.noversion_available_by_user import NoVersionAvailableByUser
+
+SOURCE_EXTENSION = ".sol"
+CHUNK_SIZE = 256
+
+
+def has_magic(path):
+    return any(char in path for char in "*?[")
+
+
+def scan_directory(directory):
+    """
+    Returns [solidity files, subdirectories] of a directory, sorted by name
+    """
+    files = []
+    subdirectories = []
+    try:
+        entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+    except OSError:
+        return [files, subdirectories]
+    for entry in entries:
+        try:
+            if entry.is_dir():
+                subdirectories.append(entry.path)
+            elif entry.name.endswith(SOURCE_EXTENSION):
+                files.append(entry.path)
+        except OSError:
+            continue
+    return [files, subdirectories]
+
+
+def walk_directories(roots, executor):
+    """
+    Returns the solidity files below the roots, scanning directories concurrently
+    The order is that of a depth-first walk sorted by name, whatever the scheduling
+    """
+    found = {}
+    pending = dict((executor.submit(scan_directory, root), root) for root in roots)
+    while pending:
+        done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            directory = pending.pop(future)
+            [files, subdirectories] = future.result()
+            found[directory] = [files, subdirectories]
+            for subdirectory in subdirectories:
+                pending[executor.submit(scan_directory, subdirectory)] = subdirectory
+
+    ordered = []
+    stack = list(reversed(roots))
+    while stack:
+        directory = stack.pop()
+        [files, subdirectories] = found[directory]
+        ordered += files
+        stack += reversed(subdirectories)
+    return ordered
+
+
+def expand_paths(paths, executor):
+    """
+    Expands globs and directories into files; other paths are kept so that errors are reported
+    """
+    filenames = []
+    for path in paths:
+        if has_magic(path):
+            matches = sorted(glob.glob(path, recursive=True))
+        else:
+            matches = [path]
+        directories = [match for match in matches if os.path.isdir(match)]
+        filenames += [match for match in matches if not os.path.isdir(match)]
+        if directories:
+            filenames += walk_directories(directories, executor)
+    return filenames
+
+
+def resolution_error(e):
+    if isinstance(e, NoVersionAvailableBySol):
+        return "No solc version satisfies the requirement of the solidity file: " + e.sol_rule
+    if isinstance(e, NoVersionAvailableByUser):
+        return ("No solc version satisfies both the requirement of the solidity file (" + e.sol_rule +
+                ") and the user's rule (" + str(e.user_rule[0]) + ")")
+    if isinstance(e, FileNotFoundError):
+        return "Solidity file not found"
+    return str(e)
+
+
+class Resolver(object):
+    """
+    Resolves the versions of files, sharing the resolution of identical rules
+    """
+
+    def __init__(self, available_versions, version_selection_strategy, follow_imports=False):
+        self.available_versions = available_versions
+        self.version_selection_strategy = version_selection_strategy
+        self.follow_imports = follow_imports
+        self.memo = {}
+
+    def file_rules(self, filename):
+        if self.follow_imports:
+            graph = import_graph.build_import_graph([filename], save=False)
+            return import_graph.unit_rules(graph) or ["*"]
+        return usolc.getrules_from_file(filename)
+
+    def choose(self, rules):
+        """
+        Returns [version, error]
+        """
+        key = tuple(rules)
+        if key not in self.memo:
+            try:
+                self.memo[key] = [usolc.choose_version_by_rules(self.available_versions, rules,
+                                                                self.version_selection_strategy), None]
+            except (NoVersionAvailableBySol, NoVersionAvailableByUser) as e:
+                self.memo[key] = [None, resolution_error(e)]
+        return self.memo[key]
+
+    def resolve(self, filename):
+        try:
+            rules = self.file_rules(filename)
+        except (OSError, ValueError) as e:
+            return {"file": filename, "rules": None, "chosen_version": None, "error": resolution_error(e)}
+        [version_chosen, error] = self.choose(rules)
+        return {"file": filename, "rules": rules, "chosen_version": version_chosen, "error": error}
+
+    def resolve_many(self, filenames):
+        return [self.resolve(filename) for filename in filenames]
+
+
+def run_resolve(paths, version_selection_strategy, output, available_versions, jobs=None, follow_imports=False):
+    """
+    Resolves every file and writes one JSON line per file to output
+    Returns the number of files that could not be resolved
+    """
+    resolver = Resolver(available_versions, version_selection_strategy, follow_imports)
+    failed = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs or min(32, (os.cpu_count() or 1) * 4)) as executor:
+        filenames = expand_paths(paths, executor)
+        chunks = [filenames[start:start + CHUNK_SIZE] for start in range(0, len(filenames), CHUNK_SIZE)]
+        if follow_imports:
+            # the constraint cache followed through imports is shared: resolve in this thread
+            resolved = map(resolver.resolve_many, chunks)
+        else:
+            resolved = executor.map(resolver.resolve_many, chunks)
+        for results in resolved:
+            for result in results:
+                if result["error"] is not None:
+                    failed += 1
+                output.write(json.dumps(result) + "\n")
+    if follow_imports:
+        import_graph.save_constraints()
+    output.flush()
+    return failed
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="usolc resolve",
+                                     description="Tell which solc version Solidity files need, without compiling")
+    parser.add_argument("paths", nargs="*", help="files, directories or globs")
+    parser.add_argument("-m", "--manifest", help="file listing the paths, one per line (- for stdin)")
+    parser.add_argument("-U", dest="strategy", default=None, help="user rule, as for solc -U")
+    parser.add_argument("--follow-imports", action="store_true",
+                        help="include the pragmas of the imported files, as compilations do")
+    parser.add_argument("--versions", default=None,
+                        help="file listing the versions to choose from, one per line, instead of the installed ones")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="number of threads")
+    parser.add_argument("-o", "--output", default=None, help="write the JSON lines to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    paths = list(args.paths)
+    if args.manifest is not None:
+        paths += batch.read_manifest(args.manifest)
+    if not paths:
+        parser.error("no files to resolve")
+
+    if args.versions is not None:
+        available_versions = [version for version in usolc.read_version_list(args.versions) if version]
+    else:
+        available_versions = usolc.fetch_resolvable_solc_versions()
+    version_selection_strategy = usolc.interpret_strategy_string(args.strategy)
+
+    if args.output is None:
+        failed = run_resolve(paths, version_selection_strategy, sys.stdout, available_versions,
+                             args.jobs, args.follow_imports)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            failed = run_resolve(paths, version_selection_strategy, output, available_versions,
+                                 args.jobs, args.follow_imports)
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,386 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+"""
+ Table of rule resolutions shared by every usolc process of a host.
+
+ The version index makes resolving a rule cheap, but each usolc invocation starts cold and
+ parses the same handful of rules again. The table maps a normalized rule to the versions
+ satisfying it, for one version list, and lives in
+
+     $USOLC_CACHE_DIR/rules/<fingerprint>.table
+
+ where the fingerprint is the sha256 of the sorted version list: installing or removing a
+ compiler changes the fingerprint, so a new table is built, and only the MAX_TABLES most
+ recently written tables are kept. Like the compile cache, tables are only kept on disk when
+ USOLC_CACHE is enabled or USOLC_CACHE_DIR is set explicitly; otherwise, or once the directory
+ turns out not to be writable, the resolutions only live as long as the process.
+
+ A table file is memory-mapped and searched by bisection, without any lock:
+
+     header     "USRT", format, version count, rule count, mask size, size of the versions
+     versions   the versions, oldest first, separated by "\\n"
+     records    (key offset, key length) of every rule, sorted by key
+     masks      one mask per rule, bit i being set when version i satisfies the rule
+     keys       "L" (loose) or "S" (strict) followed by the rule, whitespace collapsed
+
+ Files are never modified in place. The rules a process resolves itself are merged into a
+ new file, written under an exclusive flock and renamed over the old one; readers keep the
+ mapping they opened and pick up the new file on their next miss. A table holds at most
+ MAX_RULES rules: a full table keeps the rules the merging process used and drops others.
+
+ Selections are masks over the versions of the table, so RuleTable answers the queries of
+ version_index.VersionIndex (narrow, newest, oldest...) with integer operations.
+"""
+
+import os
+import mmap
+import fcntl
+import struct
+import hashlib
+import functools
+import threading
+import semver_engine
+import compile_cache
+import version_index
+
+TABLE_FORMAT_VERSION = 1
+TABLE_MAGIC = b"USRT"
+HEADER = struct.Struct("<4sIIIII")
+RECORD = struct.Struct("<II")
+
+MAX_RULES = 4096
+MAX_TABLES = 8
+TABLES_MEMO_SIZE = 16
+
+tables_memo = {}
+
+
+def table_dir():
+    """
+    Returns the directory of the table files, None if they are not to be kept on disk
+    """
+    if not compile_cache.cache_enabled() and os.environ.get("USOLC_CACHE_DIR") is None:
+        return None
+    return os.path.join(compile_cache.cache_dir(), "rules")
+
+
+def compare_versions(first, second):
+    try:
+        return semver_engine.compare(first, second, True)
+    except ValueError:
+        # a malformed version satisfies no rule, its place does not matter
+        return (first > second) - (first < second)
+
+
+def sort_versions(versions):
+    """
+    Returns the distinct versions, oldest first
+    Plain X.Y.Z versions are compared as tuples, semver_engine is only needed for the others
+    """
+    keys = dict((version, version_index.parse_plain_version(version)) for version in set(versions))
+    if None not in keys.values():
+        return sorted(keys, key=keys.get)
+    return sorted(keys, key=functools.cmp_to_key(compare_versions))
+
+
+def fingerprint(sorted_versions):
+    return hashlib.sha256("\n".join(sorted_versions).encode("utf-8")).hexdigest()[:32]
+
+
+def rule_key(rule_text, loose):
+    return (("L" if loose else "S") + " ".join(rule_text.split())).encode("utf-8")
+
+
+def encode_table(versions, masks):
+    """
+    Returns the content of a table file holding the masks, a dictionary keyed by rule key
+    """
+    mask_size = (len(versions) + 7) // 8
+    encoded_versions = "\n".join(versions).encode("utf-8")
+    keys = sorted(masks)
+
+    records = []
+    offset = 0
+    for key in keys:
+        records.append(RECORD.pack(offset, len(key)))
+        offset += len(key)
+
+    return b"".join([
+        HEADER.pack(TABLE_MAGIC, TABLE_FORMAT_VERSION, len(versions), len(keys), mask_size, len(encoded_versions)),
+        encoded_versions,
+        b"".join(records),
+        b"".join(masks[key].to_bytes(mask_size, "little") for key in keys),
+        b"".join(keys),
+    ])
+
+
+class TableFile(object):
+    """
+    A table file mapped in memory
+    Raises ValueError if the file is not a valid table
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            stat = os.fstat(file.fileno())
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.identity = (stat.st_ino, stat.st_mtime_ns)
+
+        try:
+            [magic, format_version, version_count, self.rule_count, self.mask_size, versions_size] = \
+                HEADER.unpack_from(self.data, 0)
+            if magic != TABLE_MAGIC or format_version != TABLE_FORMAT_VERSION:
+                raise ValueError("Not a rule table: " + path)
+            versions_data = self.data[HEADER.size:HEADER.size + versions_size]
+            self.versions = versions_data.decode("utf-8").split("\n") if version_count else []
+            self.records_offset = HEADER.size + versions_size
+            self.masks_offset = self.records_offset + self.rule_count * RECORD.size
+            self.keys_offset = self.masks_offset + self.rule_count * self.mask_size
+            if len(self.versions) != version_count or self.keys_offset > len(self.data):
+                raise ValueError("Truncated rule table: " + path)
+        except (struct.error, UnicodeDecodeError, ValueError):
+            self.data.close()
+            raise ValueError("Invalid rule table: " + path)
+
+    def close(self):
+        self.data.close()
+
+    def key_at(self, position):
+        [offset, length] = RECORD.unpack_from(self.data, self.records_offset + position * RECORD.size)
+        start = self.keys_offset + offset
+        return self.data[start:start + length]
+
+    def mask_at(self, position):
+        start = self.masks_offset + position * self.mask_size
+        return int.from_bytes(self.data[start:start + self.mask_size], "little")
+
+    def find(self, key):
+        """
+        Returns the mask of a rule key, None if the table does not hold it
+        """
+        low = 0
+        high = self.rule_count
+        while low < high:
+            middle = (low + high) // 2
+            candidate = self.key_at(middle)
+            if candidate < key:
+                low = middle + 1
+            elif candidate > key:
+                high = middle
+            else:
+                return self.mask_at(middle)
+        return None
+
+    def masks(self):
+        return dict((self.key_at(position), self.mask_at(position)) for position in range(self.rule_count))
+
+
+def remove_stale_tables(directory, current):
+    """
+    Keeps the MAX_TABLES most recently written tables, current being one of them
+    """
+    tables = [[float("inf"), current]]
+    for entry in os.scandir(directory):
+        if entry.name.endswith(".table") and entry.path != current:
+            try:
+                tables.append([entry.stat().st_mtime, entry.path])
+            except FileNotFoundError:
+                continue
+    for _, path in sorted(tables, reverse=True)[MAX_TABLES:]:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+def merge_table(path, versions, resolved, used=()):
+    """
+    Adds resolved masks to the table file at path, replacing it atomically
+    When the table is full, the rules of used are kept and the other rules make room
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+
+    with open(os.path.join(directory, "rules.lock"), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        masks = {}
+        try:
+            current = TableFile(path)
+        except (OSError, ValueError):
+            current = None
+        if current is not None:
+            if current.versions == versions:
+                masks = current.masks()
+            current.close()
+
+        added = [key for key in sorted(resolved) if key not in masks][:MAX_RULES]
+        if not added:
+            return
+        overflow = len(masks) + len(added) - MAX_RULES
+        if overflow > 0:
+            dropped = sorted(masks, key=lambda key: [key in used, key])[:overflow]
+            for key in dropped:
+                del masks[key]
+        for key in added:
+            masks[key] = resolved[key]
+
+        import tempfile
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-table-")
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(encode_table(versions, masks))
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        remove_stale_tables(directory, path)
+
+
+class RuleTable(object):
+    """
+    Resolutions of rules against one version list, read from the shared table file and
+    completed by resolving the missing rules with the version index
+    """
+
+    def __init__(self, versions, directory):
+        self.versions = sort_versions(versions)
+        self.path = os.path.join(directory, fingerprint(self.versions) + ".table") if directory is not None else None
+        self.file = None
+        self.index = None
+        self.memo = {}
+        self.pending = {}
+        self.used = set()
+        self.writable = directory is not None
+        self.lock = threading.Lock()
+        self.open_file()
+
+    def open_file(self):
+        """
+        Maps the current table file, returns whether it could be used
+        """
+        if self.path is None:
+            return False
+        try:
+            table_file = TableFile(self.path)
+        except (OSError, ValueError):
+            return False
+        if table_file.versions != self.versions:
+            table_file.close()
+            return False
+        self.file = table_file
+        return True
+
+    def file_replaced(self):
+        if self.path is None:
+            return False
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        return self.file is None or self.file.identity != (stat.st_ino, stat.st_mtime_ns)
+
+    def resolve(self, rule_text, loose):
+        """
+        Returns the mask of the versions satisfying the rule, computed with the version index
+        """
+        if self.index is None:
+            self.index = version_index.get_version_index(self.versions)
+        satisfying = set(self.index.filter(rule_text, loose))
+        mask = 0
+        for position, version in enumerate(self.versions):
+            if version in satisfying:
+                mask |= 1 << position
+        return mask
+
+    def mask(self, rule_text, loose=False):
+        """
+        Returns the mask of the versions satisfying the rule
+        """
+        key = rule_key(rule_text, loose)
+        mask = self.memo.get(key)
+        if mask is not None:
+            return mask
+
+        with self.lock:
+            if self.file is not None:
+                mask = self.file.find(key)
+            if mask is None and self.file_replaced() and self.open_file():
+                mask = self.file.find(key)
+            if mask is not None:
+                self.used.add(key)
+        if mask is None:
+            mask = self.resolve(rule_text, loose)
+            with self.lock:
+                self.pending[key] = mask
+        self.memo[key] = mask
+        return mask
+
+    def save(self):
+        """
+        Writes the rules resolved by this process to the table file; failing to do so is not an error,
+        the table is then only kept in memory
+        """
+        with self.lock:
+            if not self.pending or not self.writable:
+                return
+            resolved = self.pending
+            self.pending = {}
+            used = self.used | set(resolved)
+        try:
+            merge_table(self.path, self.versions, resolved, used)
+        except OSError:
+            # e.g. a read-only cache directory: do not retry on every save
+            self.writable = False
+
+    def select_all(self):
+        return (1 << len(self.versions)) - 1
+
+    def narrow(self, selection, rule_text, loose=False):
+        return selection & self.mask(rule_text, loose)
+
+    def is_empty(self, selection):
+        return selection == 0
+
+    def selected_versions(self, selection):
+        """
+        Returns the versions of the selection, oldest first
+        """
+        return [version for position, version in enumerate(self.versions) if selection >> position & 1]
+
+    def newest(self, selection):
+        if not selection:
+            return None
+        return self.versions[selection.bit_length() - 1]
+
+    def oldest(self, selection):
+        if not selection:
+            return None
+        return self.versions[(selection & -selection).bit_length() - 1]
+
+    def filter(self, rule_text, loose=False):
+        return self.selected_versions(self.narrow(self.select_all(), rule_text, loose))
+
+
+def get_table(versions):
+    """
+    Returns the rule table of a version list, opening it only the first time the list is seen
+    """
+    key = (table_dir(), tuple(versions))
+    table = tables_memo.get(key)
+    if table is None:
+        if len(tables_memo) >= TABLES_MEMO_SIZE:
+            tables_memo.clear()
+        table = RuleTable(versions, key[0])
+        tables_memo[key] = table
+    return table
@@ -0,0 +1,339 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+"""
+ Resolves version ranges the way node-semver does, for the range syntax of Solidity pragmas.
+
+ Covers comparators (<, <=, >, >=, =), partial versions and x-ranges (0.4, 0.4.x, *),
+ caret and tilde ranges, hyphen ranges (0.4.2 - 0.5.1) and "||" unions, in node-semver's
+ strict and loose modes. A range is turned into comparator sets, one per "||" branch, and
+ memoized; a version satisfies the range when it passes every comparator of one set. As in
+ node-semver, a prerelease only satisfies a set naming a prerelease of the same X.Y.Z.
+
+ The regular expressions are only compiled the first time a version or a range is parsed:
+ most invocations find their rules in the rule table (see rule_table.py) and never get here.
+"""
+
+import re
+import functools
+import collections
+
+RANGE_CACHE_SIZE = 1024
+
+Version = collections.namedtuple("Version", ["major", "minor", "patch", "prerelease"])
+
+# version is None for a comparator accepting any version; the operator is one of = < <= > >=
+Comparator = collections.namedtuple("Comparator", ["operator", "version"])
+ANY = Comparator("", None)
+
+NUMBER = {False: r'0|[1-9][0-9]*', True: r'[0-9]+'}
+BUILD = r'(?:\+[0-9A-Za-z-]+(?:\.[0-9A-Za-z-]+)*)'
+
+
+def prerelease_pattern(loose):
+    identifier = '(?:' + NUMBER[loose] + r'|[0-9]*[a-zA-Z-][a-zA-Z0-9-]*)'
+    return '(?:' + ('-?' if loose else '-') + '(' + identifier + r'(?:\.' + identifier + ')*))'
+
+
+def partial_pattern(loose):
+    """
+    A version whose parts may be missing or x, preceded by the prefix node-semver tolerates
+    Groups: prefix, major, minor, patch, prerelease
+    """
+    part = '(' + NUMBER[loose] + r'|x|X|\*)'
+    return (r'([v=\s]*)' + part + r'(?:\.' + part + r'(?:\.' + part +
+            prerelease_pattern(loose) + '?' + BUILD + '?)?)?')
+
+
+@functools.lru_cache(maxsize=None)
+def patterns(loose):
+    number = NUMBER[loose]
+    version = (('[v=\\s]*' if loose else 'v?') + '(' + number + r')\.(' + number + r')\.(' + number + ')' +
+               prerelease_pattern(loose) + '?' + BUILD + '?')
+    return {
+        "version": re.compile('^' + version + '$', re.ASCII),
+        "xrange": re.compile(r'^([<>]?=?)' + partial_pattern(loose) + '$', re.ASCII),
+        "tilde": re.compile(r'^~>?' + partial_pattern(loose) + '$', re.ASCII),
+        "caret": re.compile(r'^\^' + partial_pattern(loose) + '$', re.ASCII),
+        "hyphen": re.compile(r'^(' + partial_pattern(loose) + r')\s+-\s+(' + partial_pattern(loose) + ')$',
+                             re.ASCII),
+        # "> 0.4.2" is read as ">0.4.2", "~ 0.4" as "~0.4" and "^ 0.4" as "^0.4"
+        "operator_space": re.compile(r'([<>]=?|=)\s+(?=[v=]*[0-9xX*])'),
+        "tilde_space": re.compile(r'~>?\s+'),
+        "caret_space": re.compile(r'\^\s+'),
+        "union": re.compile(r'\s*\|\|\s*'),
+    }
+
+
+def parse_prerelease(text):
+    if not text:
+        return ()
+    return tuple(int(part) if part.isdigit() else part for part in text.split("."))
+
+
+def parse_version(text, loose=False):
+    """
+    Returns the Version of a version string, raises ValueError if it is not one
+    """
+    if isinstance(text, Version):
+        return text
+    version_match = patterns(loose)["version"].match(text.strip())
+    if version_match is None:
+        raise ValueError("Invalid Version: {}".format(text))
+    return Version(int(version_match.group(1)), int(version_match.group(2)), int(version_match.group(3)),
+                   parse_prerelease(version_match.group(4)))
+
+
+def precedence(version):
+    """
+    Sort key of a Version: a release sorts above its prereleases, whose numeric identifiers
+    sort below the alphanumeric ones
+    """
+    return (version.major, version.minor, version.patch, not version.prerelease,
+            tuple((0, part, "") if isinstance(part, int) else (1, 0, part) for part in version.prerelease))
+
+
+def compare(first, second, loose=False):
+    """
+    Returns -1, 0 or 1 as the first version is older than, equal to or newer than the second
+    """
+    first_key = precedence(parse_version(first, loose))
+    second_key = precedence(parse_version(second, loose))
+    return (first_key > second_key) - (first_key < second_key)
+
+
+def gt(first, second, loose=False):
+    return compare(first, second, loose) > 0
+
+
+def is_x(part):
+    return part is None or part in ("x", "X", "*")
+
+
+def at_least(major, minor, patch, prerelease=()):
+    return Comparator(">=", Version(major, minor, patch, prerelease))
+
+
+def below(major, minor, patch):
+    return Comparator("<", Version(major, minor, patch, ()))
+
+
+def desugar_caret(parts):
+    """
+    ^1.2.3 is >=1.2.3 <2.0.0, ^0.4.2 is >=0.4.2 <0.5.0 and ^0.0.3 is >=0.0.3 <0.0.4
+    """
+    [major, minor, patch, prerelease] = parts
+    if is_x(major):
+        return [ANY]
+    # like node-semver, a zero is told by its text: in loose mode, ^00.4.2 is >=0.4.2 <1.0.0
+    [zero_major, zero_minor] = [major == "0", minor == "0"]
+    major = int(major)
+    if is_x(minor):
+        return [at_least(major, 0, 0), below(major + 1, 0, 0)]
+    minor = int(minor)
+    if is_x(patch):
+        if zero_major:
+            return [at_least(major, minor, 0), below(major, minor + 1, 0)]
+        return [at_least(major, minor, 0), below(major + 1, 0, 0)]
+    patch = int(patch)
+    lower = at_least(major, minor, patch, parse_prerelease(prerelease))
+    if zero_major and zero_minor:
+        return [lower, below(major, minor, patch + 1)]
+    if zero_major:
+        return [lower, below(major, minor + 1, 0)]
+    return [lower, below(major + 1, 0, 0)]
+
+
+def desugar_tilde(parts):
+    """
+    ~1.2.3 and ~1.2 are >=1.2.x <1.3.0, ~1 is >=1.0.0 <2.0.0
+    """
+    [major, minor, patch, prerelease] = parts
+    if is_x(major):
+        return [ANY]
+    major = int(major)
+    if is_x(minor):
+        return [at_least(major, 0, 0), below(major + 1, 0, 0)]
+    minor = int(minor)
+    if is_x(patch):
+        return [at_least(major, minor, 0), below(major, minor + 1, 0)]
+    return [at_least(major, minor, int(patch), parse_prerelease(prerelease)), below(major, minor + 1, 0)]
+
+
+def desugar_xrange(operator, parts):
+    """
+    Partial versions cover every version they leave out: 0.4 is >=0.4.0 <0.5.0, >0.4 is >=0.5.0
+    and <=0.4 is <0.5.0
+    """
+    [major, minor, patch, prerelease] = parts
+    if not any(is_x(part) for part in [major, minor, patch]):
+        return [Comparator(operator or "=", Version(int(major), int(minor), int(patch), parse_prerelease(prerelease)))]
+
+    if operator == "=":
+        operator = ""
+    if is_x(major):
+        return [Comparator("<", Version(0, 0, 0, ()))] if operator in (">", "<") else [ANY]
+
+    major = int(major)
+    minor = None if is_x(minor) else int(minor)
+    if not operator:
+        if minor is None:
+            return [at_least(major, 0, 0), below(major + 1, 0, 0)]
+        return [at_least(major, minor, 0), below(major, minor + 1, 0)]
+
+    if operator == ">":
+        operator = ">="
+        [major, minor] = [major + 1, 0] if minor is None else [major, minor + 1]
+    elif operator == "<=":
+        operator = "<"
+        [major, minor] = [major + 1, 0] if minor is None else [major, minor + 1]
+    return [Comparator(operator, Version(major, minor or 0, 0, ()))]
+
+
+def desugar(token, loose):
+    """
+    Returns the comparators of one whitespace-separated part of a range, None if it is not valid
+    """
+    if not token:
+        return [ANY]
+    pattern = patterns(loose)
+
+    for kind, function in [["caret", desugar_caret], ["tilde", desugar_tilde]]:
+        token_match = pattern[kind].match(token)
+        if token_match is not None:
+            return function(list(token_match.groups()[1:]))
+
+    token_match = pattern["xrange"].match(token)
+    if token_match is None:
+        return None
+    [operator, prefix] = token_match.groups()[:2]
+    parts = list(token_match.groups()[2:])
+    if not loose and prefix not in ("", "v") and not any(is_x(part) for part in parts[:3]):
+        # a complete version only tolerates a "v" in strict mode
+        return None
+    return desugar_xrange(operator, parts)
+
+
+def hyphen_tokens(hyphen_match):
+    """
+    "1.2 - 3.4" is ">=1.2.0 <3.5.0": a partial lower bound is completed with zeros, and a
+    partial upper bound covers every version it leaves out
+    """
+    groups = hyphen_match.groups()
+    [lower, lower_major, lower_minor, lower_patch] = [groups[0]] + list(groups[2:5])
+    [upper, upper_major, upper_minor, upper_patch, upper_prerelease] = [groups[6]] + list(groups[8:12])
+
+    tokens = []
+    if is_x(lower_major):
+        pass
+    elif is_x(lower_minor):
+        tokens.append(">={0}.0.0".format(lower_major))
+    elif is_x(lower_patch):
+        tokens.append(">={0}.{1}.0".format(lower_major, lower_minor))
+    else:
+        tokens.append(">=" + lower)
+
+    if is_x(upper_major):
+        pass
+    elif is_x(upper_minor):
+        tokens.append("<{0}.0.0".format(int(upper_major) + 1))
+    elif is_x(upper_patch):
+        tokens.append("<{0}.{1}.0".format(upper_major, int(upper_minor) + 1))
+    elif upper_prerelease:
+        tokens.append("<={0}.{1}.{2}-{3}".format(upper_major, upper_minor, upper_patch, upper_prerelease))
+    else:
+        tokens.append("<=" + upper)
+    return tokens
+
+
+def parse_branch(branch, loose):
+    """
+    Returns the comparators of one "||" branch, None if none of them is valid
+    Invalid parts make the whole range invalid in strict mode, and are left out in loose mode
+    """
+    pattern = patterns(loose)
+    hyphen_match = pattern["hyphen"].match(branch)
+    if hyphen_match is not None:
+        tokens = hyphen_tokens(hyphen_match)
+    else:
+        branch = pattern["operator_space"].sub(r'\1', branch)
+        branch = pattern["caret_space"].sub("^", pattern["tilde_space"].sub("~", branch))
+        tokens = branch.split()
+
+    comparators = []
+    for token in tokens or [""]:
+        token_comparators = desugar(token, loose)
+        if token_comparators is None:
+            if not loose:
+                raise ValueError("Invalid comparator: {}".format(token))
+            continue
+        comparators += token_comparators
+    return tuple(comparators) or None
+
+
+@functools.lru_cache(maxsize=RANGE_CACHE_SIZE)
+def parse_range(rule_text, loose=False):
+    """
+    Returns the comparator sets of a range, one tuple of comparators per "||" branch
+    Raises ValueError when the range is not valid
+    """
+    if not isinstance(rule_text, str):
+        raise TypeError("must be str, but {!r}".format(rule_text))
+
+    comparator_sets = []
+    for branch in patterns(loose)["union"].split(rule_text.strip()):
+        comparators = parse_branch(branch.strip(), loose)
+        if comparators is not None:
+            comparator_sets.append(comparators)
+
+    if not comparator_sets:
+        raise ValueError("Invalid SemVer Range: {}".format(rule_text))
+    return tuple(comparator_sets)
+
+
+def test_comparator(comparator, key):
+    if comparator.version is None:
+        return True
+    bound = precedence(comparator.version)
+    operator = comparator.operator
+    if operator == "=":
+        return key == bound
+    if operator == ">":
+        return key > bound
+    if operator == ">=":
+        return key >= bound
+    if operator == "<":
+        return key < bound
+    return key <= bound
+
+
+def test_set(comparators, version):
+    key = precedence(version)
+    if not all(test_comparator(comparator, key) for comparator in comparators):
+        return False
+    if not version.prerelease:
+        return True
+    # 0.5.0-nightly satisfies ">=0.5.0-beta" but not ">=0.4.0": prereleases are opted into per X.Y.Z
+    return any(comparator.version is not None and comparator.version.prerelease and
+               comparator.version[:3] == version[:3] for comparator in comparators)
+
+
+def satisfies(version, rule_text, loose=False):
+    """
+    Returns whether the version is in the range; a range that is not valid contains no version
+    """
+    try:
+        comparator_sets = parse_range(rule_text, loose)
+    except ValueError:
+        return False
+    if not version:
+        return False
+
+    version = parse_version(version, loose)
+    return any(test_set(comparators, version) for comparators in comparator_sets)
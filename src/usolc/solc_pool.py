@@ -0,0 +1,205 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+"""
+ Pool of warm solc processes for standard-json compilations.
+
+ solc compiles a single standard-json input per process: it reads stdin to the end, writes
+ the output and exits. What can be saved is the exec and the dynamic startup of the binary,
+ so the pool spawns "solc-<version> --standard-json" ahead of time and leaves it blocked on
+ its stdin. A job takes a warm worker, writes its input over the pipe, reads the output, and
+ a replacement is spawned for the next job.
+
+ Workers are kept per (binary, arguments) pair, only for stdin-driven invocations: solc reads
+ the files given on the command line as soon as it starts, so those cannot be spawned early.
+ Each version is limited to a number of concurrent jobs, and workers left idle for too long
+ are killed. A worker that exits before it is handed a job (e.g. a solc that rejects the
+ arguments) makes the pool fall back to one-shot runs for that pair.
+
+ The pool only pays off in processes that outlive their compilations: a one-shot invocation
+ would kill the replacement workers it spawned at exit, so that every job runs cold and pays
+ for a spawn that is never used. It is therefore only used by processes that call enable():
+ "usolc queue worker", usolc_async and services embedding usolc, and never by the usolc command
+ or the children of the daemon. Warm workers are spawned outside of admission control, so the pool
+ is not used either while admission.py governs solc. In long-lived processes, it is opt-in:
+
+     USOLC_POOL_SIZE              warm workers kept per version (default 0: disabled)
+     USOLC_POOL_MAX_CONCURRENCY   concurrent jobs per version (default: number of CPUs)
+     USOLC_POOL_IDLE_SECONDS      lifetime of an unused worker (default 300)
+"""
+
+import os
+import time
+import atexit
+import threading
+import subprocess
+import collections
+import admission
+
+DEFAULT_IDLE_SECONDS = 300
+
+pool_memo = None
+long_lived = False
+
+
+def env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+class Worker(object):
+    """
+    A solc process spawned ahead of time, blocked on reading its input
+    """
+
+    def __init__(self, command):
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.spawned_at = time.monotonic()
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def kill(self):
+        if self.alive():
+            self.process.kill()
+        self.process.communicate()
+
+
+class SolcPool(object):
+    """
+    Hands standard-json jobs to warm solc processes, per version
+    """
+
+    def __init__(self, size=1, max_concurrency=None, idle_seconds=DEFAULT_IDLE_SECONDS):
+        self.size = size
+        self.max_concurrency = max_concurrency or os.cpu_count() or 1
+        self.idle_seconds = idle_seconds
+        self.lock = threading.Lock()
+        self.idle = collections.defaultdict(collections.deque)
+        self.limits = {}
+        self.single_shot = set()
+        self.warm_hits = 0
+        self.cold_runs = 0
+
+    @staticmethod
+    def poolable(native_argv):
+        return "--standard-json" in native_argv
+
+    def limit(self, binary):
+        with self.lock:
+            if binary not in self.limits:
+                self.limits[binary] = threading.BoundedSemaphore(self.max_concurrency)
+            return self.limits[binary]
+
+    def take(self, key):
+        """
+        Returns a warm worker for the key, or None if there is none left
+        """
+        with self.lock:
+            workers = self.idle[key]
+            while workers:
+                worker = workers.popleft()
+                if worker.alive():
+                    return worker
+                # solc does not wait for its input with these arguments: stop spawning early
+                worker.kill()
+                self.single_shot.add(key)
+        return None
+
+    def warm(self, binary, native_argv):
+        """
+        Spawns workers until the key has as many idle workers as the pool size
+        """
+        key = (binary, tuple(native_argv))
+        if not self.poolable(native_argv) or key in self.single_shot:
+            return
+        with self.lock:
+            missing = self.size - len(self.idle[key])
+        for _ in range(missing):
+            try:
+                worker = Worker([binary] + list(native_argv))
+            except OSError:
+                return
+            with self.lock:
+                self.idle[key].append(worker)
+
+    def evict_idle(self):
+        """
+        Kills the workers that have not been used within the idle lifetime
+        """
+        deadline = time.monotonic() - self.idle_seconds
+        expired = []
+        with self.lock:
+            for workers in self.idle.values():
+                while workers and workers[0].spawned_at < deadline:
+                    expired.append(workers.popleft())
+        for worker in expired:
+            worker.kill()
+        return len(expired)
+
+    def run(self, binary, native_argv, stdin_data):
+        """
+        Runs one compilation, on a warm worker when one is available
+        Returns a CompletedProcess, as subprocess.run with captured outputs would
+        """
+        command = [binary] + list(native_argv)
+        if not self.poolable(native_argv):
+            return subprocess.run(command, input=stdin_data, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+        key = (binary, tuple(native_argv))
+        with self.limit(binary):
+            self.evict_idle()
+            worker = self.take(key)
+            if worker is None:
+                self.cold_runs += 1
+                completed_process = subprocess.run(command, input=stdin_data,
+                                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            else:
+                self.warm_hits += 1
+                stdout, stderr = worker.process.communicate(stdin_data)
+                completed_process = subprocess.CompletedProcess(command, worker.process.returncode,
+                                                                stdout, stderr)
+
+        self.warm(binary, native_argv)
+        return completed_process
+
+    def close(self):
+        with self.lock:
+            workers = [worker for queue in self.idle.values() for worker in queue]
+            self.idle.clear()
+        for worker in workers:
+            worker.kill()
+
+
+def enable():
+    """
+    Marks this process as long-lived, so that the pool is used once USOLC_POOL_SIZE sets its size
+    For services embedding usolc; one-shot processes must not call it
+    """
+    global long_lived
+    long_lived = True
+
+
+def get_pool():
+    """
+    Returns the pool of this process, None if it is not enabled or the process is not long-lived
+    """
+    global pool_memo
+    size = env_int("USOLC_POOL_SIZE", 0)
+    if not long_lived or size <= 0 or admission.governed():
+        return None
+
+    if pool_memo is None:
+        pool_memo = SolcPool(size, env_int("USOLC_POOL_MAX_CONCURRENCY", 0) or None,
+                             env_int("USOLC_POOL_IDLE_SECONDS", DEFAULT_IDLE_SECONDS))
+        atexit.register(pool_memo.close)
+    return pool_memo
@@ -0,0 +1,220 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+"""
+ Split compilation of standard-json inputs whose sources no single solc version accepts.
+
+ The sources are partitioned into the components connected by their imports (resolved as
+ solc resolves them, with the remappings of the settings) and each component gets the
+ version chosen from its own pragmas. Components sharing a version are compiled together,
+ the versions concurrently, and their outputs are merged into one response:
+     - "contracts" and "sources" are the union of those of every compilation,
+     - "errors" are concatenated,
+     - source ids are renumbered in the order of the source names, as solc numbers them,
+       and the file indices of the "src" locations of the ASTs and of the source maps follow.
+ AST node ids are left as each compilation numbered them, so they are only unique among
+ the sources compiled by the same version.
+
+ Inputs with sources given by URL are not split, as their imports cannot be followed.
+"""
+
+import sys
+import json
+import concurrent.futures
+import import_graph
+import pragma_scanner
+import profiling
+import usolc
+
+
+def parse_input(stdin_data):
+    try:
+        request = json.loads(stdin_data.decode("utf-8"))
+    except (ValueError, UnicodeDecodeError):
+        return None
+    return request if isinstance(request, dict) else None
+
+
+def splittable(stdin_data):
+    """
+    Tells whether the input has several sources, all given by content
+    """
+    request = parse_input(stdin_data)
+    if request is None or not isinstance(request.get("sources"), dict) or len(request["sources"]) < 2:
+        return False
+    return all(isinstance(value, dict) and "content" in value for value in request["sources"].values())
+
+
+def input_remappings(request):
+    settings = request.get("settings")
+    remappings = settings.get("remappings", []) if isinstance(settings, dict) else []
+    return import_graph.parse_remappings([str(remapping) for remapping in remappings], usolc.PREFIX_FILELOC)
+
+
+def components(sources, remappings):
+    """
+    Returns the lists of source names connected by imports, ordered by their first name
+    """
+    parents = dict((name, name) for name in sources)
+
+    def find(name):
+        while parents[name] != name:
+            parents[name] = parents[parents[name]]
+            name = parents[name]
+        return name
+
+    for name, value in sources.items():
+        for path in pragma_scanner.scan_import_paths(value["content"]):
+            imported = import_graph.resolve_import(name, path, remappings)
+            if imported in parents:
+                parents[find(imported)] = find(name)
+
+    groups = {}
+    for name in sorted(sources):
+        groups.setdefault(find(name), []).append(name)
+    return sorted(groups.values())
+
+
+def component_rules(sources, names):
+    rules = []
+    for name in names:
+        for rule in pragma_scanner.scan_pragma_rules(sources[name]["content"]):
+            if rule not in rules:
+                rules.append(rule)
+    return rules or ["*"]
+
+
+def partition(request, available_versions, version_selection_strategy):
+    """
+    Chooses a version for every component
+    Returns {version: source names compiled by it}
+    """
+    sources = request["sources"]
+    groups = {}
+    for names in components(sources, input_remappings(request)):
+        version_chosen = usolc.choose_version_by_rules(available_versions, component_rules(sources, names),
+                                                       version_selection_strategy)
+        groups.setdefault(version_chosen, []).extend(names)
+    return groups
+
+
+def make_input(request, names):
+    """
+    The input of one compilation: the request restricted to some of its sources
+    """
+    subset = dict(request)
+    subset["sources"] = dict((name, request["sources"][name]) for name in names)
+    return json.dumps(subset).encode("utf-8")
+
+
+def remap_location(location, mapping):
+    """
+    Renumbers the file index of a "start:length:file" location
+    """
+    fields = location.split(":")
+    if len(fields) > 2 and fields[2].isdigit() and int(fields[2]) in mapping:
+        fields[2] = str(mapping[int(fields[2])])
+    return ":".join(fields)
+
+
+def remap_source_map(source_map, mapping):
+    return ";".join(remap_location(entry, mapping) for entry in source_map.split(";"))
+
+
+def renumber(node, mapping):
+    """
+    Renumbers in place the file indices found in an AST or in the contracts of an output
+    """
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key == "src" and isinstance(value, str):
+                node[key] = remap_location(value, mapping)
+            elif key == "sourceMap" and isinstance(value, str):
+                node[key] = remap_source_map(value, mapping)
+            else:
+                renumber(value, mapping)
+    elif isinstance(node, list):
+        for value in node:
+            renumber(value, mapping)
+
+
+def failure_error(version_chosen, stderr):
+    message = "solc {0} produced no standard-json output: {1}".format(
+        version_chosen, stderr.decode("utf-8", errors="replace").strip())
+    return {"component": "general", "formattedMessage": message, "message": message,
+            "severity": "error", "type": "Exception"}
+
+
+def merge_outputs(outputs):
+    """
+    Merges [version, source names, completed process] compilations into one response
+    """
+    new_ids = dict((name, index) for index, name in
+                   enumerate(sorted(name for _, names, _ in outputs for name in names)))
+    merged = {"contracts": {}, "sources": {}}
+    errors = []
+
+    for version_chosen, names, completed_process in outputs:
+        try:
+            output = json.loads(completed_process.stdout.decode("utf-8"))
+        except (ValueError, UnicodeDecodeError):
+            output = None
+        if not isinstance(output, dict):
+            errors.append(failure_error(version_chosen, completed_process.stderr))
+            continue
+
+        sources = output.get("sources", {})
+        mapping = dict((value["id"], new_ids[name]) for name, value in sources.items()
+                       if name in new_ids and isinstance(value, dict) and "id" in value)
+        renumber(sources, mapping)
+        renumber(output.get("contracts", {}), mapping)
+        for name, value in sources.items():
+            if name in new_ids and isinstance(value, dict) and "id" in value:
+                value["id"] = new_ids[name]
+
+        merged["sources"].update(sources)
+        merged["contracts"].update(output.get("contracts", {}))
+        errors += output.get("errors", [])
+
+    if errors:
+        merged["errors"] = errors
+    return merged
+
+
+def compile_split(available_versions, stdin_data, native_argv, version_selection_strategy):
+    """
+    Compiles every component with its own version and writes the merged response to stdout
+    Returns the highest exit code of the compilations
+    """
+    request = parse_input(stdin_data)
+    with profiling.phase("resolve"):
+        groups = partition(request, available_versions, version_selection_strategy)
+    profiling.annotate("version", ",".join(sorted(groups)))
+    if usolc.flag_additional_info:
+        for version_chosen, names in sorted(groups.items()):
+            print("solc version: " + version_chosen + " for " + ", ".join(names))
+
+    with profiling.phase("provision"):
+        for version_chosen in groups:
+            usolc.ensure_solc_installed(version_chosen)
+
+    with profiling.phase("solc"):
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(groups)) as executor:
+            futures = [[version_chosen, names,
+                        executor.submit(usolc.run_solc_captured, version_chosen, native_argv,
+                                        make_input(request, names))]
+                       for version_chosen, names in sorted(groups.items())]
+            outputs = [[version_chosen, names, future.result()] for version_chosen, names, future in futures]
+
+    usolc.write_output(sys.stdout, json.dumps(merge_outputs(outputs)).encode("utf-8") + b"\n")
+    for _, _, completed_process in outputs:
+        usolc.write_output(sys.stderr, completed_process.stderr)
+    # a group killed by a signal has a negative code, which max() would hide behind a success
+    return next((completed_process.returncode for _, _, completed_process in outputs
+                 if completed_process.returncode != 0), 0)
@@ -0,0 +1,352 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+"""
+ Moves solc outputs around without holding them in memory.
+
+ send_range() copies a range of a file (a cache entry, or the temporary file solc wrote its
+ output to) to a stream with os.sendfile, so the bytes never leave the kernel, or with a
+ large-buffer copy when the stream has no file descriptor.
+
+ JsonStreamParser is a push parser: fed the output of solc chunk by chunk, it returns the
+ values selected by their path in the document as soon as they are complete, and skips the
+ others without decoding them. iter_standard_json() uses it to yield the contracts, sources
+ and errors of a standard-json output one at a time:
+
+     for [kind, source_name, contract_name, value] in streaming.iter_standard_json(stream):
+         ...   # kind is "contract", "source" or "error"
+
+ so memory is bounded by the largest contract rather than by the whole output.
+"""
+
+import io
+import os
+import re
+import json
+import errno
+import codecs
+
+CHUNK_SIZE = 1024 * 1024
+MAX_SENDFILE = 0x7ffff000
+
+EMIT = "emit"
+DESCEND = "descend"
+SKIP = "skip"
+
+WHITESPACE = " \t\n\r"
+STRUCTURE = re.compile(r'["{}\[\]]')
+STRING_SPECIAL = re.compile(r'["\\]')
+PRIMITIVE_END = re.compile(r'[,}\]\s]')
+
+
+def write_bytes(stream, data):
+    if hasattr(stream, "buffer"):
+        stream.buffer.write(data)
+    else:
+        stream.write(data.decode("utf-8", errors="replace"))
+
+
+def stream_fileno(stream):
+    try:
+        return stream.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+
+
+def write_all(target_fd, data):
+    view = memoryview(data)
+    while view:
+        written = os.write(target_fd, view)
+        view = view[written:]
+
+
+def send_range(stream, source_fd, offset, count):
+    """
+    Copies count bytes of source_fd, from offset, to stream
+    """
+    if count <= 0:
+        return
+    stream.flush()
+    target_fd = stream_fileno(stream)
+
+    if target_fd is not None:
+        try:
+            while count > 0:
+                sent = os.sendfile(target_fd, source_fd, offset, min(count, MAX_SENDFILE))
+                if sent == 0:
+                    return
+                offset += sent
+                count -= sent
+            return
+        except OSError as e:
+            if e.errno not in (errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP):
+                raise
+        except AttributeError:
+            pass
+
+    while count > 0:
+        chunk = os.pread(source_fd, min(count, CHUNK_SIZE), offset)
+        if not chunk:
+            return
+        if target_fd is not None:
+            write_all(target_fd, chunk)
+        else:
+            write_bytes(stream, chunk)
+        offset += len(chunk)
+        count -= len(chunk)
+    stream.flush()
+
+
+def send_file(stream, file):
+    """
+    Copies the whole content of an open file to stream
+    """
+    file.flush()
+    send_range(stream, file.fileno(), 0, os.fstat(file.fileno()).st_size)
+
+
+class Frame(object):
+    """
+    An object or array being descended into, with the key or index of its current member
+    """
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.key = 0 if kind == "[" else None
+        self.state = "key" if kind == "{" else "value"
+        self.first = True
+
+
+class ValueScan(object):
+    """
+    Progress of the search for the end of a value, kept across chunks
+    """
+
+    def __init__(self, start, emit, primitive):
+        self.start = start
+        self.position = start
+        self.emit = emit
+        self.primitive = primitive
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+
+
+class JsonStreamParser(object):
+    """
+    selector(path) tells what to do with the value at path, a tuple of keys and indices:
+    EMIT returns it decoded, DESCEND goes through its members (objects and arrays only), and
+    SKIP drops it
+    """
+
+    def __init__(self, selector):
+        self.selector = selector
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.frames = []
+        self.scan = None
+        self.finished = False
+
+    def feed(self, data):
+        """
+        Returns the [path, value] selected in the document so far
+        """
+        self.buffer += self.decoder.decode(data)
+        results = self.parse(False)
+        self.compact()
+        return results
+
+    def close(self):
+        self.buffer += self.decoder.decode(b"", final=True)
+        results = self.parse(True)
+        if not self.finished:
+            raise ValueError("Truncated JSON document")
+        return results
+
+    def path(self):
+        return tuple(frame.key for frame in self.frames)
+
+    def compact(self):
+        """
+        Drops the part of the buffer already consumed, or skipped
+        """
+        if self.scan is None:
+            keep = self.pos
+        elif self.scan.emit:
+            keep = self.scan.start
+        else:
+            keep = self.scan.position
+        if keep == 0:
+            return
+        self.buffer = self.buffer[keep:]
+        self.pos -= keep
+        if self.scan is not None:
+            self.scan.start = max(0, self.scan.start - keep)
+            self.scan.position -= keep
+
+    def skip_whitespace(self):
+        while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+            self.pos += 1
+
+    def value_end(self, end_of_input):
+        """
+        Returns the end of the value being scanned, None if it is not in the buffer yet
+        """
+        scan = self.scan
+        buffer = self.buffer
+
+        while scan.position < len(buffer):
+            if scan.primitive:
+                match = PRIMITIVE_END.search(buffer, scan.position)
+                if match is None:
+                    break
+                return match.start()
+            if scan.in_string:
+                if scan.escaped:
+                    scan.escaped = False
+                    scan.position += 1
+                    continue
+                match = STRING_SPECIAL.search(buffer, scan.position)
+                if match is None:
+                    break
+                scan.position = match.end()
+                if match.group() == "\\":
+                    scan.escaped = True
+                else:
+                    scan.in_string = False
+                    if scan.depth == 0:
+                        return scan.position
+                continue
+            match = STRUCTURE.search(buffer, scan.position)
+            if match is None:
+                break
+            scan.position = match.end()
+            char = match.group()
+            if char == '"':
+                scan.in_string = True
+            elif char in "{[":
+                scan.depth += 1
+            else:
+                scan.depth -= 1
+                if scan.depth == 0:
+                    return scan.position
+
+        scan.position = len(buffer)
+        if scan.primitive and end_of_input:
+            return len(buffer)
+        return None
+
+    def value_done(self):
+        if self.frames:
+            self.frames[-1].state = "next"
+        else:
+            self.finished = True
+
+    def start_value(self, char):
+        action = self.selector(self.path())
+        if action == DESCEND and char in "{[":
+            self.frames.append(Frame(char))
+            self.pos += 1
+        else:
+            self.scan = ValueScan(self.pos, action == EMIT, char not in '{["')
+
+    def parse(self, end_of_input):
+        results = []
+        while not self.finished:
+            if self.scan is not None:
+                end = self.value_end(end_of_input)
+                if end is None:
+                    break
+                if self.scan.emit:
+                    results.append([self.path(), json.loads(self.buffer[self.scan.start:end])])
+                self.scan = None
+                self.pos = end
+                self.value_done()
+                continue
+
+            self.skip_whitespace()
+            if self.pos == len(self.buffer):
+                break
+            char = self.buffer[self.pos]
+            if not self.frames:
+                self.start_value(char)
+                continue
+
+            frame = self.frames[-1]
+            if frame.state == "next":
+                if char == ",":
+                    frame.state = "key" if frame.kind == "{" else "value"
+                    frame.first = False
+                    if frame.kind == "[":
+                        frame.key += 1
+                    self.pos += 1
+                else:
+                    self.close_frame(char)
+            elif frame.first and char in "}]":
+                self.close_frame(char)
+            elif frame.state == "key":
+                if char != '"':
+                    raise ValueError("Expected a key at " + str(self.pos))
+                try:
+                    frame.key, self.pos = json.decoder.scanstring(self.buffer, self.pos + 1)
+                except ValueError:
+                    if end_of_input:
+                        raise
+                    break
+                frame.state = "colon"
+            elif frame.state == "colon":
+                if char != ":":
+                    raise ValueError("Expected ':' at " + str(self.pos))
+                self.pos += 1
+                frame.state = "value"
+            else:
+                self.start_value(char)
+        return results
+
+    def close_frame(self, char):
+        frame = self.frames.pop()
+        if char != ("}" if frame.kind == "{" else "]"):
+            raise ValueError("Unexpected '" + char + "'")
+        self.pos += 1
+        self.value_done()
+
+
+def standard_json_selector(path):
+    """
+    Selects every contract, source and error of a standard-json output
+    """
+    if len(path) == 0:
+        return DESCEND
+    if len(path) == 1:
+        return DESCEND if path[0] in ("contracts", "sources", "errors") else SKIP
+    if path[0] == "contracts" and len(path) == 2:
+        return DESCEND
+    return EMIT
+
+
+def standard_json_item(path, value):
+    if path[0] == "contracts":
+        return ["contract", path[1], path[2], value]
+    if path[0] == "sources":
+        return ["source", path[1], None, value]
+    return ["error", None, None, value]
+
+
+def iter_standard_json(stream, chunk_size=CHUNK_SIZE):
+    """
+    Yields [kind, source name, contract name, value] for every contract, source and error of
+    the standard-json output read from a binary stream
+    """
+    parser = JsonStreamParser(standard_json_selector)
+    for chunk in iter(lambda: stream.read(chunk_size), b""):
+        for path, value in parser.feed(chunk):
+            yield standard_json_item(path, value)
+    for path, value in parser.close():
+        yield standard_json_item(path, value)
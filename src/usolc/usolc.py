@@ -17,19 +17,34 @@
  solc ....... -U 0.4.*-          use oldest compiler in 0.4.*
  solc ....... -U +               use newest compiler available
  solc ....... -U -               use oldest compiler available
+ solc ....... --watch            recompile whenever a source changes, see watch.py
+
+ Modules only some invocations need (subprocess, tempfile, solc_pool, ...) are imported by the
+ functions using them, so that the common case starts fast. When nothing is left to do once solc
+ is done, the process started for the invocation lets solc replace it, see exec_solc().
 
 """
 
 import os
 import sys
 import re
-import subprocess
-import semver
 import json
+import compile_cache
+import rule_table
+import semver_engine
+import pragma_scanner
+import import_graph
+import inventory
+import provisioning
+import profiling
+import admission
+import artifacts
 from enum import Enum
 from exceptions.pragmaline_notfound_error import PragmaLineNotFoundError
 from exceptions.noversion_available_by_sol import NoVersionAvailableBySol
 from exceptions.noversion_available_by_user import NoVersionAvailableByUser
+from exceptions.provisioning_error import ProvisioningError
+from exceptions.job_killed_error import JobKilledError
 
 USOLC_HOME = os.environ['USOLC_HOME']
 
@@ -42,8 +57,13 @@ PRAGMA_SOLIDITY = re.compile(r'pragma\ssolidity\s(.*);', re.IGNORECASE)
 PREFIX_FILELOC = re.compile(r'(.*)=(.*)', re.IGNORECASE)
 flag_additional_info = False
 flag_standard_json = False
+flag_watch = False
+flag_infer_version = False
+flag_exec_solc = False
+artifacts_target = None
 
-jsonData = None
+stdjson_input = None
+stdjson_rules = None
 
 SOLC_ARGUMENTS_WITH_OPTIONS = [
     "--evm-version",
@@ -62,18 +82,19 @@ def make_semver_filter(rule_text):
     Construct a filter based on the rule provided
     """
     def semver_check(x):
-        return semver.satisfies(x, rule_text)
+        return semver_engine.satisfies(x, rule_text)
 
     return semver_check
 
 
 def semver_filter(version_list, rule_text):
     """
-    Filter the list using the rule provided
+    Filter the list using the rule provided, looked up in the shared rule table
     """
-    full_rule_filter = make_semver_filter(rule_text)
-    filter_result = filter(full_rule_filter, version_list)
-    return filter_result
+    table = rule_table.get_table(version_list)
+    satisfying = set(table.filter(rule_text))
+    table.save()
+    return [version for version in version_list if version in satisfying]
 
 
 def extract_pragma_line(filename):
@@ -129,36 +150,72 @@ def getrule_from_file(filename):
     """
     Extract the versioning rule from the solidity file
     """
-    try:
-        pragma_line = extract_pragma_line(filename)
-        semver_rule = getrule_from_pragma(pragma_line)
-    except PragmaLineNotFoundError:
-        semver_rule = "*"
+    semver_rules = pragma_scanner.scan_file_pragma_rules(filename, first_only=True)
+    if not semver_rules:
+        return "*"
+
+    return semver_rules[0]
 
-    return semver_rule
 
 def getrules_from_file(filename):
     """
-    Extract the versioning rule from the solidity file
+    Extract the versioning rules from the solidity file
+    """
+    semver_rules = pragma_scanner.scan_file_pragma_rules(filename)
+    if not semver_rules:
+        semver_rules = ["*"]
+
+    return semver_rules
+
+
+def read_stdin_bytes():
+    """
+    Reads all of stdin as bytes, so that it can be handed to solc exactly as received
+    """
+    if hasattr(sys.stdin, "buffer"):
+        return sys.stdin.buffer.read()
+    return sys.stdin.read().encode("utf-8")
+
+
+def getrules_from_stdjson(stdin_data):
+    """
+    Returns the pragma rules of every source given by content in a standard-json input
+    Sources given by URL are left out; if no rule is found, returns ["*"]
+    Malformed inputs are left for solc to report.
     """
     try:
-        pragma_lines = extract_pragma_lines(filename)
-        semver_rules = []
-        for pragma_line in pragma_lines:
-            semver_rule = getrule_from_pragma(pragma_line)
-            semver_rules.append(semver_rule)
-    except PragmaLineNotFoundError:
+        sources = json.loads(stdin_data.decode("utf-8"))["sources"]
+    except (ValueError, KeyError, TypeError):
+        sources = {}
+
+    semver_rules = []
+    for value in sources.values():
+        if not isinstance(value, dict) or "content" not in value:
+            continue
+        for rule in pragma_scanner.scan_pragma_rules(value["content"]):
+            if rule not in semver_rules:
+                semver_rules.append(rule)
+
+    if not semver_rules:
         semver_rules = ["*"]
 
     return semver_rules
 
+
 def extract_arguments(sargv):
     """
     Iterate through the arguments for the universal compiler,
     then remove them if they're not needed in the usual solc compiler
     """
-    global flag_additional_info, flag_standard_json
+    global flag_additional_info, flag_standard_json, flag_watch, flag_infer_version, stdjson_input, stdjson_rules
+    global artifacts_target
     argv = sargv[1:]
+    artifacts_target = artifacts.target_dir(argv)
+    flag_standard_json = False
+    flag_watch = False
+    flag_infer_version = False
+    stdjson_input = None
+    stdjson_rules = None
 
     file_listed = []
     filename = None
@@ -177,6 +234,12 @@ def extract_arguments(sargv):
             non_native_option_expected = False
         elif arg == "-uinfo":
             flag_additional_info = True
+        elif profiling.is_profile_argument(arg) or artifacts.is_artifacts_argument(arg):
+            pass
+        elif arg == "--watch":
+            flag_watch = True
+        elif arg == "--infer-version":
+            flag_infer_version = True
         elif expecting_native_option:
             expecting_native_option = False
             native_argv.append(arg)
@@ -187,22 +250,12 @@ def extract_arguments(sargv):
             # currently ignoring bzzr and ipfs function
             flag_standard_json = True
 
-            with open("/tmp/usolc-stdjson-tmp", 'w', encoding='utf-8') as file:
-                for line in sys.stdin:
-                    file.write(line)
-                file.close()
-
-            jsonInput = open("/tmp/usolc-stdjson-tmp", 'r', encoding='utf-8')
-            jsonData = json.load(jsonInput)
-            jsonInput.close()
+            # the input is kept in memory: it is scanned for pragmas here and piped to solc as is
+            stdjson_input = read_stdin_bytes()
+            with profiling.phase("scan"):
+                stdjson_rules = getrules_from_stdjson(stdjson_input)
             native_argv.append(arg)
 
-            for contractFilename, value in jsonData["sources"].items():
-                contractTmp = open("/tmp/usolc-contract-tmp", "w", encoding="utf-8")
-                contractTmp.write(value["content"])
-                contractTmp.close()
-                file_listed.append("/tmp/usolc-contract-tmp")
-
         elif arg[0] == "-" or PREFIX_FILELOC.match(arg) is not None:
             native_argv.append(arg)
         else:
@@ -265,53 +318,60 @@ def semver_min_satisfying(target_list, target_range):
     for each_version in user_filtered_list:
         if result_version is None:
             result_version = each_version
-        elif semver.gt(result_version, each_version, loose=True):
+        elif semver_engine.gt(result_version, each_version, loose=True):
             result_version = each_version
 
     return result_version
 
 
-def choose_version_by_strategy(target_list, version_selection_strategy):
+def select_by_strategy(index, selection, version_selection_strategy):
     """
-    Choose a specific version in the list,
-    according to version selection strategy specified by the user
+    Picks the newest or oldest version of a selection of the table that satisfies the user's range
     """
-
     [target_range, choosing] = version_selection_strategy
 
     if choosing == VersionChoosing.NEWEST:
-        result = semver.max_satisfying(target_list, target_range, loose=True)
+        return index.newest(index.narrow(selection, target_range, loose=True))
     else:
-        # min_satisfying is not implemented by the library yet, using our own implementation
-        result = semver_min_satisfying(target_list, target_range)
+        return index.oldest(index.narrow(selection, target_range, loose=False))
 
-    return result
 
+def choose_version_by_strategy(target_list, version_selection_strategy):
+    """
+    Choose a specific version in the list,
+    according to version selection strategy specified by the user
+    """
+    table = rule_table.get_table(target_list)
+    try:
+        return select_by_strategy(table, table.select_all(), version_selection_strategy)
+    finally:
+        table.save()
 
-def choose_version_by_argument(available_versions, filename, version_selection_strategy):
+
+def choose_version_by_rules(available_versions, sol_rules, version_selection_strategy):
     """
     Choose a specific version in the list by:
-        (1) filtering it through the solidity requirement
+        (1) filtering it through every rule required by the solidity sources
         (2) filtering it through the user specification
         (3) Choose a version according to the user's preference
     """
-    if filename is None:
-        filtered_by_sol_compiler_list = available_versions
+    table = rule_table.get_table(available_versions)
+    try:
+        selection = table.select_all()
         sol_rule = ""
-    else:
-        sol_rules = getrules_from_file(filename)
-        filtered_by_sol_compiler_list = available_versions
 
         for sol_rule in sol_rules:
-            filtered_by_sol_compiler_list = list(semver_filter(filtered_by_sol_compiler_list, sol_rule))
-            if not filtered_by_sol_compiler_list:
+            selection = table.narrow(selection, sol_rule)
+            if table.is_empty(selection):
                 raise NoVersionAvailableBySol(
                     available_versions, sol_rule,
                     "No solc version that satisfies the requirement of the solidity file")
 
+        version_chosen = select_by_strategy(table, selection, version_selection_strategy)
+    finally:
+        table.save()
+
     user_rule = version_selection_strategy
-    version_chosen = choose_version_by_strategy(filtered_by_sol_compiler_list,
-                                                version_selection_strategy)
     if version_chosen is None:
         raise NoVersionAvailableByUser(
             available_versions, sol_rule, user_rule,
@@ -321,6 +381,64 @@ def choose_version_by_argument(available_versions, filename, version_selection_s
     return version_chosen
 
 
+def build_unit_graph(native_argv):
+    """
+    Builds the import graph of the files given to solc, honoring remappings and --allow-paths
+    """
+    return import_graph.build_import_graph(extract_source_files(native_argv),
+                                           import_graph.parse_remappings(native_argv, PREFIX_FILELOC),
+                                           import_graph.parse_allow_paths(native_argv))
+
+
+def getrules_from_unit(native_argv):
+    """
+    Extract the versioning rules of every file solc will read, following the imports
+    """
+    graph = build_unit_graph(native_argv)
+    if flag_additional_info:
+        for filename, [rules, _] in graph.items():
+            print("Solidity requirement of " + filename + ": " + str(rules or ["*"]))
+
+    semver_rules = import_graph.unit_rules(graph)
+    if graph and not semver_rules:
+        semver_rules = ["*"]
+
+    return semver_rules
+
+
+def version_inference_enabled():
+    return flag_infer_version or os.environ.get("USOLC_INFER_VERSION", "").lower() in ("1", "true", "yes", "on")
+
+
+def choose_version_by_unit(available_versions, native_argv, version_selection_strategy):
+    """
+    Choose a specific version in the list according to the pragmas of every file
+    of the compilation unit and the user's version selection strategy
+    """
+    with profiling.phase("scan"):
+        sol_rules = getrules_from_unit(native_argv)
+    if sol_rules == ["*"] and version_inference_enabled():
+        # no file of the unit tells its version: ask the compilers, see version_inference.py
+        import version_inference
+        with profiling.phase("infer"):
+            sol_rules = version_inference.infer_rules(native_argv, version_selection_strategy)
+    with profiling.phase("resolve"):
+        return choose_version_by_rules(available_versions, sol_rules, version_selection_strategy)
+
+
+def choose_version_by_argument(available_versions, filename, version_selection_strategy):
+    """
+    Choose a specific version in the list according to the pragmas of the file
+    and the user's version selection strategy
+    """
+    if filename is None:
+        sol_rules = []
+    else:
+        sol_rules = getrules_from_file(filename)
+
+    return choose_version_by_rules(available_versions, sol_rules, version_selection_strategy)
+
+
 def read_version_list(version_list_filename):
     """
     Opens the file and treat each line as a version available for solc
@@ -331,36 +449,401 @@ def read_version_list(version_list_filename):
     return list(nl_removed_list)
 
 
+def extract_source_files(native_argv):
+    """
+    Returns the source files that will be given to solc, following the same rules
+    as extract_arguments() uses to tell files apart from options
+    """
+    source_files = []
+    expecting_native_option = False
+
+    for arg in native_argv:
+        if expecting_native_option:
+            expecting_native_option = False
+        elif arg in SOLC_ARGUMENTS_WITH_OPTIONS:
+            expecting_native_option = True
+        elif arg[0] == "-" or PREFIX_FILELOC.match(arg) is not None:
+            continue
+        else:
+            source_files.append(arg)
+
+    return source_files
+
+
+def write_output(stream, data):
+    """
+    Writes bytes produced by solc to a text stream such as sys.stdout
+    """
+    stream.flush()
+    if hasattr(stream, "buffer"):
+        stream.buffer.write(data)
+        stream.buffer.flush()
+    else:
+        stream.write(data.decode("utf-8", errors="replace"))
+        stream.flush()
+
+
+def solc_binary(version_chosen):
+    return "{0}/bin/solc-".format(USOLC_HOME) + version_chosen
+
+
+def run_solc_remote(version_chosen, native_argv, stdin_data=None):
+    """
+    Runs the compilation on a worker when USOLC_COORDINATOR is set, see jobqueue.py
+    Returns [returncode, stdout, stderr], or None when it has to run here
+    """
+    if not os.environ.get("USOLC_COORDINATOR"):
+        return None
+    if stdin_data is not None and not stdjson_cacheable(stdin_data):
+        return None
+    import jobqueue
+    graph = build_unit_graph(native_argv) if stdin_data is None else {}
+    return jobqueue.run_remote(version_chosen, native_argv, stdin_data, graph)
+
+
+def spawn_solc_captured(version_chosen, native_argv, stdin_data=None):
+    """
+    Runs solc with its outputs captured, on a worker of the job queue or on a warm process
+    of the pool when they are enabled
+    """
+    import subprocess
+    import solc_pool
+    remote = run_solc_remote(version_chosen, native_argv, stdin_data)
+    if remote is not None:
+        return subprocess.CompletedProcess([solc_binary(version_chosen)] + native_argv, *remote)
+
+    pool = solc_pool.get_pool()
+    if pool is not None and stdin_data is not None:
+        return pool.run(solc_binary(version_chosen), native_argv, stdin_data)
+    if admission.governed():
+        try:
+            return admission.run([solc_binary(version_chosen)] + native_argv,
+                                 job_input_size(native_argv, stdin_data), stdin_data,
+                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except JobKilledError as e:
+            # reported to whoever reads the output, which is never cached with a negative code
+            return subprocess.CompletedProcess([solc_binary(version_chosen)] + native_argv, e.returncode,
+                                               e.stdout, e.stderr + ("Error: " + str(e) + "\n").encode("utf-8"))
+    return subprocess.run([solc_binary(version_chosen)] + native_argv, input=stdin_data,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+def job_input_size(native_argv, stdin_data):
+    """
+    Returns the size of what solc will compile, from which admission.py estimates its memory
+    """
+    if stdin_data is not None:
+        return len(stdin_data)
+    size = 0
+    for filename in build_unit_graph(native_argv):
+        try:
+            size += os.path.getsize(filename)
+        except OSError:
+            pass
+    return size
+
+
+def compilation_key(version_chosen, native_argv, stdin_data):
+    if stdin_data is None:
+        source_files = list(build_unit_graph(native_argv))
+    else:
+        source_files = []
+    return compile_cache.make_cache_key(version_chosen, native_argv, source_files, stdin_data)
+
+
+def compile_with_cache(version_chosen, native_argv, stdin_data, key=None):
+    """
+    Looks up the output of the compilation in the cache, only spawning solc on a miss
+    Returns [returncode, stdout, stderr, cache_hit]
+    """
+    if key is None:
+        key = compilation_key(version_chosen, native_argv, stdin_data)
+    cached = compile_cache.lookup(key)
+    if cached is not None:
+        return cached + [True]
+
+    completed_process = spawn_solc_captured(version_chosen, native_argv, stdin_data)
+    [returncode, stdout, stderr] = \
+        [completed_process.returncode, completed_process.stdout, completed_process.stderr]
+    if returncode >= 0:
+        try:
+            compile_cache.store(key, returncode, stdout, stderr)
+        except OSError as e:
+            print("Warning: cannot write to the usolc cache: " + str(e), file=sys.stderr)
+
+    return [returncode, stdout, stderr, False]
+
+
+def cache_usable(native_argv, stdin_data):
+    if not compile_cache.cache_enabled() or not compile_cache.is_cacheable(native_argv):
+        return False
+    return stdin_data is None or stdjson_cacheable(stdin_data)
+
+
+def run_solc_captured(version_chosen, native_argv, stdin_data=None):
+    """
+    Runs solc with its stdout/stderr captured rather than written to ours,
+    going through the compilation cache when it is enabled
+    """
+    import subprocess
+    command = [solc_binary(version_chosen)] + native_argv
+    if cache_usable(native_argv, stdin_data):
+        [returncode, stdout, stderr, _] = compile_with_cache(version_chosen, native_argv, stdin_data)
+        return subprocess.CompletedProcess(command, returncode, stdout, stderr)
+
+    return spawn_solc_captured(version_chosen, native_argv, stdin_data)
+
+
+def run_solc_cached(version_chosen, native_argv, stdin_data):
+    """
+    Compiles through the cache and replays the output to stdout/stderr.
+    The output is never held in memory: solc writes it to temporary files, which are copied
+    into the cache entry, and it is replayed from there with sendfile.
+    """
+    import subprocess
+    import tempfile
+    import solc_pool
+    import streaming
+    command = [solc_binary(version_chosen)] + native_argv
+    if (solc_pool.get_pool() is not None and stdin_data is not None) or os.environ.get("USOLC_COORDINATOR"):
+        # warm solc processes and workers of the job queue write to pipes: their output is captured
+        key = compilation_key(version_chosen, native_argv, stdin_data)
+        [returncode, stdout, stderr, cache_hit] = compile_with_cache(version_chosen, native_argv, stdin_data, key)
+        if flag_additional_info:
+            print("usolc cache: " + ("hit" if cache_hit else "miss"))
+        write_output(sys.stdout, stdout)
+        write_output(sys.stderr, stderr)
+        if returncode == 0:
+            store_artifacts(native_argv, [stdout], key)
+        return subprocess.CompletedProcess(command, returncode)
+
+    key = compilation_key(version_chosen, native_argv, stdin_data)
+    cached = compile_cache.open_entry(key)
+    if flag_additional_info:
+        print("usolc cache: " + ("hit" if cached is not None else "miss"))
+
+    if cached is not None:
+        [returncode, entry, stdout_size, stderr_size] = cached
+        with entry:
+            offset = entry.tell()
+            streaming.send_range(sys.stdout, entry.fileno(), offset, stdout_size)
+            streaming.send_range(sys.stderr, entry.fileno(), offset + stdout_size, stderr_size)
+            if returncode == 0:
+                store_artifacts(native_argv, artifacts.file_chunks(entry, offset, stdout_size), key)
+        return subprocess.CompletedProcess(command, returncode)
+
+    with tempfile.TemporaryFile() as stdout_file, tempfile.TemporaryFile() as stderr_file:
+        returncode = run_process(command, stdin_data, stdout=stdout_file, stderr=stderr_file).returncode
+        if returncode >= 0:
+            try:
+                compile_cache.store_files(key, returncode, stdout_file, stderr_file)
+            except OSError as e:
+                print("Warning: cannot write to the usolc cache: " + str(e), file=sys.stderr)
+        streaming.send_file(sys.stdout, stdout_file)
+        streaming.send_file(sys.stderr, stderr_file)
+        if returncode == 0:
+            stdout_size = os.fstat(stdout_file.fileno()).st_size
+            store_artifacts(native_argv, artifacts.file_chunks(stdout_file, 0, stdout_size), key)
+    return subprocess.CompletedProcess(command, returncode)
+
+
+def run_solc_to_artifacts(version_chosen, native_argv, stdin_data):
+    """
+    Runs solc with its stdout written to a temporary file, which is replayed to ours, then
+    split into the artifact directory
+    """
+    import tempfile
+    import streaming
+    with tempfile.TemporaryFile() as stdout_file:
+        completed_process = run_process([solc_binary(version_chosen)] + native_argv, stdin_data, stdout=stdout_file)
+        streaming.send_file(sys.stdout, stdout_file)
+        if completed_process.returncode == 0:
+            stdout_size = os.fstat(stdout_file.fileno()).st_size
+            store_artifacts(native_argv, artifacts.file_chunks(stdout_file, 0, stdout_size))
+    return completed_process
+
+
+def artifacts_wanted(native_argv):
+    return artifacts_target is not None and artifacts.output_format(native_argv) is not None
+
+
+def store_artifacts(native_argv, chunks, key=None):
+    """
+    Adds the contracts of a successful compilation to the artifact directory, if one was given
+    """
+    if not artifacts_wanted(native_argv):
+        return
+    try:
+        artifacts.collect(artifacts_target, chunks, artifacts.output_format(native_argv), key)
+    except (OSError, ValueError) as e:
+        # like the cache, the artifacts must never fail a compilation
+        print("Warning: cannot write the usolc artifacts: " + str(e), file=sys.stderr)
+
+
+def stdjson_cacheable(stdin_data):
+    """
+    Sources given by URL are read by solc itself, so they are not covered by the cache key
+    """
+    try:
+        sources = json.loads(stdin_data.decode("utf-8"))["sources"]
+    except (ValueError, KeyError, TypeError):
+        return False
+    return all("content" in value for value in sources.values())
+
+
+def exec_solc(command):
+    """
+    Replaces this process by solc, which then writes to our stdout/stderr and exits with its own code
+    Returns only if solc cannot be executed
+    """
+    sys.stdout.flush()
+    sys.stderr.flush()
+    try:
+        os.execv(command[0], command)
+    except OSError:
+        pass
+
+
 def run_solc(version_chosen, native_argv):
     global flag_additional_info, flag_standard_json
     if flag_additional_info:
         print("solc version: " + version_chosen)
         print("#################################################")
 
+    solc_command = [solc_binary(version_chosen)]
+    stdin_data = stdjson_input if flag_standard_json else None
+
+    if cache_usable(native_argv, stdin_data):
+        return run_solc_cached(version_chosen, native_argv, stdin_data)
+
+    remote = run_solc_remote(version_chosen, native_argv, stdin_data)
+    if remote is not None:
+        import subprocess
+        [returncode, stdout, stderr] = remote
+        write_output(sys.stdout, stdout)
+        write_output(sys.stderr, stderr)
+        if returncode == 0:
+            store_artifacts(native_argv, [stdout])
+        return subprocess.CompletedProcess(solc_command + native_argv, returncode)
+
+    if artifacts_wanted(native_argv):
+        return run_solc_to_artifacts(version_chosen, native_argv, stdin_data)
+
     if flag_standard_json:
-        jsonInput = open("/tmp/usolc-stdjson-tmp", 'r', encoding='utf-8')
-        return subprocess.run(["{0}/bin/solc-".format(USOLC_HOME) + version_chosen] + native_argv, stdin=jsonInput, stdout=sys.stdout)
-        jsonInput.close()
-    else:
-        return subprocess.run(["{0}/bin/solc-".format(USOLC_HOME) + version_chosen] + native_argv)
+        return run_process(solc_command + native_argv, stdin_data, stdout=sys.stdout)
+
+    if flag_exec_solc and not flag_watch and not profiling.enabled() and not admission.governed():
+        # no output to cache or replay, no report to write and no job to account for:
+        # solc can finish the invocation
+        exec_solc(solc_command + native_argv)
+    return run_process(solc_command + native_argv)
+
+
+def run_process(command, stdin_data=None, stdout=None, stderr=None):
+    """
+    Runs solc on our own stdout/stderr, as subprocess.run would, timing its start separately.
+    solc inherits our descriptors, so its output reaches them without going through usolc.
+    Under admission control or resource limits, admission.py runs it instead.
+    """
+    import subprocess
+    if admission.governed():
+        return admission.run(command, job_input_size(command[1:], stdin_data), stdin_data, stdout, stderr)
+    with profiling.phase("solc_exec"):
+        process = subprocess.Popen(command, stdin=subprocess.PIPE if stdin_data is not None else None,
+                                   stdout=stdout, stderr=stderr)
+    with process:
+        try:
+            process.communicate(stdin_data)
+        except BaseException:
+            process.kill()
+            raise
+    return subprocess.CompletedProcess(command, process.returncode)
 
 def fetch_supported_solc_versions():
-    return [f.replace("solc-", "") for f in os.listdir("{0}/bin".format(USOLC_HOME)) if re.match(r'solc-[0-9.]+', f)]
+    """
+    Lists the solc binaries installed under USOLC_HOME/bin, from the inventory manifest.
+    The manifest is only rebuilt when the directory changed.
+    """
+    return inventory.installed_versions(USOLC_HOME)
+
+
+def fetch_resolvable_solc_versions():
+    """
+    Lists the versions a compilation may be resolved to: the installed ones, plus the releases
+    of the catalog when on-demand provisioning is enabled
+    """
+    installed_versions = fetch_supported_solc_versions()
+    if not provisioning.provisioning_enabled():
+        return installed_versions
+
+    catalog_filename = os.environ.get("USOLC_CATALOG")
+    if catalog_filename:
+        catalog_versions = read_version_list(catalog_filename)
+    else:
+        catalog_versions = provisioning.known_releases(USOLC_HOME)
+    return provisioning.merge_versions(installed_versions, catalog_versions)
 
-def main():
+
+def ensure_solc_installed(version_chosen):
+    """
+    Installs the chosen version if it is missing, see provisioning.py
+    """
+    if provisioning.provision(USOLC_HOME, version_chosen) and flag_additional_info:
+        print("usolc: installed solc-" + version_chosen)
+
+def main(exec_solc=False):
+    """
+    exec_solc lets solc replace this process at the end of the invocation, which only
+    the process started for it may allow: not the daemon, nor callers of main()
+    """
+    global flag_exec_solc
+    flag_exec_solc = exec_solc
+    profiling.start(sys.argv[1:])
+    exit_code = compile_main()
+    profiling.finish(exit_code)
+    return exit_code
+
+
+def compile_main():
     global flag_additional_info    
-    valid_versions = fetch_supported_solc_versions()
+    with profiling.phase("list_versions"):
+        valid_versions = fetch_resolvable_solc_versions()
 
     try:
         flag_additional_info = False
-        [filename, version_selection_strategy, native_argv] = extract_arguments(sys.argv)
+        with profiling.phase("arguments"):
+            [filename, version_selection_strategy, native_argv] = extract_arguments(sys.argv)
         if flag_additional_info:
             print("#################################################")
             print("Available solc versions are: " + str(valid_versions))
 
-        version_chosen = choose_version_by_argument(valid_versions, filename,
+        if flag_watch:
+            if flag_standard_json:
+                print("Error: --watch cannot be used with --standard-json", file=sys.stderr)
+                return 1
+            import watch
+            return watch.watch(valid_versions, native_argv, version_selection_strategy)
+
+        if flag_standard_json:
+            try:
+                with profiling.phase("resolve"):
+                    version_chosen = choose_version_by_rules(valid_versions, stdjson_rules,
+                                                             version_selection_strategy)
+            except NoVersionAvailableBySol:
+                # no version accepts every source: compile each group of sources with its own
+                import stdjson_split
+                if not stdjson_split.splittable(stdjson_input):
+                    raise
+                return stdjson_split.compile_split(valid_versions, stdjson_input, native_argv,
+                                                   version_selection_strategy)
+        else:
+            version_chosen = choose_version_by_unit(valid_versions, native_argv,
                                                     version_selection_strategy)
-        completed_process = run_solc(version_chosen, native_argv)
+        profiling.annotate("version", version_chosen)
+        with profiling.phase("provision"):
+            ensure_solc_installed(version_chosen)
+        with profiling.phase("solc"):
+            completed_process = run_solc(version_chosen, native_argv)
         return completed_process.returncode
     except FileNotFoundError:
         print("Solidity file not found", file=sys.stderr)
@@ -379,7 +862,10 @@ def main():
         print("User's requirement: ", file=sys.stderr)
         print(e.user_rule, file=sys.stderr)
         return 1
+    except (ProvisioningError, JobKilledError) as e:
+        print("Error: " + str(e), file=sys.stderr)
+        return 1
 
 
 if __name__ == '__main__':
-    sys.exit(main())
+    sys.exit(main(exec_solc=True))
@@ -0,0 +1,344 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+"""
+ asyncio API of usolc, for services that compile from an event loop.
+
+     [version, output] = await usolc_async.compile({"A.sol": source}, strategy="^0.4.24+")
+     version = await usolc_async.resolve_version("contracts/A.sol")
+     async for [kind, source_name, contract_name, value] in usolc_async.compile_iter(sources):
+         ...
+
+ compile_iter() parses the output of solc while it is being written, see streaming.py, and
+ yields ["version", None, None, version] and then every error, source and contract as soon
+ as they are complete, so that memory stays flat whatever the size of the output. It reads
+ cached outputs but does not store new ones, which would mean holding them.
+
+ Versions are chosen exactly as the CLI chooses them. Choosing reads the sources, lists the
+ compilers, scans pragmas and may save the rule table, and the compile cache reads and writes
+ files under locks: all of this runs in the default executor of the loop, never on the loop
+ itself. Compilations go through
+ "solc-<version> --standard-json" spawned with asyncio.create_subprocess_exec, so no thread
+ is blocked while solc runs. A semaphore shared by the whole process bounds the number of
+ solc children ($USOLC_ASYNC_MAX_CONCURRENCY, the number of CPUs by default); the other
+ compilations wait for a slot. When a compilation times out or is cancelled, its solc child
+ is killed before the exception propagates.
+
+ Under admission control (see admission.py), solc is run by admission.run() in a thread of the
+ default executor instead, as waiting for the memory of the host cannot be done on the loop:
+ timeouts are enforced by admission.py, a cancelled compilation lets its solc run to its
+ limits, and compile_iter() parses the output once solc exited.
+
+ An event loop outlives its compilations, so importing this module enables the pool of warm
+ solc processes (see solc_pool.py) when USOLC_POOL_SIZE sets its size. Compilations without a
+ timeout then run on a warm solc, in a thread of the default executor, and compile_iter()
+ parses the output once solc exited; those with a timeout still spawn a solc they can kill.
+"""
+
+import os
+import json
+import time
+import asyncio
+import weakref
+import usolc
+import compile_cache
+import streaming
+import admission
+import solc_pool
+from exceptions.job_killed_error import JobKilledError
+from exceptions.solc_execution_error import SolcExecutionError
+
+DEFAULT_OUTPUT_SELECTION = {"*": {"*": ["abi", "evm.bytecode.object"]}}
+
+semaphores = weakref.WeakKeyDictionary()
+
+# an event loop runs compilation after compilation: warm solc processes get used
+solc_pool.enable()
+
+
+def max_concurrency():
+    try:
+        return int(os.environ.get("USOLC_ASYNC_MAX_CONCURRENCY", 0)) or os.cpu_count() or 1
+    except ValueError:
+        return os.cpu_count() or 1
+
+
+def concurrency_limit():
+    """
+    Returns the semaphore of the running event loop, shared by every compilation on that loop
+    """
+    loop = asyncio.get_running_loop()
+    if loop not in semaphores:
+        semaphores[loop] = asyncio.Semaphore(max_concurrency())
+    return semaphores[loop]
+
+
+def normalize_sources(sources):
+    """
+    Returns the "sources" of a standard-json input from a filename, a list of filenames, or a
+    dict mapping source names to their content (str) or to standard-json source entries (dict)
+    """
+    if isinstance(sources, str):
+        sources = [sources]
+
+    if isinstance(sources, dict):
+        return dict((name, value if isinstance(value, dict) else {"content": value})
+                    for name, value in sources.items())
+
+    normalized = {}
+    for filename in sources:
+        with open(filename, 'r', encoding='utf-8') as file:
+            normalized[filename] = {"content": file.read()}
+    return normalized
+
+
+def make_standard_json(sources, settings=None):
+    """
+    Returns the standard-json input of the sources, as bytes
+    """
+    settings = dict(settings or {})
+    settings.setdefault("outputSelection", DEFAULT_OUTPUT_SELECTION)
+    return json.dumps({
+        "language": "Solidity",
+        "sources": normalize_sources(sources),
+        "settings": settings,
+    }).encode("utf-8")
+
+
+async def resolve_version(sources, strategy=None, available_versions=None):
+    """
+    Returns the version usolc would compile the sources with
+    sources is a filename, as on the command line, or anything accepted by compile()
+    strategy is a user rule in the -U format, e.g. "^0.4.24-"
+    """
+    def choose():
+        versions = available_versions
+        if versions is None:
+            versions = usolc.fetch_resolvable_solc_versions()
+        if isinstance(sources, str):
+            # the imports and the inference of the CLI, not only the pragmas of the file
+            return usolc.choose_version_by_unit(versions, [sources], usolc.interpret_strategy_string(strategy))
+        return choose_version(make_standard_json(sources), strategy, versions)
+
+    return await asyncio.get_running_loop().run_in_executor(None, choose)
+
+
+def warm_pool(timeout):
+    """
+    Returns the pool of warm solc processes a compilation can run on, None if it spawns solc
+    """
+    if timeout is not None:
+        # a warm solc is driven from a thread, which cannot kill it on time
+        return None
+    return solc_pool.get_pool()
+
+
+def run_admitted(version_chosen, stdin_data, timeout=None):
+    """
+    Runs solc --standard-json with admission.run(), which blocks
+    Returns [returncode, stdout, stderr]; raises asyncio.TimeoutError once timeout runs out
+    """
+    import subprocess
+    start = time.monotonic()
+    try:
+        completed_process = admission.run([usolc.solc_binary(version_chosen), "--standard-json"], len(stdin_data),
+                                          stdin_data, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
+    except JobKilledError as e:
+        if timeout is not None and time.monotonic() - start >= timeout:
+            raise asyncio.TimeoutError()
+        return [e.returncode, e.stdout, e.stderr + ("Error: " + str(e) + "\n").encode("utf-8")]
+    return [completed_process.returncode, completed_process.stdout, completed_process.stderr]
+
+
+async def run_solc(version_chosen, stdin_data, timeout=None):
+    """
+    Runs solc --standard-json on the input, killing it on timeout or cancellation
+    Returns [returncode, stdout, stderr]
+    """
+    async with concurrency_limit():
+        if admission.governed():
+            return await asyncio.get_running_loop().run_in_executor(None, run_admitted, version_chosen,
+                                                                    stdin_data, timeout)
+        pool = warm_pool(timeout)
+        if pool is not None:
+            completed_process = await asyncio.get_running_loop().run_in_executor(
+                None, pool.run, usolc.solc_binary(version_chosen), ["--standard-json"], stdin_data)
+            return [completed_process.returncode, completed_process.stdout, completed_process.stderr]
+        process = await asyncio.create_subprocess_exec(
+            usolc.solc_binary(version_chosen), "--standard-json",
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(stdin_data), timeout)
+        except BaseException:
+            if process.returncode is None:
+                process.kill()
+            await process.wait()
+            raise
+
+    return [process.returncode, stdout, stderr]
+
+
+def choose_version(stdin_data, strategy, available_versions):
+    if available_versions is None:
+        available_versions = usolc.fetch_resolvable_solc_versions()
+    sol_rules = usolc.getrules_from_stdjson(stdin_data)
+    return usolc.choose_version_by_rules(available_versions, sol_rules, usolc.interpret_strategy_string(strategy))
+
+
+def prepare(sources, settings, strategy, available_versions):
+    """
+    Returns [standard-json input, version chosen for it]; blocks on files, to be run in an executor
+    """
+    stdin_data = make_standard_json(sources, settings)
+    return [stdin_data, choose_version(stdin_data, strategy, available_versions)]
+
+
+def cache_key(version_chosen, stdin_data):
+    """
+    Returns the cache key of a standard-json compilation, None if it is not to be cached
+    """
+    if not compile_cache.cache_enabled() or not usolc.stdjson_cacheable(stdin_data):
+        return None
+    return compile_cache.make_cache_key(version_chosen, ["--standard-json"], [], stdin_data)
+
+
+def lookup_cached(version_chosen, stdin_data):
+    """
+    Returns [cache key, cached [returncode, stdout, stderr] or None]; blocks, to be run in an executor
+    """
+    key = cache_key(version_chosen, stdin_data)
+    return [key, compile_cache.lookup(key) if key is not None else None]
+
+
+def store_cached(key, returncode, stdout, stderr):
+    try:
+        compile_cache.store(key, returncode, stdout, stderr)
+    except OSError:
+        pass
+
+
+async def compile(sources, strategy=None, settings=None, timeout=None, available_versions=None):
+    """
+    Compiles the sources with the version usolc chooses for them
+    settings are the standard-json settings, abi and bytecode are selected by default
+    Returns [version, standard-json output as a dict]; raises SolcExecutionError when solc fails
+    without producing an output, ProvisioningError when the version cannot be installed, and
+    asyncio.TimeoutError after timeout seconds
+    """
+    loop = asyncio.get_running_loop()
+    [stdin_data, version_chosen] = await loop.run_in_executor(None, prepare, sources, settings, strategy,
+                                                              available_versions)
+    [key, cached] = await loop.run_in_executor(None, lookup_cached, version_chosen, stdin_data)
+
+    if cached is not None:
+        [returncode, stdout, stderr] = cached
+    else:
+        # installing a missing compiler blocks on a lock and a download: keep it off the loop
+        await loop.run_in_executor(None, usolc.ensure_solc_installed, version_chosen)
+        [returncode, stdout, stderr] = await run_solc(version_chosen, stdin_data, timeout)
+        if key is not None and returncode >= 0:
+            await loop.run_in_executor(None, store_cached, key, returncode, stdout, stderr)
+
+    try:
+        output = json.loads(stdout.decode("utf-8"))
+    except ValueError:
+        output = None
+
+    if returncode != 0 or output is None:
+        raise SolcExecutionError(version_chosen, returncode, stderr.decode("utf-8", errors="replace"),
+                                 "solc {0} failed with exit code {1}".format(version_chosen, returncode))
+
+    return [version_chosen, output]
+
+
+def time_left(loop, deadline):
+    return None if deadline is None else max(0.0, deadline - loop.time())
+
+
+async def write_stdin(process, stdin_data):
+    try:
+        process.stdin.write(stdin_data)
+        await process.stdin.drain()
+        process.stdin.close()
+    except (BrokenPipeError, ConnectionResetError):
+        # solc stopped reading: its exit code and stderr tell why
+        pass
+
+
+async def compile_iter(sources, strategy=None, settings=None, timeout=None, available_versions=None):
+    """
+    Compiles the sources like compile(), yielding [kind, source name, contract name, value] as
+    the output is parsed: first ["version", None, None, version], then every "error", "source"
+    and "contract". Raises SolcExecutionError once the items parsed are yielded if solc failed
+    or its output is truncated; timeout bounds the whole compilation.
+    """
+    loop = asyncio.get_running_loop()
+    [stdin_data, version_chosen] = await loop.run_in_executor(None, prepare, sources, settings, strategy,
+                                                              available_versions)
+    yield ["version", None, None, version_chosen]
+
+    parser = streaming.JsonStreamParser(streaming.standard_json_selector)
+    key = cache_key(version_chosen, stdin_data)
+    cached = await loop.run_in_executor(None, compile_cache.open_entry, key) if key is not None else None
+
+    if cached is not None:
+        [returncode, entry, stdout_size, stderr_size] = cached
+        with entry:
+            remaining = stdout_size
+            while remaining > 0:
+                chunk = await loop.run_in_executor(None, entry.read, min(remaining, streaming.CHUNK_SIZE))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                for path, value in parser.feed(chunk):
+                    yield streaming.standard_json_item(path, value)
+            stderr = await loop.run_in_executor(None, entry.read, stderr_size)
+    else:
+        await loop.run_in_executor(None, usolc.ensure_solc_installed, version_chosen)
+        if admission.governed() or warm_pool(timeout) is not None:
+            [returncode, stdout, stderr] = await run_solc(version_chosen, stdin_data, timeout)
+            for position in range(0, len(stdout), streaming.CHUNK_SIZE):
+                for path, value in parser.feed(stdout[position:position + streaming.CHUNK_SIZE]):
+                    yield streaming.standard_json_item(path, value)
+        else:
+            deadline = None if timeout is None else loop.time() + timeout
+            async with concurrency_limit():
+                process = await asyncio.create_subprocess_exec(
+                    usolc.solc_binary(version_chosen), "--standard-json",
+                    stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+                tasks = [asyncio.ensure_future(write_stdin(process, stdin_data)),
+                         asyncio.ensure_future(process.stderr.read())]
+                try:
+                    while True:
+                        chunk = await asyncio.wait_for(process.stdout.read(streaming.CHUNK_SIZE),
+                                                       time_left(loop, deadline))
+                        if not chunk:
+                            break
+                        for path, value in parser.feed(chunk):
+                            yield streaming.standard_json_item(path, value)
+                    await asyncio.wait_for(asyncio.gather(*tasks), time_left(loop, deadline))
+                    stderr = tasks[1].result()
+                    returncode = await asyncio.wait_for(process.wait(), time_left(loop, deadline))
+                except BaseException:
+                    for task in tasks:
+                        task.cancel()
+                    if process.returncode is None:
+                        process.kill()
+                    await process.wait()
+                    raise
+
+    try:
+        items = parser.close()
+    except ValueError:
+        items = None
+    if returncode != 0 or items is None:
+        raise SolcExecutionError(version_chosen, returncode, stderr.decode("utf-8", errors="replace"),
+                                 "solc {0} failed with exit code {1}".format(version_chosen, returncode))
+    for path, value in items:
+        yield streaming.standard_json_item(path, value)
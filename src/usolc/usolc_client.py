@@ -0,0 +1,71 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+"""
+ Thin entry point used by bin/solc.
+
+ If a usolc daemon is listening (see usolc_server.py), the arguments, working directory and
+ environment are forwarded to it together with our stdin/stdout/stderr, and we simply wait
+ for the exit code. Otherwise usolc runs in this process, exactly as before. --watch always
+ runs in this process, as it lasts until interrupted from the terminal.
+
+ socket is only imported when a daemon may be listening, and a compilation run in this
+ process may end with solc replacing it (see usolc.exec_solc).
+"""
+
+import os
+import sys
+import usolc_protocol
+
+
+def run_in_daemon(socket_path, argv):
+    """
+    Returns the exit code of the compilation run by the daemon,
+    or None when no daemon is accepting connections
+    """
+    if not os.path.exists(socket_path):
+        return None
+
+    import socket
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            sock.connect(socket_path)
+        except OSError:
+            return None
+
+        usolc_protocol.send_request(sock, argv, os.getcwd(), os.environ,
+                                    [sys.stdin.fileno(), sys.stdout.fileno(), sys.stderr.fileno()])
+        return usolc_protocol.receive_exit_code(sock)
+    finally:
+        sock.close()
+
+
+def run_in_process():
+    import usolc
+    return usolc.main(exec_solc=True)
+
+
+def main():
+    if "--watch" in sys.argv[1:]:
+        return run_in_process()
+
+    try:
+        exit_code = run_in_daemon(usolc_protocol.default_socket_path(), sys.argv)
+    except ConnectionError as e:
+        print("usolc daemon failed: " + str(e), file=sys.stderr)
+        return 1
+
+    if exit_code is None:
+        exit_code = run_in_process()
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
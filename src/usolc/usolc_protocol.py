@@ -0,0 +1,114 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+"""
+ Wire format between the usolc client shim and the usolc daemon.
+
+ The client sends a single message together with its stdin, stdout and stderr file
+ descriptors (SCM_RIGHTS), so solc reads and writes the client's own streams directly:
+
+     <8 digit length> USOLC1 \\0 cwd \\0 argc \\0 argv... \\0 env...
+
+ argv and environment entries cannot contain NUL bytes, so NUL is a safe separator.
+ The daemon answers with the exit code as an ASCII line once the compilation is over.
+
+ This module only imports what the client needs, to keep the shim's startup short: socket is
+ imported by the functions that are handed one, once a daemon was found.
+"""
+
+import os
+import array
+
+PROTOCOL_MAGIC = b"USOLC1"
+LENGTH_DIGITS = 8
+MAX_FDS = 3
+
+
+def default_socket_path():
+    """
+    Socket of the daemon: $USOLC_SOCKET, or run/usolc.sock under $USOLC_HOME
+    """
+    path = os.environ.get("USOLC_SOCKET")
+    if path is None:
+        path = os.path.join(os.environ['USOLC_HOME'], "run", "usolc.sock")
+    return path
+
+
+def encode_request(argv, cwd, environ):
+    fields = [PROTOCOL_MAGIC, os.fsencode(cwd), str(len(argv)).encode("ascii")]
+    fields += [os.fsencode(arg) for arg in argv]
+    fields += [os.fsencode(key) + b"=" + os.fsencode(value) for key, value in environ.items()]
+    payload = b"\0".join(fields)
+    return str(len(payload)).zfill(LENGTH_DIGITS).encode("ascii") + payload
+
+
+def decode_request(payload):
+    """
+    Returns [argv, cwd, environ] from a payload produced by encode_request()
+    """
+    fields = payload.split(b"\0")
+    if fields[0] != PROTOCOL_MAGIC:
+        raise ValueError("Unknown usolc protocol")
+
+    cwd = os.fsdecode(fields[1])
+    argc = int(fields[2])
+    argv = [os.fsdecode(arg) for arg in fields[3:3 + argc]]
+    environ = {}
+    for entry in fields[3 + argc:]:
+        key, _, value = entry.partition(b"=")
+        environ[os.fsdecode(key)] = os.fsdecode(value)
+    return [argv, cwd, environ]
+
+
+def send_request(sock, argv, cwd, environ, fds):
+    import socket
+    sock.sendmsg([encode_request(argv, cwd, environ)],
+                 [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array("i", fds))])
+
+
+def receive_exactly(sock, size, ancillary_size=0):
+    """
+    Reads size bytes from the socket, collecting any file descriptors sent alongside
+    """
+    import socket
+    data = b""
+    fds = array.array("i")
+    while len(data) < size:
+        chunk, ancdata, _, _ = sock.recvmsg(size - len(data), ancillary_size)
+        if not chunk:
+            raise ConnectionError("usolc connection closed")
+        for level, kind, cmsg_data in ancdata:
+            if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+                fds.frombytes(cmsg_data[:len(cmsg_data) - (len(cmsg_data) % fds.itemsize)])
+        data += chunk
+    return [data, list(fds)]
+
+
+def receive_request(sock):
+    """
+    Returns [argv, cwd, environ, fds] sent by a client
+    """
+    import socket
+    [length, fds] = receive_exactly(sock, LENGTH_DIGITS, socket.CMSG_SPACE(MAX_FDS * 4))
+    [payload, more_fds] = receive_exactly(sock, int(length), socket.CMSG_SPACE(MAX_FDS * 4))
+    return decode_request(payload) + [fds + more_fds]
+
+
+def send_exit_code(sock, exit_code):
+    sock.sendall(str(exit_code).encode("ascii") + b"\n")
+
+
+def receive_exit_code(sock):
+    data = b""
+    while not data.endswith(b"\n"):
+        chunk = sock.recv(16)
+        if not chunk:
+            raise ConnectionError("usolc daemon closed the connection before finishing")
+        data += chunk
+    return int(data)
@@ -0,0 +1,160 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+"""
+ Long-lived usolc daemon.
+
+ The daemon imports usolc and warms its state (modules, installed versions, parsed rules)
+ once, then serves every client on a Unix socket. Each request is handled in a forked child
+ that inherits the warm state, takes over the client's stdin/stdout/stderr, working
+ directory and environment, and runs usolc.main() as the CLI would.
+
+     usolc daemon [--socket PATH]
+"""
+
+import io
+import os
+import sys
+import signal
+import socket
+import argparse
+import traceback
+import usolc
+import solc_pool
+import usolc_protocol
+
+
+def warm_up():
+    """
+    Loads everything a compilation needs so that forked children start warm
+    """
+    valid_versions = usolc.fetch_supported_solc_versions()
+    if valid_versions:
+        usolc.choose_version_by_strategy(valid_versions, usolc.interpret_strategy_string(None))
+    return valid_versions
+
+
+def handle_request(conn):
+    """
+    Runs in the forked child: executes one usolc invocation on behalf of a client
+    """
+    [argv, cwd, environ, fds] = usolc_protocol.receive_request(conn)
+    if len(fds) != 3:
+        raise ValueError("Expected stdin, stdout and stderr from the client")
+
+    for target_fd, client_fd in enumerate(fds):
+        os.dup2(client_fd, target_fd)
+        os.close(client_fd)
+
+    os.chdir(cwd)
+    os.environ.clear()
+    os.environ.update(environ)
+    sys.argv = argv
+
+    # the child exits after this one job: warm workers spawned here would never be used
+    solc_pool.long_lived = False
+
+    # buffer the streams the way the client's own interpreter would have
+    unbuffered = bool(environ.get("PYTHONUNBUFFERED"))
+    sys.stdin = open(0, 'r', encoding='utf-8', closefd=False)
+    if unbuffered:
+        sys.stdout = io.TextIOWrapper(open(1, 'wb', buffering=0, closefd=False),
+                                      encoding='utf-8', write_through=True)
+    else:
+        sys.stdout = open(1, 'w', encoding='utf-8', closefd=False,
+                          buffering=1 if os.isatty(1) else -1)
+    sys.stderr = open(2, 'w', encoding='utf-8', closefd=False, buffering=1)
+
+    try:
+        exit_code = usolc.main()
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else 1
+    except Exception:
+        traceback.print_exc()
+        exit_code = 1
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    usolc_protocol.send_exit_code(conn, exit_code)
+
+
+def serve_forever(server):
+    while True:
+        conn, _ = server.accept()
+        pid = os.fork()
+        if pid == 0:
+            exit_status = 0
+            try:
+                server.close()
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                handle_request(conn)
+            except BaseException:
+                traceback.print_exc()
+                exit_status = 1
+            finally:
+                os._exit(exit_status)
+        conn.close()
+
+
+def bind_socket(socket_path):
+    """
+    Binds the daemon socket, replacing a stale socket file left by a dead daemon
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(socket_path)), exist_ok=True)
+
+    if os.path.exists(socket_path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(socket_path)
+            raise OSError("A usolc daemon is already listening on " + socket_path)
+        except ConnectionRefusedError:
+            os.unlink(socket_path)
+        finally:
+            probe.close()
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen(128)
+    return server
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="usolc daemon",
+                                     description="Serve usolc compilations on a Unix socket")
+    parser.add_argument("--socket", default=None,
+                        help="socket path, $USOLC_SOCKET or $USOLC_HOME/run/usolc.sock by default")
+    args = parser.parse_args(argv)
+    socket_path = args.socket or usolc_protocol.default_socket_path()
+
+    try:
+        server = bind_socket(socket_path)
+    except OSError as e:
+        print("Error: " + str(e), file=sys.stderr)
+        return 1
+
+    valid_versions = warm_up()
+    print("usolc daemon listening on " + socket_path, file=sys.stderr)
+    print("Available solc versions are: " + str(valid_versions), file=sys.stderr)
+
+    # children are reaped automatically, we never wait for them
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    try:
+        serve_forever(server)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        try:
+            os.unlink(socket_path)
+        except OSError:
+            pass
+    return 0
@@ -0,0 +1,282 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+"""
+ Resolves version rules against a list of versions without re-parsing them.
+
+ The versions are parsed once into a table of (major, minor, patch) tuples sorted in
+ ascending order. A rule is turned into a union of intervals over that order (one per
+ "||" branch of the range), so that finding the satisfying versions, the newest or the
+ oldest one is a couple of binary searches. Parsed rules are memoized in a bounded LRU.
+
+ Versions that are not plain X.Y.Z (prereleases, malformed names) are rare in a solc
+ installation; they are kept aside and checked one by one with semver_engine.py.
+"""
+
+import re
+import bisect
+import functools
+import semver_engine
+
+PLAIN_VERSION = re.compile(r'^(0|[1-9][0-9]*)\.(0|[1-9][0-9]*)\.(0|[1-9][0-9]*)$')
+
+RULE_CACHE_SIZE = 1024
+INDEX_CACHE_SIZE = 16
+
+# bounds of an interval are (version tuple, inclusive); None means unbounded
+UNBOUNDED = None
+
+
+def parse_plain_version(version):
+    """
+    Returns (major, minor, patch) for a plain X.Y.Z version, None for anything else
+    """
+    version_match = PLAIN_VERSION.match(version)
+    if version_match is None:
+        return None
+    return (int(version_match.group(1)), int(version_match.group(2)), int(version_match.group(3)))
+
+
+def comparator_bounds(comparator):
+    """
+    Returns [lower, upper] bounds of a single comparator, as seen by plain versions
+    An empty comparator set is signalled by returning None
+    """
+    if comparator.version is None:
+        return [UNBOUNDED, UNBOUNDED]
+
+    version = comparator.version
+    key = (version.major, version.minor, version.patch)
+    operator = comparator.operator
+
+    if version.prerelease:
+        # X.Y.Z-pre sorts right below X.Y.Z, so to a plain version
+        # "<X.Y.Z-pre" and "<=X.Y.Z-pre" mean "<X.Y.Z", while ">" and ">=" mean ">=X.Y.Z"
+        if operator in ("<", "<="):
+            return [UNBOUNDED, (key, False)]
+        if operator in (">", ">="):
+            return [(key, True), UNBOUNDED]
+        return None
+
+    if operator == "=":
+        return [(key, True), (key, True)]
+    if operator == ">":
+        return [(key, False), UNBOUNDED]
+    if operator == ">=":
+        return [(key, True), UNBOUNDED]
+    if operator == "<":
+        return [UNBOUNDED, (key, False)]
+    if operator == "<=":
+        return [UNBOUNDED, (key, True)]
+    raise ValueError("Invalid operator: {}".format(operator))
+
+
+def tighter_lower(first, second):
+    if first is UNBOUNDED:
+        return second
+    if second is UNBOUNDED:
+        return first
+    if first[0] != second[0]:
+        return first if first[0] > second[0] else second
+    return first if not first[1] else second
+
+
+def tighter_upper(first, second):
+    if first is UNBOUNDED:
+        return second
+    if second is UNBOUNDED:
+        return first
+    if first[0] != second[0]:
+        return first if first[0] < second[0] else second
+    return first if not first[1] else second
+
+
+@functools.lru_cache(maxsize=RULE_CACHE_SIZE)
+def parse_rule_intervals(rule_text, loose):
+    """
+    Parses a rule into a tuple of (lower, upper) intervals, one per "||" branch
+    Returns None when the rule is not a valid range, which satisfies no version
+    """
+    try:
+        comparator_sets = semver_engine.parse_range(rule_text, loose)
+    except ValueError:
+        return None
+
+    intervals = []
+    for comparator_set in comparator_sets:
+        lower = UNBOUNDED
+        upper = UNBOUNDED
+        for comparator in comparator_set:
+            bounds = comparator_bounds(comparator)
+            if bounds is None:
+                break
+            lower = tighter_lower(lower, bounds[0])
+            upper = tighter_upper(upper, bounds[1])
+        else:
+            intervals.append((lower, upper))
+
+    return tuple(intervals)
+
+
+def merge_ranges(ranges):
+    """
+    Sorts [start, end) slices and merges the overlapping ones
+    """
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def intersect_ranges(first, second):
+    """
+    Intersects two sorted lists of disjoint [start, end) slices
+    """
+    result = []
+    i = j = 0
+    while i < len(first) and j < len(second):
+        start = max(first[i][0], second[j][0])
+        end = min(first[i][1], second[j][1])
+        if start < end:
+            result.append([start, end])
+        if first[i][1] < second[j][1]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+
+class VersionIndex(object):
+    """
+    Sorted table of a version list, answering rule queries with binary searches.
+
+    Queries work on selections, [ranges, irregular], where ranges are disjoint [start, end)
+    slices of the sorted table and irregular holds the [position, version] pairs of the
+    versions that could not be put in the table. Narrowing a selection by several rules
+    in a row intersects slices and never walks the versions themselves.
+    """
+
+    def __init__(self, versions):
+        plain = []
+        self.irregular = []
+        for position, version in enumerate(versions):
+            key = parse_plain_version(version)
+            if key is None:
+                self.irregular.append([position, version])
+            else:
+                plain.append((key, position, version))
+
+        plain.sort()
+        self.keys = tuple(entry[0] for entry in plain)
+        self.positions = tuple(entry[1] for entry in plain)
+        self.versions = tuple(entry[2] for entry in plain)
+
+    def index_ranges(self, rule_text, loose):
+        """
+        Returns the sorted, disjoint [start, end) slices of the table that satisfy the rule
+        """
+        intervals = parse_rule_intervals(rule_text, loose)
+        if intervals is None:
+            return []
+
+        ranges = []
+        for lower, upper in intervals:
+            if lower is UNBOUNDED:
+                start = 0
+            elif lower[1]:
+                start = bisect.bisect_left(self.keys, lower[0])
+            else:
+                start = bisect.bisect_right(self.keys, lower[0])
+
+            if upper is UNBOUNDED:
+                end = len(self.keys)
+            elif upper[1]:
+                end = bisect.bisect_right(self.keys, upper[0])
+            else:
+                end = bisect.bisect_left(self.keys, upper[0])
+
+            if start < end:
+                ranges.append([start, end])
+        return merge_ranges(ranges)
+
+    def select_all(self):
+        return [[[0, len(self.keys)]] if self.keys else [], list(self.irregular)]
+
+    def narrow(self, selection, rule_text, loose=False):
+        """
+        Keeps the versions of the selection that satisfy the rule
+        """
+        [ranges, irregular] = selection
+        ranges = intersect_ranges(ranges, self.index_ranges(rule_text, loose))
+        irregular = [[position, version] for position, version in irregular
+                     if semver_engine.satisfies(version, rule_text, loose=loose)]
+        return [ranges, irregular]
+
+    def is_empty(self, selection):
+        return not selection[0] and not selection[1]
+
+    def selected_versions(self, selection):
+        """
+        Returns the versions of the selection, in the order of the original list
+        """
+        [ranges, irregular] = selection
+        matches = list(irregular)
+        for start, end in ranges:
+            matches += [[self.positions[i], self.versions[i]] for i in range(start, end)]
+        matches.sort()
+        return [version for _, version in matches]
+
+    def newest(self, selection):
+        [ranges, irregular] = selection
+        best = self.versions[ranges[-1][1] - 1] if ranges else None
+        for _, version in irregular:
+            if best is None or semver_engine.gt(version, best, loose=True):
+                best = version
+        return best
+
+    def oldest(self, selection):
+        [ranges, irregular] = selection
+        best = self.versions[ranges[0][0]] if ranges else None
+        for _, version in irregular:
+            if best is None or semver_engine.gt(best, version, loose=True):
+                best = version
+        return best
+
+    def filter(self, rule_text, loose=False):
+        """
+        Returns the versions satisfying the rule, in the order of the original list
+        """
+        return self.selected_versions(self.narrow(self.select_all(), rule_text, loose))
+
+    def max_satisfying(self, rule_text, loose=True):
+        """
+        Returns the newest version satisfying the rule, None if there is none
+        """
+        return self.newest(self.narrow(self.select_all(), rule_text, loose))
+
+    def min_satisfying(self, rule_text, loose=False):
+        """
+        Returns the oldest version satisfying the rule, None if there is none
+        """
+        return self.oldest(self.narrow(self.select_all(), rule_text, loose))
+
+
+@functools.lru_cache(maxsize=INDEX_CACHE_SIZE)
+def cached_version_index(versions):
+    return VersionIndex(versions)
+
+
+def get_version_index(versions):
+    """
+    Returns the index of a version list, building it only the first time the list is seen
+    """
+    return cached_version_index(tuple(versions))
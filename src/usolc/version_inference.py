@@ -0,0 +1,248 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+"""
+ Infers the versions that compile sources without any pragma, by asking the compilers.
+
+ Enabled with --infer-version or USOLC_INFER_VERSION=1. When no file of the compilation unit
+ has a pragma, the installed versions satisfying the user's range are probed, oldest first,
+ with compilations that only ask for the AST: exit code 0 means the version parses and
+ analyses the sources. The versions that compile a given source form one contiguous range
+ (language changes are not undone), which is searched in rounds of k probes run in parallel:
+
+     * the first round spreads k probes over the whole list;
+     * once a version passes, the two ends of the range lie in the gaps between the outermost
+       passing probes and their failing neighbours, and every round cuts both gaps k-ways;
+     * while none passes, every round spreads k probes over the versions not probed yet.
+
+ so that a range is found in about log(n) / log(k / 2 + 1) rounds. The unit is then compiled
+ with the rule ">=lowest <=highest", like a pragma would have required.
+
+ The outcome of every probe is kept in $USOLC_CACHE_DIR/inference.json, keyed by a hash of
+ the content of the unit and of the probe arguments: a unit is only searched once, and a newly
+ installed compiler only costs the probes it takes to place it.
+
+     USOLC_INFER_JOBS    probes run in parallel (default: number of CPUs)
+"""
+
+import os
+import json
+import time
+import tempfile
+import subprocess
+import concurrent.futures
+import semver_engine
+import usolc
+import rule_table
+import import_graph
+import compile_cache
+import admission
+from exceptions.job_killed_error import JobKilledError
+from exceptions.noversion_available_by_sol import NoVersionAvailableBySol
+
+PROBE_TIMEOUT_SECONDS = 120
+MAX_INFERENCE_ENTRIES = 10000
+
+# the AST-only output of the versions matching each rule, the first match wins
+PROBE_OPTIONS = [
+    [">=0.8.0", ["--ast-compact-json"]],
+    ["*", ["--ast-json"]],
+]
+
+
+def inference_jobs():
+    try:
+        return max(1, int(os.environ.get("USOLC_INFER_JOBS", 0)) or os.cpu_count() or 1)
+    except ValueError:
+        return os.cpu_count() or 1
+
+
+def inference_filename():
+    return os.path.join(compile_cache.cache_dir(), "inference.json")
+
+
+def load_inferences():
+    try:
+        with open(inference_filename(), 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_inference(key, outcomes):
+    """
+    Merges the outcomes of a unit into the inference file; failing to do so is not an error
+    """
+    inferences = load_inferences()
+    inferences[key] = {"seen": time.time(), "outcomes": outcomes}
+    if len(inferences) > MAX_INFERENCE_ENTRIES:
+        newest = sorted(inferences.items(), key=lambda item: item[1]["seen"], reverse=True)
+        inferences = dict(newest[:MAX_INFERENCE_ENTRIES])
+
+    try:
+        directory = os.path.dirname(inference_filename())
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-inference-")
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            json.dump(inferences, file)
+        os.replace(tmp_path, inference_filename())
+    except OSError:
+        pass
+
+
+def probe_arguments(native_argv):
+    """
+    The arguments locating the sources (files, remappings, allowed paths), without the outputs asked for
+    """
+    arguments = [arg for arg in native_argv if not arg.startswith("-") and usolc.PREFIX_FILELOC.match(arg)]
+    allow_paths = import_graph.parse_allow_paths(native_argv)
+    if allow_paths:
+        arguments += ["--allow-paths", ",".join(allow_paths)]
+    return arguments + usolc.extract_source_files(native_argv)
+
+
+def unit_key(arguments, graph):
+    """
+    Hash of the probe arguments and of the content of every file of the unit
+    """
+    sources = [[filename, compile_cache.hash_file(filename)] for filename in sorted(graph)]
+    return compile_cache.hash_bytes(json.dumps([arguments, sources]).encode("utf-8"))
+
+
+def probe_options(version):
+    for rule, options in PROBE_OPTIONS:
+        if semver_engine.satisfies(version, rule, loose=True):
+            return options
+    return []
+
+
+def run_probe(version, arguments):
+    """
+    Returns whether solc-<version> parses and analyses the sources
+    """
+    command = [usolc.solc_binary(version)] + probe_options(version) + arguments
+    try:
+        if admission.governed():
+            completed_process = admission.run(command, usolc.job_input_size(arguments, None), b"",
+                                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                              timeout=PROBE_TIMEOUT_SECONDS)
+        else:
+            completed_process = subprocess.run(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                               stderr=subprocess.DEVNULL, timeout=PROBE_TIMEOUT_SECONDS)
+    except (OSError, subprocess.TimeoutExpired, JobKilledError):
+        return False
+    return completed_process.returncode == 0
+
+
+def spread(candidates, count):
+    """
+    Picks up to count of the candidates, evenly spaced and including both ends
+    """
+    if len(candidates) <= count:
+        return list(candidates)
+    if count == 1:
+        return [candidates[len(candidates) // 2]]
+    return sorted(set(candidates[(len(candidates) - 1) * i // (count - 1)] for i in range(count)))
+
+
+def cut(low, high, count):
+    """
+    Picks up to count positions strictly between low and high, cutting the gap into equal parts
+    """
+    return sorted(set(low + (high - low) * i // (count + 1) for i in range(1, count + 1)) - {low, high})
+
+
+def next_probes(size, outcomes, k):
+    """
+    Returns the positions to probe in the next round, [] once the range is known or none is left
+    """
+    passing = [position for position, passed in outcomes.items() if passed]
+    if not passing:
+        return spread([position for position in range(size) if position not in outcomes], k)
+
+    [low, high] = compatible_range(outcomes)
+    failing_above = min([position for position in outcomes if position > high] + [size])
+    failing_below = max([position for position in outcomes if position < low] + [-1])
+    gaps = [[gap_low, gap_high] for gap_low, gap_high in [[high, failing_above], [failing_below, low]]
+            if gap_high - gap_low > 1]
+    if not gaps:
+        return []
+
+    probes = []
+    per_gap = max(1, k // len(gaps))
+    for gap_low, gap_high in gaps[:k]:
+        probes += cut(gap_low, gap_high, per_gap)
+    return probes
+
+
+def compatible_range(outcomes):
+    """
+    Returns [lowest, highest] passing positions of the range around the newest passing version
+    """
+    high = max(position for position, passed in outcomes.items() if passed)
+    failing_below = max([position for position, passed in outcomes.items() if position < high and not passed] + [-1])
+    low = min(position for position, passed in outcomes.items() if passed and position > failing_below)
+    return [low, high]
+
+
+def search(versions, probe, k, outcomes=None):
+    """
+    Finds the range of versions, oldest first, for which probe(version) is true
+    Returns [[lowest, highest] or None, outcomes by version, rounds]
+    """
+    position_of = dict((version, position) for position, version in enumerate(versions))
+    known = dict((position_of[version], passed) for version, passed in (outcomes or {}).items()
+                 if version in position_of)
+    rounds = 0
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=k) as executor:
+        while True:
+            probes = next_probes(len(versions), known, k)
+            if not probes:
+                break
+            rounds += 1
+            for position, passed in zip(probes, executor.map(probe, [versions[position] for position in probes])):
+                known[position] = passed
+
+    outcomes = dict((versions[position], passed) for position, passed in known.items())
+    if not any(known.values()):
+        return [None, outcomes, rounds]
+    [low, high] = compatible_range(known)
+    return [[versions[low], versions[high]], outcomes, rounds]
+
+
+def range_rule(lowest, highest):
+    if lowest == highest:
+        return "=" + lowest
+    return ">=" + lowest + " <=" + highest
+
+
+def infer_rules(native_argv, version_selection_strategy):
+    """
+    Returns the rules of a unit whose files have no pragma, found by probing the installed versions
+    """
+    installed_versions = usolc.fetch_supported_solc_versions()
+    table = rule_table.get_table(installed_versions)
+    candidates = table.selected_versions(table.narrow(table.select_all(), version_selection_strategy[0], loose=True))
+
+    arguments = probe_arguments(native_argv)
+    key = unit_key(arguments, usolc.build_unit_graph(native_argv))
+    entry = load_inferences().get(key, {})
+    [found, outcomes, rounds] = search(candidates, lambda version: run_probe(version, arguments),
+                                       inference_jobs(), entry.get("outcomes"))
+    if rounds or not entry:
+        save_inference(key, dict(entry.get("outcomes", {}), **outcomes))
+
+    if usolc.flag_additional_info:
+        print("Inferred solc versions: " + (" - ".join(found) if found else "none") +
+              " (" + str(rounds) + " rounds of probes)")
+    if found is None:
+        raise NoVersionAvailableBySol(installed_versions, "(inferred) none of " + str(candidates),
+                                      "No installed solc version compiles the sources")
+    return [range_rule(found[0], found[1])]
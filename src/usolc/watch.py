@@ -0,0 +1,333 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+"""
+ Watch mode: solc ... --watch keeps running and recompiles whenever a source changes.
+
+ Every input file is compiled as its own unit, with the other arguments unchanged. The files
+ of each unit (its import closure, see import_graph.py) are watched with inotify, or by
+ polling their mtime and size when inotify is not available or USOLC_WATCH_POLL=1.
+ Bursts of saves are merged: a round starts once no change was seen for
+ USOLC_WATCH_DEBOUNCE_MS (100 ms by default).
+
+ On every round only the units importing a changed file are recompiled. Their graphs are
+ rebuilt from the persistent constraint cache, so only the edited files are scanned again,
+ and their version is only resolved again when their rules changed.
+"""
+
+import os
+import sys
+import time
+import errno
+import ctypes
+import select
+import struct
+import import_graph
+import usolc
+from exceptions.noversion_available_by_sol import NoVersionAvailableBySol
+from exceptions.noversion_available_by_user import NoVersionAvailableByUser
+from exceptions.provisioning_error import ProvisioningError
+from exceptions.job_killed_error import JobKilledError
+
+DEFAULT_DEBOUNCE_MS = 100
+DEFAULT_POLL_INTERVAL_MS = 500
+
+# from linux/inotify.h
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def environment_seconds(name, default_ms):
+    try:
+        return max(0, int(os.environ.get(name, default_ms))) / 1000.0
+    except ValueError:
+        return default_ms / 1000.0
+
+
+def file_state(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class PollingWatcher(object):
+    """
+    Notices changes by comparing the mtime and size of the files
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.states = {}
+
+    def watch(self, paths):
+        self.states = dict((path, self.states[path] if path in self.states else file_state(path))
+                           for path in paths)
+
+    def scan(self):
+        changed = set()
+        for path, state in self.states.items():
+            current = file_state(path)
+            if current != state:
+                self.states[path] = current
+                changed.add(path)
+        return changed
+
+    def wait(self, timeout=None):
+        """
+        Returns the files that changed, or an empty set once the timeout is over
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            changed = self.scan()
+            if changed:
+                return changed
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return changed
+            time.sleep(self.interval if remaining is None else min(self.interval, remaining))
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher(object):
+    """
+    Watches the directories of the files, which also sees editors saving through a rename
+    """
+
+    def __init__(self):
+        self.libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.directories = {}
+        self.paths = set()
+
+    def watch(self, paths):
+        self.paths = set(paths)
+        directories = set(os.path.dirname(path) for path in self.paths)
+
+        for directory in set(self.directories) - directories:
+            self.libc.inotify_rm_watch(self.fd, self.directories.pop(directory))
+        for directory in directories - set(self.directories):
+            descriptor = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+            if descriptor >= 0:
+                self.directories[directory] = descriptor
+            elif ctypes.get_errno() not in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                raise OSError(ctypes.get_errno(), "inotify_add_watch failed on " + directory)
+
+    def read_events(self):
+        changed = set()
+        names = dict((descriptor, directory) for directory, descriptor in self.directories.items())
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(data):
+                [descriptor, mask, _, length] = EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0")
+                offset += EVENT_HEADER.size + length
+                if mask & IN_Q_OVERFLOW:
+                    changed.update(self.paths)
+                elif descriptor in names and name:
+                    changed.add(os.path.join(names[descriptor], os.fsdecode(name)))
+
+    def wait(self, timeout=None):
+        """
+        Returns the watched files that changed, or an empty set once the timeout is over
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            ready, _, _ = select.select([self.fd], [], [], remaining)
+            if not ready:
+                if deadline is not None:
+                    return set()
+                continue
+            changed = self.read_events() & self.paths
+            if changed:
+                return changed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def make_watcher():
+    """
+    Returns an inotify watcher, or a polling one when inotify is unavailable or not wanted
+    """
+    if os.environ.get("USOLC_WATCH_POLL", "").lower() not in ("", "0", "false", "no", "off"):
+        return PollingWatcher(environment_seconds("USOLC_WATCH_POLL_INTERVAL_MS", DEFAULT_POLL_INTERVAL_MS))
+    try:
+        return InotifyWatcher()
+    except (OSError, AttributeError):
+        return PollingWatcher(environment_seconds("USOLC_WATCH_POLL_INTERVAL_MS", DEFAULT_POLL_INTERVAL_MS))
+
+
+def wait_for_changes(watcher, debounce, timeout=None):
+    """
+    Waits for a change, then keeps collecting changes until none came for debounce seconds
+    """
+    changed = watcher.wait(timeout)
+    while changed:
+        more = watcher.wait(debounce)
+        if not more:
+            break
+        changed |= more
+    return changed
+
+
+def unit_arguments(native_argv, unit):
+    """
+    Returns the arguments of solc with unit as the only input file
+    """
+    unit_argv = []
+    expecting_native_option = False
+
+    for arg in native_argv:
+        if expecting_native_option:
+            expecting_native_option = False
+        elif arg in usolc.SOLC_ARGUMENTS_WITH_OPTIONS:
+            expecting_native_option = True
+        elif arg[0] != "-" and usolc.PREFIX_FILELOC.match(arg) is None and arg != unit:
+            continue
+        unit_argv.append(arg)
+
+    return unit_argv
+
+
+def compile_unit(version_chosen, unit_argv):
+    """
+    Compiles a unit the way a regular invocation would
+    Returns the exit code of solc
+    """
+    usolc.ensure_solc_installed(version_chosen)
+    return usolc.run_solc(version_chosen, unit_argv).returncode
+
+
+class WatchSession(object):
+    """
+    The units being watched, with the files, rules and version of each
+    """
+
+    def __init__(self, available_versions, native_argv, version_selection_strategy, compiler=compile_unit):
+        self.available_versions = available_versions
+        self.native_argv = native_argv
+        self.version_selection_strategy = version_selection_strategy
+        self.compiler = compiler
+        self.remappings = import_graph.parse_remappings(native_argv, usolc.PREFIX_FILELOC)
+        self.allow_paths = import_graph.parse_allow_paths(native_argv)
+        self.units = dict((unit, {"files": set([os.path.abspath(unit)]), "rules": None, "version": None})
+                          for unit in usolc.extract_source_files(native_argv))
+
+    def watched_files(self):
+        files = set()
+        for state in self.units.values():
+            files |= state["files"]
+        return files
+
+    def affected_units(self, changed):
+        return [unit for unit, state in self.units.items() if state["files"] & changed]
+
+    def resolve(self, unit):
+        """
+        Rebuilds the graph of the unit and resolves its version again if its rules changed
+        """
+        state = self.units[unit]
+        graph = import_graph.build_import_graph([unit], self.remappings, self.allow_paths)
+
+        files = set()
+        for filename, [_, imports] in graph.items():
+            files.add(os.path.abspath(filename))
+            # imports that do not exist yet are watched too, solc will read them once created
+            files.update(os.path.abspath(path) for path in imports)
+        state["files"] = files
+
+        rules = import_graph.unit_rules(graph) or ["*"]
+        if rules != state["rules"] or state["version"] is None:
+            state["version"] = None
+            state["rules"] = rules
+            state["version"] = usolc.choose_version_by_rules(self.available_versions, rules,
+                                                             self.version_selection_strategy)
+        return state["version"]
+
+    def build(self, unit):
+        """
+        Resolves and compiles one unit, reporting errors without stopping the session
+        Returns the exit code of the compilation
+        """
+        try:
+            version_chosen = self.resolve(unit)
+            returncode = self.compiler(version_chosen, unit_arguments(self.native_argv, unit))
+        except FileNotFoundError:
+            print("usolc watch: " + unit + ": Solidity file not found", file=sys.stderr)
+            return 1
+        except (NoVersionAvailableBySol, NoVersionAvailableByUser) as e:
+            print("usolc watch: " + unit + ": no solc version satisfies " + str(e.sol_rule), file=sys.stderr)
+            return 1
+        except (ProvisioningError, JobKilledError) as e:
+            print("usolc watch: " + unit + ": Error: " + str(e), file=sys.stderr)
+            return 1
+
+        print("usolc watch: {0}: solc {1}, exit code {2}".format(unit, version_chosen, returncode),
+              file=sys.stderr)
+        return returncode
+
+    def build_all(self):
+        return [self.build(unit) for unit in self.units]
+
+
+def run(session, watcher, debounce, rounds=None):
+    """
+    Compiles every unit, then recompiles the affected ones on every change
+    Stops after the given number of rounds, or never
+    """
+    session.build_all()
+    done = 0
+    while rounds is None or done < rounds:
+        watcher.watch(session.watched_files())
+        changed = wait_for_changes(watcher, debounce)
+        for unit in session.affected_units(changed):
+            session.build(unit)
+        done += 1
+
+
+def watch(available_versions, native_argv, version_selection_strategy):
+    """
+    Entry point of --watch, runs until interrupted
+    """
+    session = WatchSession(available_versions, native_argv, version_selection_strategy)
+    if not session.units:
+        print("Error: --watch needs Solidity files to watch", file=sys.stderr)
+        return 1
+
+    watcher = make_watcher()
+    try:
+        run(session, watcher, environment_seconds("USOLC_WATCH_DEBOUNCE_MS", DEFAULT_DEBOUNCE_MS))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+    return 0
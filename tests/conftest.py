@@ -0,0 +1,87 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+import os
+import sys
+import pytest
+
+# A stand-in for a solc binary: logs every invocation, echoes stdin back in --standard-json mode,
+# emits the contracts declared in its input files for --combined-json, and fails on files
+# containing STUB_SYNTAX_ERROR
+STUB_SOLC = """#!{python}
+import os
+import re
+import sys
+import json
+
+args = sys.argv[1:]
+with open({log!r}, "a") as log:
+    log.write(" ".join(sys.argv) + "\\n")
+
+if "--standard-json" in args:
+    sys.stdout.write(sys.stdin.read())
+    sys.exit(0)
+
+files = [arg for arg in args if os.path.isfile(arg)]
+contents = dict((filename, open(filename).read()) for filename in files)
+for filename, content in contents.items():
+    if "STUB_SYNTAX_ERROR" in content:
+        sys.stderr.write(filename + ": Error: stub syntax error\\n")
+        sys.exit(1)
+
+if "--combined-json" in args:
+    contracts = {{}}
+    for filename, content in contents.items():
+        for name in re.findall(r"contract\\s+(\\w+)", content):
+            contracts[filename + ":" + name] = {{"abi": "[]", "bin": "{version}"}}
+    print(json.dumps({{"contracts": contracts, "version": "{version}"}}))
+    sys.exit(0)
+
+print("stub solc {version}: " + " ".join(args))
+sys.stderr.write("stub warning\\n")
+"""
+
+
+def make_stub_solc(usolc_home, version):
+    """
+    Installs a stub solc-<version> binary under usolc_home/bin
+    """
+    bin_dir = os.path.join(str(usolc_home), "bin")
+    os.makedirs(bin_dir, exist_ok=True)
+    path = os.path.join(bin_dir, "solc-" + version)
+    with open(path, "w") as stub:
+        stub.write(STUB_SOLC.format(python=sys.executable, version=version,
+                                    log=os.path.join(str(usolc_home), "invocations.log")))
+    os.chmod(path, 0o755)
+    return path
+
+
+def stub_invocations(usolc_home):
+    """
+    Returns the number of times any stub solc under usolc_home was run
+    """
+    try:
+        with open(os.path.join(str(usolc_home), "invocations.log")) as log:
+            return len(log.readlines())
+    except FileNotFoundError:
+        return 0
+
+
+@pytest.fixture
+def stub_usolc_home(tmp_path, monkeypatch):
+    """
+    A USOLC_HOME containing stub compilers, with the cache kept inside of it
+    """
+    import usolc
+    for version in ["0.4.24", "0.4.25", "0.5.0"]:
+        make_stub_solc(tmp_path, version)
+    monkeypatch.setattr(usolc, "USOLC_HOME", str(tmp_path))
+    monkeypatch.setenv("USOLC_HOME", str(tmp_path))
+    monkeypatch.setenv("USOLC_CACHE_DIR", str(tmp_path / "cache"))
+    return tmp_path
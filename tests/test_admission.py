@@ -0,0 +1,209 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+import os
+import sys
+import json
+import time
+import signal
+import threading
+import subprocess
+import pytest
+
+import usolc
+import admission
+from exceptions.job_killed_error import JobKilledError
+
+# sleeps for the number of seconds given on stdin, or allocates as many MB as the source says, or crashes
+GREEDY_SOLC = """#!{python}
+import os
+import re
+import sys
+import time
+import signal
+
+args = sys.argv[1:]
+if "--standard-json" in args:
+    data = sys.stdin.buffer.read()
+    time.sleep(float(data or 0))
+    sys.stdout.buffer.write(data)
+    sys.exit(0)
+
+source = open(args[-1]).read()
+if "crashes" in source:
+    os.kill(os.getpid(), signal.SIGSEGV)
+
+megabytes = int(re.search(r"allocates (\\d+)", source).group(1))
+blocks = []
+try:
+    # touched, as solc grows its structures
+    for _ in range(megabytes // 10):
+        blocks.append(b"x" * (10 * 1024 * 1024))
+except MemoryError:
+    # what solc does on std::bad_alloc
+    sys.stderr.write("terminate called after throwing an instance of 'std::bad_alloc'\\n")
+    sys.stderr.flush()
+    os.abort()
+print("allocated", len(blocks) * 10)
+"""
+
+
+@pytest.fixture
+def greedy_home(tmp_path, monkeypatch):
+    """ A USOLC_HOME with a greedy solc-0.4.25, and an admission directory of its own """
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    binary = bin_dir / "solc-0.4.25"
+    binary.write_text(GREEDY_SOLC.format(python=sys.executable))
+    binary.chmod(0o755)
+    monkeypatch.setattr(usolc, "USOLC_HOME", str(tmp_path))
+    monkeypatch.setenv("USOLC_HOME", str(tmp_path))
+    monkeypatch.setenv("USOLC_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("USOLC_ADMISSION_DIR", str(tmp_path / "admission"))
+    for name in ["USOLC_MEMORY_BUDGET_MB", "USOLC_JOB_MEMORY_MB", "USOLC_JOB_TIMEOUT", "USOLC_JOB_ESTIMATE_MB",
+                 "USOLC_CACHE", "USOLC_COORDINATOR", "USOLC_POOL_SIZE"]:
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def greedy_source(megabytes):
+    with open("Greedy.sol", "w") as source:
+        source.write("pragma solidity ^0.4.24;\n// allocates {0}\ncontract Greedy {{}}\n".format(megabytes))
+    return "Greedy.sol"
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_governed(greedy_home, monkeypatch):
+    assert(not admission.governed())
+    monkeypatch.setenv("USOLC_JOB_TIMEOUT", "0")
+    assert(not admission.governed())
+    monkeypatch.setenv("USOLC_JOB_TIMEOUT", "60")
+    assert(admission.governed())
+
+
+def test_estimate(greedy_home, monkeypatch):
+    """ Test the estimate follows the peaks recorded for the version and the size of the input """
+    monkeypatch.setenv("USOLC_JOB_ESTIMATE_MB", "100")
+    assert(admission.estimate_kb("0.4.25", 5000) == 100 * 1024)
+
+    admission.record_peak("0.4.25", 5000, 30000)
+    admission.record_peak("0.4.25", 6000, 20000)
+    admission.record_peak("0.4.25", 1 << 20, 900000)
+    assert(admission.estimate_kb("0.4.25", 4100) == 30000)
+    assert(admission.estimate_kb("0.4.25", 1000) == 30000)
+    assert(admission.estimate_kb("0.4.25", 1 << 30) == 900000)
+    assert(admission.estimate_kb("0.4.25", 1 << 15) == 100 * 1024)
+    assert(admission.estimate_kb("0.5.0", 5000) == 100 * 1024)
+
+    # a job cannot be expected to use more than its limit
+    monkeypatch.setenv("USOLC_JOB_MEMORY_MB", "10")
+    assert(admission.estimate_kb("0.4.25", 1 << 20) == 10 * 1024)
+
+    for peak in range(admission.HISTORY_SIZE):
+        admission.record_peak("0.4.25", 5000, 1000 + peak)
+    assert(admission.estimate_kb("0.4.25", 5000) == 1000 + admission.HISTORY_SIZE - 1)
+
+
+def test_run_records_peak(greedy_home, monkeypatch):
+    """ Test a job runs as subprocess.run would, and its peak RSS is kept for the next estimates """
+    monkeypatch.setenv("USOLC_MEMORY_BUDGET_MB", "1000")
+    binary = str(greedy_home / "bin" / "solc-0.4.25")
+    completed_process = admission.run([binary, "--standard-json"], 1, b"0", stdout=subprocess.PIPE,
+                                      stderr=subprocess.PIPE)
+    assert([completed_process.returncode, completed_process.stdout, completed_process.stderr] == [0, b"0", b""])
+
+    with open(str(greedy_home / "admission" / "history.json")) as history:
+        [peak] = json.load(history)["0.4.25"]["1"]
+    assert(0 < peak < 200 * 1024)
+    with open(str(greedy_home / "admission" / "jobs.json")) as ledger:
+        assert(json.load(ledger) == {})
+
+
+def test_admission_waits_for_memory(greedy_home, monkeypatch):
+    """ Test a job waits while it does not fit next to the running ones, which dead processes leave """
+    monkeypatch.setenv("USOLC_MEMORY_BUDGET_MB", "100")
+    monkeypatch.setenv("USOLC_JOB_ESTIMATE_MB", "60")
+    ledger_path = str(greedy_home / "admission" / "jobs.json")
+    os.makedirs(os.path.dirname(ledger_path))
+    binary = str(greedy_home / "bin" / "solc-0.4.25")
+
+    with open(ledger_path, "w") as ledger:
+        json.dump({"gone": {"pid": dead_pid(), "kb": 60 * 1024, "version": "0.4.25", "since": 0}}, ledger)
+    start = time.monotonic()
+    admission.run([binary, "--standard-json"], 1, b"0")
+    assert(time.monotonic() - start < 1)
+
+    with open(ledger_path, "w") as ledger:
+        json.dump({"running": {"pid": os.getpid(), "kb": 60 * 1024, "version": "0.4.25", "since": 0}}, ledger)
+
+    def finish_running_job():
+        time.sleep(0.5)
+        admission.leave("running")
+
+    finisher = threading.Thread(target=finish_running_job)
+    finisher.start()
+    start = time.monotonic()
+    admission.run([binary, "--standard-json"], 1, b"0")
+    finisher.join()
+    assert(time.monotonic() - start >= 0.5)
+
+
+def test_timeout(greedy_home, monkeypatch):
+    monkeypatch.setenv("USOLC_JOB_TIMEOUT", "0.5")
+    binary = str(greedy_home / "bin" / "solc-0.4.25")
+    start = time.monotonic()
+    with pytest.raises(JobKilledError) as killed:
+        admission.run([binary, "--standard-json"], 1, b"30", stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    assert(time.monotonic() - start < 10)
+    assert(killed.value.returncode < 0 and killed.value.version_chosen == "0.4.25")
+    assert("time limit of 0.5 s" in str(killed.value))
+
+
+def test_memory_limit(greedy_home, monkeypatch):
+    """ Test solc cannot grow past its limit, and dying of it is reported """
+    monkeypatch.setenv("USOLC_JOB_MEMORY_MB", "400")
+    binary = str(greedy_home / "bin" / "solc-0.4.25")
+    assert(admission.run([binary, greedy_source(10)], 100, stdout=subprocess.PIPE).stdout == b"allocated 10\n")
+
+    with pytest.raises(JobKilledError) as killed:
+        admission.run([binary, greedy_source(1000)], 100, stdout=subprocess.PIPE)
+    assert("memory limit of 400 MB" in str(killed.value))
+
+
+def test_crash_is_not_blamed_on_memory_limit(greedy_home, monkeypatch):
+    """ Test a solc crashing far below its memory limit is reported as the crash it is """
+    monkeypatch.setenv("USOLC_JOB_MEMORY_MB", "400")
+    binary = str(greedy_home / "bin" / "solc-0.4.25")
+    with open("Crash.sol", "w") as source:
+        source.write("pragma solidity ^0.4.24;\n// crashes\ncontract Crash {}\n")
+    completed_process = admission.run([binary, "Crash.sol"], 100, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    assert(completed_process.returncode == -signal.SIGSEGV)
+
+    # without captured errors, a peak close to the limit still tells
+    assert(admission.kill_reason(-signal.SIGSEGV, False, 10 * 1024) is None)
+    assert("memory limit" in admission.kill_reason(-signal.SIGSEGV, False, 390 * 1024))
+    assert("memory limit" in admission.kill_reason(-signal.SIGABRT, False, 10 * 1024, errors=b"std::bad_alloc"))
+
+
+def test_usolc_reports_killed_job(greedy_home, monkeypatch, capsys):
+    """ Test a killed job fails the invocation with its reason, and reaches captured outputs """
+    monkeypatch.setenv("USOLC_JOB_MEMORY_MB", "400")
+    monkeypatch.setattr(sys, "argv", ["solc", greedy_source(1000)])
+    assert(usolc.main() == 1)
+    assert("Error: solc 0.4.25 was killed: killed by SIGABRT, out of its memory limit" in capsys.readouterr().err)
+
+    completed_process = usolc.run_solc_captured("0.4.25", [greedy_source(1000)])
+    assert(completed_process.returncode < 0)
+    assert(b"Error: solc 0.4.25 was killed" in completed_process.stderr)
@@ -0,0 +1,188 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+import os
+import sys
+import json
+import gzip
+import pytest
+
+import usolc
+import artifacts
+from conftest import stub_invocations
+
+STANDARD_JSON_OUTPUT = {
+    "errors": [{"severity": "warning", "message": "unused variable"}],
+    "sources": {"contracts/Token.sol": {"id": 0, "ast": {"nodeType": "SourceUnit"}}},
+    "contracts": {
+        "contracts/Token.sol": {
+            "Token": {
+                "abi": [{"type": "function", "name": "transfer"}],
+                "evm": {
+                    "bytecode": {"object": "6080", "sourceMap": "0:10:0:-", "linkReferences": {}},
+                    "deployedBytecode": {"object": "6060", "sourceMap": "1:2:0:-"},
+                    "methodIdentifiers": {"transfer(address,uint256)": "a9059cbb"},
+                },
+            },
+            "SafeMath": {"abi": [], "evm": {"bytecode": {"object": "60ff"}}},
+        },
+        "lib/Ownable.sol": {"Ownable": {"abi": []}},
+    },
+}
+
+
+@pytest.fixture
+def artifact_home(stub_usolc_home, monkeypatch):
+    """ The stub USOLC_HOME, working in it, with artifacts written to its "artifacts" directory """
+    monkeypatch.chdir(stub_usolc_home)
+    for name in ["USOLC_CACHE", "USOLC_ARTIFACTS_DIR", "USOLC_ARTIFACTS_GZIP", "USOLC_COORDINATOR", "USOLC_POOL_SIZE",
+                 "USOLC_JOB_TIMEOUT", "USOLC_JOB_MEMORY_MB", "USOLC_MEMORY_BUDGET_MB"]:
+        monkeypatch.delenv(name, raising=False)
+    return stub_usolc_home
+
+
+def write_source(name, contracts):
+    with open(name, "w") as source:
+        source.write("pragma solidity ^0.4.24;\n")
+        for contract in contracts:
+            source.write("contract {0} {{}}\n".format(contract))
+
+
+def compile_combined_json(monkeypatch, directory, *filenames):
+    monkeypatch.setattr(sys, "argv", ["solc", "--combined-json", "abi,bin", "--usolc-artifacts=" + directory] +
+                        list(filenames))
+    return usolc.main()
+
+
+def chunked(data, size=7):
+    return [data[position:position + size] for position in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_standard_json_fields(tmp_path, monkeypatch, compress):
+    """ Test every field of every contract can be read alone, and contract files are whole JSON objects """
+    if compress:
+        monkeypatch.setenv("USOLC_ARTIFACTS_GZIP", "1")
+    directory = str(tmp_path / "artifacts")
+    output = json.dumps(STANDARD_JSON_OUTPUT).encode("utf-8")
+    artifacts.collect(directory, chunked(output), "standard-json")
+
+    token = STANDARD_JSON_OUTPUT["contracts"]["contracts/Token.sol"]["Token"]
+    assert(artifacts.read_field(directory, "contracts/Token.sol", "Token", "evm.bytecode.sourceMap") == b'"0:10:0:-"')
+    assert(json.loads(artifacts.read_field(directory, "contracts/Token.sol", "Token", "abi")) == token["abi"])
+    assert(json.loads(artifacts.read_field(directory, "contracts/Token.sol", "Token", "evm.methodIdentifiers")) ==
+           token["evm"]["methodIdentifiers"])
+    assert(artifacts.read_field(directory, "lib/Ownable.sol", "Ownable", "abi") == b"[]")
+    assert(artifacts.read_field(directory, "lib/Ownable.sol", "Ownable", "evm.bytecode.object") is None)
+    assert(artifacts.read_field(directory, "contracts/Token.sol", "Missing", "abi") is None)
+
+    records = artifacts.read_records(directory)
+    assert(sorted(set(record[1] for record in records)) == ["Ownable", "SafeMath", "Token"])
+    [path] = set(record[3] for record in records if record[1] == "Token")
+    assert(path.endswith(".json.gz" if compress else ".json"))
+    with open(os.path.join(directory, path), "rb") as contract_file:
+        content = contract_file.read()
+    contract = json.loads(gzip.decompress(content) if compress else content)
+    assert(contract["evm.deployedBytecode.object"] == "6060" and contract["abi"] == token["abi"])
+    assert(sorted(os.listdir(directory)) == ["contracts", "index", "index.lock"])
+
+
+def test_read_field_during_install(tmp_path, monkeypatch):
+    """ Test a field is read from the new index when an install removed the file the old one referenced """
+    directory = str(tmp_path / "artifacts")
+    output = json.dumps(STANDARD_JSON_OUTPUT).encode("utf-8")
+    artifacts.collect(directory, chunked(output), "standard-json")
+
+    changed = json.loads(output.decode("utf-8"))
+    changed["contracts"]["contracts/Token.sol"]["Token"]["abi"] = []
+    real_find = artifacts.ArtifactIndex.find
+
+    def find_then_install(index, *key):
+        found = real_find(index, *key)
+        if not os.path.exists(os.path.join(directory, "installed")):
+            open(os.path.join(directory, "installed"), "w").close()
+            artifacts.collect(directory, chunked(json.dumps(changed).encode("utf-8")), "standard-json")
+            assert(not os.path.exists(os.path.join(directory, found[0])))
+        return found
+    monkeypatch.setattr(artifacts.ArtifactIndex, "find", find_then_install)
+    assert(artifacts.read_field(directory, "contracts/Token.sol", "Token", "abi") == b"[]")
+
+
+def test_invalid_output(tmp_path):
+    with pytest.raises(ValueError):
+        artifacts.collect(str(tmp_path / "artifacts"), [b'{"contracts": {"A.sol": '], "standard-json")
+
+
+def test_combined_json(artifact_home, monkeypatch, capfd):
+    """ Test usolc writes the artifacts of what solc printed, and keeps printing it """
+    write_source("A.sol", ["A", "B"])
+    assert(compile_combined_json(monkeypatch, "artifacts", "A.sol") == 0)
+
+    assert(json.loads(capfd.readouterr().out)["contracts"]["A.sol:B"]["bin"] == "0.4.25")
+    assert(artifacts.read_field("artifacts", "A.sol", "B", "bin") == b'"0.4.25"')
+    assert(artifacts.read_field("artifacts", "A.sol", "A", "abi") == b'"[]"')
+    with open(str(artifact_home / "invocations.log")) as log:
+        assert("--usolc-artifacts" not in log.read())
+
+
+def test_later_compilations_replace_their_sources(artifact_home, monkeypatch):
+    """ Test a compilation replaces the contracts of its sources, and leaves the others """
+    write_source("A.sol", ["A"])
+    write_source("B.sol", ["B"])
+    compile_combined_json(monkeypatch, "artifacts", "A.sol")
+    compile_combined_json(monkeypatch, "artifacts", "B.sol")
+    assert([record[:3] for record in artifacts.read_records("artifacts")] ==
+           [["A.sol", "A", "abi"], ["A.sol", "A", "bin"], ["B.sol", "B", "abi"], ["B.sol", "B", "bin"]])
+
+    write_source("A.sol", ["Renamed"])
+    compile_combined_json(monkeypatch, "artifacts", "A.sol")
+    records = artifacts.read_records("artifacts")
+    assert(sorted(set(record[:2] for record in map(tuple, records))) == [("A.sol", "Renamed"), ("B.sol", "B")])
+
+    contract_files = [os.path.join(root, name) for root, _, names in os.walk("artifacts/contracts") for name in names]
+    assert(sorted(contract_files) == sorted(set(os.path.join("artifacts", record[3]) for record in records)))
+
+
+def test_reused_on_cache_hits(artifact_home, monkeypatch):
+    """ Test a cache hit links the artifacts built on the miss instead of parsing the output again """
+    monkeypatch.setenv("USOLC_CACHE", "1")
+    write_source("A.sol", ["A"])
+    compile_combined_json(monkeypatch, "first", "A.sol")
+
+    def no_parsing(chunks, output_format):
+        raise AssertionError("parsed again")
+    monkeypatch.setattr(artifacts, "iter_fields", no_parsing)
+    assert(compile_combined_json(monkeypatch, "second", "A.sol") == 0)
+    assert(stub_invocations(artifact_home) == 1)
+
+    [path] = set(record[3] for record in artifacts.read_records("second"))
+    assert(os.path.samefile(os.path.join("first", path), os.path.join("second", path)))
+    assert(artifacts.read_field("second", "A.sol", "A", "bin") == b'"0.4.25"')
+
+
+def test_outputs_without_contracts(artifact_home, monkeypatch):
+    write_source("A.sol", ["A"])
+    monkeypatch.setattr(sys, "argv", ["solc", "--abi", "--usolc-artifacts=artifacts", "A.sol"])
+    assert(usolc.main() == 0)
+    assert(not os.path.exists("artifacts"))
+
+
+def test_main(artifact_home, monkeypatch, capsys):
+    write_source("A.sol", ["A"])
+    compile_combined_json(monkeypatch, "artifacts", "A.sol")
+    capsys.readouterr()
+
+    assert(artifacts.main(["artifacts"]) == 0)
+    assert(capsys.readouterr().out == "A.sol:A\n")
+    assert(artifacts.main(["artifacts", "A.sol:A"]) == 0)
+    assert(capsys.readouterr().out == "abi\nbin\n")
+    assert(artifacts.main(["artifacts", "A.sol:A", "bin"]) == 0)
+    assert(capsys.readouterr().out == '"0.4.25"\n')
+    assert(artifacts.main(["artifacts", "A.sol:A", "srcmap"]) == 1)
+    assert(artifacts.main(["missing"]) == 1)
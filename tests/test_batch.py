@@ -0,0 +1,79 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+import io
+import json
+import pytest
+
+import batch
+from usolc import VersionChoosing
+from conftest import stub_invocations
+
+
+def write_contract(directory, name, pragma, body=""):
+    path = directory / (name + ".sol")
+    path.write_text("pragma solidity {0};\ncontract {1} {{ {2} }}\n".format(pragma, name, body))
+    return str(path)
+
+
+def run_batch(filenames, chunk_size=batch.DEFAULT_CHUNK_SIZE):
+    output = io.StringIO()
+    failed = batch.run_batch(filenames, ["*", VersionChoosing.NEWEST], output, jobs=2,
+                             chunk_size=chunk_size)
+    results = [json.loads(line) for line in output.getvalue().splitlines()]
+    return [failed, {result["file"]: result for result in results}]
+
+
+def test_make_chunks():
+    """ Test make_chunks keeps versions apart and splits large groups """
+    groups = {"0.5.0": ["a", "b", "c"], "0.4.25": ["d"]}
+    assert(batch.make_chunks(groups, 2) == [["0.4.25", ["d"]], ["0.5.0", ["a", "b"]], ["0.5.0", ["c"]]])
+
+
+def test_read_manifest(tmp_path):
+    """ Test read_manifest skips blank lines and comments """
+    manifest = tmp_path / "manifest"
+    manifest.write_text("# contracts\na.sol\n\n  b.sol  \n")
+    assert(batch.read_manifest(str(manifest)) == ["a.sol", "b.sol"])
+
+
+def test_run_batch_groups_by_version(stub_usolc_home, tmp_path):
+    """ Test every file is compiled by its own version, with one solc per version """
+    old_a = write_contract(tmp_path, "OldA", ">=0.4.22 <0.4.25")
+    old_b = write_contract(tmp_path, "OldB", "0.4.24")
+    new = write_contract(tmp_path, "New", "^0.5.0")
+
+    [failed, results] = run_batch([old_a, old_b, new])
+
+    assert(failed == 0)
+    assert(results[old_a]["version"] == "0.4.24")
+    assert(results[old_b]["version"] == "0.4.24")
+    assert(results[new]["version"] == "0.5.0")
+    assert(list(results[old_a]["contracts"]) == ["OldA"])
+    assert(list(results[new]["contracts"]) == ["New"])
+    assert(stub_invocations(stub_usolc_home) == 2)
+
+
+def test_run_batch_reports_errors_per_file(stub_usolc_home, tmp_path):
+    """ Test a failing chunk is retried file by file and that resolution errors are reported """
+    good = write_contract(tmp_path, "Good", "^0.4.24")
+    broken = write_contract(tmp_path, "Broken", "^0.4.24", "STUB_SYNTAX_ERROR")
+    unsatisfiable = write_contract(tmp_path, "Future", "^0.6.0")
+    missing = str(tmp_path / "Missing.sol")
+
+    [failed, results] = run_batch([good, broken, unsatisfiable, missing])
+
+    assert(failed == 3)
+    assert(results[good]["returncode"] == 0)
+    assert(list(results[good]["contracts"]) == ["Good"])
+    assert(results[broken]["returncode"] == 1)
+    assert("stub syntax error" in results[broken]["errors"])
+    assert(results[unsatisfiable]["version"] is None)
+    assert("^0.6.0" in results[unsatisfiable]["error"])
+    assert(results[missing]["error"] == "Solidity file not found")
@@ -0,0 +1,181 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+import os
+import pytest
+
+import usolc
+import compile_cache
+from conftest import stub_invocations
+from test_usolc import resource
+
+
+@pytest.mark.parametrize("native_argv, expected_result", [
+    ([resource("caret_0.4.sol"), "--abi"], True),
+    (["--standard-json"], True),
+    ([resource("caret_0.4.sol"), "--bin", "-o", "out"], False),
+    ([resource("caret_0.4.sol"), "--output-dir=out"], False),
+    (["--link", "--libraries", "a:0x0"], False),
+    (["-"], False),
+])
+def test_is_cacheable(native_argv, expected_result):
+    """ Test is_cacheable rejects compilations that write outside of stdout/stderr """
+    assert(compile_cache.is_cacheable(native_argv) == expected_result)
+
+
+def test_make_cache_key_normalizes_argv():
+    """ Test both spellings of an option with a value share the same key """
+    sources = [resource("caret_0.4.sol")]
+    key_equals = compile_cache.make_cache_key("0.4.25", ["--combined-json=abi,asm"] + sources, sources)
+    key_spaced = compile_cache.make_cache_key("0.4.25", ["--combined-json", "abi,asm"] + sources, sources)
+    assert(key_equals == key_spaced)
+
+
+def test_make_cache_key_changes(tmp_path):
+    """ Test the key depends on the version, the argv, the stdin and the content of the sources """
+    source = tmp_path / "a.sol"
+    source.write_text("pragma solidity ^0.4.24;")
+    argv = [str(source), "--abi"]
+
+    key = compile_cache.make_cache_key("0.4.25", argv, [str(source)])
+    assert(key == compile_cache.make_cache_key("0.4.25", argv, [str(source)]))
+    assert(key != compile_cache.make_cache_key("0.4.24", argv, [str(source)]))
+    assert(key != compile_cache.make_cache_key("0.4.25", argv + ["--bin"], [str(source)]))
+    assert(key != compile_cache.make_cache_key("0.4.25", argv, [str(source)], b"{}"))
+
+    source.write_text("pragma solidity ^0.4.25;")
+    assert(key != compile_cache.make_cache_key("0.4.25", argv, [str(source)]))
+
+
+def test_store_and_lookup(stub_usolc_home):
+    """ Test an entry is replayed exactly as it was stored, and that hits/misses are counted """
+    assert(compile_cache.lookup("ab" * 32) is None)
+    compile_cache.store("ab" * 32, 1, b"out\n", b"err\n")
+    assert(compile_cache.lookup("ab" * 32) == [1, b"out\n", b"err\n"])
+    assert(compile_cache.read_stats() == {"hits": 1, "misses": 1})
+
+
+def test_store_files_and_open_entry(stub_usolc_home, tmp_path):
+    """ Test outputs written to files are stored, and opened without being read """
+    with open(str(tmp_path / "out"), "w+b") as stdout_file, open(str(tmp_path / "err"), "w+b") as stderr_file:
+        stdout_file.write(b"x" * 3000000)
+        stderr_file.write(b"warning\n")
+        compile_cache.store_files("cd" * 32, 0, stdout_file, stderr_file)
+
+    [returncode, entry, stdout_size, stderr_size] = compile_cache.open_entry("cd" * 32)
+    with entry:
+        assert([returncode, stdout_size, stderr_size] == [0, 3000000, 8])
+        entry.seek(stdout_size, 1)
+        assert(entry.read() == b"warning\n")
+    assert(compile_cache.lookup("cd" * 32) == [0, b"x" * 3000000, b"warning\n"])
+
+
+def test_open_entry_rejects_truncated_entry(stub_usolc_home):
+    compile_cache.store("ef" * 32, 0, b"out", b"err")
+    with open(compile_cache.entry_path("ef" * 32), "ab") as entry:
+        entry.truncate(os.path.getsize(compile_cache.entry_path("ef" * 32)) - 1)
+    assert(compile_cache.open_entry("ef" * 32) is None)
+
+
+def test_evict_least_recently_used(stub_usolc_home):
+    """ Test eviction removes the oldest entries first until the cache fits """
+    for index, key in enumerate(["aa" * 32, "bb" * 32, "cc" * 32]):
+        compile_cache.store(key, 0, b"x" * 100, b"")
+        os.utime(compile_cache.entry_path(key), (1000 + index, 1000 + index))
+
+    # reading "aa" makes it the most recently used entry
+    assert(compile_cache.lookup("aa" * 32) is not None)
+    assert(compile_cache.evict(300) == 1)
+    assert(compile_cache.lookup("bb" * 32) is None)
+    assert(compile_cache.lookup("aa" * 32) is not None)
+    assert(compile_cache.lookup("cc" * 32) is not None)
+
+
+def test_evict_counts_artifact_sets(stub_usolc_home):
+    """ Test the artifact sets count toward the size of their entries, and sets left alone are evicted """
+    for index, key in enumerate(["aa" * 32, "bb" * 32]):
+        compile_cache.store(key, 0, b"x" * 100, b"")
+        os.utime(compile_cache.entry_path(key), (1000 + index, 1000 + index))
+    for key in ["aa" * 32, "dd" * 32]:
+        os.makedirs(compile_cache.artifacts_path(key))
+        with open(os.path.join(compile_cache.artifacts_path(key), "index"), "wb") as index:
+            index.write(b"y" * 1000)
+    os.utime(compile_cache.artifacts_path("dd" * 32), (900, 900))
+
+    sizes = dict((os.path.basename(path), size) for path, size, _ in compile_cache.list_entries())
+    assert(sizes["aa" * 32] > 1100 and sizes["bb" * 32] < 200 and sizes["dd" * 32] == 1000)
+
+    assert(compile_cache.evict(1500) == 1)
+    assert(not os.path.exists(compile_cache.artifacts_path("dd" * 32)))
+    assert(compile_cache.evict(500) == 1)
+    assert(compile_cache.lookup("aa" * 32) is None and not os.path.exists(compile_cache.artifacts_path("aa" * 32)))
+    assert(compile_cache.lookup("bb" * 32) is not None)
+
+
+def test_store_scans_only_past_the_limit(stub_usolc_home, monkeypatch):
+    """ Test stores add to a running size, and the cache is only scanned once it goes past the limit """
+    monkeypatch.setenv("USOLC_CACHE_MAX_BYTES", "1000")
+    compile_cache.store("aa" * 32, 0, b"x" * 100, b"")
+    size = compile_cache.read_size(compile_cache.cache_dir())
+    assert(0 < size < 200)
+
+    def no_scan():
+        raise AssertionError("scanned")
+    with monkeypatch.context() as scanning:
+        scanning.setattr(compile_cache, "list_entries", no_scan)
+        compile_cache.store("bb" * 32, 0, b"x" * 100, b"")
+    assert(compile_cache.read_size(compile_cache.cache_dir()) == 2 * size)
+
+    os.utime(compile_cache.entry_path("aa" * 32), (1000, 1000))
+    compile_cache.store("cc" * 32, 0, b"x" * 900, b"")
+    assert(compile_cache.lookup("aa" * 32) is None and compile_cache.lookup("bb" * 32) is None)
+    assert(compile_cache.read_size(compile_cache.cache_dir()) ==
+           os.path.getsize(compile_cache.entry_path("cc" * 32)))
+
+
+def test_stats_log_is_folded(stub_usolc_home, monkeypatch):
+    """ Test lookups are counted by appending to the log, which is folded into stats.json once large """
+    monkeypatch.setattr(compile_cache, "STATS_LOG_MAX_BYTES", 3)
+    compile_cache.record_lookup(True)
+    compile_cache.record_lookup(False)
+    assert(compile_cache.read_stats() == {"hits": 1, "misses": 1})
+    assert(os.path.getsize(os.path.join(compile_cache.cache_dir(), "stats.log")) == 2)
+
+    compile_cache.record_lookup(True)
+    assert(not os.path.exists(os.path.join(compile_cache.cache_dir(), "stats.log")))
+    compile_cache.record_lookup(True)
+    assert(compile_cache.read_stats() == {"hits": 3, "misses": 1})
+
+
+def test_run_solc_replays_cached_output(stub_usolc_home, monkeypatch, capfd):
+    """ Test a second identical compilation is served from the cache without spawning solc """
+    monkeypatch.setenv("USOLC_CACHE", "1")
+    native_argv = [resource("caret_0.4.sol"), "--abi"]
+
+    first = usolc.run_solc("0.4.25", native_argv)
+    first_output = capfd.readouterr()
+    second = usolc.run_solc("0.4.25", native_argv)
+    second_output = capfd.readouterr()
+
+    assert(stub_invocations(stub_usolc_home) == 1)
+    assert(first.returncode == second.returncode == 0)
+    assert(first_output == second_output)
+    assert(first_output.out.count("stub solc 0.4.25") == 1)
+    assert("stub solc 0.4.25" in second_output.out)
+    assert("stub warning" in second_output.err)
+
+
+def test_run_solc_skips_cache_with_output_dir(stub_usolc_home, monkeypatch, tmp_path):
+    """ Test compilations writing to an output directory always run solc """
+    monkeypatch.setenv("USOLC_CACHE", "1")
+    native_argv = [resource("caret_0.4.sol"), "--bin", "-o", str(tmp_path / "out")]
+
+    usolc.run_solc("0.4.25", native_argv)
+    usolc.run_solc("0.4.25", native_argv)
+    assert(stub_invocations(stub_usolc_home) == 2)
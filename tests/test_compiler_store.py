@@ -0,0 +1,152 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+import os
+import errno
+import shutil
+import pytest
+
+import usolc
+import inventory
+import installer
+import compile_cache
+import compiler_store
+from conftest import make_stub_solc
+
+
+@pytest.fixture
+def store(stub_usolc_home, tmp_path, monkeypatch):
+    monkeypatch.setattr(inventory, "inventory_memo", None)
+    store = str(tmp_path / "store")
+    monkeypatch.setenv("USOLC_STORE", store)
+    return store
+
+
+def binary(usolc_home, version):
+    return os.path.join(str(usolc_home), "bin", "solc-" + version)
+
+
+def test_add_bin_directory(stub_usolc_home, store):
+    """ Test binaries are moved into the store and hardlinked back into bin/ """
+    digest = compile_cache.hash_file(binary(stub_usolc_home, "0.5.0"))
+    results = compiler_store.add_bin_directory(store, str(stub_usolc_home))
+
+    assert(results == {"0.4.24": "hardlink", "0.4.25": "hardlink", "0.5.0": "hardlink"})
+    assert(os.path.samefile(binary(stub_usolc_home, "0.5.0"), compiler_store.object_path(store, digest)))
+    assert(len(compiler_store.list_objects(store)) == 3)
+    assert(usolc.fetch_supported_solc_versions() == ["0.4.24", "0.4.25", "0.5.0"])
+    assert(usolc.run_solc_captured("0.5.0", ["--abi"]).stdout.startswith(b"stub solc 0.5.0"))
+
+    # adding again is a no-op
+    assert(compiler_store.add_bin_directory(store, str(stub_usolc_home)) == {})
+
+
+def test_identical_binaries_are_stored_once(stub_usolc_home, store):
+    """ Test two versions with the same content share a single object """
+    shutil.copyfile(binary(stub_usolc_home, "0.5.0"), binary(stub_usolc_home, "0.5.1"))
+    compiler_store.add_bin_directory(store, str(stub_usolc_home))
+
+    assert(len(compiler_store.list_objects(store)) == 3)
+    assert(os.path.samefile(binary(stub_usolc_home, "0.5.0"), binary(stub_usolc_home, "0.5.1")))
+
+
+def test_link_falls_back_to_symlinks(stub_usolc_home, store, monkeypatch):
+    """ Test a store on another filesystem is reached through symlinks """
+    def cross_device(source, target):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    monkeypatch.setattr(os, "link", cross_device)
+    monkeypatch.setattr(compiler_store, "reflink", cross_device)
+    results = compiler_store.add_bin_directory(store, str(stub_usolc_home))
+
+    assert(set(results.values()) == {"symlink"})
+    assert(os.path.islink(binary(stub_usolc_home, "0.4.24")))
+    assert(compiler_store.link_kind(store, binary(stub_usolc_home, "0.4.24")) == "symlink")
+    assert(compiler_store.collect_garbage(store, str(stub_usolc_home)) == [])
+
+
+def test_collect_garbage(stub_usolc_home, store):
+    """ Test objects no binary links to are removed, the others kept """
+    compiler_store.add_bin_directory(store, str(stub_usolc_home))
+    digest = compile_cache.hash_file(binary(stub_usolc_home, "0.4.24"))
+    os.unlink(binary(stub_usolc_home, "0.4.24"))
+
+    assert(compiler_store.collect_garbage(store, str(stub_usolc_home), dry_run=True) ==
+           [compiler_store.object_path(store, digest)])
+    assert(len(compiler_store.list_objects(store)) == 3)
+    assert(compiler_store.collect_garbage(store, str(stub_usolc_home)) ==
+           [compiler_store.object_path(store, digest)])
+    assert(len(compiler_store.list_objects(store)) == 2)
+
+
+def other_home(tmp_path, stub_usolc_home, versions):
+    """ A second USOLC_HOME with copies of some stub compilers """
+    home = tmp_path / "other"
+    (home / "bin").mkdir(parents=True)
+    for version in versions:
+        shutil.copyfile(binary(stub_usolc_home, version), binary(home, version))
+        os.chmod(binary(home, version), 0o755)
+    return str(home)
+
+
+def test_collect_garbage_keeps_objects_of_other_homes(stub_usolc_home, store, tmp_path, monkeypatch):
+    """ Test gc from a home keeps the objects another home of the store symlinks or reflinks to """
+    home = other_home(tmp_path, stub_usolc_home, ["0.4.24", "0.5.0"])
+    compiler_store.add_bin_directory(store, str(stub_usolc_home))
+
+    def cross_device(source, target):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    def copy(source, target):
+        # what a reflink looks like: another inode, a link count of 1
+        shutil.copyfile(source, target)
+    monkeypatch.setattr(inventory, "inventory_memo", None)
+    with monkeypatch.context() as linking:
+        linking.setattr(os, "link", cross_device)
+        linking.setattr(compiler_store, "reflink", copy)
+        assert(compiler_store.add_bin_directory(store, home) == {"0.4.24": "reflink", "0.5.0": "reflink"})
+        # what the extents of a reflink tell
+        linking.setattr(compiler_store, "is_reflink", lambda path, filename: True)
+        assert(compiler_store.link_kind(store, binary(home, "0.5.0")) == "reflink")
+        linking.setattr(inventory, "inventory_memo", None)
+        assert(compiler_store.add_bin_directory(store, home) == {})
+
+    digest = compile_cache.hash_file(binary(stub_usolc_home, "0.4.25"))
+    for version in ["0.4.24", "0.4.25", "0.5.0"]:
+        os.unlink(binary(stub_usolc_home, version))
+    assert(compiler_store.collect_garbage(store, str(stub_usolc_home)) == [compiler_store.object_path(store, digest)])
+    assert(len(compiler_store.list_objects(store)) == 2)
+
+    compiler_store.release(store, home)
+    assert(len(compiler_store.collect_garbage(store, str(stub_usolc_home), dry_run=True)) == 2)
+    assert(len(compiler_store.collect_garbage(store, home)) == 0)
+    assert(len(compiler_store.list_objects(store)) == 2)
+
+
+def test_collect_garbage_keeps_unregistered_objects(stub_usolc_home, store):
+    """ Test objects no home ever registered are kept, since nothing proves them unused """
+    compiler_store.add_bin_directory(store, str(stub_usolc_home))
+    shutil.rmtree(os.path.join(store, "refs"))
+    for version in ["0.4.24", "0.4.25", "0.5.0"]:
+        os.unlink(binary(stub_usolc_home, version))
+    assert(compiler_store.collect_garbage(store, str(stub_usolc_home)) == [])
+    assert(len(compiler_store.list_objects(store)) == 3)
+
+
+def test_installer_uses_store(stub_usolc_home, store, tmp_path):
+    """ Test installed binaries go through the store when it is configured """
+    mirror = tmp_path / "mirror"
+    stub = make_stub_solc(tmp_path / "releases", "0.5.1")
+    (mirror / "v0.5.1").mkdir(parents=True)
+    shutil.copyfile(stub, str(mirror / "v0.5.1" / "solc-static-linux"))
+
+    results = installer.install(str(stub_usolc_home), ["0.5.1"], str(mirror), checksums={})
+    assert(results == {"0.5.1": "installed"})
+    assert(compiler_store.link_kind(store, binary(stub_usolc_home, "0.5.1")) == "hardlink")
+    assert(os.access(binary(stub_usolc_home, "0.5.1"), os.X_OK))
@@ -0,0 +1,146 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+import os
+import pytest
+
+import usolc
+import import_graph
+import pragma_scanner
+from usolc import VersionChoosing, PREFIX_FILELOC
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    """
+    contracts/Main.sol -> contracts/lib/Math.sol (relative import)
+                       -> @oz/Token.sol (remapped to node_modules/oz/Token.sol), pinned to ^0.4.24
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("USOLC_CACHE_DIR", str(tmp_path / "cache"))
+    (tmp_path / "contracts" / "lib").mkdir(parents=True)
+    (tmp_path / "node_modules" / "oz").mkdir(parents=True)
+    (tmp_path / "contracts" / "Main.sol").write_text(
+        'pragma solidity >=0.4.22 <0.6.0;\nimport "./lib/Math.sol";\nimport {Token} from "@oz/Token.sol";\n'
+        '// import "./Commented.sol";\nimport "./Missing.sol";\ncontract Main {}\n')
+    (tmp_path / "contracts" / "lib" / "Math.sol").write_text(
+        'pragma solidity >=0.4.0;\nimport "../Main.sol";\nlibrary Math {}\n')
+    (tmp_path / "node_modules" / "oz" / "Token.sol").write_text(
+        'pragma solidity ^0.4.24;\ncontract Token {}\n')
+    return tmp_path
+
+
+def test_build_import_graph(project):
+    """ Test the graph follows relative and remapped imports, and skips missing files """
+    remappings = [["", "@oz/", "node_modules/oz/"]]
+    graph = import_graph.build_import_graph(["contracts/Main.sol"], remappings)
+
+    assert(list(graph) == ["contracts/Main.sol", "contracts/lib/Math.sol", "node_modules/oz/Token.sol"])
+    assert(graph["contracts/Main.sol"][1] ==
+           ["contracts/lib/Math.sol", "node_modules/oz/Token.sol", "contracts/Missing.sol"])
+    assert(import_graph.unit_rules(graph) == [">=0.4.22 <0.6.0", ">=0.4.0", "^0.4.24"])
+
+
+def test_build_import_graph_missing_input(project):
+    """ Test a missing input file raises FileNotFoundError """
+    with pytest.raises(FileNotFoundError):
+        import_graph.build_import_graph(["contracts/Nope.sol"])
+
+
+def test_build_import_graph_honors_allowed_paths(project, tmp_path):
+    """ Test files outside of the directories solc may read are not followed """
+    outside = tmp_path.parent / (tmp_path.name + "-outside")
+    outside.mkdir()
+    (outside / "Far.sol").write_text("pragma solidity 0.4.0;\n")
+    (project / "contracts" / "Far.sol").write_text('import "{0}";\n'.format(outside / "Far.sol"))
+
+    graph = import_graph.build_import_graph(["contracts/Far.sol"])
+    assert(list(graph) == ["contracts/Far.sol"])
+
+    graph = import_graph.build_import_graph(["contracts/Far.sol"], allow_paths=[str(outside)])
+    assert(list(graph) == ["contracts/Far.sol", str(outside / "Far.sol")])
+
+
+@pytest.mark.parametrize("native_argv, expected_remappings, expected_allow_paths", [
+    (["a.sol", "@oz/=node_modules/oz/", "--abi"], [["", "@oz/", "node_modules/oz/"]], []),
+    (["contracts:lib/=vendor/lib/", "--allow-paths", "vendor,/opt"],
+     [["contracts", "lib/", "vendor/lib/"]], ["vendor", "/opt"]),
+    (["--allow-paths=/opt", "a.sol"], [], ["/opt"]),
+])
+def test_parse_arguments(native_argv, expected_remappings, expected_allow_paths):
+    """ Test remappings and --allow-paths are extracted from the native arguments """
+    assert(import_graph.parse_remappings(native_argv, PREFIX_FILELOC) == expected_remappings)
+    assert(import_graph.parse_allow_paths(native_argv) == expected_allow_paths)
+
+
+@pytest.mark.parametrize("importing_file, path, expected_path", [
+    ("contracts/A.sol", "./B.sol", "contracts/B.sol"),
+    ("contracts/A.sol", "../B.sol", "B.sol"),
+    ("contracts/A.sol", "lib/C.sol", "vendor/lib/C.sol"),
+    ("contracts/A.sol", "lib/special/C.sol", "special/C.sol"),
+    ("other/A.sol", "lib/C.sol", "lib/C.sol"),
+])
+def test_resolve_import(importing_file, path, expected_path):
+    """ Test remappings with the longest context and prefix win """
+    remappings = [["contracts", "lib/", "vendor/lib/"], ["contracts", "lib/special/", "special/"]]
+    assert(import_graph.resolve_import(importing_file, path, remappings) == expected_path)
+
+
+def test_constraints_are_cached(project, monkeypatch):
+    """ Test unchanged files are not scanned again, while edited files are """
+    monkeypatch.setenv("USOLC_CACHE", "1")
+    import_graph.build_import_graph(["contracts/Main.sol"])
+
+    scanned = []
+    original_scan = pragma_scanner.scan_file_header
+    monkeypatch.setattr(pragma_scanner, "scan_file_header",
+                        lambda filename: scanned.append(filename) or original_scan(filename))
+    monkeypatch.setattr(import_graph, "constraints_memo", None)
+
+    import_graph.build_import_graph(["contracts/Main.sol"])
+    assert(scanned == [])
+
+    math = project / "contracts" / "lib" / "Math.sol"
+    math.write_text("pragma solidity ^0.4.18;\nlibrary Math {}\n")
+    os.utime(str(math), ns=(1, 1))
+    graph = import_graph.build_import_graph(["contracts/Main.sol"])
+    assert(scanned == ["contracts/lib/Math.sol"])
+    assert(graph["contracts/lib/Math.sol"][0] == ["^0.4.18"])
+
+    # touched, not edited
+    os.utime(str(math), ns=(2, 2))
+    import_graph.build_import_graph(["contracts/Main.sol"])
+    assert(scanned == ["contracts/lib/Math.sol"])
+
+
+def test_constraints_stay_in_memory_without_cache(project, monkeypatch):
+    """ Test constraints are only written when the compile cache is enabled """
+    monkeypatch.delenv("USOLC_CACHE", raising=False)
+    monkeypatch.setattr(import_graph, "constraints_memo", None)
+    # files written within RACY_NANOSECONDS of their scan are scanned again, lacking a hash
+    for source in ["contracts/Main.sol", "contracts/lib/Math.sol", "node_modules/oz/Token.sol"]:
+        os.utime(source, ns=(10 ** 18, 10 ** 18))
+    import_graph.build_import_graph(["contracts/Main.sol"])
+    assert(not (project / "cache" / "constraints.json").exists())
+
+    scanned = []
+    monkeypatch.setattr(pragma_scanner, "scan_file_header", lambda filename: scanned.append(filename))
+    import_graph.build_import_graph(["contracts/Main.sol"])
+    assert(scanned == [])
+
+
+def test_choose_version_by_unit(project):
+    """ Test an imported library pinning an older compiler constrains the whole unit """
+    available_versions = ["0.4.24", "0.4.25", "0.5.0"]
+    strategy = ["*", VersionChoosing.NEWEST]
+
+    assert(usolc.choose_version_by_argument(available_versions, "contracts/Main.sol", strategy) == "0.5.0")
+    assert(usolc.choose_version_by_unit(available_versions, ["contracts/Main.sol", "--abi"], strategy) == "0.5.0")
+    assert(usolc.choose_version_by_unit(available_versions,
+                                        ["@oz/=node_modules/oz/", "contracts/Main.sol"], strategy) == "0.4.25")
@@ -0,0 +1,239 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+import os
+import json
+import hashlib
+import threading
+import http.server
+import pytest
+
+import inventory
+import installer
+from exceptions.checksum_mismatch_error import ChecksumMismatchError
+
+
+def release_content(version):
+    return ("#!/bin/sh\necho solc " + version + "\n").encode("utf-8") * 1000
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+@pytest.fixture
+def usolc_home(tmp_path, monkeypatch):
+    home = tmp_path / "home"
+    (home / "bin").mkdir(parents=True)
+    monkeypatch.setattr(inventory, "inventory_memo", None)
+    monkeypatch.setattr(installer.time, "sleep", lambda seconds: None)
+    return str(home)
+
+
+@pytest.fixture
+def mirror_dir(tmp_path):
+    """ A local mirror laid out like the releases """
+    mirror = tmp_path / "mirror"
+    for version in ["0.4.10", "0.4.24", "0.5.0"]:
+        asset = mirror / ("v" + version) / installer.KNOWN_RELEASES[version]
+        asset.parent.mkdir(parents=True)
+        asset.write_bytes(release_content(version))
+    return str(mirror)
+
+
+class MirrorHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Serves the mirror directory with range support; the first response of every file is cut
+    short when the server is flaky
+    """
+
+    def do_GET(self):
+        path = os.path.join(self.server.mirror, self.path.lstrip("/"))
+        self.server.requests.append([self.path, self.headers.get("Range")])
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+
+        with open(path, 'rb') as file:
+            data = file.read()
+        start = 0
+        if self.headers.get("Range"):
+            start = int(self.headers["Range"].split("=")[1].rstrip("-"))
+            self.send_response(206)
+            self.send_header("Content-Range", "bytes {0}-{1}/{2}".format(start, len(data) - 1, len(data)))
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(data) - start))
+        self.end_headers()
+
+        if self.server.flaky and self.path not in self.server.cut:
+            self.server.cut.add(self.path)
+            self.wfile.write(data[start:start + len(data) // 2])
+            self.wfile.flush()
+            self.connection.shutdown(2)
+            return
+        self.wfile.write(data[start:])
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def mirror_server(mirror_dir):
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), MirrorHandler)
+    server.mirror = mirror_dir
+    server.requests = []
+    server.flaky = False
+    server.cut = set()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def mirror_url(server):
+    return "http://127.0.0.1:{0}".format(server.server_address[1])
+
+
+def test_install_from_directory(usolc_home, mirror_dir):
+    """ Test versions are installed from a local mirror and recorded in the inventory """
+    results = installer.install(usolc_home, ["0.4.10", "0.5.0"], mirror_dir, checksums={}, jobs=2)
+
+    assert(results == {"0.4.10": "installed", "0.5.0": "installed"})
+    assert(inventory.installed_versions(usolc_home) == ["0.4.10", "0.5.0"])
+    binary = os.path.join(usolc_home, "bin", "solc-0.5.0")
+    assert(os.access(binary, os.X_OK))
+    with open(binary, 'rb') as file:
+        assert(file.read() == release_content("0.5.0"))
+    assert([name for name in os.listdir(os.path.join(usolc_home, "downloads")) if name.endswith(".part")] == [])
+
+
+def test_install_skips_present_versions(usolc_home, mirror_dir):
+    """ Test installed versions are not fetched again unless forced """
+    installer.install(usolc_home, ["0.5.0"], mirror_dir, checksums={})
+    assert(installer.install(usolc_home, ["0.5.0"], mirror_dir, checksums={}) == {"0.5.0": "present"})
+    assert(installer.install(usolc_home, ["0.5.0"], mirror_dir, checksums={}, force=True) ==
+           {"0.5.0": "installed"})
+
+
+def test_install_verifies_checksums(usolc_home, mirror_dir):
+    """ Test a binary not matching its pinned sha256 never reaches bin/ """
+    checksums = {"0.4.24": sha256(release_content("0.4.24")), "0.5.0": "00" * 32}
+    results = installer.install(usolc_home, ["0.4.24", "0.5.0", "0.4.10"], mirror_dir, checksums,
+                                require_checksums=True)
+
+    assert(results["0.4.24"] == "installed")
+    assert(isinstance(results["0.5.0"], ChecksumMismatchError))
+    assert(results["0.5.0"].actual_sha256 == sha256(release_content("0.5.0")))
+    assert(isinstance(results["0.4.10"], ChecksumMismatchError))
+    assert(inventory.installed_versions(usolc_home) == ["0.4.24"])
+
+
+def test_install_over_http(usolc_home, mirror_server):
+    """ Test versions are downloaded concurrently from an HTTP mirror """
+    versions = ["0.4.10", "0.4.24", "0.5.0"]
+    checksums = dict((version, sha256(release_content(version))) for version in versions)
+    results = installer.install(usolc_home, versions, mirror_url(mirror_server), checksums, jobs=3)
+
+    assert(results == dict((version, "installed") for version in versions))
+    # without a list.json, the mirror is laid out like the GitHub releases
+    assert(sorted(path for path, _ in mirror_server.requests) ==
+           ["/list.json", "/v0.4.10/solc", "/v0.4.24/solc-static-linux", "/v0.5.0/solc-static-linux"])
+
+
+def test_install_resumes_interrupted_downloads(usolc_home, mirror_server):
+    """ Test an interrupted download resumes with a range request """
+    mirror_server.flaky = True
+    checksums = {"0.5.0": sha256(release_content("0.5.0"))}
+    results = installer.install(usolc_home, ["0.5.0"], mirror_url(mirror_server), checksums)
+
+    assert(results == {"0.5.0": "installed"})
+    half = len(release_content("0.5.0")) // 2
+    assert(mirror_server.requests == [["/list.json", None], ["/v0.5.0/solc-static-linux", None],
+                                      ["/v0.5.0/solc-static-linux", "bytes={0}-".format(half)]])
+
+
+def test_install_missing_release(usolc_home, mirror_server):
+    """ Test a release missing from the mirror is reported without retrying """
+    results = installer.install(usolc_home, ["0.4.11"], mirror_url(mirror_server), {})
+    assert(isinstance(results["0.4.11"], OSError))
+    assert(len(mirror_server.requests) == 2)
+
+
+def test_install_from_release_list(usolc_home, mirror_server):
+    """ Test a mirror with a list.json is downloaded from by the paths of the list, checked by its sha256 """
+    os.makedirs(os.path.join(mirror_server.mirror, "builds"))
+    for version in ["0.4.24", "0.5.0"]:
+        with open(os.path.join(mirror_server.mirror, "builds", "solc-v" + version), 'wb') as build:
+            build.write(release_content(version))
+    with open(os.path.join(mirror_server.mirror, "list.json"), 'w') as release_list:
+        json.dump({"builds": [
+            {"path": "builds/solc-v0.4.24", "version": "0.4.24", "sha256": "0x" + sha256(release_content("0.4.24"))},
+            {"path": "builds/solc-v0.5.0", "version": "0.5.0", "sha256": "0x" + "00" * 32},
+            {"path": "builds/solc-v0.5.1-nightly", "version": "0.5.1", "prerelease": "nightly"},
+        ]}, release_list)
+
+    results = installer.install(usolc_home, ["0.4.24", "0.5.0", "0.5.1"], mirror_url(mirror_server), {},
+                                require_checksums=True)
+    assert(results["0.4.24"] == "installed")
+    assert(isinstance(results["0.5.0"], ChecksumMismatchError))
+    assert(isinstance(results["0.5.1"], ChecksumMismatchError))
+    assert(sorted(path for path, _ in mirror_server.requests) ==
+           ["/builds/solc-v0.4.24", "/builds/solc-v0.5.0", "/list.json"])
+
+    # a pinned sha256 wins over the list
+    pinned = {"0.5.0": sha256(release_content("0.5.0"))}
+    assert(installer.install(usolc_home, ["0.5.0"], mirror_url(mirror_server), pinned) == {"0.5.0": "installed"})
+
+
+def test_install_checks_published_checksums(usolc_home, mirror_dir, tmp_path):
+    """ Test versions without a pinned sha256 are checked against the published list """
+    checksum_list = tmp_path / "list.json"
+    checksum_list.write_text(json.dumps({"builds": [
+        {"version": "0.4.24", "sha256": "0x" + sha256(release_content("0.4.24"))},
+        {"version": "0.5.0", "sha256": "0x" + "00" * 32},
+        {"version": "0.4.10", "sha256": "0x" + "00" * 32},
+    ]}))
+    pinned = {"0.4.10": sha256(release_content("0.4.10"))}
+    results = installer.install(usolc_home, ["0.4.24", "0.5.0", "0.4.10"], mirror_dir, pinned,
+                                require_checksums=True, checksum_list=str(checksum_list))
+
+    assert([results["0.4.24"], results["0.4.10"]] == ["installed", "installed"])
+    assert(isinstance(results["0.5.0"], ChecksumMismatchError))
+
+    # an unreadable list leaves the versions without a sha256
+    results = installer.install(usolc_home, ["0.5.0"], mirror_dir, {}, require_checksums=True,
+                                checksum_list=str(tmp_path / "missing.json"))
+    assert(isinstance(results["0.5.0"], ChecksumMismatchError))
+
+
+def test_concurrent_installs_fetch_once(usolc_home, mirror_server):
+    """ Test installers of the same version do not share a .part file, the version is fetched once """
+    checksums = {"0.5.0": sha256(release_content("0.5.0"))}
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(
+        installer.install_version(usolc_home, "0.5.0", mirror_url(mirror_server), checksums))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert(sorted(results) == ["installed", "present", "present", "present"])
+    assert(len(mirror_server.requests) == 1)
+    with open(os.path.join(usolc_home, "bin", "solc-0.5.0"), 'rb') as binary:
+        assert(binary.read() == release_content("0.5.0"))
+
+
+def test_read_checksums(tmp_path):
+    """ Test the pinned list format, including the shipped list """
+    checksums = tmp_path / "checksums.txt"
+    checksums.write_text("# comment\n\n0.4.24 ABCDEF  # trailing comment\n")
+    assert(installer.read_checksums(str(checksums)) == {"0.4.24": "abcdef"})
+    assert(isinstance(installer.read_checksums(installer.PINNED_CHECKSUMS), dict))
@@ -0,0 +1,104 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+import os
+import json
+import pytest
+
+import usolc
+import inventory
+import compile_cache
+from conftest import make_stub_solc
+
+
+@pytest.fixture
+def usolc_home(stub_usolc_home, monkeypatch):
+    monkeypatch.setattr(inventory, "inventory_memo", None)
+    return str(stub_usolc_home)
+
+
+def count_hashes(monkeypatch):
+    hashed = []
+    original_hash_file = compile_cache.hash_file
+    monkeypatch.setattr(compile_cache, "hash_file",
+                        lambda filename: hashed.append(os.path.basename(filename)) or original_hash_file(filename))
+    return hashed
+
+
+def test_installed_versions_writes_manifest(usolc_home, monkeypatch):
+    """ Test the first listing writes a manifest describing every binary, without hashing them """
+    hashed = count_hashes(monkeypatch)
+    assert(inventory.installed_versions(usolc_home) == ["0.4.24", "0.4.25", "0.5.0"])
+
+    with open(inventory.manifest_filename(usolc_home)) as file:
+        manifest = json.load(file)
+    entry = manifest["versions"]["0.4.25"]
+    assert(entry["path"] == os.path.join(usolc_home, "bin", "solc-0.4.25"))
+    assert(entry["size"] == os.path.getsize(entry["path"]))
+    assert(entry["sha256"] is None and hashed == [])
+
+    manifest = inventory.refresh_manifest(usolc_home)
+    assert(manifest["versions"]["0.4.25"]["sha256"] == compile_cache.hash_file(entry["path"]))
+
+
+def test_manifest_is_reused(usolc_home, monkeypatch):
+    """ Test a current manifest is loaded without listing or hashing the binaries """
+    inventory.installed_versions(usolc_home)
+    monkeypatch.setattr(inventory, "inventory_memo", None)
+    hashed = count_hashes(monkeypatch)
+    monkeypatch.setattr(os, "listdir", None)
+
+    assert(inventory.installed_versions(usolc_home) == ["0.4.24", "0.4.25", "0.5.0"])
+    assert(hashed == [])
+
+
+def test_manifest_follows_installs(usolc_home, monkeypatch):
+    """ Test installing a binary rebuilds the manifest, hashing only the new binary on refresh """
+    inventory.refresh_manifest(usolc_home)
+    hashed = count_hashes(monkeypatch)
+
+    make_stub_solc(usolc_home, "0.4.11")
+    bin_dir = os.path.join(usolc_home, "bin")
+    os.utime(bin_dir, ns=(1, 1))
+
+    assert(inventory.installed_versions(usolc_home) == ["0.4.11", "0.4.24", "0.4.25", "0.5.0"])
+    assert(hashed == [])
+    assert(inventory.refresh_manifest(usolc_home)["versions"]["0.4.24"]["sha256"] is not None)
+    assert(hashed == ["solc-0.4.11"])
+
+    os.unlink(os.path.join(bin_dir, "solc-0.4.24"))
+    os.utime(bin_dir, ns=(2, 2))
+    assert(inventory.installed_versions(usolc_home) == ["0.4.11", "0.4.25", "0.5.0"])
+
+
+def test_verify_manifest(usolc_home):
+    """ Test a binary rewritten in place is reported by the verification """
+    inventory.refresh_manifest(usolc_home)
+    assert(inventory.verify_manifest(usolc_home) == [])
+
+    with open(os.path.join(usolc_home, "bin", "solc-0.5.0"), "a") as binary:
+        binary.write("# tampered\n")
+    assert(inventory.verify_manifest(usolc_home) == ["0.5.0"])
+    assert(inventory.main(["--verify"]) == 1)
+
+
+def test_read_only_installation(usolc_home, monkeypatch):
+    """ Test a manifest that cannot be written is rebuilt from stat data, without hashing """
+    monkeypatch.setattr(inventory, "write_manifest", lambda usolc_home, manifest: False)
+    hashed = count_hashes(monkeypatch)
+    for _ in range(3):
+        monkeypatch.setattr(inventory, "inventory_memo", None)
+        assert(inventory.installed_versions(usolc_home) == ["0.4.24", "0.4.25", "0.5.0"])
+    assert(hashed == [])
+    assert(inventory.verify_manifest(usolc_home) == ["0.4.24", "0.4.25", "0.5.0"])
+
+
+def test_fetch_supported_solc_versions(usolc_home):
+    """ Test usolc lists the versions of the inventory """
+    assert(usolc.fetch_supported_solc_versions() == ["0.4.24", "0.4.25", "0.5.0"])
@@ -0,0 +1,265 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+import json
+import time
+import socket
+import threading
+import pytest
+
+import usolc
+import jobqueue
+from conftest import make_stub_solc, stub_invocations
+
+
+def job(version, argv=None):
+    return {"id": None, "version": version, "argv": argv or [], "files": {}, "stdin": None}
+
+
+@pytest.fixture(autouse=True)
+def short_polls(monkeypatch):
+    monkeypatch.setattr(jobqueue, "TAKE_TIMEOUT_SECONDS", 0.05)
+
+
+@pytest.fixture
+def sources(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "contracts").mkdir()
+    (tmp_path / "contracts" / "A.sol").write_text('pragma solidity ^0.4.24;\nimport "./lib/L.sol";\ncontract A {}\n')
+    (tmp_path / "contracts" / "lib").mkdir()
+    (tmp_path / "contracts" / "lib" / "L.sol").write_text("pragma solidity ^0.4.24;\ncontract L {}\n")
+    return tmp_path
+
+
+@pytest.fixture
+def worker_home(tmp_path_factory):
+    """ A host of its own, with stubs that tell their outputs apart only by their invocation log """
+    home = tmp_path_factory.mktemp("worker")
+    for version in ["0.4.24", "0.4.25", "0.5.0"]:
+        make_stub_solc(home, version)
+    return home
+
+
+@pytest.fixture
+def queue(worker_home):
+    """ A coordinator with one worker thread compiling with the binaries of worker_home """
+    coordinator = jobqueue.Coordinator()
+    stop = threading.Event()
+    worker = jobqueue.JobWorker(jobqueue.LocalTransport(coordinator), str(worker_home), "w1", "node1")
+    thread = threading.Thread(target=worker.serve, args=(stop,))
+    thread.start()
+    while "w1" not in coordinator.workers:
+        time.sleep(0.01)
+    yield [coordinator, worker]
+    stop.set()
+    thread.join()
+
+
+def test_affinity():
+    """ Test a node keeps the versions it compiled, and idle nodes take the versions nobody is warm for """
+    coordinator = jobqueue.Coordinator()
+    coordinator.register("a", ["0.4.24", "0.5.0", "0.6.0"], "node-a")
+    coordinator.register("b", ["0.4.24", "0.5.0", "0.6.0"], "node-b")
+    ids = [coordinator.submit(job(version)) for version in ["0.4.24", "0.5.0", "0.4.24", "0.6.0", "0.5.0"]]
+
+    assert(coordinator.take("a", 0)["id"] == ids[0])
+    assert(coordinator.take("b", 0)["id"] == ids[1])
+    assert(coordinator.take("b", 0)["id"] == ids[4])
+    assert(coordinator.take("a", 0)["id"] == ids[2])
+    assert(coordinator.take("b", 0)["id"] == ids[3])
+    assert(coordinator.take("a", 0) is None)
+
+
+def test_idle_worker_steals():
+    coordinator = jobqueue.Coordinator()
+    coordinator.register("a", ["0.4.24"], "node-a")
+    coordinator.register("b", ["0.4.24"], "node-b")
+    ids = [coordinator.submit(job("0.4.24")) for _ in range(2)]
+    assert(coordinator.take("a", 0)["id"] == ids[0])
+    assert(coordinator.take("b", 0)["id"] == ids[1])
+
+
+def test_jobs_follow_installed_versions():
+    coordinator = jobqueue.Coordinator()
+    assert(coordinator.submit(job("0.4.24")) is None)
+    coordinator.register("a", ["0.4.24"], "node-a")
+    assert(coordinator.submit(job("0.5.0")) is None)
+    assert(coordinator.submit(job("0.4.24")) is not None)
+
+
+def test_unregister_requeues():
+    """ Test the job of a lost worker goes to another one, or back to its client if none is left """
+    coordinator = jobqueue.Coordinator()
+    coordinator.register("a", ["0.4.24", "0.5.0"], "node-a")
+    coordinator.register("b", ["0.4.24"], "node-b")
+    job_id = coordinator.submit(job("0.4.24"))
+    other_id = coordinator.submit(job("0.5.0"))
+    assert(coordinator.take("a", 0)["id"] == job_id)
+
+    coordinator.unregister("a")
+    coordinator.complete("a", job_id, {"returncode": 0})
+    assert(coordinator.wait(other_id, 0)["error"] == "No worker left for solc 0.5.0")
+    assert(coordinator.wait(job_id, 0) is None)
+    assert(coordinator.take("b", 0)["id"] == job_id)
+
+
+def test_make_job_refuses(sources):
+    graph = usolc.build_unit_graph(["contracts/A.sol"])
+    assert(sorted(jobqueue.make_job("0.4.24", ["contracts/A.sol"], None, graph)["files"]) ==
+           ["contracts/A.sol", "contracts/lib/L.sol"])
+    assert(jobqueue.make_job("0.4.24", ["contracts/A.sol", "-o", "out"], None, graph) is None)
+    assert(jobqueue.make_job("0.4.24", [str(sources / "contracts" / "A.sol")], None,
+                             usolc.build_unit_graph([str(sources / "contracts" / "A.sol")])) is None)
+    (sources / "contracts" / "lib" / "L.sol").unlink()
+    assert(jobqueue.make_job("0.4.24", ["contracts/A.sol"], None, usolc.build_unit_graph(["contracts/A.sol"])) is None)
+
+
+@pytest.mark.parametrize("argv", [
+    ["contracts/A.sol"],
+    ["--combined-json", "abi,bin", "./contracts/A.sol"],
+])
+def test_remote_matches_local(stub_usolc_home, sources, worker_home, queue, argv):
+    """ Test a compilation run by a worker gives what the local solc gives """
+    [coordinator, worker] = queue
+    local = usolc.run_solc_captured("0.4.24", argv)
+    remote = jobqueue.run_remote("0.4.24", argv, None, usolc.build_unit_graph(argv),
+                                 jobqueue.LocalTransport(coordinator))
+    assert(remote == [local.returncode, local.stdout, local.stderr])
+    assert(worker.completed == 1)
+    assert(stub_invocations(worker_home) == 1)
+
+
+def test_remote_standard_json(stub_usolc_home, queue):
+    [coordinator, _] = queue
+    stdin_data = json.dumps({"language": "Solidity", "sources": {"A.sol": {"content": "contract A {}"}}}).encode()
+    remote = jobqueue.run_remote("0.5.0", ["--standard-json"], stdin_data, {}, jobqueue.LocalTransport(coordinator))
+    assert(remote == [0, stdin_data, b""])
+
+
+def test_socket_transport(stub_usolc_home, sources, worker_home, tmp_path, monkeypatch):
+    """ Test usolc compiles through a coordinator and a worker talking over sockets """
+    address = "unix:" + str(tmp_path / "coordinator.sock")
+    server = jobqueue.listen(address)
+    coordinator = jobqueue.Coordinator()
+    threading.Thread(target=jobqueue.serve_forever, args=(coordinator, server), daemon=True).start()
+    stop = threading.Event()
+    worker = threading.Thread(target=jobqueue.serve_worker, args=(address, str(worker_home), "w1", "node1", stop))
+    worker.start()
+    while "w1" not in coordinator.workers:
+        time.sleep(0.01)
+    monkeypatch.setenv("USOLC_COORDINATOR", address)
+    try:
+        for _ in range(2):
+            completed_process = usolc.spawn_solc_captured("0.4.25", ["--combined-json", "abi", "contracts/A.sol"])
+            assert(json.loads(completed_process.stdout.decode())["version"] == "0.4.25")
+        assert(stub_invocations(worker_home) == 2)
+        assert(stub_invocations(stub_usolc_home) == 0)
+
+        # a version the worker does not have is compiled here
+        make_stub_solc(stub_usolc_home, "0.6.0")
+        assert(usolc.spawn_solc_captured("0.6.0", ["contracts/A.sol"]).returncode == 0)
+        assert(stub_invocations(stub_usolc_home) == 1)
+    finally:
+        stop.set()
+        worker.join()
+        server.close()
+
+
+def test_unreachable_coordinator(stub_usolc_home, sources, tmp_path, monkeypatch):
+    monkeypatch.setenv("USOLC_COORDINATOR", "unix:" + str(tmp_path / "nobody.sock"))
+    assert(usolc.spawn_solc_captured("0.4.24", ["contracts/A.sol"]).returncode == 0)
+    assert(stub_invocations(stub_usolc_home) == 1)
+
+
+def test_parse_address():
+    assert(jobqueue.parse_address("unix:/run/q.sock") == [socket.AF_UNIX, "/run/q.sock"])
+    assert(jobqueue.parse_address("run/q.sock") == [socket.AF_UNIX, "run/q.sock"])
+    assert(jobqueue.parse_address("build1:7400") == [socket.AF_INET, ("build1", 7400)])
+    assert(jobqueue.parse_address(":7400") == [socket.AF_INET, ("127.0.0.1", 7400)])
+
+
+@pytest.mark.parametrize("argv,files", [
+    [["contracts/A.sol", "-o", "out"], {"contracts/A.sol": b""}],
+    [["/etc/passwd"], {"contracts/A.sol": b""}],
+    [["contracts/B.sol"], {"contracts/A.sol": b""}],
+    [["x=/etc/", "contracts/A.sol"], {"contracts/A.sol": b""}],
+    [["--allow-paths", "/", "contracts/A.sol"], {"contracts/A.sol": b""}],
+    [["--libraries=/etc/libraries", "contracts/A.sol"], {"contracts/A.sol": b""}],
+])
+def test_worker_checks_jobs(worker_home, argv, files):
+    """ Test a worker refuses the jobs that could read or write anything but their own sources """
+    result = jobqueue.run_job(dict(job("0.4.24", argv), files=files), str(worker_home))
+    assert(result["returncode"] is None and result["error"] is not None)
+    assert(jobqueue.run_job(dict(job("../../../bin/true", ["contracts/A.sol"]), files=files),
+                            str(worker_home))["error"] == "Invalid solc version: ../../../bin/true")
+    assert(stub_invocations(worker_home) == 0)
+
+    allowed = jobqueue.run_job(dict(job("0.4.24", ["lib/=contracts/", "contracts/A.sol"]), files=files),
+                               str(worker_home))
+    assert(allowed["error"] is None and allowed["returncode"] == 0)
+
+
+def serve_coordinator(tmp_path, token=None):
+    address = "unix:" + str(tmp_path / "coordinator.sock")
+    server = jobqueue.listen(address)
+    coordinator = jobqueue.Coordinator()
+    threading.Thread(target=jobqueue.serve_forever, args=(coordinator, server, token), daemon=True).start()
+    return [address, server, coordinator]
+
+
+def test_queue_token(tmp_path, monkeypatch):
+    """ Test a coordinator with a token drops the calls that do not carry it """
+    monkeypatch.setenv("USOLC_QUEUE_TOKEN", "secret")
+    [address, server, coordinator] = serve_coordinator(tmp_path, "secret")
+    try:
+        transport = jobqueue.SocketTransport(address)
+        transport.register("w1", ["0.4.24"], "node1")
+        assert("w1" in coordinator.workers)
+        transport.close()
+
+        monkeypatch.setenv("USOLC_QUEUE_TOKEN", "guess")
+        transport = jobqueue.SocketTransport(address)
+        with pytest.raises(ConnectionError):
+            transport.register("w2", ["0.4.24"], "node1")
+        transport.close()
+        assert("w2" not in coordinator.workers)
+    finally:
+        server.close()
+
+
+def test_listen_beyond_loopback_requires_token(monkeypatch):
+    monkeypatch.delenv("USOLC_QUEUE_TOKEN", raising=False)
+    with pytest.raises(PermissionError):
+        jobqueue.listen("0.0.0.0:0")
+    jobqueue.listen("127.0.0.1:0").close()
+    monkeypatch.setenv("USOLC_QUEUE_TOKEN", "secret")
+    jobqueue.listen("0.0.0.0:0").close()
+
+
+def test_jobs_dropped_on_disconnect(tmp_path, monkeypatch):
+    """ Test the jobs of a client gone before their result are not kept """
+    monkeypatch.delenv("USOLC_QUEUE_TOKEN", raising=False)
+    [address, server, coordinator] = serve_coordinator(tmp_path)
+    try:
+        coordinator.register("w1", ["0.4.24"], "node1")
+        client = jobqueue.SocketTransport(address)
+        done_id = client.submit(dict(job("0.4.24"), files={"A.sol": b"contract A {}"}))
+        queued_id = client.submit(job("0.4.24"))
+        assert(coordinator.take("w1", 0)["id"] == done_id)
+        coordinator.complete("w1", done_id, {"returncode": 0, "stdout": b"x" * 1000, "stderr": b"", "error": None})
+        client.close()
+
+        deadline = time.monotonic() + 5
+        while coordinator.jobs and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert(coordinator.jobs == {} and coordinator.results == {})
+        assert(coordinator.take("w1", 0) is None)
+        assert(queued_id not in coordinator.assigned)
+    finally:
+        server.close()
@@ -0,0 +1,74 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+import pytest
+
+import pragma_scanner
+from usolc import extract_pragma_lines, getrule_from_pragma
+from exceptions.pragmaline_notfound_error import PragmaLineNotFoundError
+from test_usolc import resource
+
+
+@pytest.mark.parametrize("source, expected_rules", [
+    ("pragma solidity ^0.4.24;\ncontract A {}", ["^0.4.24"]),
+    ("    pragma solidity ^0.4.24;\n", ["^0.4.24"]),
+    ("// SPDX-License-Identifier: MIT\npragma solidity >=0.4.22 <0.6.0;\n", [">=0.4.22 <0.6.0"]),
+    ("/* Copyright */ pragma solidity 0.5.0; contract A {}", ["0.5.0"]),
+    ("pragma solidity ^0.4.24; pragma experimental ABIEncoderV2;", ["^0.4.24"]),
+    ("pragma solidity\n    >=0.4.22\n    <0.6.0;\n", [">=0.4.22 <0.6.0"]),
+    ("// pragma solidity ^0.4.0;\npragma solidity ^0.5.0;", ["^0.5.0"]),
+    ("/*\npragma solidity ^0.4.0;\n*/\npragma solidity ^0.5.0;", ["^0.5.0"]),
+    ("contract A { string s = \"pragma solidity ^0.4.0;\"; }", []),
+    ("contract A { string s = 'it''s'; }\npragma solidity ^0.5.0;", ["^0.5.0"]),
+    ("/* unterminated pragma solidity ^0.4.0;", []),
+    ("", []),
+    ("pragma solidity ^0.4.24;\ncontract A {}\n"
+     "// File: B.sol\npragma solidity ^0.4.18;\ncontract B {}\n", ["^0.4.24", "^0.4.18"]),
+])
+def test_scan_pragma_rules(source, expected_rules):
+    """ Test scan_pragma_rules finds pragmas in code only, wherever they are """
+    assert(pragma_scanner.scan_pragma_rules(source) == expected_rules)
+    assert(pragma_scanner.scan_pragma_rules(source.encode("utf-8")) == expected_rules)
+
+
+def test_scan_pragma_rules_first_only():
+    """ Test first_only stops at the first pragma in code """
+    source = "// pragma solidity ^0.4.0;\npragma solidity ^0.4.24;\npragma solidity 0.4.24;"
+    assert(pragma_scanner.scan_pragma_rules(source, first_only=True) == ["^0.4.24"])
+
+
+@pytest.mark.parametrize("source, expected_rules", [
+    ("pragma solidity ^0.4.24;\ncontract A {}\npragma solidity ^0.5.0;", ["^0.4.24"]),
+    ("// contract\n/* library */ string constant s = \"interface\";\npragma solidity ^0.4.24;", ["^0.4.24"]),
+    ("contract A {}\npragma solidity ^0.5.0;", []),
+    ("library L {}\n" + "contract A { string s = \"pragma solidity ^0.4.0;\"; }\n" * 1000, []),
+])
+def test_scan_pragma_rules_first_only_stops_at_header(source, expected_rules):
+    """ Test first_only looks no further than the first definition in code """
+    assert(pragma_scanner.scan_pragma_rules(source, first_only=True) == expected_rules)
+
+
+@pytest.mark.parametrize("filename", [
+    "exactly_one.sol", "caret_0.4.sol", "caret_0.5.sol", "range.sol", "range_or_one.sol",
+    "multipragma_exist.sol", "multipragma_nonexistent.sol", "storage_0.4_to_0.6.sol",
+    "bugs/DAOBug.sol", "bugs/QuantstampAudit.sol", "bugs/Queue.sol", "empty.sol",
+])
+def test_scan_file_pragma_rules_matches_line_scan(filename):
+    """ Test the scanner agrees with the line by line extraction on well-formed files """
+    try:
+        expected_rules = [getrule_from_pragma(line) for line in extract_pragma_lines(resource(filename))]
+    except PragmaLineNotFoundError:
+        expected_rules = []
+    assert(pragma_scanner.scan_file_pragma_rules(resource(filename)) == expected_rules)
+
+
+def test_scan_file_pragma_rules_throws_file_not_found():
+    """ Test scan_file_pragma_rules throws FileNotFoundError when the file doesn't exist """
+    with pytest.raises(FileNotFoundError):
+        pragma_scanner.scan_file_pragma_rules("from_somerandomfilenamethat_shouldnt_exist.sol")
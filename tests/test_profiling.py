@@ -0,0 +1,99 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+import sys
+import json
+import time
+import pytest
+
+import usolc
+import profiling
+from test_usolc import resource
+
+
+@pytest.fixture(autouse=True)
+def no_profile(monkeypatch):
+    monkeypatch.delenv("USOLC_PROFILE", raising=False)
+    monkeypatch.setattr(profiling, "profile", None)
+
+
+@pytest.mark.parametrize("argv, environ, expected_destination", [
+    (["a.sol"], None, None),
+    (["a.sol", "--usolc-profile"], None, "-"),
+    (["--usolc-profile=/tmp/usolc.log", "a.sol"], None, "/tmp/usolc.log"),
+    (["a.sol"], "1", "-"),
+    (["a.sol"], "0", None),
+    (["a.sol"], "/var/log/usolc.log", "/var/log/usolc.log"),
+])
+def test_profile_destination(monkeypatch, argv, environ, expected_destination):
+    """ Test profiling is requested by argument or environment """
+    if environ is not None:
+        monkeypatch.setenv("USOLC_PROFILE", environ)
+    assert(profiling.profile_destination(argv) == expected_destination)
+
+
+def test_disabled_profiling_is_a_no_op(capfd):
+    """ Test nothing is measured nor reported when profiling is disabled """
+    profiling.start(["a.sol"])
+    assert(profiling.phase("scan") is profiling.NO_PHASE)
+    profiling.annotate("version", "0.4.25")
+    profiling.finish(0)
+    assert(capfd.readouterr().err == "")
+
+
+def test_phases_are_exclusive(tmp_path):
+    """ Test the time of nested phases is not counted in the enclosing phase """
+    log = tmp_path / "profile.log"
+    profiling.start(["--usolc-profile=" + str(log)])
+    with profiling.phase("solc"):
+        time.sleep(0.05)
+        with profiling.phase("solc_exec"):
+            time.sleep(0.1)
+    profiling.finish(0)
+
+    [report] = [json.loads(line) for line in log.read_text().splitlines()]
+    assert(90 <= report["phases_ms"]["solc_exec"] < 150)
+    assert(40 <= report["phases_ms"]["solc"] < 90)
+    assert(report["total_ms"] >= 150)
+
+
+def test_main_reports_phases(stub_usolc_home, monkeypatch, tmp_path, capfd):
+    """ Test a profiled invocation appends one JSON record per run to the log """
+    log = tmp_path / "profile.log"
+    monkeypatch.setenv("USOLC_START_TIME", str(time.time() - 0.5))
+    monkeypatch.setattr(sys, "argv", ["solc", resource("caret_0.4.sol"), "--usolc-profile=" + str(log), "--abi"])
+
+    assert(usolc.main() == 0)
+    assert(usolc.main() == 0)
+
+    output = capfd.readouterr().out
+    assert("--usolc-profile" not in output)
+    assert("stub solc 0.4.25" in output)
+
+    reports = [json.loads(line) for line in log.read_text().splitlines()]
+    assert(len(reports) == 2)
+    report = reports[0]
+    assert(report["exit_code"] == 0)
+    assert(report["version"] == "0.4.25")
+    assert(set(report["phases_ms"]) == {"list_versions", "arguments", "scan", "resolve", "provision",
+                                        "solc_exec", "solc"})
+    assert(report["startup_ms"] >= 500)
+    assert(report["solc_maxrss_kb"] > 0)
+    assert(set(report["cache"]) == {"hits", "misses"})
+
+
+def test_main_reports_on_stderr(stub_usolc_home, monkeypatch, capfd):
+    """ Test the report goes to stderr when no log is given """
+    monkeypatch.setenv("USOLC_PROFILE", "1")
+    monkeypatch.setattr(sys, "argv", ["solc", resource("exactly_0.6.0.sol")])
+
+    assert(usolc.main() == 1)
+    report = json.loads(capfd.readouterr().err.splitlines()[-1])
+    assert(report["exit_code"] == 1)
+    assert("version" not in report)
@@ -0,0 +1,140 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+import os
+import sys
+import json
+import time
+import shutil
+import threading
+import pytest
+
+import usolc
+import inventory
+import installer
+import provisioning
+from conftest import make_stub_solc
+from test_usolc import resource
+from exceptions.provisioning_error import ProvisioningError
+
+
+@pytest.fixture
+def mirror(stub_usolc_home, tmp_path, monkeypatch):
+    """
+    A local mirror holding stub releases of 0.4.26 and 0.5.1, with provisioning enabled
+    """
+    mirror = tmp_path / "mirror"
+    for version in ["0.4.26", "0.5.1"]:
+        stub = make_stub_solc(tmp_path / "releases" / version, version)
+        asset = mirror / ("v" + version) / "solc-static-linux"
+        asset.parent.mkdir(parents=True)
+        shutil.copyfile(stub, str(asset))
+
+    catalog = tmp_path / "catalog.txt"
+    catalog.write_text("0.4.24\n0.4.25\n0.4.26\n0.5.0\n0.5.1\n")
+    monkeypatch.setattr(inventory, "inventory_memo", None)
+    monkeypatch.setenv("USOLC_PROVISION", "1")
+    monkeypatch.setenv("USOLC_MIRROR", str(mirror))
+    monkeypatch.setenv("USOLC_CHECKSUM_LIST", "")
+    monkeypatch.setenv("USOLC_CATALOG", str(catalog))
+    return mirror
+
+
+def installed(usolc_home, version):
+    return os.path.exists(os.path.join(str(usolc_home), "bin", "solc-" + version))
+
+
+def test_resolvable_versions(stub_usolc_home, mirror, monkeypatch):
+    """ Test versions are resolved against the catalog only when provisioning is enabled """
+    assert(usolc.fetch_resolvable_solc_versions() == ["0.4.24", "0.4.25", "0.4.26", "0.5.0", "0.5.1"])
+
+    monkeypatch.delenv("USOLC_CATALOG")
+    assert("0.4.11" in usolc.fetch_resolvable_solc_versions())
+
+    monkeypatch.delenv("USOLC_PROVISION")
+    assert(usolc.fetch_resolvable_solc_versions() == ["0.4.24", "0.4.25", "0.5.0"])
+
+
+def test_catalog_from_release_list(stub_usolc_home, mirror, tmp_path, monkeypatch):
+    """ Test the catalog is the list.json of the mirror, kept on disk, and fetched again for a missing version """
+    monkeypatch.delenv("USOLC_CATALOG")
+    builds = [{"path": "v0.4.26/solc-static-linux", "version": "0.4.26"},
+              {"path": "solc-v0.8.0", "version": "0.8.0"}]
+    (mirror / "list.json").write_text(json.dumps({"builds": builds}))
+    fetched = []
+    original_read_release_list = installer.read_release_list
+
+    def counted_read_release_list(location):
+        fetched.append(location)
+        return original_read_release_list(location)
+    monkeypatch.setattr(installer, "read_release_list", counted_read_release_list)
+
+    assert(usolc.fetch_resolvable_solc_versions() == ["0.4.24", "0.4.25", "0.4.26", "0.5.0", "0.8.0"])
+    assert(usolc.fetch_resolvable_solc_versions() == ["0.4.24", "0.4.25", "0.4.26", "0.5.0", "0.8.0"])
+    assert(provisioning.provision(str(stub_usolc_home), "0.4.26"))
+    assert(len(fetched) == 1)
+
+    # a version released since the list was fetched
+    shutil.copytree(str(mirror / "v0.5.1"), str(mirror / "builds"))
+    builds.append({"path": "builds/solc-static-linux", "version": "0.5.1"})
+    (mirror / "list.json").write_text(json.dumps({"builds": builds}))
+    assert(provisioning.provision(str(stub_usolc_home), "0.5.1"))
+    assert(len(fetched) == 2)
+    assert("0.5.1" in usolc.fetch_resolvable_solc_versions())
+
+
+def test_main_provisions_missing_version(stub_usolc_home, mirror, monkeypatch, capfd):
+    """ Test the CLI installs the version it resolved to before running it """
+    monkeypatch.setattr(sys, "argv", ["solc", resource("caret_0.4.sol"), "--abi"])
+    assert(usolc.main() == 0)
+
+    assert(installed(stub_usolc_home, "0.4.26"))
+    assert("stub solc 0.4.26" in capfd.readouterr().out)
+    assert("0.4.26" in inventory.installed_versions(str(stub_usolc_home)))
+
+
+def test_main_reports_provisioning_errors(stub_usolc_home, mirror, monkeypatch, capfd):
+    """ Test a version missing from the mirror fails the compilation with a clear error """
+    shutil.rmtree(str(mirror / "v0.4.26"))
+    monkeypatch.setattr(sys, "argv", ["solc", resource("caret_0.4.sol"), "--abi"])
+
+    assert(usolc.main() == 1)
+    assert("Cannot provision solc 0.4.26" in capfd.readouterr().err)
+    assert(not installed(stub_usolc_home, "0.4.26"))
+
+
+def test_provision_installs_once(stub_usolc_home, mirror, monkeypatch):
+    """ Test concurrent wrappers needing the same version download it only once """
+    fetched = []
+    original_fetch = installer.fetch
+
+    def slow_fetch(mirror, version, part_path, **options):
+        fetched.append(version)
+        time.sleep(0.2)
+        original_fetch(mirror, version, part_path, **options)
+
+    monkeypatch.setattr(installer, "fetch", slow_fetch)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(
+        provisioning.provision(str(stub_usolc_home), "0.5.1"))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert(fetched == ["0.5.1"])
+    assert(sorted(results) == [False, False, False, True])
+    assert(installed(stub_usolc_home, "0.5.1"))
+
+
+def test_provision_error(stub_usolc_home, mirror):
+    """ Test failures are reported as ProvisioningError """
+    with pytest.raises(ProvisioningError) as e:
+        provisioning.provision(str(stub_usolc_home), "0.4.11")
+    assert(e.value.version == "0.4.11")
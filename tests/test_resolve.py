@@ -0,0 +1,107 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+import io
+import json
+import concurrent.futures
+import pytest
+
+import usolc
+import resolve
+from conftest import stub_invocations
+from usolc import VersionChoosing
+
+VERSIONS = ["0.4.24", "0.4.25", "0.5.0"]
+NEWEST = ["*", VersionChoosing.NEWEST]
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    """
+    a/A.sol (^0.4.24, imports ../lib/Lib.sol pinned to 0.4.24), a/deep/B.sol (^0.5.0),
+    lib/Lib.sol, notes.txt
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("USOLC_CACHE_DIR", str(tmp_path / "cache"))
+    (tmp_path / "a" / "deep").mkdir(parents=True)
+    (tmp_path / "lib").mkdir()
+    (tmp_path / "a" / "A.sol").write_text('pragma solidity ^0.4.24;\nimport "../lib/Lib.sol";\ncontract A {}\n')
+    (tmp_path / "a" / "deep" / "B.sol").write_text("pragma solidity ^0.5.0;\ncontract B {}\n")
+    (tmp_path / "lib" / "Lib.sol").write_text("pragma solidity 0.4.24;\nlibrary Lib {}\n")
+    (tmp_path / "notes.txt").write_text("pragma solidity ^0.6.0;\n")
+    return tmp_path
+
+
+def run(paths, follow_imports=False, strategy=NEWEST):
+    output = io.StringIO()
+    failed = resolve.run_resolve(paths, strategy, output, VERSIONS, 4, follow_imports)
+    return [failed, [json.loads(line) for line in output.getvalue().splitlines()]]
+
+
+def test_walk_directories_order(tree):
+    """ Test the concurrent walk returns files in depth-first order, sorted by name """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+        assert(resolve.walk_directories(["."], executor) == ["./a/A.sol", "./a/deep/B.sol", "./lib/Lib.sol"])
+
+
+def test_expand_paths(tree):
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        assert(resolve.expand_paths(["**/B.sol", "lib", "missing.sol"], executor) ==
+               ["a/deep/B.sol", "lib/Lib.sol", "missing.sol"])
+
+
+def test_run_resolve(tree):
+    [failed, results] = run(["a", "missing.sol"])
+    assert(failed == 1)
+    assert(results == [
+        {"file": "a/A.sol", "rules": ["^0.4.24"], "chosen_version": "0.4.25", "error": None},
+        {"file": "a/deep/B.sol", "rules": ["^0.5.0"], "chosen_version": "0.5.0", "error": None},
+        {"file": "missing.sol", "rules": None, "chosen_version": None, "error": "Solidity file not found"},
+    ])
+
+
+def test_run_resolve_follow_imports(tree):
+    [failed, results] = run(["a/A.sol"], follow_imports=True)
+    assert(failed == 0)
+    assert(results == [{"file": "a/A.sol", "rules": ["^0.4.24", "0.4.24"], "chosen_version": "0.4.24",
+                        "error": None}])
+
+
+def test_run_resolve_reports_unsatisfiable(tree):
+    [failed, results] = run(["a"], strategy=["<0.5.0", VersionChoosing.NEWEST])
+    assert(failed == 1)
+    assert(results[0]["chosen_version"] == "0.4.25")
+    assert(results[1]["error"] == "No solc version satisfies both the requirement of the solidity file "
+                                  "(^0.5.0) and the user's rule (<0.5.0)")
+
+
+def test_resolver_shares_resolutions(tree, monkeypatch):
+    """ Test files with the same rules are resolved once """
+    calls = []
+    choose_version_by_rules = usolc.choose_version_by_rules
+    monkeypatch.setattr(usolc, "choose_version_by_rules", lambda *args: calls.append(args) or
+                        choose_version_by_rules(*args))
+    for index in range(10):
+        (tree / "a" / "C{0}.sol".format(index)).write_text("pragma solidity ^0.4.24;\n")
+    run(["a"])
+    assert(len(calls) == 2)
+
+
+def test_main_resolve(stub_usolc_home, tree, capsys):
+    """ Test the subcommand resolves against the installed versions without running solc """
+    assert(resolve.main(["a/**/*.sol", "-U", "-"]) == 0)
+    results = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert([result["chosen_version"] for result in results] == ["0.4.24", "0.5.0"])
+    assert(stub_invocations(stub_usolc_home) == 0)
+
+
+def test_main_resolve_versions_file(tree, capsys):
+    (tree / "versions.txt").write_text("0.4.24\n0.4.26\n")
+    assert(resolve.main(["a/A.sol", "--versions", "versions.txt"]) == 0)
+    assert(json.loads(capsys.readouterr().out)["chosen_version"] == "0.4.26")
@@ -0,0 +1,150 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+import os
+import semver
+import pytest
+
+import usolc
+import rule_table
+from usolc import VersionChoosing, make_semver_filter
+
+VERSIONS = ["0.5.0", "0.4.24", "0.4.25", "0.4.26-nightly.2018.9.25", "0.6.12", "0.4.10"]
+RULES = ["*", "^0.4.24", ">=0.4.22 <0.6.0", "0.4.10 || ^0.6.0", "<0.5.0", ">5.0.0", "garbage", "  ^0.4.24 "]
+
+
+@pytest.fixture
+def table_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("USOLC_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(rule_table, "tables_memo", {})
+    return tmp_path / "rules"
+
+
+def refuse_resolving(monkeypatch):
+    def resolve(self, rule_text, loose):
+        raise AssertionError("resolved " + rule_text)
+    monkeypatch.setattr(rule_table.RuleTable, "resolve", resolve)
+
+
+@pytest.mark.parametrize("rule_text", RULES)
+def test_table_matches_node_semver(table_dir, rule_text):
+    """ Test the answers of the table, fresh and read back from the file, match node-semver """
+    table = rule_table.RuleTable(VERSIONS, str(table_dir))
+    expected = sorted(filter(make_semver_filter(rule_text), VERSIONS), key=table.versions.index)
+    assert(table.filter(rule_text) == expected)
+    assert(table.newest(table.narrow(table.select_all(), rule_text, loose=True)) ==
+           semver.max_satisfying(VERSIONS, rule_text, loose=True))
+    table.save()
+
+    table = rule_table.RuleTable(VERSIONS, str(table_dir))
+    assert(table.file is not None)
+    assert(table.filter(rule_text) == expected)
+    assert(table.oldest(table.narrow(table.select_all(), rule_text)) == usolc.semver_min_satisfying(VERSIONS, rule_text))
+
+
+def test_table_is_shared(table_dir, monkeypatch):
+    """ Test rules saved by two processes are merged and then found without resolving them """
+    first = rule_table.RuleTable(VERSIONS, str(table_dir))
+    second = rule_table.RuleTable(VERSIONS, str(table_dir))
+    first.mask("^0.4.24")
+    second.mask("<0.5.0", loose=True)
+    first.save()
+    second.save()
+
+    refuse_resolving(monkeypatch)
+    assert(first.mask("<0.5.0", loose=True) == second.mask("<0.5.0", loose=True))
+    table = rule_table.RuleTable(list(reversed(VERSIONS)), str(table_dir))
+    assert(table.filter("^0.4.24 ") == ["0.4.24", "0.4.25"])
+    with pytest.raises(AssertionError):
+        table.mask("^0.4.24", loose=True)
+
+
+def test_table_per_inventory(table_dir):
+    """ Test another version list gets its own table, and only the recent tables are kept """
+    for count in range(rule_table.MAX_TABLES + 2):
+        table = rule_table.RuleTable(VERSIONS + ["0.7.{0}".format(count)], str(table_dir))
+        table.mask("*")
+        table.save()
+        assert(os.path.exists(table.path))
+    assert(len([name for name in os.listdir(str(table_dir)) if name.endswith(".table")]) == rule_table.MAX_TABLES)
+
+
+def test_invalid_table_is_rebuilt(table_dir):
+    table = rule_table.RuleTable(VERSIONS, str(table_dir))
+    table_dir.mkdir()
+    with open(table.path, 'wb') as file:
+        file.write(b"USRT\x01\x00")
+    table = rule_table.RuleTable(VERSIONS, str(table_dir))
+    assert(table.file is None)
+    assert(table.filter("^0.5.0") == ["0.5.0"])
+    table.save()
+    assert(rule_table.RuleTable(VERSIONS, str(table_dir)).file is not None)
+
+
+def test_choose_version_by_rules_uses_table(table_dir, monkeypatch):
+    strategy = ["<0.6.0", VersionChoosing.NEWEST]
+    assert(usolc.choose_version_by_rules(VERSIONS, ["^0.4.24"], strategy) == "0.4.25")
+
+    monkeypatch.setattr(rule_table, "tables_memo", {})
+    refuse_resolving(monkeypatch)
+    assert(usolc.choose_version_by_rules(VERSIONS, ["^0.4.24"], strategy) == "0.4.25")
+    assert(usolc.semver_filter(VERSIONS, "^0.4.24") == ["0.4.24", "0.4.25"])
+
+
+def test_table_kept_in_memory_without_cache(tmp_path, monkeypatch):
+    """ Test no table is written unless the cache is enabled or its directory set """
+    monkeypatch.setenv("USOLC_HOME", str(tmp_path))
+    monkeypatch.delenv("USOLC_CACHE_DIR", raising=False)
+    monkeypatch.delenv("USOLC_CACHE", raising=False)
+    monkeypatch.setattr(rule_table, "tables_memo", {})
+    assert(rule_table.table_dir() is None)
+    table = rule_table.get_table(VERSIONS)
+    assert(table.filter("^0.4.24") == ["0.4.24", "0.4.25"])
+    table.save()
+    assert(os.listdir(str(tmp_path)) == [])
+
+    monkeypatch.setenv("USOLC_CACHE", "1")
+    assert(rule_table.table_dir() == str(tmp_path / "cache" / "rules"))
+
+
+def test_read_only_table_dir(table_dir, monkeypatch):
+    """ Test a table that cannot be written is only tried once, and is still read """
+    first = rule_table.RuleTable(VERSIONS, str(table_dir))
+    first.mask("^0.4.24")
+    first.save()
+
+    attempts = []
+
+    def read_only(*args):
+        attempts.append(args)
+        raise PermissionError("read-only")
+    monkeypatch.setattr(rule_table, "merge_table", read_only)
+    table = rule_table.RuleTable(VERSIONS, str(table_dir))
+    for rule_text in ["^0.5.0", "<0.5.0"]:
+        table.mask(rule_text)
+        table.save()
+    assert(len(attempts) == 1 and not table.writable)
+    refuse_resolving(monkeypatch)
+    assert(table.filter("^0.4.24") == ["0.4.24", "0.4.25"])
+
+
+def test_full_table_keeps_used_rules(table_dir, monkeypatch):
+    """ Test a full table drops unused rules to learn new ones """
+    monkeypatch.setattr(rule_table, "MAX_RULES", 3)
+    first = rule_table.RuleTable(VERSIONS, str(table_dir))
+    for rule_text in ["^0.4.0", "^0.5.0", "^0.6.0"]:
+        first.mask(rule_text)
+    first.save()
+
+    second = rule_table.RuleTable(VERSIONS, str(table_dir))
+    second.mask("^0.5.0")
+    second.mask("<0.5.0")
+    second.save()
+    keys = sorted(rule_table.TableFile(second.path).masks())
+    assert(keys == sorted(rule_table.rule_key(rule_text, False) for rule_text in ["^0.5.0", "^0.6.0", "<0.5.0"]))
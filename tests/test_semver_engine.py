@@ -0,0 +1,88 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+import random
+import semver
+import pytest
+
+import semver_engine
+
+VERSIONS = ["0.{0}.{1}".format(minor, patch) for minor in range(0, 9) for patch in [0, 1, 2, 3, 10, 24, 25, 26]] + \
+           ["0.0.3", "0.0.4", "1.0.0", "1.2.3", "2.0.0", "0.4.26-nightly.2018.9.25", "0.5.0-nightly", "0.5.0-0",
+            "0.5.0-1", "0.5.0-alpha", "0.5.0-alpha.1", "0.5.0-beta.1", "1.0.0-rc.1", "0.4.24+commit.e67f0147"]
+
+RULES = [
+    "*", "", "x", "0.4.18", "=0.4.24", "v0.4.24", "==0.4.24", "=v0.4.24", "^0.4.18", "^0.5.0", "^0", "^0.0", "^0.0.3",
+    "^0.x", "^v0.4.24", "~0.4.2", "~0.5", "~0", "~> 0.4.2", "~>0.4", ">=0.4.22 <0.6.0", ">= 0.4.22 < 0.6.0",
+    ">=0.4.0<0.6.0", "^ 0.4.24", "~ 0.4", "  ^0.4.24 ", "0.4.21 || >=0.4.25 <0.6.0", "^0.4.24||^0.5.0",
+    ">0.4.24", ">=0.4.24", "<0.5.0", "<=0.5.0", ">0", "<0", ">=*", ">*", "<*", "=*", "^*", "~*", "x.x.x", "0.x.x",
+    "0.4.x", "0.4.*", "0.4", "=0.4", "=0.4.x", "v0.4", ">0.4.x", ">=0.4", "<0.5", "<=0.4", "<=0.x", "> 0.4",
+    "0.4.2 - 0.5.1", "0.4 - 0.6", "0 - 1", "* - 0.5", "0.4.1 - 0.5.0-beta", "0.5.0-0 - 0.5.0",
+    "^0.5.0-beta", "<0.5.0-0", ">0.5.0-0", "=0.5.0-0", "~0.4.24-0", "0.4.24-nightly", "^0.4.26-nightly.2018.9.25",
+    ">=0.5.0-alpha <0.5.0", ">=0.4.2-0 <0.4.3", ">=0.4.24 <0.4.24", ">5.0.0", "1.2.3beta", "^01.2.3", "0.04.1",
+    "garbage", ">=0.4.0 garbage", "1.x || >=2.5.0 || 5.0.0 - 7.2.3",
+]
+
+
+@pytest.mark.parametrize("loose", [False, True])
+@pytest.mark.parametrize("rule_text", RULES)
+def test_satisfies_matches_node_semver(rule_text, loose):
+    """ Test the engine accepts the same versions as node-semver, which it replaces """
+    for version in VERSIONS:
+        assert(semver_engine.satisfies(version, rule_text, loose) == semver.satisfies(version, rule_text, loose)), \
+            version
+
+
+def test_generated_ranges_match_node_semver():
+    """ Test ranges assembled from the pieces of the pragma syntax, in both modes """
+    generator = random.Random(0)
+    parts = ["0", "1", "4", "5", "24", "x", "*", "00", "01"]
+    prefixes = ["", "=", "<", "<=", ">", ">=", "^", "~", "~>", "v", ">= ", "^ ", "~ "]
+    prereleases = ["", "", "", "-0", "-beta", "-nightly.2018.9.25", "beta"]
+
+    def partial():
+        text = ".".join(generator.choice(parts) for _ in range(generator.choice([1, 2, 3, 3])))
+        return text + (generator.choice(prereleases) if text.count(".") == 2 else "")
+
+    def branch():
+        if generator.random() < 0.15:
+            return partial() + " - " + partial()
+        return " ".join(generator.choice(prefixes) + partial() for _ in range(generator.choice([1, 1, 2, 3])))
+
+    for _ in range(1000):
+        rule_text = " || ".join(branch() for _ in range(generator.choice([1, 1, 2])))
+        loose = generator.random() < 0.5
+        for version in generator.sample(VERSIONS, 8):
+            assert(semver_engine.satisfies(version, rule_text, loose) == semver.satisfies(version, rule_text, loose)), \
+                [version, rule_text, loose]
+
+
+@pytest.mark.parametrize("loose", [False, True])
+def test_compare_matches_node_semver(loose):
+    for first in VERSIONS:
+        for second in VERSIONS:
+            assert(semver_engine.compare(first, second, loose) == semver.compare(first, second, loose))
+
+
+def test_parse_range():
+    assert(semver_engine.parse_range("^0.4.24 || 0.5.x") == (
+        (semver_engine.Comparator(">=", semver_engine.Version(0, 4, 24, ())),
+         semver_engine.Comparator("<", semver_engine.Version(0, 5, 0, ()))),
+        (semver_engine.Comparator(">=", semver_engine.Version(0, 5, 0, ())),
+         semver_engine.Comparator("<", semver_engine.Version(0, 6, 0, ()))),
+    ))
+    assert(semver_engine.parse_range("*") == ((semver_engine.ANY,),))
+    assert(semver_engine.parse_range(">=0.4.0 garbage", loose=True) ==
+           ((semver_engine.Comparator(">=", semver_engine.Version(0, 4, 0, ())),),))
+    with pytest.raises(ValueError):
+        semver_engine.parse_range(">=0.4.0 garbage")
+    with pytest.raises(TypeError):
+        semver_engine.parse_range(None)
+    with pytest.raises(ValueError):
+        semver_engine.satisfies("0.4", "*")
@@ -0,0 +1,146 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+import io
+import os
+import sys
+import pytest
+
+import usolc
+import solc_pool
+
+STDJSON_INPUT = b'{"language": "Solidity", "sources": {"A.sol": {"content": "contract A {}"}}}'
+
+
+@pytest.fixture
+def pool():
+    pool = solc_pool.SolcPool(size=1, max_concurrency=2)
+    yield pool
+    pool.close()
+
+
+def solc_path(usolc_home, version):
+    return os.path.join(str(usolc_home), "bin", "solc-" + version)
+
+
+def test_run_uses_warm_workers(stub_usolc_home, pool):
+    """ Test the first job spawns solc and leaves a warm worker that serves the next one """
+    binary = solc_path(stub_usolc_home, "0.5.0")
+
+    first = pool.run(binary, ["--standard-json"], STDJSON_INPUT)
+    second = pool.run(binary, ["--standard-json"], STDJSON_INPUT)
+
+    assert(first.returncode == second.returncode == 0)
+    assert(first.stdout == second.stdout == STDJSON_INPUT)
+    assert([pool.cold_runs, pool.warm_hits] == [1, 1])
+    assert(len(pool.idle[(binary, ("--standard-json",))]) == 1)
+
+
+def test_run_is_one_shot_for_file_arguments(stub_usolc_home, pool, tmp_path):
+    """ Test invocations reading files are never spawned ahead of time """
+    binary = solc_path(stub_usolc_home, "0.5.0")
+    source = tmp_path / "A.sol"
+    source.write_text("contract A {}\n")
+
+    completed_process = pool.run(binary, [str(source), "--abi"], None)
+    assert(completed_process.returncode == 0)
+    assert(b"stub solc 0.5.0" in completed_process.stdout)
+    assert(not any(pool.idle.values()))
+
+
+def test_run_falls_back_to_one_shot(tmp_path, pool):
+    """ Test a solc exiting before it receives its input is run one-shot from then on """
+    binary = tmp_path / "solc-0.3.6"
+    binary.write_text("#!{0}\nimport sys\nsys.stdout.write('single shot')\n".format(sys.executable))
+    binary.chmod(0o755)
+    key = (str(binary), ("--standard-json",))
+
+    pool.run(str(binary), ["--standard-json"], STDJSON_INPUT)
+    pool.idle[key][0].process.wait()
+    completed_process = pool.run(str(binary), ["--standard-json"], STDJSON_INPUT)
+
+    assert(completed_process.stdout == b"single shot")
+    assert(key in pool.single_shot)
+    assert(not pool.idle[key])
+    assert(pool.warm_hits == 0)
+
+
+def test_evict_idle(stub_usolc_home, pool):
+    """ Test workers past their idle lifetime are killed """
+    binary = solc_path(stub_usolc_home, "0.5.0")
+    pool.warm(binary, ["--standard-json"])
+    worker = pool.idle[(binary, ("--standard-json",))][0]
+
+    assert(pool.evict_idle() == 0)
+    pool.idle_seconds = 0
+    assert(pool.evict_idle() == 1)
+    assert(not worker.alive())
+
+
+def test_get_pool(monkeypatch):
+    """ Test the pool is only created when USOLC_POOL_SIZE is set, in long-lived processes """
+    monkeypatch.setattr(solc_pool, "pool_memo", None)
+    monkeypatch.setattr(solc_pool, "long_lived", True)
+    monkeypatch.delenv("USOLC_POOL_SIZE", raising=False)
+    assert(solc_pool.get_pool() is None)
+
+    monkeypatch.setenv("USOLC_POOL_SIZE", "2")
+    monkeypatch.setenv("USOLC_POOL_MAX_CONCURRENCY", "3")
+    pool = solc_pool.get_pool()
+    assert([pool.size, pool.max_concurrency] == [2, 3])
+    assert(solc_pool.get_pool() is pool)
+
+    # warm workers would escape admission control
+    monkeypatch.setenv("USOLC_JOB_TIMEOUT", "60")
+    assert(solc_pool.get_pool() is None)
+    monkeypatch.delenv("USOLC_JOB_TIMEOUT")
+
+    # one-shot processes would kill the workers they warm at exit
+    monkeypatch.setattr(solc_pool, "long_lived", False)
+    assert(solc_pool.get_pool() is None)
+    pool.close()
+
+
+def test_enable(monkeypatch):
+    """ Test embedders enable the pool of their process by calling enable() """
+    monkeypatch.setattr(solc_pool, "pool_memo", None)
+    monkeypatch.setattr(solc_pool, "long_lived", False)
+    monkeypatch.setenv("USOLC_POOL_SIZE", "1")
+    assert(solc_pool.get_pool() is None)
+
+    solc_pool.enable()
+    pool = solc_pool.get_pool()
+    assert(pool is not None and pool.size == 1)
+    pool.close()
+
+
+def test_run_solc_captured_through_pool(stub_usolc_home, monkeypatch):
+    """ Test standard-json compilations go through the pool when it is enabled """
+    pool = solc_pool.SolcPool(size=1)
+    monkeypatch.setattr(solc_pool, "pool_memo", pool)
+    monkeypatch.setattr(solc_pool, "long_lived", True)
+    monkeypatch.setenv("USOLC_POOL_SIZE", "1")
+
+    for _ in range(3):
+        completed_process = usolc.run_solc_captured("0.4.25", ["--standard-json"], STDJSON_INPUT)
+        assert(completed_process.stdout == STDJSON_INPUT)
+
+    pool.close()
+    assert([pool.cold_runs, pool.warm_hits] == [1, 2])
+
+
+def test_one_shot_invocations_skip_pool(stub_usolc_home, monkeypatch, capfd):
+    """ Test the usolc command does not warm workers it would kill at exit """
+    monkeypatch.setattr(solc_pool, "pool_memo", None)
+    monkeypatch.setattr(solc_pool, "long_lived", False)
+    monkeypatch.setenv("USOLC_POOL_SIZE", "1")
+    monkeypatch.setattr(sys, "stdin", io.TextIOWrapper(io.BytesIO(STDJSON_INPUT)))
+    monkeypatch.setattr(sys, "argv", ["solc", "--standard-json"])
+    assert(usolc.main() == 0)
+    assert(solc_pool.pool_memo is None)
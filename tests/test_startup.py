@@ -0,0 +1,130 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+import os
+import sys
+import time
+import shutil
+import zipfile
+import statistics
+import subprocess
+import pytest
+
+REPO_DIR = os.path.join(os.path.dirname(__file__), "..")
+SRC_DIR = os.path.join(REPO_DIR, "src", "usolc")
+
+# modules a compilation with a fixed version must not load before solc takes over
+DEFERRED_MODULES = ["subprocess", "socket", "tempfile", "shutil", "argparse", "ssl", "urllib.request",
+                    "concurrent.futures", "semver", "installer", "solc_pool", "streaming", "jobqueue"]
+
+# time usolc may add to the start of the interpreter, before solc runs
+STARTUP_BUDGET_SECONDS = 0.1
+
+# stops at the exec of solc and lists the modules loaded by then
+LIST_MODULES = """
+import os
+import sys
+import usolc_client
+
+def execv(path, argv):
+    print(" ".join(sorted(sys.modules)))
+    os._exit(0)
+
+os.execv = execv
+sys.argv = ["solc", "-U", "0.4.25", "A.sol"]
+usolc_client.main()
+"""
+
+
+@pytest.fixture
+def pid_home(tmp_path, monkeypatch):
+    """ A USOLC_HOME whose solc prints its pid and exits with 3, in a directory with a source """
+    (tmp_path / "bin").mkdir()
+    for version in ["0.4.24", "0.4.25"]:
+        stub = tmp_path / "bin" / ("solc-" + version)
+        stub.write_text("#!/bin/sh\necho $$\nexit 3\n")
+        stub.chmod(0o755)
+    (tmp_path / "A.sol").write_text("pragma solidity ^0.4.24;\ncontract A {}\n")
+    monkeypatch.setenv("USOLC_HOME", str(tmp_path))
+    monkeypatch.setenv("USOLC_CACHE_DIR", str(tmp_path / "cache"))
+    for name in ["USOLC_CACHE", "USOLC_PROFILE", "USOLC_COORDINATOR", "USOLC_SOCKET", "USOLC_PROVISION"]:
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def run_usolc(entry_point):
+    """ Returns [pid, exit code, stdout] of usolc run with a fixed version """
+    process = subprocess.Popen([sys.executable, entry_point, "-U", "0.4.25", "A.sol"], stdout=subprocess.PIPE)
+    stdout = process.communicate()[0]
+    return [process.pid, process.returncode, stdout.decode().strip()]
+
+
+def median_run_time(command, rounds=5):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, check=False)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def test_deferred_imports(pid_home):
+    """ Test the common case leaves the heavy modules alone, once the manifest and the rule table are written """
+    for _ in range(2):
+        completed_process = subprocess.run([sys.executable, "-c", LIST_MODULES], stdout=subprocess.PIPE,
+                                           env=dict(os.environ, PYTHONPATH=SRC_DIR), check=True)
+    loaded = completed_process.stdout.decode().split()
+    assert("usolc" in loaded)
+    assert([module for module in DEFERRED_MODULES if module in loaded] == [])
+
+
+def test_solc_replaces_usolc(pid_home):
+    """ Test solc runs in the process started for usolc, and its exit code is the invocation's """
+    [pid, returncode, stdout] = run_usolc(os.path.join(SRC_DIR, "usolc_client.py"))
+    assert([returncode, stdout] == [3, str(pid)])
+
+
+def test_zipapp(pid_home, tmp_path_factory):
+    """ Test the zipapp carries the bytecode of every module and starts within the budget """
+    if shutil.which("make") is None:
+        pytest.skip("make is not installed")
+    build_dir = tmp_path_factory.mktemp("build")
+    subprocess.run(["make", "-s", "-C", REPO_DIR, "zipapp", "BUILD_DIR=" + str(build_dir)], check=True)
+    zipapp = str(build_dir / "usolc.pyz")
+
+    names = zipfile.ZipFile(zipapp).namelist()
+    assert("__main__.pyc" in names and "exceptions/provisioning_error.pyc" in names)
+    assert([name for name in names if name.endswith(".py") and name + "c" not in names] == [])
+
+    [pid, returncode, stdout] = run_usolc(zipapp)
+    assert([returncode, stdout] == [3, str(pid)])
+
+    interpreter = median_run_time([sys.executable, "-c", "pass"])
+    assert(median_run_time([sys.executable, zipapp, "-U", "0.4.25", "A.sol"]) - interpreter < STARTUP_BUDGET_SECONDS)
+
+
+def test_bin_solc_skips_stale_zipapp(tmp_path):
+    """ Test bin/solc runs the zipapp only while no source is newer than it """
+    (tmp_path / "bin").mkdir()
+    shutil.copy(os.path.join(REPO_DIR, "bin", "solc"), str(tmp_path / "bin" / "solc"))
+    (tmp_path / "src" / "usolc").mkdir(parents=True)
+    (tmp_path / "build").mkdir()
+    client = tmp_path / "src" / "usolc" / "usolc_client.py"
+    client.write_text("print('sources')\n")
+    zipapp = tmp_path / "build" / "usolc.pyz"
+    zipapp.write_text("print('zipapp')\n")
+
+    def run_bin_solc():
+        return subprocess.run([str(tmp_path / "bin" / "solc")], stdout=subprocess.PIPE, check=True).stdout.strip()
+
+    os.utime(str(client), (1000, 1000))
+    assert(run_bin_solc() == b"zipapp")
+    os.utime(str(zipapp), (500, 500))
+    assert(run_bin_solc() == b"sources")
@@ -0,0 +1,145 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+import sys
+import json
+import subprocess
+import pytest
+
+import usolc
+import stdjson_split
+from conftest import stub_invocations
+from usolc import VersionChoosing
+from exceptions.noversion_available_by_user import NoVersionAvailableByUser
+
+VERSIONS = ["0.4.24", "0.4.25", "0.5.0"]
+NEWEST = ["*", VersionChoosing.NEWEST]
+
+MIXED_INPUT = {
+    "language": "Solidity",
+    "sources": {
+        "old/Token.sol": {"content": 'pragma solidity ^0.4.24;\nimport "./Math.sol";\ncontract Token {}\n'},
+        "old/Math.sol": {"content": "pragma solidity >=0.4.0;\nlibrary Math {}\n"},
+        "new/Vault.sol": {"content": 'pragma solidity ^0.5.0;\nimport "lib/Safe.sol";\ncontract Vault {}\n'},
+        "vendor/Safe.sol": {"content": "library Safe {}\n"},
+        "Lone.sol": {"content": "pragma solidity 0.4.24;\ncontract Lone {}\n"},
+    },
+    "settings": {"remappings": ["lib/=vendor/"]},
+}
+
+
+def encode(request):
+    return json.dumps(request).encode("utf-8")
+
+
+def test_splittable():
+    assert(stdjson_split.splittable(encode(MIXED_INPUT)))
+    assert(not stdjson_split.splittable(b"not json"))
+    assert(not stdjson_split.splittable(encode({"sources": {"A.sol": {"content": ""}}})))
+    assert(not stdjson_split.splittable(encode({"sources": {"A.sol": {"content": ""}, "B.sol": {"urls": []}}})))
+
+
+def test_components():
+    """ Test relative and remapped imports connect sources """
+    remappings = stdjson_split.input_remappings(MIXED_INPUT)
+    assert(stdjson_split.components(MIXED_INPUT["sources"], remappings) == [
+        ["Lone.sol"],
+        ["new/Vault.sol", "vendor/Safe.sol"],
+        ["old/Math.sol", "old/Token.sol"],
+    ])
+
+
+def test_partition():
+    """ Test components sharing a version are compiled together """
+    assert(stdjson_split.partition(MIXED_INPUT, VERSIONS, NEWEST) == {
+        "0.4.24": ["Lone.sol"],
+        "0.5.0": ["new/Vault.sol", "vendor/Safe.sol"],
+        "0.4.25": ["old/Math.sol", "old/Token.sol"],
+    })
+    with pytest.raises(NoVersionAvailableByUser):
+        stdjson_split.partition(MIXED_INPUT, VERSIONS, ["<0.5.0", VersionChoosing.OLDEST])
+
+
+@pytest.mark.parametrize("source_map, expected", [
+    ("0:10:0:-;5:3:1:o;;:::-;1:2:-1", "0:10:4:-;5:3:2:o;;:::-;1:2:-1"),
+    ("", ""),
+])
+def test_remap_source_map(source_map, expected):
+    assert(stdjson_split.remap_source_map(source_map, {0: 4, 1: 2}) == expected)
+
+
+def completed(output, stderr=b""):
+    return subprocess.CompletedProcess([], 0, json.dumps(output).encode("utf-8"), stderr)
+
+
+def test_merge_outputs_renumbers_sources():
+    """ Test ids follow the order of every source name, in the ASTs and source maps too """
+    old = completed({
+        "sources": {"B.sol": {"id": 0, "ast": {"src": "0:20:0", "nodes": [{"src": "3:4:0"}]}},
+                    "D.sol": {"id": 1, "ast": {"src": "0:9:1"}}},
+        "contracts": {"B.sol": {"B": {"evm": {"bytecode": {"sourceMap": "0:20:0:-;3:4:1:-"}}}}},
+        "errors": [{"severity": "warning", "message": "old"}],
+    })
+    new = completed({
+        "sources": {"A.sol": {"id": 0, "ast": {"src": "0:5:0"}}, "C.sol": {"id": 1, "ast": {"src": "0:7:1"}}},
+        "contracts": {"C.sol": {"C": {"evm": {"deployedBytecode": {"sourceMap": "1:2:1:i"}}}}},
+    })
+    merged = stdjson_split.merge_outputs([["0.4.25", ["B.sol", "D.sol"], old], ["0.5.0", ["A.sol", "C.sol"], new]])
+
+    assert(dict((name, value["id"]) for name, value in merged["sources"].items()) ==
+           {"A.sol": 0, "B.sol": 1, "C.sol": 2, "D.sol": 3})
+    assert(merged["sources"]["B.sol"]["ast"] == {"src": "0:20:1", "nodes": [{"src": "3:4:1"}]})
+    assert(merged["sources"]["D.sol"]["ast"]["src"] == "0:9:3")
+    assert(merged["sources"]["C.sol"]["ast"]["src"] == "0:7:2")
+    assert(merged["contracts"]["B.sol"]["B"]["evm"]["bytecode"]["sourceMap"] == "0:20:1:-;3:4:3:-")
+    assert(merged["contracts"]["C.sol"]["C"]["evm"]["deployedBytecode"]["sourceMap"] == "1:2:2:i")
+    assert(merged["errors"] == [{"severity": "warning", "message": "old"}])
+
+
+def test_merge_outputs_reports_failures():
+    crashed = subprocess.CompletedProcess([], -11, b"", b"Segmentation fault")
+    merged = stdjson_split.merge_outputs([["0.5.0", ["A.sol"], crashed]])
+    assert(merged["contracts"] == {} and merged["sources"] == {})
+    assert(merged["errors"][0]["severity"] == "error")
+    assert("solc 0.5.0 produced no standard-json output: Segmentation fault" in merged["errors"][0]["message"])
+
+
+def test_main_splits_mixed_pragmas(stub_usolc_home, monkeypatch, capfd):
+    """ Test an input no single version accepts is compiled by one solc per version """
+    monkeypatch.setattr(usolc, "read_stdin_bytes", lambda: encode(MIXED_INPUT))
+    monkeypatch.setattr(sys, "argv", ["solc", "--standard-json"])
+    assert(usolc.main() == 0)
+
+    # the stub solc echoes its input: the merged "sources" are those given to every solc
+    output = json.loads(capfd.readouterr().out)
+    assert(output["sources"] == MIXED_INPUT["sources"])
+    assert(stub_invocations(stub_usolc_home) == 3)
+
+
+def test_main_reports_crashed_group(stub_usolc_home, monkeypatch, capfd):
+    """ Test a group killed by a signal fails the invocation even when the other groups succeed """
+    def run_solc_captured(version_chosen, native_argv, stdin_data):
+        if version_chosen == "0.5.0":
+            return subprocess.CompletedProcess([], -11, b"", b"Segmentation fault\n")
+        return subprocess.CompletedProcess([], 0, stdin_data, b"")
+    monkeypatch.setattr(usolc, "run_solc_captured", run_solc_captured)
+    monkeypatch.setattr(usolc, "read_stdin_bytes", lambda: encode(MIXED_INPUT))
+    monkeypatch.setattr(sys, "argv", ["solc", "--standard-json"])
+    assert(usolc.main() == -11)
+    assert("Segmentation fault" in capfd.readouterr().err)
+
+
+def test_main_reports_unsatisfiable_component(stub_usolc_home, monkeypatch, capfd):
+    request = {"sources": {"A.sol": {"content": "pragma solidity ^0.5.0;"},
+                           "B.sol": {"content": "pragma solidity ^0.6.0;"}}}
+    monkeypatch.setattr(usolc, "read_stdin_bytes", lambda: encode(request))
+    monkeypatch.setattr(sys, "argv", ["solc", "--standard-json"])
+    assert(usolc.main() == 1)
+    assert("^0.6.0" in capfd.readouterr().err)
+    assert(stub_invocations(stub_usolc_home) == 0)
@@ -0,0 +1,88 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+import io
+import json
+import tempfile
+import pytest
+
+import streaming
+
+OUTPUT = {
+    "errors": [{"message": 'quote \\" and brace }', "severity": "warning"}],
+    "sources": {
+        "A.sol": {"id": 0, "ast": {"src": "0:10:0", "nodes": [1, 2.5e3, None, True, False]}},
+        "dir/B é.sol": {"id": 1},
+    },
+    "other": [{"x": "]}"}, -12, "skipped"],
+    "contracts": {
+        "A.sol": {"A": {"abi": [], "evm": {"bytecode": {"object": "6060", "sourceMap": "0:1:0:-"}}},
+                  "L": {}},
+    },
+    "last": -1.5,
+}
+
+EXPECTED_ITEMS = [
+    ["error", None, None, OUTPUT["errors"][0]],
+    ["source", "A.sol", None, OUTPUT["sources"]["A.sol"]],
+    ["source", "dir/B é.sol", None, {"id": 1}],
+    ["contract", "A.sol", "A", OUTPUT["contracts"]["A.sol"]["A"]],
+    ["contract", "A.sol", "L", {}],
+]
+
+
+@pytest.mark.parametrize("indent", [None, 2])
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 1 << 20])
+def test_iter_standard_json(indent, chunk_size):
+    """ Test every item is found whatever the chunks the output arrives in """
+    data = json.dumps(OUTPUT, indent=indent, ensure_ascii=False).encode("utf-8")
+    assert(list(streaming.iter_standard_json(io.BytesIO(data), chunk_size)) == EXPECTED_ITEMS)
+
+
+def test_iter_standard_json_truncated():
+    data = json.dumps(OUTPUT).encode("utf-8")
+    with pytest.raises(ValueError):
+        list(streaming.iter_standard_json(io.BytesIO(data[:-10]), 16))
+
+
+def test_parser_skips_without_holding():
+    """ Test a large skipped value is dropped from the buffer while it is being read """
+    parser = streaming.JsonStreamParser(streaming.standard_json_selector)
+    assert(parser.feed(b'{"sources": {}, "huge": "') == [])
+    for _ in range(100):
+        assert(parser.feed(b"x" * 10000) == [])
+        assert(len(parser.buffer) < 100)
+    assert(parser.feed(b'", "errors": [1]}') == [[("errors", 0), 1]])
+    assert(parser.close() == [])
+
+
+def test_parser_emits_root_primitive():
+    parser = streaming.JsonStreamParser(lambda path: streaming.EMIT)
+    assert(parser.feed(b"12") == [])
+    assert(parser.close() == [[(), 12]])
+
+
+def test_send_range_to_descriptor(tmp_path):
+    """ Test a range of a file reaches a stream backed by a file descriptor """
+    with tempfile.TemporaryFile() as source, open(str(tmp_path / "target"), "w") as target:
+        source.write(b"header\npayload")
+        source.flush()
+        target.write("before ")
+        streaming.send_range(target, source.fileno(), 7, 7)
+        target.write(" after")
+    assert((tmp_path / "target").read_text() == "before payload after")
+
+
+def test_send_file_to_text_stream():
+    """ Test a stream without a file descriptor gets a buffered copy """
+    target = io.StringIO()
+    with tempfile.TemporaryFile() as source:
+        source.write("café".encode("utf-8"))
+        streaming.send_file(target, source)
+    assert(target.getvalue() == "café")
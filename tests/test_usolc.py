@@ -10,6 +10,7 @@
 import os
 import pytest
 
+import usolc
 from usolc import *
 from solc import compile_standard
 
@@ -292,3 +293,41 @@ def test_main_standard_json(input_json_file, expected_output_json_file):
     expected_output_json = [elem.rstrip('\n') for elem in list(open(expected_output_json_file, "r"))]
 
     assert(expected_output_json == produced_output_json)
+
+
+def test_main_standard_json_in_memory(stub_usolc_home, monkeypatch, tmp_path, capfd):
+    """
+    Test the standard-json input is resolved from the pragmas of every source and piped
+    to solc unchanged, without going through temporary files
+    """
+    stdin_data = json.dumps({
+        "language": "Solidity",
+        "sources": {
+            "A.sol": {"content": "pragma solidity >=0.4.24;\ncontract A {}\n"},
+            "B.sol": {"content": "// pragma solidity ^0.5.0;\npragma solidity ^0.4.0;\ncontract B {}\n"},
+            "C.sol": {"urls": ["C.sol"]},
+        },
+    }).encode("utf-8")
+    stdin_file = tmp_path / "input.json"
+    stdin_file.write_bytes(stdin_data)
+
+    with open(str(stdin_file), "r") as json_input:
+        monkeypatch.setattr(sys, "stdin", json_input)
+        monkeypatch.setattr(sys, "argv", ["solc", "--standard-json", "-uinfo"])
+        assert(main() == 0)
+
+    output = capfd.readouterr().out
+    assert("solc version: 0.4.25" in output)
+    assert(stdin_data.decode("utf-8") in output)
+    assert(usolc.stdjson_rules == [">=0.4.24", "^0.4.0"])
+
+
+@pytest.mark.parametrize("stdin_data, expected_rules", [
+    (b'{"sources": {"A.sol": {"content": "contract A {}"}}}', ["*"]),
+    (b'{"sources": {"A.sol": {"content": "pragma solidity 0.4.24;"}, '
+     b'"B.sol": {"content": "pragma solidity 0.4.24;"}}}', ["0.4.24"]),
+    (b'not json', ["*"]),
+])
+def test_getrules_from_stdjson(stdin_data, expected_rules):
+    """ Test the pragmas of a standard-json input are collected without repetitions """
+    assert(usolc.getrules_from_stdjson(stdin_data) == expected_rules)
@@ -0,0 +1,278 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+import os
+import sys
+import json
+import time
+import asyncio
+import pytest
+
+import solc_pool
+import usolc_async
+from test_usolc import resource
+from exceptions.solc_execution_error import SolcExecutionError
+
+# A solc that records when it runs, then sleeps before echoing its input
+SLOW_SOLC = """#!{python}
+import os
+import sys
+import time
+with open({log!r}, "a") as log:
+    log.write("{{0}} start {{1}}\\n".format(os.getpid(), time.time()))
+data = sys.stdin.read()
+time.sleep({delay})
+with open({log!r}, "a") as log:
+    log.write("{{0}} end {{1}}\\n".format(os.getpid(), time.time()))
+sys.stdout.write(data)
+sys.exit({returncode})
+"""
+
+
+def make_slow_solc(usolc_home, version, delay, returncode=0):
+    path = os.path.join(str(usolc_home), "bin", "solc-" + version)
+    log = os.path.join(str(usolc_home), "slow.log")
+    with open(path, "w") as stub:
+        stub.write(SLOW_SOLC.format(python=sys.executable, log=log, delay=delay, returncode=returncode))
+    os.chmod(path, 0o755)
+    return log
+
+
+def read_slow_log(log):
+    """
+    Returns {pid: [start, end]} from the log of the slow solc
+    """
+    runs = {}
+    with open(log) as file:
+        for line in file:
+            [pid, event, timestamp] = line.split()
+            runs.setdefault(int(pid), [None, None])[0 if event == "start" else 1] = float(timestamp)
+    return runs
+
+
+def wait_for_log(log):
+    for _ in range(100):
+        if os.path.exists(log):
+            return
+        time.sleep(0.05)
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def test_compile(stub_usolc_home):
+    """ Test the sources are compiled with the version their pragmas require """
+    sources = {"A.sol": "pragma solidity ^0.4.24;\ncontract A {}\n"}
+    [version, output] = asyncio.run(usolc_async.compile(sources, settings={"optimizer": {"enabled": True}}))
+
+    # the stub solc echoes its standard-json input
+    assert(version == "0.4.25")
+    assert(output["sources"] == {"A.sol": {"content": sources["A.sol"]}})
+    assert(output["settings"]["optimizer"] == {"enabled": True})
+    assert(output["settings"]["outputSelection"] == usolc_async.DEFAULT_OUTPUT_SELECTION)
+
+
+def collect(async_iterator):
+    async def run():
+        return [item async for item in async_iterator]
+    return asyncio.run(run())
+
+
+def test_compile_iter(stub_usolc_home):
+    """ Test the items of the output are yielded after the version """
+    sources = {"A.sol": "pragma solidity ^0.4.24;\ncontract A {}\n", "B.sol": "contract B {}\n"}
+    items = collect(usolc_async.compile_iter(sources))
+
+    # the stub solc echoes its standard-json input, whose "sources" are yielded
+    assert(items == [
+        ["version", None, None, "0.4.25"],
+        ["source", "A.sol", None, {"content": sources["A.sol"]}],
+        ["source", "B.sol", None, {"content": sources["B.sol"]}],
+    ])
+
+
+def test_compile_iter_reads_cache(stub_usolc_home, monkeypatch):
+    monkeypatch.setenv("USOLC_CACHE", "1")
+    sources = {"A.sol": "pragma solidity ^0.4.24;\ncontract A {}\n"}
+    [_, output] = asyncio.run(usolc_async.compile(sources))
+    make_slow_solc(stub_usolc_home, "0.4.25", 0, returncode=1)
+
+    items = collect(usolc_async.compile_iter(sources))
+    assert(items[1] == ["source", "A.sol", None, output["sources"]["A.sol"]])
+
+
+def test_compile_iter_failure(stub_usolc_home):
+    make_slow_solc(stub_usolc_home, "0.5.0", 0, returncode=1)
+    with pytest.raises(SolcExecutionError) as e:
+        collect(usolc_async.compile_iter({"A.sol": "contract A {}"}))
+    assert(e.value.returncode == 1)
+
+
+def test_compile_iter_timeout_kills_solc(stub_usolc_home):
+    log = make_slow_solc(stub_usolc_home, "0.5.0", 30)
+    with pytest.raises(asyncio.TimeoutError):
+        collect(usolc_async.compile_iter({"A.sol": "contract A {}"}, timeout=0.5))
+
+    [pid] = read_slow_log(log)
+    assert(not process_alive(pid))
+
+
+@pytest.mark.parametrize("sources, strategy, expected_version", [
+    ({"A.sol": "pragma solidity ^0.4.24;"}, None, "0.4.25"),
+    ({"A.sol": "pragma solidity ^0.4.24;"}, "-", "0.4.24"),
+    ({"A.sol": "pragma solidity >=0.4.24;", "B.sol": "pragma solidity <0.4.25;"}, None, "0.4.24"),
+    ({"A.sol": "contract A {}"}, None, "0.5.0"),
+    (resource("caret_0.4.sol"), None, "0.4.25"),
+])
+def test_resolve_version(stub_usolc_home, sources, strategy, expected_version):
+    """ Test versions are resolved like the CLI resolves them """
+    assert(asyncio.run(usolc_async.resolve_version(sources, strategy)) == expected_version)
+
+
+def test_resolve_version_follows_imports(stub_usolc_home, tmp_path):
+    """ Test a filename is resolved by its whole unit, as on the command line """
+    (tmp_path / "Lib.sol").write_text("pragma solidity 0.4.24;\ncontract Lib {}\n")
+    (tmp_path / "A.sol").write_text("pragma solidity ^0.4.0;\nimport \"./Lib.sol\";\ncontract A {}\n")
+    assert(asyncio.run(usolc_async.resolve_version(str(tmp_path / "A.sol"))) == "0.4.24")
+
+
+def test_compile_failure(stub_usolc_home):
+    """ Test a solc exiting with an error raises SolcExecutionError """
+    make_slow_solc(stub_usolc_home, "0.5.0", 0, returncode=1)
+    with pytest.raises(SolcExecutionError) as e:
+        asyncio.run(usolc_async.compile({"A.sol": "contract A {}"}))
+    assert(e.value.version_chosen == "0.5.0")
+    assert(e.value.returncode == 1)
+
+
+def test_compile_timeout_kills_solc(stub_usolc_home):
+    """ Test a timed out compilation does not leave solc running """
+    log = make_slow_solc(stub_usolc_home, "0.5.0", 30)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(usolc_async.compile({"A.sol": "contract A {}"}, timeout=0.5))
+
+    [pid] = read_slow_log(log)
+    assert(not process_alive(pid))
+
+
+def test_compile_cancellation_kills_solc(stub_usolc_home):
+    """ Test cancelling a compilation kills its solc """
+    log = make_slow_solc(stub_usolc_home, "0.5.0", 30)
+
+    async def compile_then_cancel():
+        task = asyncio.ensure_future(usolc_async.compile({"A.sol": "contract A {}"}))
+        await asyncio.get_running_loop().run_in_executor(None, wait_for_log, log)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(compile_then_cancel())
+    [pid] = read_slow_log(log)
+    assert(not process_alive(pid))
+
+
+def test_compile_concurrency_limit(stub_usolc_home, monkeypatch):
+    """ Test no more solc children than allowed run at the same time """
+    monkeypatch.setenv("USOLC_ASYNC_MAX_CONCURRENCY", "2")
+    log = make_slow_solc(stub_usolc_home, "0.5.0", 0.2)
+
+    async def compile_many():
+        return await asyncio.gather(*[usolc_async.compile({"A.sol": "contract A{0} {{}}".format(i)})
+                                      for i in range(6)])
+
+    results = asyncio.run(compile_many())
+    assert([version for version, _ in results] == ["0.5.0"] * 6)
+
+    runs = list(read_slow_log(log).values())
+    assert(len(runs) == 6)
+    for start, _ in runs:
+        overlapping = [run for run in runs if run[0] <= start < run[1]]
+        assert(len(overlapping) <= 2)
+
+
+def test_governed_compilations(stub_usolc_home, monkeypatch):
+    """ Test compilations go through admission control when it is enabled, timeouts included """
+    monkeypatch.setenv("USOLC_JOB_TIMEOUT", "60")
+    admitted = []
+    original_run = usolc_async.admission.run
+    monkeypatch.setattr(usolc_async.admission, "run",
+                        lambda command, *args, **kwargs: admitted.append(command) or original_run(command, *args, **kwargs))
+
+    sources = {"A.sol": "pragma solidity ^0.4.24;\ncontract A {}\n"}
+    [version, output] = asyncio.run(usolc_async.compile(sources))
+    assert(version == "0.4.25" and output["sources"] == {"A.sol": {"content": sources["A.sol"]}})
+    items = collect(usolc_async.compile_iter(sources))
+    assert(items[1] == ["source", "A.sol", None, {"content": sources["A.sol"]}])
+    assert(len(admitted) == 2)
+
+    log = make_slow_solc(stub_usolc_home, "0.5.0", 30)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(usolc_async.compile({"A.sol": "contract A {}"}, timeout=0.5))
+    [pid] = read_slow_log(log)
+    assert(not process_alive(pid))
+
+
+def test_compilations_on_warm_pool(stub_usolc_home, monkeypatch):
+    """ Test importing usolc_async enables the pool, which serves the compilations without a timeout """
+    assert(solc_pool.long_lived)
+    pool = solc_pool.SolcPool(size=1)
+    monkeypatch.setattr(solc_pool, "pool_memo", pool)
+    monkeypatch.setenv("USOLC_POOL_SIZE", "1")
+
+    sources = {"A.sol": "pragma solidity ^0.4.24;\ncontract A {}\n"}
+    for _ in range(2):
+        [version, output] = asyncio.run(usolc_async.compile(sources))
+        assert(version == "0.4.25" and output["sources"] == {"A.sol": {"content": sources["A.sol"]}})
+    items = collect(usolc_async.compile_iter(sources))
+    assert(items[1] == ["source", "A.sol", None, {"content": sources["A.sol"]}])
+    assert([pool.cold_runs, pool.warm_hits] == [1, 2])
+
+    # a warm solc could not be killed on time
+    log = make_slow_solc(stub_usolc_home, "0.5.0", 30)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(usolc_async.compile({"A.sol": "contract A {}"}, timeout=0.5))
+    [pid] = read_slow_log(log)
+    assert(not process_alive(pid))
+    pool.close()
+    assert([pool.cold_runs, pool.warm_hits] == [1, 2])
+
+
+def test_blocking_work_runs_off_the_loop(stub_usolc_home, monkeypatch):
+    """ Test listing compilers, scanning sources and the compile cache never run on the event loop """
+    monkeypatch.setenv("USOLC_CACHE", "1")
+    on_loop = []
+
+    def off_loop(function):
+        def wrapper(*args, **kwargs):
+            try:
+                asyncio.get_running_loop()
+                on_loop.append(function.__name__)
+            except RuntimeError:
+                pass
+            return function(*args, **kwargs)
+        return wrapper
+
+    for module, name in [[usolc_async.usolc, "fetch_resolvable_solc_versions"],
+                         [usolc_async.usolc, "getrules_from_stdjson"],
+                         [usolc_async.usolc, "choose_version_by_argument"],
+                         [usolc_async.compile_cache, "lookup"], [usolc_async.compile_cache, "store"],
+                         [usolc_async.compile_cache, "open_entry"]]:
+        monkeypatch.setattr(module, name, off_loop(getattr(module, name)))
+
+    sources = {"A.sol": "pragma solidity ^0.4.24;\ncontract A {}\n"}
+    asyncio.run(usolc_async.compile(sources))
+    asyncio.run(usolc_async.compile(sources))
+    collect(usolc_async.compile_iter(sources))
+    assert(asyncio.run(usolc_async.resolve_version(resource("caret_0.4.sol"))) == "0.4.25")
+    assert(on_loop == [])
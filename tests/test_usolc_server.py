@@ -0,0 +1,95 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+import os
+import sys
+import time
+import subprocess
+import pytest
+
+import usolc_protocol
+from conftest import stub_invocations
+from test_usolc import resource
+
+SRC_DIR = os.path.join(os.path.dirname(__file__), "..", "src", "usolc")
+
+
+def run_client(env, argv, stdin_data=b""):
+    return subprocess.run([sys.executable, os.path.join(SRC_DIR, "usolc_client.py")] + argv,
+                          input=stdin_data, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+
+
+@pytest.fixture
+def client_env(stub_usolc_home, tmp_path):
+    env = dict(os.environ)
+    env["USOLC_HOME"] = str(stub_usolc_home)
+    env["USOLC_SOCKET"] = str(tmp_path / "usolc.sock")
+    return env
+
+
+@pytest.fixture
+def daemon(client_env):
+    process = subprocess.Popen([sys.executable, os.path.join(SRC_DIR, "cli.py"), "daemon"],
+                               env=client_env, stderr=subprocess.PIPE)
+    deadline = time.time() + 10
+    while not os.path.exists(client_env["USOLC_SOCKET"]) and time.time() < deadline:
+        time.sleep(0.05)
+    yield process
+    process.terminate()
+    process.wait()
+
+
+def test_request_roundtrip():
+    """ Test decode_request restores what encode_request produced """
+    argv = ["solc", "a b.sol", "--combined-json", "abi,asm"]
+    environ = {"USOLC_HOME": "/usolc", "EMPTY": "", "WITH_EQUALS": "a=b"}
+    payload = usolc_protocol.encode_request(argv, "/tmp", environ)[usolc_protocol.LENGTH_DIGITS:]
+    assert(usolc_protocol.decode_request(payload) == [argv, "/tmp", environ])
+
+
+def test_client_without_daemon_runs_in_process(client_env, stub_usolc_home):
+    """ Test the client falls back to running usolc itself when no daemon is listening """
+    completed_process = run_client(client_env, [resource("caret_0.4.sol"), "--abi", "-U", "0.4.25"])
+    assert(completed_process.returncode == 0)
+    assert(b"stub solc 0.4.25" in completed_process.stdout)
+    assert(stub_invocations(stub_usolc_home) == 1)
+
+
+def test_client_with_daemon(daemon, client_env, stub_usolc_home, tmp_path):
+    """ Test the daemon produces the same outputs and exit codes as the in-process path """
+    argv = ["caret_0.4.sol", "--abi", "-uinfo"]
+    client_env_cwd = dict(client_env, PWD=resource(""))
+
+    with_daemon = subprocess.run(
+        [sys.executable, os.path.join(SRC_DIR, "usolc_client.py")] + argv,
+        cwd=resource(""), env=client_env_cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    assert(daemon.poll() is None)
+
+    without_daemon_env = dict(client_env_cwd, USOLC_SOCKET=str(tmp_path / "missing.sock"))
+    without_daemon = subprocess.run(
+        [sys.executable, os.path.join(SRC_DIR, "usolc_client.py")] + argv,
+        cwd=resource(""), env=without_daemon_env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    assert(with_daemon.returncode == without_daemon.returncode == 0)
+    assert(with_daemon.stdout == without_daemon.stdout)
+    assert(with_daemon.stderr == without_daemon.stderr)
+    assert(stub_invocations(stub_usolc_home) == 2)
+
+
+def test_client_with_daemon_forwards_stdin_and_errors(daemon, client_env):
+    """ Test stdin reaches solc through the daemon and that failures keep their exit code """
+    with open(resource("stdjson-input-0.5.0.json"), "rb") as json_input:
+        stdin_data = json_input.read()
+    completed_process = run_client(client_env, ["--standard-json"], stdin_data)
+    assert(completed_process.returncode == 0)
+    assert(completed_process.stdout == stdin_data)
+
+    completed_process = run_client(client_env, [resource("exactly_0.6.0.sol"), "--bin"])
+    assert(completed_process.returncode == 1)
+    assert(b"requires different compiler version" in completed_process.stderr)
@@ -0,0 +1,78 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+import semver
+import pytest
+
+import version_index
+from usolc import make_semver_filter, semver_min_satisfying
+
+SOLC_VERSIONS = ["0.4.{0}".format(patch) for patch in range(10, 27)] + \
+                ["0.5.{0}".format(patch) for patch in range(0, 18)] + \
+                ["0.6.{0}".format(patch) for patch in range(0, 13)] + \
+                ["0.8.0", "1.0.0", "1.0.1"]
+
+RULES = [
+    "*", "", "x", "0.4.18", "=0.4.24", "v0.4.24", "^0.4.18", "^0.5.0", "~0.4.2", "~0.5",
+    ">=0.4.22 <0.6.0", "0.4.21 || >=0.4.25 <0.6.0", ">0.4.24", ">=0.4.24", "<0.5.0", "<=0.5.0",
+    "0.4.x", "0.4", ">0.4.x", "<=0.4", "0.4.2 - 0.5.1", "^0.5.0-beta", "<0.5.0-0", ">0.5.0-0",
+    "=0.5.0-0", ">=0.4.24 <0.4.24", "^0.0.3", ">5.0.0", "garbage", "0.4.20 || 0.5.3 || ^0.6.2",
+]
+
+
+@pytest.mark.parametrize("rule_text", RULES)
+@pytest.mark.parametrize("version_list", [
+    SOLC_VERSIONS,
+    list(reversed(SOLC_VERSIONS)),
+    ["1.0.1", "0.4.1", "0.3.9", "0.4.2", "0.4.3", "0.4.18", "0.5.0", "1.0.0"],
+    [],
+])
+def test_index_matches_node_semver(version_list, rule_text):
+    """ Test the index gives the same answers as the node-semver functions it replaces """
+    index = version_index.VersionIndex(version_list)
+    assert(index.filter(rule_text) == list(filter(make_semver_filter(rule_text), version_list)))
+    assert(index.max_satisfying(rule_text) == semver.max_satisfying(version_list, rule_text, loose=True))
+    assert(index.min_satisfying(rule_text) == semver_min_satisfying(version_list, rule_text))
+
+
+def test_index_keeps_irregular_versions():
+    """ Test prerelease versions, which cannot be put in the table, are still resolved """
+    version_list = ["0.4.25", "0.5.0-nightly", "0.5.0"]
+    index = version_index.VersionIndex(version_list)
+    assert(index.irregular == [[1, "0.5.0-nightly"]])
+    assert(index.filter("*") == ["0.4.25", "0.5.0"])
+    assert(index.filter(">=0.5.0-nightly") == ["0.5.0-nightly", "0.5.0"])
+    assert(index.min_satisfying(">=0.5.0-nightly") == "0.5.0-nightly")
+    assert(index.max_satisfying("<0.5.0", loose=False) == "0.4.25")
+
+
+def test_narrow_intersects_rules():
+    """ Test narrowing a selection by several rules in a row """
+    index = version_index.VersionIndex(SOLC_VERSIONS)
+    selection = index.narrow(index.select_all(), "^0.4.18")
+    selection = index.narrow(selection, "0.4.20 || >=0.4.24")
+    assert(index.selected_versions(selection) == ["0.4.20", "0.4.24", "0.4.25", "0.4.26"])
+    assert(index.newest(selection) == "0.4.26")
+    assert(index.oldest(selection) == "0.4.20")
+    assert(index.is_empty(index.narrow(selection, "^0.5.0")))
+
+
+def test_parse_rule_intervals_is_memoized():
+    """ Test a rule is parsed once however many times it is resolved """
+    version_index.parse_rule_intervals.cache_clear()
+    index = version_index.VersionIndex(SOLC_VERSIONS)
+    for _ in range(10):
+        index.max_satisfying("^0.4.24")
+    assert(version_index.parse_rule_intervals.cache_info().misses == 1)
+
+
+def test_get_version_index_reuses_index():
+    """ Test the index of a list is only built the first time the list is seen """
+    assert(version_index.get_version_index(SOLC_VERSIONS) is
+           version_index.get_version_index(list(SOLC_VERSIONS)))
@@ -0,0 +1,163 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+import os
+import sys
+import math
+import pytest
+
+import usolc
+import admission
+import version_inference
+from conftest import stub_invocations
+from usolc import VersionChoosing
+from exceptions.noversion_available_by_sol import NoVersionAvailableBySol
+
+# A solc that only compiles the files whose "compiles with LOW - HIGH" comment includes its version
+PROBED_SOLC = """#!{python}
+import re
+import sys
+
+def parse(version):
+    return tuple(int(part) for part in version.split("."))
+
+with open({log!r}, "a") as log:
+    log.write(" ".join(sys.argv) + "\\n")
+for arg in sys.argv[1:]:
+    if arg.endswith(".sol"):
+        match = re.search(r"compiles with (\\S+) - (\\S+)", open(arg).read())
+        if match and not parse(match.group(1)) <= parse("{version}") <= parse(match.group(2)):
+            sys.exit(1)
+"""
+
+VERSIONS = ["0.4.{0}".format(patch) for patch in range(10, 27)] + \
+           ["0.5.{0}".format(patch) for patch in range(0, 18)] + \
+           ["0.6.{0}".format(patch) for patch in range(0, 13)] + ["0.8.0"]
+NEWEST = ["*", VersionChoosing.NEWEST]
+
+
+@pytest.fixture
+def probed_home(tmp_path, monkeypatch):
+    """ A USOLC_HOME with a probed stub for every version, working in a directory of sources """
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    for version in VERSIONS:
+        path = str(bin_dir / ("solc-" + version))
+        with open(path, "w") as stub:
+            stub.write(PROBED_SOLC.format(python=sys.executable, version=version,
+                                          log=str(tmp_path / "invocations.log")))
+        os.chmod(path, 0o755)
+    monkeypatch.setattr(usolc, "USOLC_HOME", str(tmp_path))
+    monkeypatch.setattr(usolc, "flag_infer_version", False)
+    monkeypatch.setenv("USOLC_HOME", str(tmp_path))
+    monkeypatch.setenv("USOLC_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("USOLC_INFER_VERSION", "1")
+    monkeypatch.setenv("USOLC_INFER_JOBS", "4")
+    (tmp_path / "src").mkdir()
+    monkeypatch.chdir(tmp_path / "src")
+    return tmp_path
+
+
+@pytest.mark.parametrize("k", [1, 2, 4, 8])
+@pytest.mark.parametrize("compatible", [[0, 99], [0, 0], [99, 99], [30, 31], [17, 64], [50, 50], [3, 90], None])
+def test_search(k, compatible):
+    """ Test the range is found, in a logarithmic number of rounds once a version passes """
+    versions = ["0.{0}.0".format(position) for position in range(100)]
+    probed = []
+
+    def probe(version):
+        probed.append(version)
+        return compatible is not None and compatible[0] <= versions.index(version) <= compatible[1]
+
+    [found, outcomes, rounds] = version_inference.search(versions, probe, k)
+    assert(len(probed) == len(set(probed)) == len(outcomes))
+    if compatible is None:
+        assert(found is None and len(probed) == len(versions))
+        return
+
+    assert(found == [versions[compatible[0]], versions[compatible[1]]])
+    if compatible[1] - compatible[0] >= len(versions) // k:
+        assert(rounds <= 1 + 2 * math.ceil(math.log(len(versions)) / math.log(max(2, k // 2 + 1))))
+
+    # the outcomes already known need no probe
+    assert(version_inference.search(versions, probe, k, outcomes) == [found, outcomes, 0])
+
+
+def test_probe_arguments():
+    assert(version_inference.probe_arguments(["--combined-json", "abi", "lib=node_modules/lib", "--allow-paths",
+                                              "x,y", "A.sol", "-o", "out", "B.sol"]) ==
+           ["lib=node_modules/lib", "--allow-paths", "x,y", "A.sol", "B.sol"])
+
+
+def test_infer_version(probed_home):
+    """ Test a file without pragma gets the newest version that compiles it, found once """
+    with open("Legacy.sol", "w") as source:
+        source.write("// compiles with 0.4.11 - 0.4.26\ncontract Legacy {}\n")
+
+    assert(usolc.choose_version_by_unit(VERSIONS, ["Legacy.sol"], NEWEST) == "0.4.26")
+    assert(usolc.choose_version_by_unit(VERSIONS, ["Legacy.sol"], ["*", VersionChoosing.OLDEST]) == "0.4.11")
+    probes = stub_invocations(probed_home)
+    assert(0 < probes < len(VERSIONS) // 2)
+    assert(usolc.choose_version_by_unit(VERSIONS, ["Legacy.sol"], NEWEST) == "0.4.26")
+    assert(stub_invocations(probed_home) == probes)
+
+    # a narrower range only probes around its own ends
+    assert(usolc.choose_version_by_unit(VERSIONS, ["Legacy.sol"], ["<0.4.20", VersionChoosing.NEWEST]) == "0.4.19")
+    assert(stub_invocations(probed_home) - probes <= 4)
+
+    with open(str(probed_home / "invocations.log")) as log:
+        invocations = log.read().splitlines()
+    assert(any("solc-0.4.10 --ast-json Legacy.sol" in line for line in invocations))
+    assert(any("solc-0.8.0 --ast-compact-json Legacy.sol" in line for line in invocations))
+
+
+def test_infer_version_follows_content(probed_home):
+    with open("Token.sol", "w") as source:
+        source.write("// compiles with 0.5.0 - 0.6.12\ncontract Token {}\n")
+    assert(usolc.choose_version_by_unit(VERSIONS, ["Token.sol"], NEWEST) == "0.6.12")
+    with open("Token.sol", "w") as source:
+        source.write("// compiles with 0.5.0 - 0.5.3\ncontract Token {}\n")
+    assert(usolc.choose_version_by_unit(VERSIONS, ["Token.sol"], NEWEST) == "0.5.3")
+
+
+def test_pragma_or_disabled_skip_inference(probed_home, monkeypatch):
+    with open("Legacy.sol", "w") as source:
+        source.write("// compiles with 0.4.11 - 0.4.26\ncontract Legacy {}\n")
+    with open("Pinned.sol", "w") as source:
+        source.write("pragma solidity ^0.5.0;\n// compiles with 0.4.11 - 0.4.26\ncontract Pinned {}\n")
+
+    assert(usolc.choose_version_by_unit(VERSIONS, ["Pinned.sol"], NEWEST) == "0.5.17")
+    monkeypatch.delenv("USOLC_INFER_VERSION")
+    assert(usolc.choose_version_by_unit(VERSIONS, ["Legacy.sol"], NEWEST) == "0.8.0")
+    assert(stub_invocations(probed_home) == 0)
+
+    usolc.extract_arguments(["solc", "--infer-version", "Legacy.sol"])
+    assert(usolc.choose_version_by_unit(VERSIONS, ["Legacy.sol"], NEWEST) == "0.4.26")
+
+
+def test_nothing_compiles(probed_home):
+    with open("Future.sol", "w") as source:
+        source.write("// compiles with 0.9.0 - 0.9.9\ncontract Future {}\n")
+    with pytest.raises(NoVersionAvailableBySol):
+        usolc.choose_version_by_unit(VERSIONS, ["Future.sol"], NEWEST)
+    assert(stub_invocations(probed_home) == len(VERSIONS))
+
+
+def test_governed_probes(probed_home, monkeypatch):
+    """ Test probes are admitted like compilations when admission control is enabled """
+    monkeypatch.setenv("USOLC_JOB_TIMEOUT", "60")
+    admitted = []
+    original_run = admission.run
+    monkeypatch.setattr(admission, "run",
+                        lambda command, *args, **kwargs: admitted.append(command) or original_run(command, *args, **kwargs))
+    with open("Legacy.sol", "w") as source:
+        source.write("// compiles with 0.4.11 - 0.4.26\ncontract Legacy {}\n")
+
+    assert(usolc.choose_version_by_unit(VERSIONS, ["Legacy.sol"], NEWEST) == "0.4.26")
+    assert(0 < len(admitted) == stub_invocations(probed_home))
@@ -0,0 +1,176 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2019 Quantstamp, Inc. All rights reserved.  This content shall not be used, copied,          #
+# modified, redistributed, or otherwise disseminated except to the extent expressly authorized by  #
+# Quantstamp for credentialed users. This content and its use are governed by the Quantstamp       #
+# Demonstration License Terms at <https://s3.amazonaws.com/qsp-protocol-license/LICENSE.txt>.      #
+#                                                                                                  #
+####################################################################################################
+
+import os
+import sys
+import time
+import threading
+import pytest
+
+import usolc
+import watch
+from usolc import VersionChoosing
+
+VERSIONS = ["0.4.24", "0.4.25", "0.5.0"]
+NEWEST = ["*", VersionChoosing.NEWEST]
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    """
+    A.sol -> Lib.sol, B.sol on its own
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("USOLC_CACHE_DIR", str(tmp_path / "cache"))
+    (tmp_path / "A.sol").write_text('pragma solidity ^0.4.24;\nimport "./Lib.sol";\ncontract A {}\n')
+    (tmp_path / "Lib.sol").write_text('pragma solidity >=0.4.0;\nlibrary Lib {}\n')
+    (tmp_path / "B.sol").write_text('pragma solidity ^0.5.0;\ncontract B {}\n')
+    return tmp_path
+
+
+class Recorder(object):
+    def __init__(self):
+        self.compiled = []
+
+    def __call__(self, version_chosen, unit_argv):
+        self.compiled.append([version_chosen, unit_argv])
+        return 0
+
+
+@pytest.mark.parametrize("native_argv, unit, expected", [
+    (["A.sol", "B.sol", "--abi"], "A.sol", ["A.sol", "--abi"]),
+    (["--combined-json", "abi,bin", "A.sol", "B.sol"], "B.sol", ["--combined-json", "abi,bin", "B.sol"]),
+    (["-o", "B.sol", "A.sol", "B.sol", "x=y"], "A.sol", ["-o", "B.sol", "A.sol", "x=y"]),
+])
+def test_unit_arguments(native_argv, unit, expected):
+    assert(watch.unit_arguments(native_argv, unit) == expected)
+
+
+def test_session_recompiles_affected_units(project):
+    """ Test only the units importing a changed file are rebuilt, each with its own version """
+    recorder = Recorder()
+    session = watch.WatchSession(VERSIONS, ["A.sol", "B.sol", "--abi"], NEWEST, recorder)
+    session.build_all()
+    assert(recorder.compiled == [["0.4.25", ["A.sol", "--abi"]], ["0.5.0", ["B.sol", "--abi"]]])
+    assert(session.watched_files() == set(str(project / name) for name in ["A.sol", "Lib.sol", "B.sol"]))
+
+    assert(session.affected_units({str(project / "Lib.sol")}) == ["A.sol"])
+    assert(session.affected_units({str(project / "B.sol")}) == ["B.sol"])
+    assert(session.affected_units({str(project / "Other.sol")}) == [])
+
+    (project / "Lib.sol").write_text('pragma solidity 0.4.24;\nlibrary Lib {}\n')
+    session.build("A.sol")
+    assert(recorder.compiled[-1] == ["0.4.24", ["A.sol", "--abi"]])
+
+
+def test_session_keeps_version_when_rules_unchanged(project, monkeypatch):
+    """ Test editing the body of a file does not resolve the version again """
+    session = watch.WatchSession(VERSIONS, ["A.sol"], NEWEST, Recorder())
+    session.build_all()
+
+    calls = []
+    monkeypatch.setattr(usolc, "choose_version_by_rules", lambda *args: calls.append(args))
+    (project / "A.sol").write_text('pragma solidity ^0.4.24;\nimport "./Lib.sol";\ncontract A { uint x; }\n')
+    assert(session.resolve("A.sol") == "0.4.25")
+    assert(calls == [])
+
+
+def test_session_reports_errors_and_goes_on(project, capsys):
+    """ Test a unit without a matching version is reported, and compiled once fixed """
+    recorder = Recorder()
+    session = watch.WatchSession(VERSIONS, ["A.sol"], NEWEST, recorder)
+    (project / "A.sol").write_text('pragma solidity ^0.6.0;\ncontract A {}\n')
+    assert(session.build("A.sol") == 1)
+    assert("A.sol: no solc version satisfies ^0.6.0" in capsys.readouterr().err)
+
+    (project / "A.sol").write_text('pragma solidity ^0.4.0;\ncontract A {}\n')
+    assert(session.build("A.sol") == 0)
+    assert(recorder.compiled == [["0.4.25", ["A.sol"]]])
+
+
+def test_polling_watcher(project):
+    watcher = watch.PollingWatcher(0.01)
+    watcher.watch([str(project / "A.sol"), str(project / "Missing.sol")])
+    assert(watcher.wait(0.05) == set())
+
+    (project / "Missing.sol").write_text("contract M {}\n")
+    assert(watcher.wait(1) == {str(project / "Missing.sol")})
+    assert(watcher.wait(0.05) == set())
+
+
+def test_inotify_watcher(project):
+    try:
+        watcher = watch.InotifyWatcher()
+    except (OSError, AttributeError):
+        pytest.skip("inotify is not available")
+    try:
+        watcher.watch([str(project / "A.sol")])
+        assert(watcher.wait(0.05) == set())
+
+        # editors often save by renaming a new file over the old one
+        (project / "A.sol.swp").write_text("contract A {}\n")
+        os.replace(str(project / "A.sol.swp"), str(project / "A.sol"))
+        assert(watcher.wait(1) == {str(project / "A.sol")})
+        (project / "B.sol").write_text("contract B {}\n")
+        assert(watcher.wait(0.05) == set())
+    finally:
+        watcher.close()
+
+
+def test_wait_for_changes_debounces(project):
+    """ Test a burst of saves is reported as a single round """
+    watcher = watch.PollingWatcher(0.01)
+    watcher.watch([str(project / "A.sol"), str(project / "B.sol")])
+
+    def burst():
+        for i in range(3):
+            (project / "A.sol").write_text("contract A {}\n" + "//\n" * (i + 1))
+            time.sleep(0.03)
+        (project / "B.sol").write_text("contract B {}\n")
+    thread = threading.Thread(target=burst)
+    thread.start()
+    changed = watch.wait_for_changes(watcher, 0.2, timeout=2)
+    thread.join()
+    assert(changed == {str(project / "A.sol"), str(project / "B.sol")})
+
+
+def test_run_rebuilds_on_change(project):
+    """ Test a round of run() recompiles the unit importing the edited file """
+    recorder = Recorder()
+    session = watch.WatchSession(VERSIONS, ["A.sol", "B.sol"], NEWEST, recorder)
+    watcher = watch.PollingWatcher(0.01)
+
+    def edit():
+        while len(recorder.compiled) < 2:
+            time.sleep(0.01)
+        (project / "Lib.sol").write_text('pragma solidity 0.4.24;\nlibrary Lib { }\n')
+    thread = threading.Thread(target=edit)
+    thread.start()
+    watch.run(session, watcher, 0.05, rounds=1)
+    thread.join()
+    assert([version for version, _ in recorder.compiled] == ["0.4.25", "0.5.0", "0.4.24"])
+
+
+def test_main_watch(stub_usolc_home, project, monkeypatch, capfd):
+    """ Test --watch compiles every input file on its own through the stub solc """
+    monkeypatch.setattr(watch, "run", lambda session, watcher, debounce: session.build_all())
+    monkeypatch.setattr(sys, "argv", ["solc", "A.sol", "B.sol", "--watch", "--abi"])
+    assert(usolc.main() == 0)
+
+    captured = capfd.readouterr()
+    assert("stub solc 0.4.25: A.sol --abi" in captured.out)
+    assert("stub solc 0.5.0: B.sol --abi" in captured.out)
+    assert("usolc watch: B.sol: solc 0.5.0, exit code 0" in captured.err)
+
+
+def test_main_watch_refuses_standard_json(stub_usolc_home, project, monkeypatch, capfd):
+    monkeypatch.setattr(usolc, "read_stdin_bytes", lambda: b'{"sources": {}}')
+    monkeypatch.setattr(sys, "argv", ["solc", "--standard-json", "--watch"])
+    assert(usolc.main() == 1)
+    assert("--watch cannot be used with --standard-json" in capfd.readouterr().err)